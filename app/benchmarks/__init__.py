@@ -0,0 +1 @@
+# Scripts de benchmark — à lancer avec python -m app.benchmarks.<nom>
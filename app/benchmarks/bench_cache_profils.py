@@ -0,0 +1,115 @@
+"""
+bench_cache_profils.py — Cache borné des profils : coût des accès, évictions, fautes
+Auteur : Moi (ESIEA 3A)
+
+1. Coût d'un accès : hit (profil en RAM), éviction (écriture dans le débord) et
+   faute (relecture du débord), en µs.
+2. Trafic mixte : `--utilisateurs` apprenants (loi de Zipf, quelques-uns très actifs)
+   répondent, pendant qu'un crawler appelle GET /stats sur des user_id tous différents.
+   On regarde la taille du cache, le nb de profils débordés et le taux de fautes,
+   pour plusieurs tailles de cache.
+
+Lancer :
+    python -m app.benchmarks.bench_cache_profils
+    python -m app.benchmarks.bench_cache_profils --utilisateurs 50000 --reponses 200000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.models import adaptive_model
+from app.models.cache_profils import METRIQUE_CACHE, CacheProfils
+from app.models.profil import Profil
+
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def cout_acces(nb: int = 20_000):
+    cache = CacheProfils(max_profils=nb // 2, ttl_s=0)
+    profils = []
+    for i in range(nb):
+        profil = Profil(f"u{i}")
+        for k in range(30):
+            profil.ajouter(k, k % 2, 20.0, k % 4)
+        profils.append(profil)
+
+    debut = time.perf_counter()
+    for profil in profils:
+        cache[profil.user_id] = profil  # la 2e moitié évince la 1re
+    insertion = (time.perf_counter() - debut) / nb * 1e6
+
+    debut = time.perf_counter()
+    for i in range(nb // 2, nb):
+        cache.obtenir(f"u{i}")
+    hit = (time.perf_counter() - debut) / (nb // 2) * 1e6
+
+    debut = time.perf_counter()
+    for i in range(nb // 2):
+        cache.obtenir(f"u{i}")  # faute + éviction d'un autre
+    faute = (time.perf_counter() - debut) / (nb // 2) * 1e6
+
+    octets = len(profils[0].vers_octets())
+    print(
+        f"  insertion (moitié avec éviction) : {insertion:6.2f} µs | hit : {hit:5.2f} µs | "
+        f"faute + éviction : {faute:6.2f} µs | profil sérialisé : {octets} octets"
+    )
+
+
+def trafic_mixte(max_profils: int, nb_utilisateurs: int, nb_reponses: int, nb_crawler: int):
+    adaptive_model.user_profiles = CacheProfils(max_profils=max_profils, ttl_s=0)
+    avant = dict(METRIQUE_CACHE.valeurs())
+    rng = np.random.default_rng(0)
+    users = (rng.zipf(1.3, nb_reponses) - 1) % nb_utilisateurs
+    scores = rng.integers(0, 2, nb_reponses)
+    crawler_tous_les = max(1, nb_reponses // nb_crawler)
+
+    debut = time.perf_counter()
+    for i in range(nb_reponses):
+        adaptive_model.update_user_profile(
+            f"u{users[i]}", 1 + i % 1000, int(scores[i]), 30.0, SUJETS[i % 4]
+        )
+        if i % crawler_tous_les == 0:
+            adaptive_model.get_stats(f"crawler_{i}")
+    duree = time.perf_counter() - debut
+
+    evenements = {
+        cle[0]: n - avant.get(cle, 0) for cle, n in METRIQUE_CACHE.valeurs().items()
+    }
+    fautes = evenements.get("faute_disque", 0)
+    evictions = sum(n for cle, n in evenements.items() if cle.startswith("eviction"))
+    metriques = adaptive_model.user_profiles.metriques()
+    print(
+        f"  max {max_profils:>7d} : {metriques['profils']:>7d} en RAM "
+        f"({metriques['octets_estimes'] / 1e6:6.1f} Mo estimés), "
+        f"{metriques['profils_debordes']:>7d} débordés | "
+        f"fautes {fautes / nb_reponses:6.2%} des réponses, {evictions} évictions | "
+        f"{duree / nb_reponses * 1e6:6.1f} µs / réponse"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache borné des profils")
+    parser.add_argument("--utilisateurs", type=int, default=20_000)
+    parser.add_argument("--reponses", type=int, default=100_000)
+    parser.add_argument("--crawler", type=int, default=20_000, help="GET /stats inconnus")
+    args = parser.parse_args()
+
+    print("== Coût d'un accès ==")
+    cout_acces()
+
+    print(
+        f"\n== Trafic mixte ({args.utilisateurs} apprenants Zipf, {args.reponses} réponses, "
+        f"{args.crawler} user_id de crawler) =="
+    )
+    ancien = adaptive_model.user_profiles
+    try:
+        for max_profils in (1_000, 5_000, args.utilisateurs):
+            trafic_mixte(max_profils, args.utilisateurs, args.reponses, args.crawler)
+    finally:
+        adaptive_model.user_profiles = ancien
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+bench_charge_api.py — Test de charge en process de l'API + garde-fou de régression
+Auteur : Moi (ESIEA 3A)
+
+On pilote l'app FastAPI directement via httpx.ASGITransport (pas de réseau, pas
+d'uvicorn) avec des sessions d'apprenants réalistes, tirées de la même simulation
+que generate_data.py : pour chaque réponse simulée on fait
+    GET /api/questions → POST /api/reponse   (+ GET /api/stats de temps en temps)
+avec `--concurrence` sessions en parallèle sur `--utilisateurs` apprenants.
+
+Sortie : débit et p50/p95/p99 par endpoint, plus un découpage par étape :
+    validation  : solve_dependencies de FastAPI (query/body → Pydantic)
+    select      : select_question
+    predict     : _predire_niveau (table compilée, lots ou sklearn)
+    pool        : aller-retour vers le pool de processus (avec --pool)
+    serialisation : serialize_response (modèle de réponse → JSON)
+Les étapes sont chronométrées en enveloppant les fonctions pendant le bench
+seulement (rien n'est instrumenté dans l'app elle-même). Ce sont des durées murales :
+pour nos handlers sync, FastAPI sérialise dans le threadpool, donc sous concurrence
+"serialisation" inclut aussi l'attente d'un thread / du GIL (à concurrence 1 on a
+le coût propre, ~0.15ms).
+
+Les résultats sont écrits en JSON ; avec --baseline on compare à un run précédent
+et le script sort en erreur (code 1) si une latence p95/p99 ou un débit se dégrade
+de plus de --seuil (20 % par défaut).
+
+Lancer :
+    python -m app.benchmarks.bench_charge_api
+    python -m app.benchmarks.bench_charge_api --utilisateurs 500 --concurrence 32
+    python -m app.benchmarks.bench_charge_api --sortie base.json
+    python -m app.benchmarks.bench_charge_api --baseline base.json --seuil 0.2
+    python -m app.benchmarks.bench_charge_api --prechargement 3   # file de questions en fond
+    python -m app.benchmarks.bench_charge_api --sklearn            # predict sklearn, sans table
+    python -m app.benchmarks.bench_charge_api --sklearn --pool 4   # ... dans 4 process
+
+Avec --prechargement, le résumé donne aussi le taux de hit de la file. Attention :
+l'ASGITransport attend la fin des tâches de fond avant de rendre la réponse, donc
+ici la file est toujours prête au GET suivant (comme en vrai, où l'apprenant lit
+le feedback pendant des secondes) ; les miss viennent des files périmées.
+
+Avec --pool N (pool de processus, seulement utile avec --sklearn) : les 503 du
+pool saturé (file de --pool-file calculs) apparaissent en "erreurs" sur POST /api/reponse.
+Le gain n'existe qu'avec plusieurs cœurs : sur une machine à 1 cœur on ne mesure
+que le surcoût de l'aller-retour entre process.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import fastapi.routing
+import httpx
+import numpy as np
+
+from app.data.generate_data import SEED, _generer_utilisateurs
+from app.main import app
+from app.models import adaptive_model
+from app.routes import questions
+
+SORTIE_DEFAUT = os.path.join(os.path.dirname(__file__), "resultats", "charge_api.json")
+STATS_TOUTES_LES = 5  # un GET /stats toutes les 5 réponses (+ un en fin de session)
+
+# Endpoint de la requête en cours : posé par la session avant chaque appel.
+# Avec l'ASGITransport l'app tourne dans la même tâche asyncio que le client,
+# et run_in_threadpool copie le contexte → les étapes savent à qui elles appartiennent.
+_endpoint_courant = contextvars.ContextVar("endpoint_courant", default="?")
+
+_latences = defaultdict(list)  # endpoint → durées (s)
+_etapes = defaultdict(list)  # (endpoint, étape) → durées (s)
+_erreurs = defaultdict(int)  # endpoint → nb de réponses non 2xx
+
+
+# ============================================================
+# Chronométrage des étapes (enveloppes posées le temps du bench)
+# ============================================================
+
+
+def _chrono_sync(etape: str, fonction):
+    def enveloppe(*args, **kwargs):
+        debut = time.perf_counter()
+        try:
+            return fonction(*args, **kwargs)
+        finally:
+            _etapes[(_endpoint_courant.get(), etape)].append(time.perf_counter() - debut)
+
+    return enveloppe
+
+
+def _chrono_async(etape: str, fonction):
+    async def enveloppe(*args, **kwargs):
+        debut = time.perf_counter()
+        try:
+            return await fonction(*args, **kwargs)
+        finally:
+            _etapes[(_endpoint_courant.get(), etape)].append(time.perf_counter() - debut)
+
+    return enveloppe
+
+
+def instrumenter() -> list:
+    """Pose les enveloppes ; retourne de quoi les retirer."""
+    cibles = [
+        (fastapi.routing, "solve_dependencies", _chrono_async, "validation"),
+        (fastapi.routing, "serialize_response", _chrono_async, "serialisation"),
+        (questions, "select_question", _chrono_sync, "select"),
+        (adaptive_model, "_predire_niveau", _chrono_sync, "predict"),
+        (questions, "predire_niveaux_deportes", _chrono_async, "pool"),
+    ]
+    originaux = []
+    for module, nom, chrono, etape in cibles:
+        originaux.append((module, nom, getattr(module, nom)))
+        setattr(module, nom, chrono(etape, getattr(module, nom)))
+    return originaux
+
+
+def desinstrumenter(originaux: list):
+    for module, nom, fonction in originaux:
+        setattr(module, nom, fonction)
+
+
+# ============================================================
+# Sessions simulées
+# ============================================================
+
+
+def construire_sessions(nb_utilisateurs: int, seed: int = SEED) -> list:
+    """
+    Une session par apprenant simulé : liste de (sujet, niveau, score, temps).
+    Mêmes lois que generate_data.py (niveau réel, sigmoid de réussite, temps).
+    """
+    rng = np.random.default_rng(seed)
+    df = _generer_utilisateurs(rng, np.arange(nb_utilisateurs), 1)
+    sessions = []
+    for user_id, lignes in df.groupby("user_id", sort=False):
+        sessions.append(
+            (
+                f"charge_{user_id}",
+                list(
+                    zip(
+                        lignes["sujet"],
+                        lignes["niveau_difficulte"].astype(int),
+                        lignes["score"].astype(int),
+                        lignes["temps_secondes"].astype(float),
+                    )
+                ),
+            )
+        )
+    return sessions
+
+
+async def _appel(client, endpoint: str, methode: str, url: str, **kwargs):
+    _endpoint_courant.set(endpoint)
+    debut = time.perf_counter()
+    reponse = await client.request(methode, url, **kwargs)
+    _latences[endpoint].append(time.perf_counter() - debut)
+    if reponse.status_code >= 300:
+        _erreurs[endpoint] += 1
+    return reponse
+
+
+async def jouer_session(client, user_id: str, reponses: list):
+    for i, (sujet, niveau, score, temps) in enumerate(reponses, start=1):
+        q = await _appel(
+            client, "GET /api/questions", "GET", "/api/questions", params={"user_id": user_id}
+        )
+        if q.status_code == 200:
+            question = q.json()
+            question_id = question["question_id"]
+            sujet, niveau = question["sujet"], question["niveau_difficulte"]
+        else:
+            question_id = i
+
+        await _appel(
+            client,
+            "POST /api/reponse",
+            "POST",
+            "/api/reponse",
+            json={
+                "user_id": user_id,
+                "question_id": question_id,
+                "reponse_index": 0 if score else 1 + i % 3,  # 0 = bonne réponse
+                "sujet": sujet,
+                "niveau_difficulte": niveau,
+                "temps_secondes": temps,
+            },
+        )
+        if i % STATS_TOUTES_LES == 0 or i == len(reponses):
+            await _appel(client, "GET /api/stats", "GET", f"/api/stats/{user_id}")
+
+
+async def lancer_charge(sessions: list, concurrence: int) -> float:
+    """Joue toutes les sessions avec `concurrence` sessions en vol. Retourne la durée (s)."""
+    file = asyncio.Queue()
+    for session in sessions:
+        file.put_nowait(session)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def travailleur():
+            while True:
+                try:
+                    user_id, reponses = file.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await jouer_session(client, user_id, reponses)
+
+        debut = time.perf_counter()
+        await asyncio.gather(*(travailleur() for _ in range(concurrence)))
+        return time.perf_counter() - debut
+
+
+# ============================================================
+# Résultats + comparaison à une baseline
+# ============================================================
+
+
+def _percentiles(durees: list) -> dict:
+    ms = np.asarray(durees) * 1e3
+    return {
+        "nb": int(len(ms)),
+        "moyenne_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def resumer(duree_s: float, config: dict) -> dict:
+    endpoints = {}
+    for endpoint, durees in sorted(_latences.items()):
+        endpoints[endpoint] = {
+            **_percentiles(durees),
+            "debit_rps": round(len(durees) / duree_s, 1),
+            "erreurs": _erreurs[endpoint],
+        }
+    etapes = defaultdict(dict)
+    for (endpoint, etape), durees in sorted(_etapes.items()):
+        if endpoint in endpoints:
+            etapes[endpoint][etape] = _percentiles(durees)
+
+    nb_requetes = sum(len(d) for d in _latences.values())
+    resultats_file = adaptive_model.METRIQUE_PRECHARGEMENT.valeurs()
+    servies = resultats_file.get(("servie",), 0)
+    demandes = servies + resultats_file.get(("vide",), 0) + resultats_file.get(("perimee",), 0)
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "duree_s": round(duree_s, 3),
+        "debit_total_rps": round(nb_requetes / duree_s, 1),
+        "endpoints": endpoints,
+        "etapes": dict(etapes),
+        "prechargement": {
+            **{cle[0]: n for cle, n in sorted(resultats_file.items())},
+            "taux_hit": round(servies / demandes, 4) if demandes else None,
+        },
+    }
+
+
+def comparer(resultat: dict, baseline: dict, seuil: float) -> list:
+    """Liste des régressions au-delà du seuil (latences p95/p99 en hausse, débit en baisse)."""
+    regressions = []
+
+    def verifier(nom, actuel, reference, plus_grand_est_pire):
+        if not reference:
+            return
+        ecart = (actuel - reference) / reference
+        if (ecart if plus_grand_est_pire else -ecart) > seuil:
+            regressions.append(f"{nom} : {reference} → {actuel} ({ecart:+.0%})")
+
+    verifier(
+        "débit total (req/s)", resultat["debit_total_rps"], baseline["debit_total_rps"], False
+    )
+    for endpoint, stats in resultat["endpoints"].items():
+        ref = baseline["endpoints"].get(endpoint)
+        if ref is None:
+            continue
+        for cle in ("p95_ms", "p99_ms"):
+            verifier(f"{endpoint} {cle}", stats[cle], ref[cle], True)
+        verifier(f"{endpoint} débit", stats["debit_rps"], ref["debit_rps"], False)
+    return regressions
+
+
+def afficher(resultat: dict):
+    print(
+        f"\n{resultat['duree_s']:.2f}s — {resultat['debit_total_rps']:.0f} req/s au total "
+        f"(mode {resultat['config']['mode']})\n"
+    )
+    print(f"{'endpoint':22s} {'nb':>7s} {'req/s':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+    for endpoint, s in resultat["endpoints"].items():
+        print(
+            f"{endpoint:22s} {s['nb']:>7d} {s['debit_rps']:>8.0f} "
+            f"{s['p50_ms']:>6.2f}ms {s['p95_ms']:>6.2f}ms {s['p99_ms']:>6.2f}ms"
+            + (f"  ({s['erreurs']} erreurs)" if s["erreurs"] else "")
+        )
+        for etape, e in resultat["etapes"].get(endpoint, {}).items():
+            print(
+                f"  └ {etape:18s} {e['nb']:>7d} {'':>8s} "
+                f"{e['p50_ms']:>6.3f}ms {e['p95_ms']:>6.3f}ms {e['p99_ms']:>6.3f}ms"
+            )
+    if resultat["prechargement"]["taux_hit"] is not None:
+        print(f"\nPréchargement : {resultat['prechargement']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge en process de l'API")
+    parser.add_argument("--utilisateurs", type=int, default=200, help="nb d'apprenants simulés")
+    parser.add_argument("--concurrence", type=int, default=16, help="sessions en parallèle")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--sans-modele", action="store_true", help="mode fallback (pas de ML)")
+    parser.add_argument("--sortie", default=SORTIE_DEFAUT, help="fichier JSON des résultats")
+    parser.add_argument("--baseline", default=None, help="JSON d'un run de référence")
+    parser.add_argument("--seuil", type=float, default=0.2, help="dégradation tolérée (0.2 = 20 %%)")
+    parser.add_argument(
+        "--prechargement", type=int, default=0, help="questions préchargées par utilisateur"
+    )
+    parser.add_argument(
+        "--sklearn", action="store_true", help="sans la table compilée (predict sklearn)"
+    )
+    parser.add_argument("--pool", type=int, default=0, help="process du pool de calcul")
+    parser.add_argument(
+        "--pool-file", type=int, default=None, help="calculs en attente max dans le pool"
+    )
+    args = parser.parse_args()
+    adaptive_model.activer_prechargement(args.prechargement)
+
+    if not args.sans_modele:
+        adaptive_model.charger_modele()
+        if args.sklearn:
+            adaptive_model.table_prediction = None
+        if args.pool:
+            adaptive_model.activer_pool_calcul(args.pool, args.pool_file)
+    mode = "ml" if adaptive_model.modele is not None else "fallback"
+    if mode == "ml" and args.sklearn:
+        mode = "ml-sklearn"
+
+    sessions = construire_sessions(args.utilisateurs, args.seed)
+    nb_reponses = sum(len(r) for _, r in sessions)
+    print(
+        f"[CHARGE] {len(sessions)} sessions, {nb_reponses} réponses, "
+        f"concurrence {args.concurrence}"
+    )
+
+    originaux = instrumenter()
+    try:
+        duree = asyncio.run(lancer_charge(sessions, args.concurrence))
+    finally:
+        desinstrumenter(originaux)
+        adaptive_model.desactiver_pool_calcul()
+
+    config = {
+        "utilisateurs": args.utilisateurs,
+        "concurrence": args.concurrence,
+        "seed": args.seed,
+        "nb_reponses": nb_reponses,
+        "prechargement": args.prechargement,
+        "pool": args.pool,
+        "mode": mode,
+    }
+    resultat = resumer(duree, config)
+    afficher(resultat)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.sortie)), exist_ok=True)
+    with open(args.sortie, "w") as f:
+        json.dump(resultat, f, indent=2, ensure_ascii=False)
+    print(f"\n[CHARGE] Résultats écrits dans {args.sortie}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = comparer(resultat, baseline, args.seuil)
+        if regressions:
+            print(f"[ERREUR] Régressions > {args.seuil:.0%} par rapport à {args.baseline} :")
+            for r in regressions:
+                print(f"  - {r}")
+            sys.exit(1)
+        print(f"[CHARGE] Pas de régression > {args.seuil:.0%} par rapport à {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+bench_chargement_dataset.py — Chargement du dataset : CSV pandas vs colonnes en mmap
+Auteur : Moi (ESIEA 3A)
+
+Pour chaque taille (2k, 1M, 10M lignes par défaut) on génère un CSV, on le convertit
+en colonnes (une fois), puis on mesure dans un processus neuf, comme un worker :
+
+- "csv"      : l'ancien chemin, pd.read_csv + df.copy() (le df_global d'avant)
+- "colonnes" : charger_colonnes (np.load en mmap) + construction de l'index des questions,
+               en touchant toutes les colonnes pour que les pages soient vraiment lues
+
+La RSS est séparée en privé (RssAnon, propre à chaque worker) et fichier (RssFile,
+pages du cache disque, partagées entre tous les workers qui mappent les mêmes .npy).
+Les chiffres sont relatifs à la RSS juste après les imports.
+
+Lancer :
+    python -m app.benchmarks.bench_chargement_dataset
+    python -m app.benchmarks.bench_chargement_dataset --tailles 2000 1000000
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.data.colonnes import convertir
+from app.data.generate_data import sauvegarder_en_flux
+
+
+def _rss_ko() -> dict:
+    """RssAnon / RssFile / VmRSS du processus courant, en ko (Linux)."""
+    valeurs = {}
+    with open("/proc/self/status") as f:
+        for ligne in f:
+            cle, _, reste = ligne.partition(":")
+            if cle in ("VmRSS", "RssAnon", "RssFile"):
+                valeurs[cle] = int(reste.split()[0])
+    return valeurs
+
+
+def _mesurer(args: tuple) -> dict:
+    """Exécuté dans un processus neuf : charge le dataset et mesure temps + RSS."""
+    mode, chemin_csv = args
+    import numpy as np
+    import pandas as pd
+
+    from app.data.colonnes import DatasetColonnes, dossier_colonnes
+    from app.models.index_questions import IndexQuestions
+
+    avant = _rss_ko()
+    debut = time.perf_counter()
+    if mode == "csv":
+        df = pd.read_csv(chemin_csv)
+        df_global = df.copy()
+        garde = (df, df_global)
+    else:
+        ds = DatasetColonnes(dossier_colonnes(chemin_csv))
+        for nom in ds.manifeste["colonnes"]:
+            np.add.reduce(ds[nom], dtype=np.float64)  # force la lecture des pages
+        index = IndexQuestions(ds["question_id"], ds["niveau_difficulte"], ds["sujet"], ds.sujets)
+        garde = (ds, index)
+    duree = time.perf_counter() - debut
+    apres = _rss_ko()
+    del garde
+
+    return {
+        "duree_s": duree,
+        "prive_mo": (apres["RssAnon"] - avant["RssAnon"]) / 1024,
+        "fichier_mo": (apres["RssFile"] - avant["RssFile"]) / 1024,
+        "total_mo": (apres["VmRSS"] - avant["VmRSS"]) / 1024,
+    }
+
+
+def _dans_un_processus_neuf(mode: str, chemin_csv: str) -> dict:
+    contexte = multiprocessing.get_context("spawn")
+    with contexte.Pool(1) as pool:
+        return pool.apply(_mesurer, ((mode, chemin_csv),))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV vs colonnes mmap")
+    parser.add_argument(
+        "--tailles", type=int, nargs="+", default=[2_000, 1_000_000, 10_000_000]
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'lignes':>10s} {'mode':>9s} {'chargement':>11s} "
+        f"{'RSS privée':>11s} {'RSS fichier':>12s} {'RSS totale':>11s}"
+    )
+    with tempfile.TemporaryDirectory() as dossier:
+        for nb_lignes in args.tailles:
+            chemin = os.path.join(dossier, f"dataset_{nb_lignes}.csv")
+            sauvegarder_en_flux(chemin, nb_lignes, nb_processus=os.cpu_count() or 1)
+
+            debut = time.perf_counter()
+            convertir(chemin)
+            duree_conversion = time.perf_counter() - debut
+            taille_csv = os.path.getsize(chemin) / 2**20
+
+            for mode in ("csv", "colonnes"):
+                r = _dans_un_processus_neuf(mode, chemin)
+                print(
+                    f"{nb_lignes:>10d} {mode:>9s} {r['duree_s'] * 1e3:>9.1f}ms "
+                    f"{r['prive_mo']:>9.1f}Mo {r['fichier_mo']:>10.1f}Mo {r['total_mo']:>9.1f}Mo"
+                )
+            print(f"{'':>10s} conversion unique : {duree_conversion:.2f}s (CSV {taille_csv:.0f}Mo)")
+            os.remove(chemin)
+
+
+if __name__ == "__main__":
+    main()
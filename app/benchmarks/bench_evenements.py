@@ -0,0 +1,157 @@
+"""
+bench_evenements.py — Journal des réponses : coût par réponse, écriture, pertes, lecture
+Auteur : Moi (ESIEA 3A)
+
+1. Chemin de la requête : update_user_profile sans / avec le journal (µs par réponse),
+   et ajouter() seul. Objectif : quelques µs, aucune I/O.
+2. Écriture : `--evenements` événements poussés d'un coup (politique "attendre", rien
+   n'est perdu), débit soutenu et octets par événement sur disque (Parquet zstd).
+3. Mémoire bornée : mêmes événements avec 2 petits tampons, en "perdre" (la réponse
+   n'attend jamais, on compte les pertes) et en "attendre" (latence max d'ajouter()).
+4. Lecture : scan complet par lots, scan d'un seul sujet (élagage des partitions),
+   deux colonnes seulement, et reponses_recentes() pour le ré-entraînement.
+
+Lancer :
+    python -m app.benchmarks.bench_evenements
+    python -m app.benchmarks.bench_evenements --evenements 5000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.models import adaptive_model, evenements
+from app.models.evenements import JournalEvenements
+
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def taille_dossier(dossier: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(racine, nom))
+        for racine, _, noms in os.walk(dossier)
+        for nom in noms
+    )
+
+
+def cout_reponse(nb: int = 30_000) -> float:
+    """µs par update_user_profile (1000 utilisateurs, profils déjà en cache)."""
+    for i in range(1000):
+        adaptive_model.update_user_profile(f"bench_{i}", 0, 1, 20.0, "python", niveau_question=2)
+    debut = time.perf_counter()
+    for i in range(nb):
+        adaptive_model.update_user_profile(
+            f"bench_{i % 1000}", i, i % 2, 20.0 + i % 30, SUJETS[i % 4], niveau_question=1 + i % 5
+        )
+    return (time.perf_counter() - debut) / nb * 1e6
+
+
+def pousser(journal: JournalEvenements, nb: int) -> tuple:
+    """nb ajouter() d'affilée : (durée totale, pire latence d'un ajouter en s)."""
+    pire = 0.0
+    debut = time.perf_counter()
+    for i in range(nb):
+        avant = time.perf_counter()
+        journal.ajouter(
+            f"apprenant_{i % 100_000}", i, i % 2, 5.0 + i % 60, SUJETS[i % 4], 1 + i % 5, 3
+        )
+        pire = max(pire, time.perf_counter() - avant)
+    return time.perf_counter() - debut, pire
+
+
+def chemin_requete(dossier: str):
+    sans = cout_reponse()
+    adaptive_model.activer_evenements(os.path.join(dossier, "requete"))
+    avec = cout_reponse()
+    adaptive_model.desactiver_evenements()
+    print(f"  update_user_profile sans journal : {sans:6.1f} µs")
+    print(f"  update_user_profile avec journal : {avec:6.1f} µs (surcoût {avec - sans:+.1f} µs)")
+    journal = JournalEvenements(os.path.join(dossier, "seul"))
+    duree, _ = pousser(journal, 200_000)
+    journal.fermer()
+    print(f"  ajouter() seul                   : {duree / 200_000 * 1e6:6.1f} µs "
+          f"({journal.metriques()['evenements_perdus']} perdus)")
+
+
+def ecriture(dossier: str, nb: int):
+    journal = JournalEvenements(dossier, politique="attendre", attente_max_s=60)
+    debut = time.perf_counter()
+    pousser(journal, nb)
+    journal.vider()
+    duree = time.perf_counter() - debut
+    metriques = journal.metriques()
+    journal.fermer()
+    octets = taille_dossier(dossier)
+    print(
+        f"  {nb} événements écrits en {duree:.1f}s ({nb / duree:,.0f} / s), "
+        f"{metriques['fichiers_ecrits']} fichiers, {octets / 1e6:.1f} Mo "
+        f"({octets / nb:.1f} octets / événement), {metriques['evenements_perdus']} perdus"
+    )
+
+
+def memoire_bornee(dossier: str, nb: int):
+    for politique in ("perdre", "attendre"):
+        journal = JournalEvenements(
+            os.path.join(dossier, politique), taille_tampon=4096, nb_tampons=2,
+            politique=politique, attente_max_s=1.0,
+        )
+        duree, pire = pousser(journal, nb)
+        journal.fermer()
+        metriques = journal.metriques()
+        print(
+            f"  {politique:8s} : 2 tampons de 4096 lignes, {nb / duree:,.0f} ajouter/s, "
+            f"pire ajouter {pire * 1e3:.1f} ms, {metriques['evenements_perdus']} perdus "
+            f"({metriques['evenements_perdus'] / nb:.1%})"
+        )
+
+
+def lecture(dossier: str):
+    debut = time.perf_counter()
+    lignes = sum(len(df) for df in evenements.scanner(dossier))
+    duree = time.perf_counter() - debut
+    print(
+        f"  scan complet par lots      : {lignes} lignes en {duree:.2f}s "
+        f"({lignes / duree:,.0f} / s)"
+    )
+
+    debut = time.perf_counter()
+    lignes = sum(len(df) for df in evenements.scanner(dossier, sujets=["algo"]))
+    print(f"  un sujet (partition)       : {lignes} lignes en {time.perf_counter() - debut:.2f}s")
+
+    debut = time.perf_counter()
+    df = evenements.lire(dossier, colonnes=["score", "niveau_question"])
+    taux = df.groupby("niveau_question")["score"].mean()
+    print(
+        f"  2 colonnes, taux par niveau: {time.perf_counter() - debut:.2f}s "
+        f"({', '.join(f'{n}: {t:.2f}' for n, t in taux.items())})"
+    )
+
+    debut = time.perf_counter()
+    reponses = evenements.reponses_recentes(dossier, 100_000)
+    print(
+        f"  reponses_recentes(100k)    : {time.perf_counter() - debut:.2f}s "
+        f"(niveaux {np.bincount(reponses['niveau'])[1:].tolist()})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal des réponses en Parquet")
+    parser.add_argument("--evenements", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        print("== Chemin de la requête ==")
+        chemin_requete(dossier)
+        print(f"\n== Écriture de {args.evenements} événements ==")
+        ecriture(os.path.join(dossier, "journal"), args.evenements)
+        print("\n== Mémoire bornée (écrivain plus lent que les réponses) ==")
+        memoire_bornee(os.path.join(dossier, "borne"), min(args.evenements, 500_000))
+        print("\n== Lecture ==")
+        lecture(os.path.join(dossier, "journal"))
+
+
+if __name__ == "__main__":
+    main()
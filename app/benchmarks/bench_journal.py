@@ -0,0 +1,136 @@
+"""
+bench_journal.py — Snapshot binaire + journal : coût de l'ajout, snapshot, récupération
+Auteur : Moi (ESIEA 3A)
+
+1. Surcoût du journal sur une réponse : update_user_profile avec le stockage mémoire
+   vs le journal (fsync groupés toutes les 10 ms), en µs par réponse. Objectif < 50 µs.
+   Le mode synchrone (on attend le fsync) est mesuré à part : là c'est la latence
+   du disque + la fenêtre du group commit.
+2. Récupération : `--profils` profils journalisés, snapshot, puis une queue de journal
+   de `--queue` réponses. On mesure le temps du snapshot (compaction comprise) et le
+   temps de redémarrage (ouverture du snapshot en mmap + rejeu de la queue), comparé
+   au rejeu d'un journal sans snapshot.
+
+Lancer :
+    python -m app.benchmarks.bench_journal
+    python -m app.benchmarks.bench_journal --profils 1000000 --queue 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from app.models import adaptive_model
+from app.models.journal import StockageJournal
+from app.models.profil import Profil
+from app.models.stockage import StockageMemoire
+
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def taille_dossier(dossier: str) -> int:
+    return sum(os.path.getsize(os.path.join(dossier, f)) for f in os.listdir(dossier))
+
+
+def cout_reponse(stockage, nb: int = 30_000) -> float:
+    """µs par update_user_profile (1000 utilisateurs, profils déjà en cache)."""
+    adaptive_model.changer_stockage(stockage)
+    for i in range(1000):
+        adaptive_model.update_user_profile(f"bench_{i}", 0, 1, 20.0, "python")
+    debut = time.perf_counter()
+    for i in range(nb):
+        adaptive_model.update_user_profile(
+            f"bench_{i % 1000}", i, i % 2, 20.0 + i % 30, SUJETS[i % 4]
+        )
+    return (time.perf_counter() - debut) / nb * 1e6
+
+
+def surcout_ajout(dossier: str):
+    memoire = cout_reponse(StockageMemoire())
+    journal = cout_reponse(StockageJournal(os.path.join(dossier, "async")))
+    metriques = adaptive_model.stockage.metriques()
+    synchrone = cout_reponse(
+        StockageJournal(os.path.join(dossier, "sync"), synchrone=True), nb=300
+    )
+    adaptive_model.changer_stockage(StockageMemoire())
+    print(f"  update_user_profile, stockage mémoire  : {memoire:7.1f} µs")
+    print(
+        f"  update_user_profile, journal           : {journal:7.1f} µs "
+        f"(surcoût {journal - memoire:+.1f} µs, {metriques['nb_fsync']} fsync)"
+    )
+    print(f"  update_user_profile, journal synchrone : {synchrone:7.1f} µs (attend le fsync)")
+
+
+def profil_type(k: int) -> Profil:
+    profil = Profil("modele")
+    for q in range(5 + k % 40):
+        profil.ajouter(q, (q + k) % 2, 15.0 + q, q % 4)
+    return profil
+
+
+def recuperation(dossier: str, nb_profils: int, nb_queue: int):
+    # On journalise nb_profils profils (quelques modèles recopiés sous d'autres user_id)
+    modeles = [profil_type(k) for k in range(64)]
+    stockage = StockageJournal(dossier, intervalle_snapshot_s=1e9, seuil_snapshot_octets=1 << 62)
+    debut = time.perf_counter()
+    for i in range(nb_profils):
+        profil = modeles[i % 64]
+        profil.user_id = f"apprenant_{i}"
+        stockage.enregistrer(profil)
+    stockage.vider()
+    ecriture = time.perf_counter() - debut
+    journal_seul = taille_dossier(dossier)
+    stockage.fermer()
+    print(
+        f"  {nb_profils} profils journalisés en {ecriture:.1f}s "
+        f"({ecriture / nb_profils * 1e6:.1f} µs / profil, {journal_seul / 1e6:.0f} Mo de journal)"
+    )
+
+    debut = time.perf_counter()
+    stockage = StockageJournal(dossier, intervalle_snapshot_s=1e9, seuil_snapshot_octets=1 << 62)
+    print(f"  redémarrage sans snapshot (rejeu complet) : {time.perf_counter() - debut:.2f}s")
+
+    debut = time.perf_counter()
+    stockage.snapshot()
+    duree_snapshot = time.perf_counter() - debut
+    print(
+        f"  snapshot + compaction : {duree_snapshot:.1f}s, {taille_dossier(dossier) / 1e6:.0f} Mo "
+        f"(journal compacté : {stockage.metriques()['journal_octets']} octets)"
+    )
+
+    for i in range(nb_queue):
+        profil = modeles[i % 64]
+        profil.user_id = f"apprenant_{(i * 7919) % nb_profils}"
+        stockage.enregistrer(profil)
+    stockage.fermer()
+
+    debut = time.perf_counter()
+    stockage = StockageJournal(dossier, intervalle_snapshot_s=1e9, seuil_snapshot_octets=1 << 62)
+    duree = time.perf_counter() - debut
+    debut = time.perf_counter()
+    for i in range(0, nb_profils, max(1, nb_profils // 10_000)):
+        stockage.charger(f"apprenant_{i}")
+    lecture = (time.perf_counter() - debut) / min(nb_profils, 10_000) * 1e6
+    stockage.fermer()
+    print(
+        f"  redémarrage snapshot + queue de {nb_queue} trames : {duree:.2f}s "
+        f"(premier charger() d'un profil : {lecture:.1f} µs)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot binaire + journal des profils")
+    parser.add_argument("--profils", type=int, default=200_000)
+    parser.add_argument("--queue", type=int, default=50_000, help="réponses après le snapshot")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        print("== Surcoût du journal par réponse ==")
+        surcout_ajout(dossier)
+        print(f"\n== Récupération ({args.profils} profils) ==")
+        recuperation(os.path.join(dossier, "recuperation"), args.profils, args.queue)
+
+
+if __name__ == "__main__":
+    main()
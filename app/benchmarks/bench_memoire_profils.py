@@ -0,0 +1,72 @@
+"""
+bench_memoire_profils.py — Octets par profil : ancien dict vs Profil compact
+Auteur : Moi (ESIEA 3A)
+
+On remplit des profils avec un historique plein (50 entrées) et on mesure la RAM
+allouée avec tracemalloc, puis on extrapole à 1M d'utilisateurs.
+L'ancien format (dict + liste de 50 dicts) est recréé ici à l'identique.
+
+Lancer :
+    python -m app.benchmarks.bench_memoire_profils
+"""
+
+import gc
+import tracemalloc
+
+from app.models.profil import TAILLE_HISTORIQUE, Profil, code_sujet
+
+SUJETS = ["python", "algo", "math", "bdd"]
+NB_ANCIEN = 20_000
+NB_NOUVEAU = 100_000
+CIBLE = 1_000_000
+
+
+def ancien_profil(user_id: str) -> dict:
+    profil = {
+        "user_id": user_id,
+        "niveau_actuel": 2,
+        "score_total": 0,
+        "nb_questions": 0,
+        "bonnes_reponses": 0,
+        "historique": [],
+        "sujets_faibles": [],
+    }
+    for i in range(TAILLE_HISTORIQUE):
+        profil["historique"].append(
+            {"question_id": 1000 + i, "score": i % 2, "temps": 20.0 + i, "sujet": SUJETS[i % 4]}
+        )
+    return profil
+
+
+def nouveau_profil(user_id: str) -> Profil:
+    profil = Profil(user_id)
+    for i in range(TAILLE_HISTORIQUE):
+        profil.ajouter(1000 + i, i % 2, 20.0 + i, code_sujet(SUJETS[i % 4]))
+    return profil
+
+
+def octets_par_profil(fabrique, nb: int) -> float:
+    # Les user_id sont créés avant la mesure : ils existent dans les deux formats
+    ids = [f"user_{i:08d}" for i in range(nb)]
+    gc.collect()
+    tracemalloc.start()
+    avant = tracemalloc.get_traced_memory()[0]
+    profils = {user_id: fabrique(user_id) for user_id in ids}
+    apres = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del profils
+    return (apres - avant) / nb
+
+
+def main():
+    ancien = octets_par_profil(ancien_profil, NB_ANCIEN)
+    nouveau = octets_par_profil(nouveau_profil, NB_NOUVEAU)
+    print(f"{'format':18s} | {'octets/profil':>13s} | {'1M profils':>10s}")
+    print("-" * 48)
+    print(f"{'dict + 50 dicts':18s} | {ancien:13.0f} | {ancien * CIBLE / 1e9:8.2f} Go")
+    print(f"{'Profil __slots__':18s} | {nouveau:13.0f} | {nouveau * CIBLE / 1e9:8.2f} Go")
+    print(f"Gain : x{ancien / nouveau:.1f}")
+
+
+if __name__ == "__main__":
+    main()
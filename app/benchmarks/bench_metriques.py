@@ -0,0 +1,99 @@
+"""
+bench_metriques.py — Coût de l'instrumentation /metrics sur le chemin chaud
+Auteur : Moi (ESIEA 3A)
+
+Mesure le coût d'un Compteur.inc et d'un Histogramme.observer (un thread, puis
+8 threads en parallèle pour vérifier que les shards évitent la contention),
+et le rapporte au coût d'une requête /api/reponse complète en process.
+Une requête fait ~4 observations (route, predict, candidats côté GET, etc.).
+
+Lancer :
+    python -m app.benchmarks.bench_metriques
+"""
+
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import adaptive_model
+from app.utils.metriques import Registre, registre as registre_global
+
+NB_OPERATIONS = 200_000
+NB_THREADS = 8
+OBSERVATIONS_PAR_REQUETE = 4
+
+
+def cout_ns(fonction, nb: int = NB_OPERATIONS) -> float:
+    debut = time.perf_counter()
+    for _ in range(nb):
+        fonction()
+    return (time.perf_counter() - debut) / nb * 1e9
+
+
+def cout_ns_threads(fonction, nb_threads: int = NB_THREADS) -> float:
+    """Temps mural par opération avec nb_threads qui écrivent en même temps."""
+    par_thread = NB_OPERATIONS // nb_threads
+
+    def boucle():
+        for _ in range(par_thread):
+            fonction()
+
+    threads = [threading.Thread(target=boucle) for _ in range(nb_threads)]
+    debut = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return (time.perf_counter() - debut) / (par_thread * nb_threads) * 1e9
+
+
+def cout_requete_us(nb: int = 2000) -> float:
+    client = TestClient(app)
+    corps = {
+        "user_id": "bench_metriques",
+        "question_id": 1,
+        "reponse_index": 0,
+        "sujet": "math",
+        "niveau_difficulte": 2,
+        "temps_secondes": 20.0,
+    }
+    for _ in range(100):  # échauffement
+        client.post("/api/reponse", json=corps)
+    debut = time.perf_counter()
+    for _ in range(nb):
+        client.post("/api/reponse", json=corps)
+    return (time.perf_counter() - debut) / nb * 1e6
+
+
+def main():
+    registre = Registre()
+    compteur = registre.compteur("bench_total", "bench", ("type",))
+    histo = registre.histogramme("bench_secondes", "bench", ("route",))
+
+    inc = cout_ns(lambda: compteur.inc("a"))
+    obs = cout_ns(lambda: histo.observer(0.0012, "/api/reponse"))
+    obs_mt = cout_ns_threads(lambda: histo.observer(0.0012, "/api/reponse"))
+    print(f"Compteur.inc          : {inc:7.0f} ns")
+    print(f"Histogramme.observer  : {obs:7.0f} ns  ({obs_mt:.0f} ns/op avec {NB_THREADS} threads)")
+
+    adaptive_model.charger_modele()
+    requete = cout_requete_us()
+    surcout = OBSERVATIONS_PAR_REQUETE * obs / 1e3
+    print(f"POST /api/reponse     : {requete:7.0f} µs (TestClient, en process)")
+    print(
+        f"Instrumentation       : ~{surcout:.1f} µs/requête "
+        f"= {surcout / requete:.2%} du temps de la requête"
+    )
+
+    debut = time.perf_counter()
+    sortie = registre_global.exposer()
+    print(
+        f"Scrape /metrics       : {(time.perf_counter() - debut) * 1e3:7.2f} ms "
+        f"({len(sortie.splitlines())} lignes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
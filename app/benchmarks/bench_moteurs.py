@@ -0,0 +1,173 @@
+"""
+bench_moteurs.py — Moteur Elo (IRT 1PL) vs RandomForest + lissage
+Auteur : Moi (ESIEA 3A)
+
+Trois mesures :
+1. CPU par réponse : update_user_profile avec chaque moteur
+   (forêt en table compilée, forêt via sklearn, Elo).
+2. Calibration hors-ligne : calibrer_elo sur 80% des lignes du dataset, puis
+   - β des niveaux (la vraie loi du générateur c'est β = niveau)
+   - capacités θ des utilisateurs vs leur niveau_reel_user
+   - log-loss / AUC sur les 20% de réponses mises de côté
+3. Suivi du niveau en boucle fermée : des apprenants simulés (même loi que
+   generate_data.py) répondent aux questions de select_question, et on regarde
+   l'écart entre le niveau_actuel du profil et leur vrai niveau au fil des réponses.
+
+Lancer :
+    python -m app.benchmarks.bench_moteurs
+    python -m app.benchmarks.bench_moteurs --apprenants 2000 --reponses 40
+"""
+
+import argparse
+import math
+import time
+import warnings
+
+import numpy as np
+
+from app.data.colonnes import charger_colonnes
+from app.models import adaptive_model
+from app.models.moteurs import MoteurElo, calibrer_elo
+
+SUJETS = ["python", "algo", "math", "bdd"]
+ETAPES_SUIVI = (5, 10, 20, 30, 40)
+
+
+def cpu_par_reponse(nb: int) -> float:
+    """µs CPU par update_user_profile (moteur courant)."""
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 2, nb)
+    temps = rng.uniform(5, 90, nb).round(1)
+    sujets = rng.integers(0, len(SUJETS), nb)
+    adaptive_model.user_profiles.clear()
+
+    debut = time.process_time()
+    for i in range(nb):
+        adaptive_model.update_user_profile(
+            f"bench_{i % 100}", 1 + i % 1000, int(scores[i]), float(temps[i]), SUJETS[sujets[i]]
+        )
+    return (time.process_time() - debut) / nb * 1e6
+
+
+def _auc(scores: np.ndarray, p: np.ndarray) -> float:
+    """AUC via les rangs (Mann-Whitney), sans sklearn."""
+    rangs = np.empty(len(p))
+    rangs[np.argsort(p, kind="stable")] = np.arange(1, len(p) + 1)
+    positifs = scores == 1
+    nb_pos, nb_neg = positifs.sum(), (~positifs).sum()
+    return float((rangs[positifs].sum() - nb_pos * (nb_pos + 1) / 2) / (nb_pos * nb_neg))
+
+
+def _log_loss(scores: np.ndarray, p: np.ndarray) -> float:
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    return float(-np.mean(scores * np.log(p) + (1 - scores) * np.log(1 - p)))
+
+
+def bench_calibration():
+    ds = charger_colonnes()
+    users = np.asarray(ds["user_id"], dtype=np.int64)
+    niveaux = np.asarray(ds["niveau_difficulte"], dtype=np.int64)
+    scores = np.asarray(ds["score"], dtype=np.float64)
+
+    rng = np.random.default_rng(42)
+    test = rng.random(len(ds)) < 0.2
+
+    debut = time.perf_counter()
+    elo = calibrer_elo(users[~test], niveaux[~test], scores[~test], ds["question_id"][~test])
+    duree = time.perf_counter() - debut
+    print(f"Calibration sur {int((~test).sum())} lignes : {duree * 1e3:.1f} ms")
+    print(f"  β niveaux : {elo['metriques']['beta_niveaux']}  (loi du générateur : 1..5)")
+
+    # Capacités vs vrai niveau (un utilisateur = un niveau_reel constant)
+    niveau_reel = np.zeros(int(users.max()) + 1)
+    niveau_reel[users] = ds["niveau_reel_user"]
+    theta = elo["capacites"]
+    vus = np.bincount(users[~test], minlength=len(theta)) > 0
+    correlation = np.corrcoef(theta[vus], niveau_reel[: len(theta)][vus])[0, 1]
+    rmse = math.sqrt(np.mean((theta[vus] - niveau_reel[: len(theta)][vus]) ** 2))
+    print(f"  θ vs niveau_reel_user : corrélation {correlation:.3f} | RMSE {rmse:.3f}")
+
+    # Réponses mises de côté : P = sigmoid(θ_user - β_niveau) (questions jamais vues → δ = 0)
+    beta = np.asarray(elo["beta_niveaux"])
+    p = 1 / (1 + np.exp(-(theta[users[test]] - beta[niveaux[test] - 1])))
+    p_constant = np.full(int(test.sum()), scores[~test].mean())
+    print(
+        f"  hold-out : log-loss {_log_loss(scores[test], p):.3f} "
+        f"(constante {_log_loss(scores[test], p_constant):.3f}) | "
+        f"AUC {_auc(scores[test], p):.3f}"
+    )
+
+
+def suivi_niveau(nb_apprenants: int, nb_reponses: int, seed: int = 0) -> dict:
+    """
+    Boucle fermée avec le moteur courant : select_question → réponse simulée →
+    update_user_profile. Retourne {nb de réponses: écart moyen |niveau_actuel - vrai niveau|}.
+    """
+    rng = np.random.default_rng(seed)
+    vrais_niveaux = np.clip(rng.normal(2.5, 1.2, nb_apprenants), 1, 5)
+    ecarts = {}
+    adaptive_model.user_profiles.clear()
+    users = [f"sim_{i}" for i in range(nb_apprenants)]
+
+    for etape in range(1, nb_reponses + 1):
+        tirages = rng.random(nb_apprenants)
+        bruits = rng.normal(0, 5, nb_apprenants)
+        for i, user_id in enumerate(users):
+            question = adaptive_model.select_question(user_id)
+            niveau_question = question["niveau_difficulte"]
+            # Même loi que generate_data.py
+            p = min(0.95, max(0.05, 1 / (1 + math.exp(niveau_question - vrais_niveaux[i]))))
+            score = int(tirages[i] < p)
+            temps = max(5.0, 15 + niveau_question * 8 + bruits[i] + (1 - score) * 10)
+            adaptive_model.update_user_profile(
+                user_id, question["question_id"], score, temps, question["sujet"]
+            )
+        if etape in ETAPES_SUIVI or etape == nb_reponses:
+            niveaux = np.array([adaptive_model.user_profiles[u].niveau_actuel for u in users])
+            ecarts[etape] = float(np.mean(np.abs(niveaux - vrais_niveaux)))
+    return ecarts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Moteur Elo vs RandomForest")
+    parser.add_argument("--cpu", type=int, default=20_000, help="réponses pour la mesure CPU")
+    parser.add_argument("--apprenants", type=int, default=500)
+    parser.add_argument("--reponses", type=int, default=30, help="réponses par apprenant")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    adaptive_model.charger_modele()
+    if adaptive_model.modele is None:
+        print("Modèle indisponible — lance d'abord generate_data.py")
+        return
+    table = adaptive_model.table_prediction
+
+    print("== CPU par réponse (update_user_profile) ==")
+    adaptive_model.changer_moteur("foret")
+    print(f"  forêt, table compilée : {cpu_par_reponse(args.cpu):7.2f} µs")
+    adaptive_model.table_prediction = None
+    print(f"  forêt, sklearn        : {cpu_par_reponse(300):7.2f} µs")
+    adaptive_model.table_prediction = table
+    adaptive_model.changer_moteur("elo")
+    print(f"  elo                   : {cpu_par_reponse(args.cpu):7.2f} µs")
+
+    print("\n== Calibration hors-ligne ==")
+    bench_calibration()
+
+    print(f"\n== Suivi du niveau ({args.apprenants} apprenants simulés) ==")
+    print("  |niveau_actuel - vrai niveau| moyen après n réponses")
+    etapes = None
+    for nom in ("foret", "elo"):
+        adaptive_model.changer_moteur(nom)
+        ecarts = suivi_niveau(args.apprenants, args.reponses)
+        if etapes is None:
+            etapes = list(ecarts)
+            print("  " + " " * 8 + "".join(f"{'n=' + str(n):>8s}" for n in etapes))
+        print(f"  {nom:8s}" + "".join(f"{ecarts[n]:8.3f}" for n in etapes))
+
+    assert isinstance(adaptive_model.moteur, MoteurElo)
+    adaptive_model.changer_moteur("foret")
+
+
+if __name__ == "__main__":
+    main()
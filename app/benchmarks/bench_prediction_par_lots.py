@@ -0,0 +1,79 @@
+"""
+bench_prediction_par_lots.py — predict une ligne vs micro-batching, en concurrence
+Auteur : Moi (ESIEA 3A)
+
+On désactive la table compilée (pour que sklearn soit le prédicteur), puis
+N threads — comme le threadpool de Starlette — enchaînent des prédictions.
+On compare le débit (prédictions/s) et le p99 par appel, sans et avec batching.
+
+Lancer :
+    python -m app.benchmarks.bench_prediction_par_lots
+"""
+
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from app.models import adaptive_model
+
+NB_THREADS = 40  # taille par défaut du threadpool AnyIO
+DUREE_S = 5.0
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def charge(duree_s: float) -> tuple:
+    """Lance NB_THREADS threads pendant duree_s, retourne (débit, latences en ms)."""
+    latences = []
+    verrou = threading.Lock()
+    fin = time.perf_counter() + duree_s
+
+    def travailleur(numero: int):
+        locales = []
+        i = 0
+        while time.perf_counter() < fin:
+            debut = time.perf_counter()
+            adaptive_model._predire_niveau(i % 2, 10 + (i * 7 + numero) % 60, SUJETS[i % 4])
+            locales.append((time.perf_counter() - debut) * 1e3)
+            i += 1
+        with verrou:
+            latences.extend(locales)
+
+    threads = [threading.Thread(target=travailleur, args=(n,)) for n in range(NB_THREADS)]
+    debut = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(latences) / (time.perf_counter() - debut), np.array(latences)
+
+
+def main():
+    adaptive_model.charger_modele()
+    warnings.filterwarnings("ignore")
+    if adaptive_model.modele is None:
+        print("Modèle indisponible — lance d'abord generate_data.py")
+        return
+
+    table = adaptive_model.table_prediction
+    adaptive_model.table_prediction = None
+    try:
+        adaptive_model.desactiver_prediction_par_lots()
+        debit, lat = charge(DUREE_S)
+        print(f"sans batching : {debit:8.0f} préd/s | p50 {np.percentile(lat, 50):6.1f} ms"
+              f" | p99 {np.percentile(lat, 99):6.1f} ms")
+
+        adaptive_model.activer_prediction_par_lots(taille_max=64, attente_max_us=500)
+        debit, lat = charge(DUREE_S)
+        print(f"avec batching : {debit:8.0f} préd/s | p50 {np.percentile(lat, 50):6.1f} ms"
+              f" | p99 {np.percentile(lat, 99):6.1f} ms")
+        for cle, valeur in adaptive_model.metriques_prediction_par_lots().items():
+            print(f"  {cle:28s} {valeur:.2f}" if isinstance(valeur, float) else f"  {cle:28s} {valeur}")
+    finally:
+        adaptive_model.desactiver_prediction_par_lots()
+        adaptive_model.table_prediction = table
+
+
+if __name__ == "__main__":
+    main()
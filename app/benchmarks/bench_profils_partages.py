@@ -0,0 +1,97 @@
+"""
+bench_profils_partages.py — Table de profils partagée : débit de 1 à N workers + cohérence
+Auteur : Moi (ESIEA 3A)
+
+On lance N process (spawn, comme des workers uvicorn) qui ouvrent la même
+TableProfilsPartagee et font chacun `--reponses` update_user_profile sur un pool
+commun d'utilisateurs : les mêmes apprenants reçoivent des réponses de tous les
+workers en même temps, c'est le pire cas pour les verrous par case.
+
+Pour chaque N on affiche le débit total (réponses / s) et on vérifie qu'aucune
+réponse n'a été perdue : la somme des nb_questions de tous les profils doit être
+exactement N × `--reponses`. Même chose pour les lectures (GET /stats, seqlock).
+
+Le modèle n'est pas chargé (ajustement manuel du niveau) : on mesure le chemin du
+profil, pas la forêt. Sur une machine à 1 cœur les courbes restent plates, c'est
+le nombre de cœurs qui fait le passage à l'échelle.
+
+Lancer :
+    python -m app.benchmarks.bench_profils_partages
+    python -m app.benchmarks.bench_profils_partages --workers 1 2 4 8 --utilisateurs 100
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+import uuid
+
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def _worker(nom: str, capacite: int, rang: int, nb: int, nb_utilisateurs: int, depart):
+    # Comme un worker uvicorn : la table est choisie par l'environnement à l'import
+    os.environ["PROFILS_PARTAGES"] = nom
+    os.environ["PROFILS_PARTAGES_CAPACITE"] = str(capacite)
+    from app.models import adaptive_model
+
+    depart.wait()
+    debut = time.perf_counter()
+    for i in range(nb):
+        adaptive_model.update_user_profile(
+            f"apprenant_{(i * 31 + rang) % nb_utilisateurs}",
+            rang * nb + i, i % 2, 20.0 + i % 30, SUJETS[i % 4],
+        )
+    ecritures = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    for i in range(nb):
+        adaptive_model.trouver_profil(f"apprenant_{(i * 31 + rang) % nb_utilisateurs}")
+    return ecritures, time.perf_counter() - debut
+
+
+def mesurer(nb_workers: int, nb: int, nb_utilisateurs: int, capacite: int):
+    from app.models.profils_partages import TableProfilsPartagee
+
+    nom = f"bench_{uuid.uuid4().hex[:8]}"
+    table = TableProfilsPartagee(nom, capacite=capacite)
+    contexte = multiprocessing.get_context("spawn")
+    with contexte.Manager() as gestionnaire, contexte.Pool(nb_workers) as pool:
+        depart = gestionnaire.Barrier(nb_workers)
+        durees = pool.starmap(
+            _worker,
+            [(nom, capacite, rang, nb, nb_utilisateurs, depart) for rang in range(nb_workers)],
+        )
+
+    total = sum(table.get(f"apprenant_{u}").nb_questions for u in range(nb_utilisateurs))
+    table.fermer(supprimer=True)
+    # Les workers démarrent ensemble (barrière) : le plus lent donne la durée totale
+    ecritures = nb_workers * nb / max(d[0] for d in durees)
+    lectures = nb_workers * nb / max(d[1] for d in durees)
+    attendu = nb_workers * nb
+    print(
+        f"  {nb_workers:2d} worker(s) : {ecritures:9.0f} réponses/s, {lectures:9.0f} lectures/s"
+        f"  | nb_questions total {total} / {attendu} {'OK' if total == attendu else 'PERDUES'}"
+    )
+    return total == attendu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Table de profils partagée entre workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--reponses", type=int, default=20_000, help="réponses par worker")
+    parser.add_argument("--utilisateurs", type=int, default=1000)
+    parser.add_argument("--capacite", type=int, default=4096)
+    args = parser.parse_args()
+
+    print(f"== {args.reponses} réponses par worker, {args.utilisateurs} apprenants partagés ==")
+    print(f"   ({os.cpu_count()} cœur(s) sur cette machine)")
+    coherent = all(
+        mesurer(n, args.reponses, args.utilisateurs, args.capacite) for n in args.workers
+    )
+    if not coherent:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+bench_reponses_batch.py — CPU par 1000 réponses : POST /reponse × 1000 vs /reponses/batch
+Auteur : Moi (ESIEA 3A)
+
+On passe par l'app FastAPI en process (TestClient), pour compter tout ce que
+paie vraiment une réponse : HTTP/ASGI, validation Pydantic, prédiction, profil.
+On mesure le temps CPU (process_time), avec la table compilée puis avec sklearn.
+
+Lancer :
+    python -m app.benchmarks.bench_reponses_batch
+"""
+
+import random
+import time
+import warnings
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import adaptive_model
+
+NB_REPONSES = 1000
+TAILLE_LOT = 50  # un client hors-ligne qui rejoue quelques dizaines de réponses
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def reponses_simulees(nb: int) -> list:
+    rng = random.Random(0)
+    return [
+        {
+            "user_id": f"bench_{i % 100}",
+            "question_id": i,
+            "reponse_index": rng.choice([0, 0, 1, 2]),
+            "sujet": rng.choice(SUJETS),
+            "niveau_difficulte": rng.randint(1, 5),
+            "temps_secondes": round(rng.uniform(5, 90), 1),
+        }
+        for i in range(nb)
+    ]
+
+
+def cpu_unitaire(client, reponses: list) -> float:
+    debut = time.process_time()
+    for r in reponses:
+        client.post("/api/reponse", json=r)
+    return time.process_time() - debut
+
+
+def cpu_batch(client, reponses: list) -> float:
+    debut = time.process_time()
+    for i in range(0, len(reponses), TAILLE_LOT):
+        client.post("/api/reponses/batch", json=reponses[i : i + TAILLE_LOT])
+    return time.process_time() - debut
+
+
+def main():
+    warnings.filterwarnings("ignore")
+    reponses = reponses_simulees(NB_REPONSES)
+
+    with TestClient(app) as client:
+        adaptive_model.charger_modele()  # on attend le modèle au lieu du chargement de fond
+        table = adaptive_model.table_prediction
+
+        for nom, table_active in [("table compilée", table), ("sklearn", None)]:
+            adaptive_model.table_prediction = table_active
+            nb = NB_REPONSES if table_active is not None else 200
+            t_unitaire = cpu_unitaire(client, reponses[:nb]) * NB_REPONSES / nb
+            t_batch = cpu_batch(client, reponses)
+            print(
+                f"{nom:15s} | unitaire {t_unitaire:6.2f} s CPU | batch {t_batch:6.3f} s CPU"
+                f" | x{t_unitaire / t_batch:.0f}  (pour {NB_REPONSES} réponses)"
+            )
+
+        adaptive_model.table_prediction = table
+        for i in range(100):
+            adaptive_model.supprimer_profil(f"bench_{i}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+bench_sans_repetition.py — Questions déjà vues : répétitions, coût du tirage, mémoire
+Auteur : Moi (ESIEA 3A)
+
+1. Répétitions : des apprenants simulés enchaînent select_question → update_user_profile
+   sur le vrai catalogue, avec et sans SANS_REPETITION. On compte les questions revues.
+2. Coût d'un tirage dans un catalogue synthétique de 100k questions, selon le nombre de
+   questions déjà vues (tirées DANS la bande visée, le pire cas pour le rejet).
+3. Mémoire (sys.getsizeof) : EnsembleVus pour 5000 utilisateurs, extrapolée à 1M, vs un bitset complet.
+
+Lancer :
+    python -m app.benchmarks.bench_sans_repetition
+"""
+
+import random
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from app.models import adaptive_model
+from app.models.index_questions import IndexQuestions
+from app.models.vus import EnsembleVus
+
+NB_CATALOGUE = 100_000
+SUJETS = ["algo", "bdd", "math", "python"]
+
+
+def taux_repetition(nb_apprenants: int, nb_reponses: int) -> float:
+    rng = random.Random(0)
+    adaptive_model.user_profiles.clear()
+    revues = 0
+    for u in range(nb_apprenants):
+        user_id = f"rep_{u}"
+        deja = set()
+        for _ in range(nb_reponses):
+            question = adaptive_model.select_question(user_id)
+            revues += question["question_id"] in deja
+            deja.add(question["question_id"])
+            adaptive_model.update_user_profile(
+                user_id, question["question_id"], int(rng.random() < 0.6), 30.0, question["sujet"]
+            )
+    return revues / (nb_apprenants * nb_reponses)
+
+
+def cout_tirage():
+    rng = np.random.default_rng(0)
+    index = IndexQuestions(
+        np.arange(1, NB_CATALOGUE + 1),
+        rng.integers(1, 6, NB_CATALOGUE),
+        rng.integers(0, len(SUJETS), NB_CATALOGUE),
+        SUJETS,
+    )
+    niveau, code = 3, 1
+    bande = index.question_ids[index.positions_bande(niveau, code)]
+    print(f"  bande niveau 3 ± 1, sujet {SUJETS[code]} : {len(bande)} questions")
+
+    for nb_vus in (0, 100, 1_000, 2_048, len(bande) - 10):
+        vus = EnsembleVus()
+        for qid in rng.choice(bande, nb_vus, replace=False):
+            vus.ajouter(int(qid))
+        nb = 20_000 if nb_vus < len(bande) // 2 else 200
+        debut = time.perf_counter()
+        for _ in range(nb):
+            index.tirer(niveau, code, exclus=vus)
+        duree = (time.perf_counter() - debut) / nb * 1e6
+        print(f"  {nb_vus:>6d} vues : {duree:8.2f} µs / tirage")
+
+
+def memoire(nb_users: int = 5_000, nb_vus: int = 200):
+    rng = np.random.default_rng(1)
+    tirages = rng.integers(1, NB_CATALOGUE + 1, (nb_users, nb_vus))
+    octets = 0
+    for ligne in tirages.tolist():
+        vus = EnsembleVus()
+        for qid in ligne:
+            vus.ajouter(qid)
+        # objet + dict des blocs + blocs (getsizeof compte les données des array)
+        octets += sys.getsizeof(vus) + sys.getsizeof(vus._blocs)
+        octets += sum(sys.getsizeof(bloc) for bloc in vus._blocs.values())
+    par_user = octets / nb_users
+    print(
+        f"  {nb_vus} vues / utilisateur : {par_user:.0f} octets "
+        f"→ {par_user * 1e6 / 1e9:.2f} Go pour 1M d'utilisateurs "
+        f"(bitset complet : {NB_CATALOGUE / 8 * 1e6 / 1e9:.1f} Go)"
+    )
+
+
+def main():
+    warnings.filterwarnings("ignore")
+    adaptive_model.charger_modele()
+
+    print("== Répétitions (catalogue du dataset, 40 apprenants × 300 réponses) ==")
+    if adaptive_model.index_questions is not None:
+        for actif in (False, True):
+            adaptive_model.sans_repetition = actif
+            taux = taux_repetition(40, 300)
+            epuisements = adaptive_model.METRIQUE_EPUISEMENTS.valeurs()
+            print(
+                f"  sans_repetition={actif!s:5s} : {taux:6.1%} de questions revues "
+                f"(épuisements : {dict((k[0], v) for k, v in epuisements.items())})"
+            )
+    else:
+        print("  catalogue indisponible — lance d'abord generate_data.py")
+
+    print(f"\n== Coût d'un tirage (catalogue synthétique de {NB_CATALOGUE} questions) ==")
+    cout_tirage()
+
+    print("\n== Mémoire ==")
+    for nb_vus in (50, 200, 1_000):
+        memoire(5_000, nb_vus)
+
+
+if __name__ == "__main__":
+    main()
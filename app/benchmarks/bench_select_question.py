@@ -0,0 +1,99 @@
+"""
+bench_select_question.py — Latence de select_question selon la taille du catalogue
+Auteur : Moi (ESIEA 3A)
+
+On fabrique des catalogues synthétiques de 2k à 10M lignes (directement en NumPy,
+pas besoin de passer par le CSV), on installe l'index dans adaptive_model et on
+mesure le temps moyen par appel. Avec l'index, la latence doit rester plate.
+Pour comparer, on mesure aussi l'ancien chemin pandas (isin + masque + sample)
+jusqu'à 1M lignes — au-delà c'est trop long.
+
+Lancer :
+    python -m app.benchmarks.bench_select_question
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.models import adaptive_model
+from app.models.index_questions import IndexQuestions
+
+SUJETS = ["algo", "bdd", "math", "python"]
+TAILLES = [2_000, 100_000, 1_000_000, 10_000_000]
+NB_APPELS = 20_000
+
+
+def catalogue_synthetique(nb_lignes: int, seed: int = 42) -> tuple:
+    """Colonnes question_id / niveau / code sujet tirées au hasard."""
+    rng = np.random.default_rng(seed)
+    question_ids = np.arange(1, nb_lignes + 1, dtype=np.int64)
+    niveaux = rng.integers(1, 6, nb_lignes).astype(np.int8)
+    codes = rng.integers(0, len(SUJETS), nb_lignes).astype(np.uint8)
+    return question_ids, niveaux, codes
+
+
+def ancienne_selection(df: pd.DataFrame, niveau_cible: int, sujet: str = None):
+    """Recopie du chemin pandas d'origine, pour la comparaison."""
+    niveaux_acceptes = [max(1, niveau_cible - 1), niveau_cible, min(5, niveau_cible + 1)]
+    df_filtre = df[df["niveau_difficulte"].isin(niveaux_acceptes)]
+    if sujet and sujet in df["sujet"].unique():
+        df_filtre = df_filtre[df_filtre["sujet"] == sujet]
+    return df_filtre.sample(1).iloc[0]
+
+
+def mesurer(fonction, nb_appels: int) -> float:
+    """Temps moyen par appel en microsecondes."""
+    debut = time.perf_counter()
+    for i in range(nb_appels):
+        fonction(i)
+    return (time.perf_counter() - debut) / nb_appels * 1e6
+
+
+def main():
+    index_origine = adaptive_model.index_questions
+    sujets_tests = [None, "python", "math"]
+
+    print(f"{'lignes':>12} | {'index (µs/req)':>15} | {'pandas (µs/req)':>16}")
+    print("-" * 50)
+    try:
+        for taille in TAILLES:
+            question_ids, niveaux, codes = catalogue_synthetique(taille)
+            adaptive_model.index_questions = IndexQuestions(
+                question_ids, niveaux, codes, SUJETS
+            )
+
+            def appel_index(i):
+                adaptive_model.select_question(
+                    f"bench_{i % 500}", sujets_tests[i % len(sujets_tests)]
+                )
+
+            t_index = mesurer(appel_index, NB_APPELS)
+
+            t_pandas = float("nan")
+            if taille <= 1_000_000:
+                df = pd.DataFrame(
+                    {
+                        "question_id": question_ids,
+                        "niveau_difficulte": niveaux,
+                        "sujet": np.array(SUJETS)[codes],
+                    }
+                )
+                nb_pandas = 200 if taille <= 100_000 else 20
+                t_pandas = mesurer(
+                    lambda i: ancienne_selection(
+                        df, 1 + i % 5, sujets_tests[i % len(sujets_tests)]
+                    ),
+                    nb_pandas,
+                )
+
+            print(f"{taille:>12,} | {t_index:>15.1f} | {t_pandas:>16.1f}")
+    finally:
+        adaptive_model.index_questions = index_origine
+        for i in range(500):
+            adaptive_model.user_profiles.pop(f"bench_{i}", None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+bench_sharding.py — Anneau de hachage cohérent : répartition, débit de 1 à N nœuds, handoff
+Auteur : Moi (ESIEA 3A)
+
+1. Répartition (sans réseau) : 100k user_id (generer_user_id) sur N nœuds, écart du
+   nœud le plus chargé à la moyenne selon le nombre de nœuds virtuels, et part des
+   apprenants qui changent de nœud quand on passe de N à N+1 (idéal : 1/(N+1)).
+2. Débit : N nœuds uvicorn sur localhost (un process chacun), `--requetes` POST
+   /api/reponse envoyés par un client asyncio. Deux façons d'arroser les nœuds :
+     * aleatoire : un répartiteur bête, le nœud reçu relaie au propriétaire (N-1)/N
+       des requêtes ;
+     * anneau    : le client connaît l'anneau et va directement chez le propriétaire.
+   Ensuite on vérifie que la somme des nb_questions_repondues (GET /api/stats via
+   n'importe quel nœud) est exactement le nombre de réponses envoyées.
+3. Changement de membres : 2 nœuds, on ajoute un 3e pendant que la charge continue,
+   on attend la fin du passage de relais et on refait la même vérification.
+
+Sur une machine à 1 cœur les nœuds se partagent le même CPU : le débit total ne peut
+pas monter avec N (c'est le nombre de cœurs / de hosts qui le fait monter).
+
+Lancer :
+    python -m app.benchmarks.bench_sharding
+    python -m app.benchmarks.bench_sharding --noeuds 1 2 4 --requetes 4000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.utils.helpers import generer_user_id
+from app.utils.sharding import AnneauCoherent
+
+JETON = "bench-sharding"
+PORT_BASE = 8301
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def repartition(nb_ids: int = 100_000):
+    ids = [generer_user_id(f"apprenant {i}") for i in range(nb_ids)]
+    for vnoeuds in (1, 16, 64, 256):
+        ecarts = []
+        for nb in (2, 4, 8):
+            anneau = AnneauCoherent({f"n{k}": "" for k in range(nb)}, vnoeuds)
+            charges = {}
+            for user_id in ids:
+                nom = anneau.proprietaire(user_id)
+                charges[nom] = charges.get(nom, 0) + 1
+            ecarts.append(f"{nb} nœuds : max {max(charges.values()) / (nb_ids / nb):.2f}×")
+        print(f"  {vnoeuds:3d} vnœuds | " + " | ".join(ecarts) + " la moyenne")
+
+    for nb in (1, 2, 4, 8):
+        avant = AnneauCoherent({f"n{k}": "" for k in range(nb)})
+        apres = AnneauCoherent({f"n{k}": "" for k in range(nb + 1)})
+        bouges = sum(avant.proprietaire(u) != apres.proprietaire(u) for u in ids) / nb_ids
+        print(f"  {nb} → {nb + 1} nœuds : {bouges:.1%} des apprenants changent de nœud "
+              f"(idéal {1 / (nb + 1):.1%})")
+
+
+# --- Nœuds locaux ---
+
+
+def noeuds_locaux(nb: int, premier: int = 0) -> dict:
+    return {f"n{k}": f"http://127.0.0.1:{PORT_BASE + k}" for k in range(premier, premier + nb)}
+
+
+def lancer(nom: str, noeuds: dict) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SHARDING_NOEUD=nom,
+        SHARDING_NOEUDS=",".join(f"{n}={url}" for n, url in noeuds.items()),
+        ADMIN_TOKEN=JETON,
+    )
+    port = noeuds[nom].rsplit(":", 1)[1]
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", port,
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+
+def attendre_prets(urls: list, processus: list, delai_s: float = 180):
+    fin = time.monotonic() + delai_s
+    for url in urls:
+        while True:
+            if any(p.poll() is not None for p in processus):
+                raise RuntimeError("Un nœud s'est arrêté au démarrage (uvicorn installé ?)")
+            try:
+                if httpx.get(f"{url}/health/ready", timeout=2).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > fin:
+                raise RuntimeError(f"{url} pas prêt après {delai_s:.0f}s")
+            time.sleep(0.5)
+
+
+def arreter(processus: list):
+    for p in processus:
+        p.terminate()
+    for p in processus:
+        p.wait(timeout=30)
+
+
+# --- Charge ---
+
+
+async def charge(
+    noeuds: dict, nb: int, utilisateurs: list, routage: str, concurrence: int = 32,
+    anneau: AnneauCoherent = None,
+) -> float:
+    """Envoie `nb` réponses, retourne le débit (réponses / s)."""
+    urls = list(noeuds.values())
+    file = asyncio.Queue()
+    for i in range(nb):
+        file.put_nowait(i)
+
+    async def client_http(client):
+        while not file.empty():
+            i = file.get_nowait()
+            user_id = utilisateurs[i % len(utilisateurs)]
+            if routage == "anneau":
+                url = noeuds[anneau.proprietaire(user_id)]
+            else:
+                url = random.choice(urls)
+            while True:
+                reponse = await client.post(f"{url}/api/reponse", json={
+                    "user_id": user_id, "question_id": i, "reponse_index": i % 4,
+                    "temps_secondes": 10.0 + i % 40, "sujet": SUJETS[i % 4],
+                    "niveau_difficulte": 1 + i % 5,
+                })
+                if reponse.status_code != 503:
+                    break
+                # Anneau pas encore arrivé sur tous les nœuds : on réessaie comme un client
+                await asyncio.sleep(float(reponse.headers.get("retry-after", 1)))
+            reponse.raise_for_status()
+
+    limites = httpx.Limits(max_connections=concurrence)
+    async with httpx.AsyncClient(timeout=30, limits=limites) as client:
+        debut = time.perf_counter()
+        await asyncio.gather(*(client_http(client) for _ in range(concurrence)))
+        return nb / (time.perf_counter() - debut)
+
+
+def total_reponses(url: str, utilisateurs: list) -> int:
+    with httpx.Client(timeout=30) as client:
+        return sum(
+            client.get(f"{url}/api/stats/{u}").json()["nb_questions_repondues"]
+            for u in utilisateurs
+        )
+
+
+def debit(nb_noeuds: int, nb: int, utilisateurs: list) -> bool:
+    noeuds = noeuds_locaux(nb_noeuds)
+    processus = [lancer(nom, noeuds) for nom in noeuds]
+    try:
+        attendre_prets(list(noeuds.values()), processus)
+        anneau = AnneauCoherent(noeuds)
+        resultats = []
+        for routage in ("aleatoire", "anneau"):
+            resultats.append(asyncio.run(charge(noeuds, nb, utilisateurs, routage, anneau=anneau)))
+        total = total_reponses(noeuds["n0"], utilisateurs)
+    finally:
+        arreter(processus)
+    ok = total == 2 * nb
+    print(
+        f"  {nb_noeuds} nœud(s) : {resultats[0]:7.0f} rép/s (répartiteur aléatoire), "
+        f"{resultats[1]:7.0f} rép/s (client qui connaît l'anneau) "
+        f"| total {total} / {2 * nb} {'OK' if ok else 'PERDUES'}"
+    )
+    return ok
+
+
+def ajout_noeud(nb: int, utilisateurs: list) -> bool:
+    avant = noeuds_locaux(2)
+    apres = noeuds_locaux(3)
+    processus = [lancer(nom, avant) for nom in avant]
+    try:
+        attendre_prets(list(avant.values()), processus)
+        asyncio.run(charge(avant, nb, utilisateurs, "aleatoire"))
+
+        processus.append(lancer("n2", apres))
+        attendre_prets([apres["n2"]], processus)
+        debut = time.perf_counter()
+        entetes = {"X-Admin-Token": JETON}
+        for url in apres.values():
+            httpx.post(
+                f"{url}/admin/cluster", json={"noeuds": apres, "version": 1}, headers=entetes
+            ).raise_for_status()
+        # La charge continue pendant le passage de relais (tous les nœuds en reçoivent)
+        asyncio.run(charge(apres, nb, utilisateurs, "aleatoire"))
+        while any(
+            httpx.get(f"{url}/admin/cluster", headers=entetes).json()["transition"]
+            for url in apres.values()
+        ):
+            time.sleep(0.2)
+        duree = time.perf_counter() - debut
+        etats = [
+            httpx.get(f"{url}/admin/cluster", headers=entetes).json() for url in apres.values()
+        ]
+        total = total_reponses(apres["n0"], utilisateurs)
+    finally:
+        arreter(processus)
+    ok = total == 2 * nb
+    pousses = sum(e["profils_pousses"] for e in etats)
+    print(
+        f"  2 → 3 nœuds : {pousses} profils poussés ({pousses / len(utilisateurs):.0%}), "
+        f"charge + fin de transition en {duree:.1f}s "
+        f"| total {total} / {2 * nb} {'OK' if ok else 'PERDUES'}"
+    )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharding des apprenants entre nœuds")
+    parser.add_argument("--noeuds", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requetes", type=int, default=3000)
+    parser.add_argument("--utilisateurs", type=int, default=500)
+    args = parser.parse_args()
+
+    print("== Répartition sur l'anneau ==")
+    repartition()
+
+    utilisateurs = [generer_user_id(f"bench {i}") for i in range(args.utilisateurs)]
+    print(f"\n== Débit, {args.requetes} réponses par routage ({os.cpu_count()} cœur(s)) ==")
+    coherent = all(debit(n, args.requetes, utilisateurs) for n in args.noeuds)
+    print("\n== Ajout d'un nœud sous charge ==")
+    coherent = ajout_noeud(args.requetes, utilisateurs) and coherent
+    if not coherent:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+bench_stockage.py — Écritures/s soutenues selon le stockage des profils
+Auteur : Moi (ESIEA 3A)
+
+On enchaîne des update_user_profile sur 1000 utilisateurs avec trois stockages :
+dict en mémoire, SQLite write-through (un commit par réponse) et SQLite write-behind.
+Pour le write-behind on compte aussi le flush final, sinon ce serait tricher.
+Le modèle n'est pas chargé : on ne mesure que le coût du stockage.
+
+Lancer :
+    python -m app.benchmarks.bench_stockage
+"""
+
+import os
+import tempfile
+import time
+
+from app.models import adaptive_model
+from app.models.stockage import StockageMemoire, StockageSQLite
+
+NB_UTILISATEURS = 1000
+SUJETS = ["python", "algo", "math", "bdd"]
+
+
+def mesurer(nb_reponses: int) -> float:
+    """Réponses/s, flush final compris."""
+    debut = time.perf_counter()
+    for i in range(nb_reponses):
+        adaptive_model.update_user_profile(
+            f"bench_{i % NB_UTILISATEURS}", i, i % 2, 20.0 + i % 30, SUJETS[i % 4]
+        )
+    adaptive_model.stockage.vider()
+    return nb_reponses / (time.perf_counter() - debut)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as dossier:
+        cas = [
+            ("dict (mémoire)", StockageMemoire(), 50_000),
+            (
+                "SQLite write-through",
+                StockageSQLite(os.path.join(dossier, "wt.db"), write_behind=False),
+                3_000,
+            ),
+            (
+                "SQLite write-behind",
+                StockageSQLite(os.path.join(dossier, "wb.db"), write_behind=True),
+                50_000,
+            ),
+        ]
+        for nom, stockage, nb in cas:
+            adaptive_model.changer_stockage(stockage)
+            debit = mesurer(nb)
+            print(f"{nom:22s} : {debit:10.0f} réponses/s  ({nb} réponses)")
+        adaptive_model.changer_stockage(StockageMemoire())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+bench_table_prediction.py — Table compilée vs modele.predict
+Auteur : Moi (ESIEA 3A)
+
+Deux choses :
+1. Équivalence : on compare la table à modele.predict sur des temps tirés au hasard,
+   plus les seuils eux-mêmes et leurs voisins immédiats (c'est là que ça casserait).
+2. Latence : une prédiction "une ligne" via sklearn vs via la table.
+
+Lancer :
+    python -m app.benchmarks.bench_table_prediction
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.models import adaptive_model
+from app.models.compilateur import FEATURES, verifier_table
+
+
+def points_de_test(seuils: np.ndarray, nb_sujets: int, nb_aleatoires: int = 50_000):
+    """Temps aléatoires + seuils + voisins float32 des seuils, pour chaque score/sujet."""
+    rng = np.random.default_rng(0)
+    temps = np.concatenate(
+        [
+            rng.uniform(0, 200, nb_aleatoires),
+            seuils,
+            np.nextafter(seuils.astype(np.float32), np.float32(np.inf)),
+            np.nextafter(seuils.astype(np.float32), np.float32(-np.inf)),
+        ]
+    )
+    scores = rng.integers(0, 2, len(temps))
+    codes = rng.integers(0, nb_sujets, len(temps))
+    return pd.DataFrame(
+        {"score": scores, "temps_secondes": temps, "sujet_encode": codes}
+    )[FEATURES]
+
+
+def main():
+    adaptive_model.charger_modele()
+    modele = adaptive_model.modele
+    table = adaptive_model.table_prediction
+    if modele is None or table is None:
+        print("Modèle ou table indisponible — lance d'abord generate_data.py")
+        return
+
+    X = points_de_test(table.seuils_temps, len(table.classes_sujets))
+    nb_ecarts = verifier_table(table, modele, X)
+    print(f"Équivalence : {nb_ecarts} écart(s) sur {len(X)} points")
+    print(f"Table : {len(table.seuils_temps)} seuils, {table.table.size} cases")
+
+    sujets = table.classes_sujets
+    nb_sklearn, nb_table = 200, 200_000
+
+    debut = time.perf_counter()
+    for i in range(nb_sklearn):
+        sujet_encode = adaptive_model.label_encoder.transform([sujets[i % 4]])[0]
+        modele.predict(np.array([[i % 2, 10 + i % 60, sujet_encode]]))
+    t_sklearn = (time.perf_counter() - debut) / nb_sklearn * 1e6
+
+    debut = time.perf_counter()
+    for i in range(nb_table):
+        table.predire(i % 2, 10 + i % 60, sujets[i % 4])
+    t_table = (time.perf_counter() - debut) / nb_table * 1e6
+
+    print(f"sklearn predict (1 ligne) : {t_sklearn:10.1f} µs")
+    print(f"table compilée            : {t_table:10.2f} µs  (x{t_sklearn / t_table:.0f})")
+
+
+if __name__ == "__main__":
+    main()
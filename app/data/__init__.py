@@ -0,0 +1 @@
+# Données : génération du dataset et format en colonnes
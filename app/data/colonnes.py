@@ -0,0 +1,230 @@
+"""
+colonnes.py — Dataset en colonnes binaires (.npy) ouvertes en mmap
+Auteur : Moi (ESIEA 3A)
+
+pd.read_csv sur le dataset donne des colonnes object (user_id, sujet en str Python) :
+c'est lent à parser et chaque worker en garde sa propre copie en RAM.
+Ici on convertit le CSV UNE fois, par paquets, en un dossier de colonnes :
+
+    dataset_quiz.csv.colonnes/
+        manifeste.json          # nb de lignes, colonnes, sujets, empreinte du CSV source
+        user_id.npy             # int32 : code de l'utilisateur (→ users.npy)
+        users.npy               # noms des utilisateurs (chaînes de largeur fixe)
+        question_id.npy         # int64
+        sujet.npy               # uint8 : code du sujet (→ manifeste["sujets"])
+        niveau_difficulte.npy   # int8
+        score.npy               # int8
+        temps_secondes.npy      # float32 (sklearn travaille en float32 de toute façon)
+        niveau_reel_user.npy    # float32
+
+Les sujets sont triés par ordre alphabétique avant d'être codés : c'est le même ordre
+que LabelEncoder / np.unique, donc le code du sujet EST déjà le sujet_encode du modèle.
+
+Ensuite chaque worker fait juste np.load(..., mmap_mode="r") : rien n'est copié,
+les N workers partagent les mêmes pages du cache disque.
+Le dossier est re-généré tout seul si le CSV a changé (taille ou mtime).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "dataset_quiz.csv")
+FORMAT_COLONNES = 1
+TAILLE_CHUNK = 1_000_000  # lignes lues par paquet pendant la conversion
+
+# Colonnes numériques stockées telles quelles (avec un dtype plus petit)
+DTYPES = {
+    "question_id": np.int64,
+    "niveau_difficulte": np.int8,
+    "score": np.int8,
+    "temps_secondes": np.float32,
+    "niveau_reel_user": np.float32,
+}
+
+
+def dossier_colonnes(chemin_csv: str) -> str:
+    """Dossier des colonnes associé à un CSV (à côté du CSV)."""
+    return f"{chemin_csv}.colonnes"
+
+
+def _empreinte(chemin: str) -> dict:
+    st = os.stat(chemin)
+    return {"taille": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _lire_manifeste(dossier: str) -> dict:
+    try:
+        with open(os.path.join(dossier, "manifeste.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def est_a_jour(chemin_csv: str, dossier: str = None) -> bool:
+    """Vrai si les colonnes correspondent au CSV actuel (taille + mtime)."""
+    manifeste = _lire_manifeste(dossier or dossier_colonnes(chemin_csv))
+    if manifeste is None or manifeste.get("format") != FORMAT_COLONNES:
+        return False
+    if not os.path.exists(chemin_csv):
+        return True  # déploiement sans le CSV : on garde les colonnes
+    return manifeste["source"] == _empreinte(chemin_csv)
+
+
+def convertir(chemin_csv: str, dossier: str = None, taille_chunk: int = TAILLE_CHUNK) -> str:
+    """
+    Convertit le CSV en colonnes .npy, sans jamais avoir tout le CSV en mémoire.
+
+    1re passe : seulement la colonne sujet → nombre de lignes + dictionnaire des sujets
+    2e passe  : on remplit des .npy préalloués (open_memmap) paquet par paquet
+    Écrit dans un dossier temporaire puis renomme → un worker ne voit jamais
+    un dossier à moitié écrit.
+    """
+    dossier = dossier or dossier_colonnes(chemin_csv)
+    empreinte = _empreinte(chemin_csv)
+
+    entete = pd.read_csv(chemin_csv, nrows=0).columns
+    numeriques = {nom: dtype for nom, dtype in DTYPES.items() if nom in entete}
+
+    nb_lignes = 0
+    sujets = set()
+    for chunk in pd.read_csv(chemin_csv, usecols=["sujet"], chunksize=taille_chunk):
+        nb_lignes += len(chunk)
+        sujets.update(chunk["sujet"].unique())
+    sujets = sorted(str(s) for s in sujets)
+    if len(sujets) > 256:
+        raise ValueError("Trop de sujets différents pour un code uint8 (256 max)")
+    code_par_sujet = {nom: code for code, nom in enumerate(sujets)}
+
+    parent = os.path.dirname(os.path.abspath(dossier))
+    tmp = tempfile.mkdtemp(prefix=".tmp-colonnes-", dir=parent)
+    try:
+        def colonne(nom, dtype):
+            return np.lib.format.open_memmap(
+                os.path.join(tmp, f"{nom}.npy"), mode="w+", dtype=dtype, shape=(nb_lignes,)
+            )
+
+        sorties = {nom: colonne(nom, dtype) for nom, dtype in numeriques.items()}
+        sorties["sujet"] = colonne("sujet", np.uint8)
+        sorties["user_id"] = colonne("user_id", np.int32)
+
+        code_par_user = {}
+        debut = 0
+        for chunk in pd.read_csv(chemin_csv, chunksize=taille_chunk):
+            fin = debut + len(chunk)
+            for nom in numeriques:
+                sorties[nom][debut:fin] = chunk[nom].to_numpy()
+
+            # Dictionnaire des sujets : petit, connu d'avance
+            sorties["sujet"][debut:fin] = chunk["sujet"].map(code_par_sujet).to_numpy()
+
+            # Utilisateurs : factorize local au paquet, puis on ne passe en Python
+            # que sur les valeurs uniques du paquet pour les codes globaux
+            codes_locaux, uniques = pd.factorize(chunk["user_id"])
+            codes_globaux = np.fromiter(
+                (code_par_user.setdefault(u, len(code_par_user)) for u in uniques),
+                dtype=np.int32,
+                count=len(uniques),
+            )
+            sorties["user_id"][debut:fin] = codes_globaux[codes_locaux]
+            debut = fin
+
+        for tableau in sorties.values():
+            tableau.flush()
+        del sorties
+
+        np.save(os.path.join(tmp, "users.npy"), np.array(list(code_par_user), dtype=str))
+
+        manifeste = {
+            "format": FORMAT_COLONNES,
+            "nb_lignes": nb_lignes,
+            "sujets": sujets,
+            "colonnes": ["user_id", "sujet", *numeriques],
+            "source": empreinte,
+        }
+        with open(os.path.join(tmp, "manifeste.json"), "w") as f:
+            json.dump(manifeste, f, indent=2)
+
+        # Remplacement de l'ancienne version (s'il y en a une)
+        if os.path.exists(dossier):
+            ancien = f"{dossier}.ancien-{os.getpid()}"
+            os.replace(dossier, ancien)
+            os.replace(tmp, dossier)
+            shutil.rmtree(ancien, ignore_errors=True)
+        else:
+            os.replace(tmp, dossier)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    print(f"[DATASET] {nb_lignes} lignes converties en colonnes : {dossier}")
+    return dossier
+
+
+class DatasetColonnes:
+    """
+    Le dataset ouvert en mmap lecture seule. ds["score"] → tableau NumPy (vue sur le fichier).
+    Le sujet et le user_id sont des codes : voir `sujets` et `users` pour les noms.
+    """
+
+    def __init__(self, dossier: str):
+        manifeste = _lire_manifeste(dossier)
+        if manifeste is None:
+            raise FileNotFoundError(f"Pas de dataset en colonnes dans {dossier}")
+        if manifeste.get("format") != FORMAT_COLONNES:
+            raise ValueError(f"Format de colonnes non supporté : {manifeste.get('format')}")
+
+        self.dossier = dossier
+        self.manifeste = manifeste
+        self.sujets = manifeste["sujets"]
+        self.colonnes = {
+            nom: np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r")
+            for nom in manifeste["colonnes"]
+        }
+        self.users = np.load(os.path.join(dossier, "users.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return self.manifeste["nb_lignes"]
+
+    def __getitem__(self, nom: str) -> np.ndarray:
+        return self.colonnes[nom]
+
+    def __contains__(self, nom: str) -> bool:
+        return nom in self.colonnes
+
+    def vers_dataframe(self, colonnes: list = None) -> pd.DataFrame:
+        """
+        DataFrame décodé comme le CSV d'origine (pour le notebook / l'analyse).
+        Attention ça recopie tout en mémoire, le service n'en a pas besoin.
+        """
+        colonnes = colonnes or self.manifeste["colonnes"]
+        donnees = {}
+        for nom in colonnes:
+            if nom == "sujet":
+                donnees[nom] = pd.Categorical.from_codes(self[nom], self.sujets)
+            elif nom == "user_id":
+                donnees[nom] = np.asarray(self.users)[self[nom]]
+            else:
+                donnees[nom] = np.asarray(self[nom])
+        return pd.DataFrame(donnees)
+
+
+def charger_colonnes(chemin_csv: str = DATA_PATH, dossier: str = None) -> DatasetColonnes:
+    """Ouvre le dataset en colonnes, en (re)convertissant le CSV d'abord si besoin."""
+    dossier = dossier or dossier_colonnes(chemin_csv)
+    if not est_a_jour(chemin_csv, dossier):
+        convertir(chemin_csv, dossier)
+    return DatasetColonnes(dossier)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convertit le CSV en colonnes .npy")
+    parser.add_argument("--csv", default=DATA_PATH, help="chemin du CSV")
+    parser.add_argument("--chunk", type=int, default=TAILLE_CHUNK, help="lignes par paquet")
+    args = parser.parse_args()
+    convertir(args.csv, taille_chunk=args.chunk)
@@ -8,14 +8,27 @@ mais pour prototype c'est largement suffisant.
 
 Lancer ce script une seule fois pour créer le CSV :
     python app/data/generate_data.py
+
+La première version faisait une double boucle Python avec un np.random.* par ligne :
+ok pour 2000 lignes, inutilisable pour les 10M+ qu'il faut pour les tests de charge.
+Maintenant tout est tiré en tableaux (np.random.Generator), par paquets d'utilisateurs,
+et écrit au fil de l'eau (CSV ou Parquet) → mémoire bornée quelle que soit la taille.
+On peut aussi répartir sur plusieurs processus, chaque shard a sa propre seed dérivée.
+
+    python app/data/generate_data.py --lignes 10000000 --processus 8
+    python app/data/generate_data.py --lignes 10000000 --format parquet
 """
 
+import argparse
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
-import os
 
 # Seed pour la reproductibilité — important pour que les résultats soient consistants
-np.random.seed(42)
+SEED = 42
 
 # Paramètres du dataset
 NB_UTILISATEURS = 200
@@ -25,88 +38,121 @@ NB_TOTAL = 2000  # on cible ~2000 entrées
 SUJETS = ["python", "algo", "math", "bdd"]
 NIVEAUX = [1, 2, 3, 4, 5]
 
+# Nombre de questions par utilisateur : randint(5, 20) → 12 en moyenne
+NB_QUESTIONS_MIN, NB_QUESTIONS_MAX = 5, 20
+MOYENNE_QUESTIONS = (NB_QUESTIONS_MIN + NB_QUESTIONS_MAX - 1) / 2
+
+TAILLE_CHUNK = 1_000_000  # lignes par paquet écrit
 
-def generer_dataset(nb_entrees: int = NB_TOTAL) -> pd.DataFrame:
+
+def repondre(rng: np.random.Generator, niveau_reel, niveau_question) -> tuple:
+    """
+    Le modèle de réponse, vectorisé : (score, temps_secondes) pour des tableaux de
+    niveaux réels / niveaux de questions. Sert aussi au simulateur (models/simulateur.py).
     """
-    Génère un dataset simulant des historiques de réponses.
+    n = len(niveau_question)
+
+    # Probabilité de réussite : sigmoid de l'écart niveau_user - niveau_question
+    ecart = niveau_reel - niveau_question
+    p_reussite = np.clip(1 / (1 + np.exp(-ecart)), 0.05, 0.95)
+    score = (rng.random(n) < p_reussite).astype(np.int64)
 
-    Logique de simulation :
+    # Temps de réponse : plus c'est dur, plus c'est long ; un échec coûte en plus
+    temps_base = 15 + niveau_question * 8  # entre 23s (niv 1) et 55s (niv 5)
+    variation = rng.normal(0, 5, n)
+    malus_echec = (1 - score) * rng.uniform(5, 15, n)
+    temps_secondes = np.maximum(5.0, temps_base + variation + malus_echec)
+    return score, temps_secondes
+
+
+def _generer_utilisateurs(
+    rng: np.random.Generator, indices_users: np.ndarray, premier_question_id: int
+) -> pd.DataFrame:
+    """
+    Simule les réponses d'un paquet d'utilisateurs, tout en tableaux.
+
+    Logique de simulation (la même qu'avant, ligne par ligne) :
     - Les utilisateurs ont un "vrai niveau" (1-5) tiré au sort
     - Leur probabilité de réussite dépend de l'écart entre leur niveau et la difficulté
     - Le temps de réponse est corrélé avec la difficulté et le résultat
     """
+    nb_users = len(indices_users)
 
-    lignes = []
-    question_counter = 1
-
-    for user_idx in range(NB_UTILISATEURS):
-        user_id = f"user_{user_idx:04d}"
-
-        # Niveau "réel" de l'utilisateur (distribution normale centrée sur 2.5)
-        niveau_reel_user = np.clip(np.random.normal(2.5, 1.2), 1, 5)
-
-        # Nombre de questions pour cet utilisateur (variable)
-        nb_questions_user = np.random.randint(5, 20)
-
-        for _ in range(nb_questions_user):
-            sujet = np.random.choice(SUJETS)
-
-            # Niveau de la question (entre 1 et 5)
-            # Tendance à poser des questions proches du niveau de l'user
-            niveau_question = int(
-                np.clip(np.random.normal(niveau_reel_user, 1.0), 1, 5)
-            )
-
-            # Probabilité de réussite : dépend de l'écart niveau_user - niveau_question
-            ecart = niveau_reel_user - niveau_question
-            # Si ecart > 0 : question trop facile → p_reussite haute
-            # Si ecart < 0 : question trop dure → p_reussite basse
-            p_reussite = 1 / (1 + np.exp(-ecart))  # sigmoid — j'adore cette formule
-            p_reussite = np.clip(p_reussite, 0.05, 0.95)
-
-            score = int(np.random.rand() < p_reussite)
-
-            # Temps de réponse : dépend du niveau et du résultat
-            # Plus c'est dur, plus ça prend du temps. Si on rate, ça prend plus de temps aussi.
-            temps_base = 15 + niveau_question * 8  # entre 23s (niv 1) et 55s (niv 5)
-            variation = np.random.normal(0, 5)
-            malus_echec = (1 - score) * np.random.uniform(5, 15)  # pénalité si erreur
-            temps_secondes = max(5.0, temps_base + variation + malus_echec)
-
-            lignes.append(
-                {
-                    "user_id": user_id,
-                    "question_id": question_counter,
-                    "sujet": sujet,
-                    "niveau_difficulte": niveau_question,
-                    "score": score,
-                    "temps_secondes": round(temps_secondes, 1),
-                    "niveau_reel_user": round(
-                        niveau_reel_user, 2
-                    ),  # utile pour analyse
-                }
-            )
-
-            question_counter += 1
-
-    df = pd.DataFrame(lignes)
-
-    # On s'assure d'avoir ~NB_TOTAL entrées (on complète si besoin)
-    if len(df) < nb_entrees:
-        # Compléter en dupliquant avec du bruit
-        nb_manquants = nb_entrees - len(df)
-        df_extra = df.sample(nb_manquants, replace=True).copy()
-        df_extra["user_id"] = df_extra["user_id"] + "_bis"
-        df_extra["question_id"] = range(
-            question_counter, question_counter + nb_manquants
-        )
-        # Petit bruit sur le temps
-        df_extra["temps_secondes"] = (
-            (df_extra["temps_secondes"] + np.random.normal(0, 2, nb_manquants))
-            .clip(5)
-            .round(1)
-        )
-        df = pd.concat([df, df_extra], ignore_index=True)
+    # Niveau "réel" de l'utilisateur (distribution normale centrée sur 2.5)
+    niveaux_reels = np.clip(rng.normal(2.5, 1.2, nb_users), 1, 5)
+
+    # Nombre de questions pour chaque utilisateur (variable)
+    nb_questions = rng.integers(NB_QUESTIONS_MIN, NB_QUESTIONS_MAX, nb_users)
+
+    # Une ligne par (utilisateur, question) : on répète les attributs de l'utilisateur
+    ligne_vers_user = np.repeat(np.arange(nb_users), nb_questions)
+    niveau_reel = niveaux_reels[ligne_vers_user]
+    n = len(ligne_vers_user)
+
+    sujets = np.asarray(SUJETS)[rng.integers(0, len(SUJETS), n)]
+
+    # Niveau de la question (entre 1 et 5), proche du niveau de l'user.
+    # astype(int) tronque comme le int() d'avant (valeurs positives)
+    niveau_question = np.clip(rng.normal(niveau_reel, 1.0), 1, 5).astype(np.int64)
+
+    score, temps_secondes = repondre(rng, niveau_reel, niveau_question)
+
+    noms_users = np.array([f"user_{i:04d}" for i in indices_users])
+
+    return pd.DataFrame(
+        {
+            "user_id": noms_users[ligne_vers_user],
+            "question_id": np.arange(premier_question_id, premier_question_id + n),
+            "sujet": sujets,
+            "niveau_difficulte": niveau_question,
+            "score": score,
+            "temps_secondes": np.round(temps_secondes, 1),
+            "niveau_reel_user": np.round(niveau_reel, 2),  # utile pour analyse
+        }
+    )
+
+
+def generer_chunks(
+    nb_entrees: int,
+    seed: int = SEED,
+    shard: int = 0,
+    nb_shards: int = 1,
+    taille_chunk: int = TAILLE_CHUNK,
+    premier_question_id: int = 1,
+):
+    """
+    Générateur de DataFrames d'environ `taille_chunk` lignes, jusqu'à `nb_entrees`
+    lignes au total pour ce shard (le dernier paquet est tronqué pile).
+
+    Chaque shard a sa propre seed (SeedSequence.spawn) → résultat déterministe.
+    Les user_id sont entrelacés entre shards (shard, shard + nb_shards, ...) ;
+    avec des `premier_question_id` disjoints, on peut concaténer les shards.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(nb_shards)[shard])
+
+    question_id = premier_question_id
+    prochain_user = 0
+    restant = nb_entrees
+    users_par_chunk = max(1, int(taille_chunk / MOYENNE_QUESTIONS))
+
+    while restant > 0:
+        # Un peu plus d'utilisateurs que nécessaire pour le dernier paquet, on tronque après
+        nb_users = min(users_par_chunk, int(restant / MOYENNE_QUESTIONS) + 2)
+        locaux = np.arange(prochain_user, prochain_user + nb_users)
+        prochain_user += nb_users
+
+        chunk = _generer_utilisateurs(rng, locaux * nb_shards + shard, question_id)
+        if len(chunk) > restant:
+            chunk = chunk.iloc[:restant]
+
+        question_id += len(chunk)
+        restant -= len(chunk)
+        yield chunk
+
+
+def generer_dataset(nb_entrees: int = NB_TOTAL, seed: int = SEED) -> pd.DataFrame:
+    """Génère le dataset complet en mémoire (pour les petites tailles / le notebook)."""
+    df = pd.concat(list(generer_chunks(nb_entrees, seed)), ignore_index=True)
 
     print(f"Dataset généré : {len(df)} entrées")
     print(f"Distribution des scores : {df['score'].value_counts().to_dict()}")
@@ -124,20 +170,121 @@ def sauvegarder_dataset(df: pd.DataFrame, chemin: str):
     print(f"Dataset sauvegardé : {chemin}")
 
 
-if __name__ == "__main__":
-    print("=== Génération du dataset simulé ===")
+def _ecrire_shard(args: tuple) -> str:
+    """Écrit un shard dans son propre fichier, paquet par paquet. Retourne le chemin."""
+    chemin, format_sortie, nb_entrees, seed, shard, nb_shards, taille_chunk, premier_id = args
+    chunks = generer_chunks(nb_entrees, seed, shard, nb_shards, taille_chunk, premier_id)
+
+    if format_sortie == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Le format parquet nécessite pyarrow : pip install pyarrow")
+
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(chemin, table.schema, compression="zstd")
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    else:
+        with open(chemin, "w", newline="") as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, header=(i == 0), index=False)
+    return chemin
+
+
+def sauvegarder_en_flux(
+    chemin: str,
+    nb_entrees: int,
+    format_sortie: str = "csv",
+    nb_processus: int = 1,
+    seed: int = SEED,
+    taille_chunk: int = TAILLE_CHUNK,
+):
+    """
+    Génère et écrit `nb_entrees` lignes sans jamais tout avoir en mémoire.
+
+    - 1 processus : écriture directe dans `chemin`
+    - N processus : chaque shard écrit un fichier part, puis
+        * CSV : les parts sont concaténées dans `chemin` (copie d'octets, sans les en-têtes)
+        * Parquet : `chemin` devient un dossier de parts (lisible tel quel par pyarrow/pandas)
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+
+    if nb_processus <= 1:
+        _ecrire_shard((chemin, format_sortie, nb_entrees, seed, 0, 1, taille_chunk, 1))
+        print(f"Dataset sauvegardé : {chemin} ({nb_entrees} lignes)")
+        return
+
+    # Répartition des lignes entre shards (les premiers prennent le reste)
+    base, reste = divmod(nb_entrees, nb_processus)
+    lignes_par_shard = [base + (1 if s < reste else 0) for s in range(nb_processus)]
+    # question_id disjoints et contigus : chaque shard démarre après le précédent
+    premiers_ids = 1 + np.concatenate([[0], np.cumsum(lignes_par_shard)[:-1]])
+
+    if format_sortie == "parquet":
+        os.makedirs(chemin, exist_ok=True)
+        parts = [os.path.join(chemin, f"part-{s:05d}.parquet") for s in range(nb_processus)]
+    else:
+        parts = [f"{chemin}.part-{s:05d}" for s in range(nb_processus)]
+
+    taches = [
+        (
+            parts[s], format_sortie, lignes_par_shard[s], seed, s, nb_processus,
+            taille_chunk, int(premiers_ids[s]),
+        )
+        for s in range(nb_processus)
+    ]
+    with ProcessPoolExecutor(max_workers=nb_processus) as pool:
+        list(pool.map(_ecrire_shard, taches))
 
-    df_scores = generer_dataset(NB_TOTAL)
+    if format_sortie != "parquet":
+        with open(chemin, "wb") as sortie:
+            for s, part in enumerate(parts):
+                with open(part, "rb") as f:
+                    if s > 0:
+                        f.readline()  # en-tête déjà écrit par le premier part
+                    shutil.copyfileobj(f, sortie, 1 << 20)
+                os.remove(part)
 
-    chemin_csv = os.path.join(os.path.dirname(__file__), "dataset_quiz.csv")
-    sauvegarder_dataset(df_scores, chemin_csv)
+    print(f"Dataset sauvegardé : {chemin} ({nb_entrees} lignes, {nb_processus} shards)")
 
-    # Petit résumé statistique
-    print("\n=== Statistiques du dataset ===")
-    print(f"Nb utilisateurs uniques : {df_scores['user_id'].nunique()}")
-    print(f"Score moyen global : {df_scores['score'].mean():.3f}")
-    print(f"Temps moyen de réponse : {df_scores['temps_secondes'].mean():.1f}s")
 
-    # Distribution par sujet
-    print("\nTaux de réussite par sujet :")
-    print(df_scores.groupby("sujet")["score"].mean().round(3))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère le dataset simulé")
+    parser.add_argument("--lignes", type=int, default=NB_TOTAL, help="nombre de lignes")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--processus", type=int, default=1, help="nb de shards en parallèle")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--chunk", type=int, default=TAILLE_CHUNK, help="lignes par paquet")
+    parser.add_argument("--sortie", default=None, help="chemin de sortie")
+    args = parser.parse_args()
+
+    extension = "parquet" if args.format == "parquet" else "csv"
+    chemin_sortie = args.sortie or os.path.join(
+        os.path.dirname(__file__), f"dataset_quiz.{extension}"
+    )
+
+    print("=== Génération du dataset simulé ===")
+
+    if args.lignes <= TAILLE_CHUNK and args.format == "csv" and args.processus <= 1:
+        # Petit dataset : on garde le résumé statistique d'avant
+        df_scores = generer_dataset(args.lignes, args.seed)
+        sauvegarder_dataset(df_scores, chemin_sortie)
+
+        print("\n=== Statistiques du dataset ===")
+        print(f"Nb utilisateurs uniques : {df_scores['user_id'].nunique()}")
+        print(f"Score moyen global : {df_scores['score'].mean():.3f}")
+        print(f"Temps moyen de réponse : {df_scores['temps_secondes'].mean():.1f}s")
+
+        # Distribution par sujet
+        print("\nTaux de réussite par sujet :")
+        print(df_scores.groupby("sujet")["score"].mean().round(3))
+    else:
+        sauvegarder_en_flux(
+            chemin_sortie, args.lignes, args.format, args.processus, args.seed, args.chunk
+        )
@@ -7,18 +7,117 @@ J'ai choisi FastAPI parce que c'est ultra rapide à mettre en place
 et la doc auto avec Swagger c'est vraiment pratique pour tester sans Postman.
 """
 
+import os
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 # Import de mes routes custom
+from app.models import adaptive_model
+from app.routes.admin import router as admin_router
 from app.routes.questions import router as questions_router
+from app.utils import profileur, sharding
+from app.utils.metriques import registre
+from app.utils.trace import MiddlewareTrace
+
+METRIQUE_REQUETES = registre.histogramme(
+    "http_requete_duree_secondes",
+    "Durée des requêtes HTTP par route (gabarit, ex. /api/stats/{user_id})",
+    ("methode", "route", "code"),
+)
+
+
+class MiddlewareMetriques:
+    """
+    Middleware ASGI "brut" (pas BaseHTTPMiddleware, qui coûte une tâche de plus
+    par requête) : chronomètre chaque requête HTTP et l'observe par route.
+    On prend le gabarit de la route posé dans le scope par FastAPI, sinon
+    chaque user_id de /api/stats/{user_id} créerait sa propre série.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        code = [500]
+
+        async def send_avec_code(message):
+            if message["type"] == "http.response.start":
+                code[0] = message["status"]
+            await send(message)
+
+        debut = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_avec_code)
+        finally:
+            METRIQUE_REQUETES.observer(
+                time.perf_counter() - debut, scope["method"], _gabarit_route(scope), code[0]
+            )
+
+
+def _gabarit_route(scope) -> str:
+    """
+    Gabarit de la route matchée (ex. /api/stats/{user_id}), "inconnue" pour un 404.
+    Les FastAPI récents ne mettent dans scope["route"] que le chemin relatif au
+    router inclus (/stats/{user_id}) : le chemin complet est alors dans le contexte
+    de route effectif.
+    """
+    contexte = scope.get("fastapi", {}).get("effective_route_context")
+    if getattr(contexte, "path", None):
+        return contexte.path
+    route = scope.get("route")
+    return route.path if route is not None else "inconnue"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Cycle de vie de l'app (remplace l'ancien event "startup").
+
+    Le modèle est chargé dans un thread de fond : l'API répond tout de suite
+    en mode fallback (ajustement manuel du niveau, question de secours), puis
+    bascule sur le modèle ML dès qu'il est prêt. /health/ready permet au load
+    balancer de n'envoyer du trafic qu'aux workers déjà chauds.
+    """
+    print("[INFO] Démarrage de l'API...")
+    print("[INFO] Chargement du modèle adaptatif en tâche de fond...")
+    adaptive_model.demarrer_chargement_en_fond()
+    print("[INFO] API prête (mode fallback en attendant le modèle) !")
+
+    # kill -USR2 <pid> → profil de N secondes écrit dans /tmp (voir utils/profileur.py)
+    secondes = float(os.environ.get("PROFIL_SIGNAL_SECONDES", 10))
+    if profileur.installer_signal(secondes=secondes):
+        print(f"[INFO] Profilage à chaud : kill -USR2 {os.getpid()} ({secondes:.0f}s)")
+
+    yield
+
+    adaptive_model.desactiver_prediction_par_lots()
+    adaptive_model.desactiver_pool_calcul()
+    adaptive_model.desactiver_reentrainement()
+    adaptive_model.desactiver_evenements()
+    sharding.arreter_cluster()
+    adaptive_model.fermer_stockage()
+    print("[INFO] Arrêt de l'API")
+
 
 app = FastAPI(
     title="Plateforme d'Apprentissage Adaptatif",
     description="API pour gérer les quiz adaptatifs selon le niveau de l'utilisateur",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Plusieurs nœuds : chaque apprenant est servi par son nœud propriétaire, les autres
+# relaient (voir utils/sharding.py). En premier = au plus près des routes
+app.add_middleware(sharding.MiddlewareSharding)
+
 # CORS — nécessaire si je veux connecter un front React un jour
 # TODO: restreindre les origines en prod, là c'est trop permissif
 app.add_middleware(
@@ -29,9 +128,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latence par route pour /metrics
+app.add_middleware(MiddlewareMetriques)
+
+# Trace à la demande : X-Trace: 1 → en-tête Server-Timing avec les étapes
+app.add_middleware(MiddlewareTrace)
+
 # Inclusion du router principal
 app.include_router(questions_router, prefix="/api")
 
+# Profilage à chaud, protégé par ADMIN_TOKEN (voir routes/admin.py)
+app.include_router(admin_router, prefix="/admin")
+
 
 @app.get("/")
 def root():
@@ -39,17 +147,33 @@ def root():
     return {"message": "API Apprentissage Adaptatif — v1.0", "status": "ok"}
 
 
-@app.on_event("startup")
-async def startup_event():
+@app.get("/health/live")
+def health_live():
+    """Liveness : le process répond, c'est tout (pas de dépendance au modèle)."""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def health_ready():
     """
-    Au démarrage, on charge le modèle ML en mémoire.
-    J'ai mis ça ici pour éviter de recharger le modèle à chaque requête
-    — j'ai galéré sur ça un moment avant de comprendre comment fonctionne le lifecycle FastAPI.
+    Readiness : 200 seulement quand le modèle ML est chargé, 503 sinon.
+    Le corps indique l'état, la durée de chargement et la version de l'artefact.
     """
-    print("[INFO] Démarrage de l'API...")
-    print("[INFO] Chargement du modèle adaptatif...")
-    # Le modèle est chargé dans adaptive_model.py directement (voir là-bas)
-    print("[INFO] API prête !")
+    etat = dict(adaptive_model.etat_modele)
+    etat["mode"] = "ml" if adaptive_model.modele is not None else "fallback"
+    code = 200 if etat["statut"] == "pret" else 503
+    return JSONResponse(status_code=code, content=etat)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Métriques au format texte Prometheus (latences par route, predict, fallbacks,
+    taille du cache de profils, micro-batching, stockage...). Voir utils/metriques.py.
+    """
+    return PlainTextResponse(
+        registre.exposer(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 # Pour lancer en local : uvicorn app.main:app --reload
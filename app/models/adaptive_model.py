@@ -11,208 +11,956 @@ du coup j'ai switché sur RandomForest. Meilleur résultat en validation croisé
 
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
 import os
 import json
+import threading
+import time
+
+from app.models.cache_profils import METRIQUE_CACHE, CacheProfils, creer_cache_depuis_env
+from app.models.compilateur import FEATURES, TablePrediction
+from app.models import evenements
+from app.models.index_questions import NIVEAU_MAX, NIVEAU_MIN, IndexQuestions
+from app.models.moteurs import MoteurAdaptation, MoteurElo
+from app.models.pool_calcul import PoolCalcul, calculer_niveaux
+from app.models.prediction_par_lots import PredicteurParLots, PredictionIndisponible
+from app.models.profil import OCTETS_HISTORIQUE, Profil, code_sujet
+from app.models.reentrainement import Reentraineur, TamponReponses
+from app.models.stockage import StockageProfils, creer_stockage_depuis_env
+from app.models.vus import MAX_VUS, EnsembleVus
+from app.utils.metriques import registre
+from app.utils.trace import etape
 
 # Chemin vers les données simulées
 DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/dataset_quiz.csv")
 
-# Profils utilisateurs en mémoire (simple dict pour l'instant)
-# TODO: remplacer par une vraie base de données (SQLite ou PostgreSQL)
-user_profiles: dict = {}
+# Profils utilisateurs en mémoire — c'est le cache chaud, borné (LRU + TTL, débord
+# sur disque, voir cache_profils.py), ou une table en mémoire partagée entre les
+# workers (PROFILS_PARTAGES, voir profils_partages.py). La persistance est déléguée
+# au stockage (mémoire seule par défaut, SQLite en option)
+user_profiles: CacheProfils = creer_cache_depuis_env()
+stockage: StockageProfils = creer_stockage_depuis_env()
 
-# Encodeur pour la variable "sujet"
-label_encoder = LabelEncoder()
+# Encodeur pour la variable "sujet" (LabelEncoder, vient de l'artefact)
+label_encoder = None
 
-# Modèle global — chargé une fois au démarrage
-modele: RandomForestClassifier = None
-df_global: pd.DataFrame = None
+# Modèle global (RandomForestClassifier) — chargé en tâche de fond au démarrage.
+# Tant qu'il vaut None, l'API tourne sur les fallbacks (_ajuster_niveau_manuel, _question_fallback)
+modele = None
 
+# Manifeste de l'artefact chargé (version, métriques, hash du dataset...)
+manifeste_modele: dict = None
 
-def charger_modele():
-    """
-    Charge le dataset et entraîne le modèle RandomForest.
-    Appelé au démarrage de l'app.
-    """
-    global modele, df_global, label_encoder
+# Index (niveau, sujet) → positions, construit au chargement pour select_question
+index_questions: IndexQuestions = None
 
-    try:
-        df = pd.read_csv(DATA_PATH)
-        df_global = df.copy()
+# Forêt "compilée" en table — une prédiction = un accès tableau (voir compilateur.py)
+table_prediction: TablePrediction = None
 
-        # Encodage de la colonne 'sujet' (catégorielle → numérique)
-        df["sujet_encode"] = label_encoder.fit_transform(df["sujet"])
+# Micro-batching des predict sklearn (optionnel, voir activer_prediction_par_lots)
+predicteur_par_lots: PredicteurParLots = None
 
-        # Features pour prédire la difficulté optimale
-        X = df[["score", "temps_secondes", "sujet_encode"]]
-        y = df["niveau_difficulte"]
+# Pool de processus pour les predict sklearn (optionnel, voir activer_pool_calcul).
+# Réglé par POOL_CALCUL (nb de process, 0 = désactivé) et POOL_CALCUL_FILE
+# (nb max de calculs en attente, 8 par process par défaut)
+pool_calcul: PoolCalcul = None
+nb_processus_pool: int = int(os.environ.get("POOL_CALCUL", 0))
+profondeur_pool: int = int(os.environ.get("POOL_CALCUL_FILE", 0)) or None
 
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+# Ré-entraînement en tâche de fond (optionnel, voir activer_reentrainement) : les
+# réponses vont dans un tampon borné, un process ré-entraîne et on bascule à chaud
+tampon_reponses: TamponReponses = None
+reentraineur: Reentraineur = None
 
-        modele = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=8,  # j'ai testé des valeurs entre 5 et 15, 8 semblait bien
-            random_state=42,
-        )
-        modele.fit(X_train, y_train)
+# Journal des réponses en Parquet pour l'analyse (optionnel, voir activer_evenements)
+journal_evenements: evenements.JournalEvenements = None
+
+# Calibration Elo de l'artefact (difficultés des questions), None si absente
+calibration_elo: dict = None
+
+# Moteur d'adaptation du niveau : "foret" (RandomForest + lissage, par défaut) ou "elo"
+# (voir moteurs.py). Choisi par MOTEUR_ADAPTATION, en bas du module.
+moteur: MoteurAdaptation = None
 
-        score_train = modele.score(X_train, y_train)
-        score_test = modele.score(X_test, y_test)
-        print(f"[MODELE] Accuracy train: {score_train:.3f} | test: {score_test:.3f}")
+# Préchargement : nb de questions préparées en fond après chaque réponse (0 = désactivé).
+# Voir precharger_questions ; réglé par PRECHARGEMENT_QUESTIONS.
+nb_prechargement: int = 0
 
+# Sans répétition : on ne repropose pas une question déjà répondue (voir vus.py).
+# Quand toute la bande niveau ± 1 est vue : "elargir" (± 2, ± 3...) ou "reinitialiser"
+# (on oublie les questions vues de la bande). Au-delà de max_vus questions vues, on oublie tout.
+POLITIQUES_EPUISEMENT = ("elargir", "reinitialiser")
+sans_repetition: bool = os.environ.get("SANS_REPETITION", "1") != "0"
+politique_epuisement: str = os.environ.get("POLITIQUE_EPUISEMENT", "elargir")
+max_vus: int = int(os.environ.get("MAX_VUS", MAX_VUS))
+if politique_epuisement not in POLITIQUES_EPUISEMENT:
+    raise ValueError(f"POLITIQUE_EPUISEMENT doit valoir {POLITIQUES_EPUISEMENT}")
+
+# État du chargement, lu par /health/ready
+# statut : non_charge → chargement → pret | indisponible (pas de données) | erreur
+etat_modele: dict = {
+    "statut": "non_charge",
+    "version": None,
+    "duree_chargement_s": None,
+    "erreur": None,
+}
+
+# Métriques exposées sur /metrics (voir utils/metriques.py)
+METRIQUE_PREDICT = registre.histogramme(
+    "modele_predict_duree_secondes",
+    "Durée d'une prédiction de niveau "
+    "(table compilée, micro-batch, sklearn, lot ou pool de processus)",
+    ("chemin",),
+)
+METRIQUE_FALLBACKS = registre.compteur(
+    "fallbacks_total",
+    "Passages par un fallback (question de secours, ajustement manuel, erreur de prédiction, "
+    "prédicteur par lots arrêté ou trop lent)",
+    ("type",),
+)
+METRIQUE_CANDIDATS = registre.histogramme(
+    "select_question_candidats",
+    "Nb de questions dans la bande niveau ± 1 où select_question a tiré",
+    bornes=(0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+METRIQUE_PRECHARGEMENT = registre.compteur(
+    "prechargement_questions_total",
+    "File de questions préchargées : servie (hit), vide ou perimee (miss), "
+    "remplie ou conservee (tâche de fond)",
+    ("resultat",),
+)
+METRIQUE_EPUISEMENTS = registre.compteur(
+    "questions_epuisees_total",
+    "Bandes de questions entièrement vues par un utilisateur (elargir, reinitialiser) "
+    "et plafonds de questions vues atteints (plafond)",
+    ("politique",),
+)
+
+
+def charger_modele(forcer: bool = False):
+    """
+    Charge le modèle depuis l'artefact versionné (voir artefact.py).
+    On ne ré-entraîne que si forcer=True ou si le dataset a changé depuis l'artefact.
+
+    Appelé en tâche de fond au démarrage de l'app (voir demarrer_chargement_en_fond) :
+    les globales ne sont remplacées qu'une fois tout chargé, donc les requêtes
+    passent directement du fallback au modèle ML sans coupure.
+    """
+    global modele
+
+    etat_modele.update(statut="chargement", erreur=None)
+    debut = time.perf_counter()
+
+    # Import ici : sklearn met plusieurs secondes à s'importer, autant que ce soit
+    # dans le thread de chargement plutôt qu'avant que uvicorn puisse servir
+    from app.models import artefact
+
+    try:
+        resultat = artefact.charger_ou_entrainer(forcer, DATA_PATH)
     except FileNotFoundError:
         print(f"[ERREUR] Dataset introuvable : {DATA_PATH}")
         print("[INFO] Lance d'abord : python app/data/generate_data.py")
         # On crée un modèle vide pour pas crasher l'API
         modele = None
+        etat_modele.update(statut="indisponible", erreur="dataset et artefact introuvables")
+        return
+    except Exception as e:
+        print(f"[ERREUR] Chargement du modèle impossible : {e}")
+        etat_modele.update(statut="erreur", erreur=str(e))
+        return
+
+    installer_modele(resultat)
+    etat_modele.update(duree_chargement_s=round(time.perf_counter() - debut, 3))
+
+
+def installer_modele(resultat: dict):
+    """
+    Remplace le modèle servi par `resultat` (artefact.charger). Sert au démarrage et
+    à la bascule à chaud après un ré-entraînement (voir basculer_version) : les
+    requêtes en cours finissent avec les anciennes références, aucune n'est refusée.
+    """
+    global modele, label_encoder, index_questions, table_prediction, manifeste_modele
+    global calibration_elo
+
+    # Ordre important : l'encodeur et l'index avant le modèle, puisque
+    # update_user_profile teste `modele is not None` avant d'utiliser le reste
+    label_encoder = resultat["label_encoder"]
+    index_questions = resultat["index"]
+    table_prediction = resultat["table"]
+    manifeste_modele = resultat["manifeste"]
+    calibration_elo = resultat.get("elo")
+    if isinstance(moteur, MoteurElo) and calibration_elo is not None:
+        moteur.charger_calibration(calibration_elo)
+    modele = resultat["modele"]
+
+    # Les process du pool chargent l'artefact courant : on les relance à chaque version
+    if nb_processus_pool > 0:
+        activer_pool_calcul(nb_processus_pool, profondeur_pool)
+
+    etat_modele.update(statut="pret", version=manifeste_modele["version"])
+    print(f"[MODELE] Version {manifeste_modele['version']} chargée")
+
+
+def basculer_version(version: str):
+    """Charge la version `version` de l'artefact et la sert à la place de l'actuelle."""
+    from app.models import artefact
 
+    manifeste = artefact.lire_manifeste(artefact.ARTEFACTS_DIR, version)
+    installer_modele(artefact.charger(artefact.ARTEFACTS_DIR, manifeste))
 
-def get_user_profile(user_id: str) -> dict:
+
+def demarrer_chargement_en_fond(forcer: bool = False) -> threading.Thread:
+    """Lance charger_modele dans un thread pour que l'API serve tout de suite."""
+    etat_modele["statut"] = "chargement"
+    thread = threading.Thread(
+        target=charger_modele, args=(forcer,), name="chargement-modele", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def get_user_profile(user_id: str) -> Profil:
     """Retourne le profil d'un utilisateur, le crée s'il n'existe pas."""
-    if user_id not in user_profiles:
-        user_profiles[user_id] = {
-            "user_id": user_id,
-            "niveau_actuel": 2,  # on commence en niveau intermédiaire
-            "score_total": 0,
-            "nb_questions": 0,
-            "bonnes_reponses": 0,
-            "historique": [],  # liste des (question_id, resultat, temps)
-            "sujets_faibles": [],  # sujets où l'utilisateur a du mal
-        }
-    return user_profiles[user_id]
+    return user_profiles.obtenir(user_id, _charger_ou_creer)
+
+
+def trouver_profil(user_id: str):
+    """
+    Comme get_user_profile mais sans jamais créer de profil (None si inconnu).
+    Pour les routes en lecture : un crawler sur /api/stats/xxx ne remplit plus la RAM.
+    """
+    return user_profiles.obtenir(user_id, _charger_du_stockage)
+
+
+def _charger_du_stockage(user_id: str):
+    # Ni dans le cache chaud ni dans le débord → on regarde dans le stockage
+    profil = stockage.charger(user_id)
+    if profil is not None:
+        METRIQUE_CACHE.inc("faute_stockage")
+    return profil
+
+
+def _charger_ou_creer(user_id: str) -> Profil:
+    profil = _charger_du_stockage(user_id)
+    if profil is None:
+        profil = Profil(user_id)  # niveau 2 (intermédiaire) au départ
+        METRIQUE_CACHE.inc("creation")
+    return profil
 
 
 def update_user_profile(
-    user_id: str, question_id: int, score: int, temps_secondes: float, sujet: str
+    user_id: str, question_id: int, score: int, temps_secondes: float, sujet: str,
+    prediction: int = None, niveau_question: int = None,
 ):
     """
     Met à jour le profil utilisateur après une réponse.
-    Recalcule le niveau optimal via le modèle ML.
+    Recalcule le niveau optimal via le moteur d'adaptation (modèle ML par défaut).
+    `prediction` : niveau déjà prédit ailleurs (pool de processus), sinon on prédit ici.
+    `niveau_question` : niveau de la question répondue, la cible du modèle → va dans
+    le tampon de ré-entraînement s'il est actif.
+    Retourne le profil mis à jour.
     """
-    profil = get_user_profile(user_id)
+    # modifier : avec la table partagée entre workers, le profil est verrouillé de la
+    # lecture à la réécriture (deux workers, même apprenant → aucune réponse perdue)
+    with user_profiles.modifier(user_id, _charger_ou_creer) as profil:
+        with etape("enregistrer"):
+            _enregistrer_reponse(profil, question_id, score, temps_secondes, sujet)
+
+        # Nouveau niveau optimal : forêt + lissage, ou Elo (voir changer_moteur)
+        with etape("predict"):
+            moteur.apres_reponse(profil, question_id, score, temps_secondes, sujet, prediction)
+
+        # En write-behind ça ne fait que marquer le profil à écrire plus tard
+        with etape("stockage"):
+            stockage.enregistrer(profil, (question_id, score, temps_secondes, sujet))
+
+    if tampon_reponses is not None and niveau_question is not None:
+        tampon_reponses.ajouter(score, temps_secondes, sujet, niveau_question)
+    if journal_evenements is not None:
+        journal_evenements.ajouter(
+            user_id, question_id, score, temps_secondes, sujet, niveau_question,
+            profil.niveau_actuel,
+        )
+    return profil
+
+
+def update_user_profiles_lot(
+    reponses: list, predictions=None, niveaux_questions: list = None
+) -> list:
+    """
+    Version par lot de update_user_profile (pour POST /reponses/batch).
+
+    `reponses` : liste de (user_id, question_id, score, temps_secondes, sujet),
+    éventuellement pour plusieurs utilisateurs. Avec la forêt, la prédiction ne
+    dépend que de la réponse (pas du profil), donc on la fait en UNE passe vectorisée
+    sur toutes les lignes (moteur.predire_lot) ; ensuite le moteur applique lissage
+    + clamp utilisateur par utilisateur, dans l'ordre d'arrivée de ses réponses.
+
+    `predictions` : niveaux déjà prédits par le pool de processus (sinon on prédit ici).
+    `niveaux_questions` : niveau de chaque question (tampon de ré-entraînement).
+    Retourne le niveau de l'utilisateur après chaque réponse (même ordre).
+    """
+    if predictions is None:
+        predictions = moteur.predire_lot(reponses)
+
+    # Regroupement par utilisateur, en gardant l'ordre de ses réponses
+    par_utilisateur: dict = {}
+    for i, reponse in enumerate(reponses):
+        par_utilisateur.setdefault(reponse[0], []).append(i)
+
+    niveaux_apres = [0] * len(reponses)
+    for user_id, indices in par_utilisateur.items():
+        with user_profiles.modifier(user_id, _charger_ou_creer) as profil:
+            for i in indices:
+                _, question_id, score, temps_secondes, sujet = reponses[i]
+                _enregistrer_reponse(profil, question_id, score, temps_secondes, sujet)
+                moteur.apres_reponse(
+                    profil, question_id, score, temps_secondes, sujet,
+                    prediction=None if predictions is None else predictions[i],
+                )
+                stockage.enregistrer(profil, (question_id, score, temps_secondes, sujet))
+                niveaux_apres[i] = profil.niveau_actuel
+
+    if tampon_reponses is not None and niveaux_questions is not None:
+        for (_, _, score, temps_secondes, sujet), niveau in zip(reponses, niveaux_questions):
+            tampon_reponses.ajouter(score, temps_secondes, sujet, niveau)
+    if journal_evenements is not None:
+        for i, reponse in enumerate(reponses):
+            niveau = niveaux_questions[i] if niveaux_questions is not None else None
+            journal_evenements.ajouter(*reponse, niveau, niveaux_apres[i])
+
+    return niveaux_apres
+
 
-    profil["nb_questions"] += 1
-    profil["score_total"] += score
+def _enregistrer_reponse(
+    profil: Profil, question_id: int, score: int, temps_secondes: float, sujet: str
+):
+    """Compteurs, historique et sujets faibles — tout sauf le niveau."""
+    # Ajout dans l'historique — buffer circulaire de 50 entrées, la plus ancienne
+    # est écrasée automatiquement (plus de re-slicing, voir profil.py).
+    # Avant les compteurs : si ça lève, le profil n'a pas bougé
+    code = code_sujet(sujet)
+    profil.ajouter(question_id, score, temps_secondes, code)
+
+    profil.nb_questions += 1
+    profil.score_total += score
     if score == 1:
-        profil["bonnes_reponses"] += 1
+        profil.bonnes_reponses += 1
 
-    # Ajout dans l'historique (on garde max 50 dernières entrées pour pas surcharger)
-    profil["historique"].append(
-        {
-            "question_id": question_id,
-            "score": score,
-            "temps": temps_secondes,
-            "sujet": sujet,
-        }
-    )
-    if len(profil["historique"]) > 50:
-        profil["historique"] = profil["historique"][-50:]
+    # Question vue : elle ne sera plus tirée pour cet utilisateur (voir _tirer_non_vue)
+    if sans_repetition and 0 <= question_id < 1 << 32:
+        vus = profil.vus
+        if vus is None:
+            vus = profil.vus = EnsembleVus()
+        elif len(vus) >= max_vus:
+            # Mémoire bornée par utilisateur : on repart de zéro
+            vus.vider()
+            METRIQUE_EPUISEMENTS.inc("plafond")
+        vus.ajouter(question_id)
 
     # Mise à jour des sujets faibles
     # Si l'utilisateur rate beaucoup dans un sujet, on le note
-    historique_sujet = [h for h in profil["historique"] if h["sujet"] == sujet]
-    if len(historique_sujet) >= 3:
-        taux_reussite_sujet = sum(h["score"] for h in historique_sujet) / len(
-            historique_sujet
+    # (compteurs glissants du profil → O(1), pas de re-parcours de l'historique)
+    tentatives_sujet, reussites_sujet = profil.stats_sujet(code)
+    if tentatives_sujet >= 3:
+        taux_reussite_sujet = reussites_sujet / tentatives_sujet
+        if taux_reussite_sujet < 0.4 and sujet not in profil.sujets_faibles:
+            profil.sujets_faibles.append(sujet)
+        elif taux_reussite_sujet >= 0.6 and sujet in profil.sujets_faibles:
+            profil.sujets_faibles.remove(sujet)
+
+
+def _lisser_niveau(niveau_actuel: int, nouveau_niveau: int) -> int:
+    """
+    Lissage : on fait une moyenne pondérée entre l'ancien niveau et le nouveau
+    pour éviter des changements trop brutaux. Puis clamp entre 1 et 5.
+    """
+    poids_nouveau = 0.3  # TODO: rendre ça dynamique selon le nb de questions
+    niveau_lisse = int(
+        round((1 - poids_nouveau) * niveau_actuel + poids_nouveau * nouveau_niveau)
+    )
+    return max(1, min(5, niveau_lisse))
+
+
+class MoteurForet(MoteurAdaptation):
+    """
+    Le moteur historique : le RandomForest (ou sa table compilée) prédit le niveau
+    à partir de la réponse, puis lissage 70/30 avec l'ancien niveau.
+    Sans modèle chargé → ajustement manuel sur les 3 dernières réponses.
+    """
+
+    nom = "foret"
+
+    def apres_reponse(
+        self, profil: Profil, question_id: int, score: int, temps_secondes: float,
+        sujet: str, prediction=None,
+    ):
+        if prediction is None:
+            # Chemin une réponse (pas de pré-calcul par lot)
+            if modele is None:
+                _ajuster_niveau_manuel(profil, score)
+                return
+            try:
+                prediction = _predire_niveau(score, temps_secondes, sujet)
+            except Exception as e:
+                print(f"[WARN] Erreur prédiction niveau: {e}")
+                METRIQUE_FALLBACKS.inc("erreur_prediction")
+                # Fallback : ajustement manuel basique
+                _ajuster_niveau_manuel(profil, score)
+                return
+
+        if prediction > 0:
+            profil.niveau_actuel = _lisser_niveau(profil.niveau_actuel, prediction)
+        else:
+            # Ligne du lot que le modèle ne sait pas prédire, ou lot sans modèle
+            _ajuster_niveau_manuel(profil, score)
+
+    def predire_lot(self, reponses: list):
+        niveaux = _predire_niveaux_lot(
+            [r[2] for r in reponses], [r[3] for r in reponses], [r[4] for r in reponses]
         )
-        if taux_reussite_sujet < 0.4 and sujet not in profil["sujets_faibles"]:
-            profil["sujets_faibles"].append(sujet)
-        elif taux_reussite_sujet >= 0.6 and sujet in profil["sujets_faibles"]:
-            profil["sujets_faibles"].remove(sujet)
+        # Pas de modèle ou lot en erreur : 0 partout → ajustement manuel pour chaque ligne
+        return np.zeros(len(reponses), dtype=np.int64) if niveaux is None else niveaux
+
+
+class MoteurEloChronometre(MoteurElo):
+    """MoteurElo + la même métrique de durée que les prédictions de la forêt."""
+
+    def apres_reponse(self, *args, **kwargs):
+        debut = time.perf_counter()
+        super().apres_reponse(*args, **kwargs)
+        METRIQUE_PREDICT.observer(time.perf_counter() - debut, "elo")
+
+
+MOTEURS = {"foret": MoteurForet, "elo": MoteurEloChronometre}
+
+
+def changer_moteur(nom: str) -> MoteurAdaptation:
+    """
+    Change de moteur d'adaptation ("foret" ou "elo"). Les profils gardent leur
+    niveau_actuel ; en passant à Elo, θ part de ce niveau.
+    """
+    global moteur
+
+    if nom not in MOTEURS:
+        raise ValueError(f"Moteur inconnu : {nom} (valeurs : {sorted(MOTEURS)})")
+    nouveau = MOTEURS[nom]()
+    if isinstance(nouveau, MoteurElo) and calibration_elo is not None:
+        nouveau.charger_calibration(calibration_elo)
+    moteur = nouveau
+    print(f"[MODELE] Moteur d'adaptation : {nom}")
+    return moteur
 
-    # Prédiction du nouveau niveau optimal via le modèle
-    if modele is not None:
+
+def supprimer_profil(user_id: str) -> bool:
+    """Supprime un profil (cache + stockage). Retourne True s'il existait."""
+    existait = user_profiles.pop(user_id, None) is not None
+    if not existait:
+        existait = stockage.charger(user_id) is not None
+    stockage.supprimer(user_id)
+    return existait
+
+
+def ids_profils() -> list:
+    """user_id de tous les profils de ce nœud : cache chaud, débord et stockage."""
+    return list(dict.fromkeys(user_profiles.user_ids() + stockage.user_ids()))
+
+
+def image_profil(user_id: str):
+    """
+    Profil.vers_octets() lu sous le verrou du profil (pas au milieu d'une réponse),
+    None s'il n'existe pas. Rien n'est créé.
+    """
+    with user_profiles.modifier(user_id, _charger_du_stockage) as profil:
+        return None if profil is None else profil.vers_octets()
+
+
+def ceder_profil(user_id: str):
+    """
+    Image du profil retirée de ce nœud (cache + stockage), None s'il n'existe pas.
+    Lecture et suppression sous le même verrou : une réponse en cours passe avant ou
+    après, jamais entre les deux.
+    """
+    with user_profiles.retirer(user_id, _charger_du_stockage) as profil:
+        if profil is None:
+            return None
+        donnees = profil.vers_octets()
+        stockage.supprimer(user_id)
+    return donnees
+
+
+def importer_profil(user_id: str, donnees: bytes) -> bool:
+    """
+    Profil reçu d'un autre nœud (Profil.vers_octets). Un profil déjà présent ici est
+    forcément plus récent (créé ou mis à jour depuis le changement d'anneau) : on le
+    garde. Retourne True si le profil reçu a été pris.
+    Seul le profil voyage : avec StockageSQLite, la table `historique` (toutes les
+    réponses, au-delà des 50 du profil) reste sur l'ancien nœud et y est supprimée.
+    """
+    recu = Profil.depuis_octets(user_id, donnees)
+    pris = []
+
+    def charger(uid: str):
+        profil = _charger_du_stockage(uid)
+        if profil is None:
+            profil = recu
+            pris.append(True)
+        return profil
+
+    user_profiles.obtenir(user_id, charger)
+    if pris:
+        stockage.enregistrer(recu)
+    return bool(pris)
+
+
+def changer_stockage(nouveau: StockageProfils):
+    """Remplace le stockage des profils (vide l'ancien et le cache chaud)."""
+    global stockage
+
+    ancien, stockage = stockage, nouveau
+    ancien.fermer()
+    user_profiles.clear()
+
+
+def fermer_stockage():
+    """À appeler à l'arrêt : écrit tout ce qui est encore en attente."""
+    stockage.fermer()
+
+
+def _predire_niveau(score: int, temps_secondes: float, sujet: str) -> int:
+    """
+    Prédit le niveau optimal pour une réponse.
+    Passe par la table compilée si elle existe, sinon par sklearn (une ligne).
+    """
+    debut = time.perf_counter()
+    if table_prediction is not None and score in (0, 1):
+        niveau = table_prediction.predire(score, temps_secondes, sujet)
+        METRIQUE_PREDICT.observer(time.perf_counter() - debut, "table")
+        return niveau
+
+    sujet_encode = label_encoder.transform([sujet])[0]
+    predicteur = predicteur_par_lots  # peut passer à None pendant l'appel (désactivation)
+    if predicteur is not None:
         try:
-            sujet_encode = label_encoder.transform([sujet])[0]
-            features = np.array([[score, temps_secondes, sujet_encode]])
-            nouveau_niveau = modele.predict(features)[0]
-
-            # Lissage : on fait une moyenne pondérée entre l'ancien niveau et le nouveau
-            # pour éviter des changements trop brutaux
-            poids_nouveau = 0.3  # TODO: rendre ça dynamique selon le nb de questions
-            niveau_lisse = int(
-                round(
-                    (1 - poids_nouveau) * profil["niveau_actuel"]
-                    + poids_nouveau * nouveau_niveau
-                )
-            )
-            # Clamp entre 1 et 5
-            profil["niveau_actuel"] = max(1, min(5, niveau_lisse))
+            niveau = predicteur.predire([score, temps_secondes, sujet_encode])
+            METRIQUE_PREDICT.observer(time.perf_counter() - debut, "lots")
+            return niveau
+        except PredictionIndisponible:
+            METRIQUE_FALLBACKS.inc("lots_indisponible")  # → predict direct
 
-        except Exception as e:
-            print(f"[WARN] Erreur prédiction niveau: {e}")
-            # Fallback : ajustement manuel basique
-            _ajuster_niveau_manuel(profil, score)
-    else:
-        _ajuster_niveau_manuel(profil, score)
+    features = np.array([[score, temps_secondes, sujet_encode]])
+    niveau = modele.predict(features)[0]
+    METRIQUE_PREDICT.observer(time.perf_counter() - debut, "sklearn")
+    return niveau
+
+
+def _predire_niveaux_lot(scores: list, temps_secondes: list, sujets: list):
+    """
+    Prédiction vectorisée pour un lot de réponses.
+    Retourne un tableau de niveaux (0 = ligne non prédictible, ex. sujet inconnu),
+    ou None si le modèle n'est pas chargé / a planté (→ fallback manuel partout).
+    """
+    if modele is None:
+        return None
+
+    debut = time.perf_counter()
+    try:
+        niveaux = calculer_niveaux(
+            modele, table_prediction, _code_par_sujet(), scores, temps_secondes, sujets
+        )
+        METRIQUE_PREDICT.observer(time.perf_counter() - debut, "lot")
+        return niveaux
+
+    except Exception as e:
+        print(f"[WARN] Erreur prédiction par lot: {e}")
+        METRIQUE_FALLBACKS.inc("erreur_prediction")
+        return None
+
+
+def _code_par_sujet() -> dict:
+    if table_prediction is not None:
+        return table_prediction.code_par_sujet
+    return {str(s): code for code, s in enumerate(label_encoder.classes_)}
+
+
+def _predict_lot(X: np.ndarray) -> np.ndarray:
+    """predict vectorisé pour le micro-batching (lit le modèle global à chaque lot)."""
+    return modele.predict(pd.DataFrame(X, columns=FEATURES))
+
+
+def activer_prediction_par_lots(
+    taille_max: int = 64, attente_max_us: int = 500, profondeur_max: int = 10_000
+) -> PredicteurParLots:
+    """
+    Active le micro-batching des prédictions sklearn.
+    Utile seulement quand la table compilée n'est pas dispo.
+    """
+    global predicteur_par_lots
+
+    desactiver_prediction_par_lots()
+    predicteur_par_lots = PredicteurParLots(
+        _predict_lot, taille_max, attente_max_us, profondeur_max
+    )
+    return predicteur_par_lots
+
+
+def desactiver_prediction_par_lots():
+    """Revient aux predict une ligne à la fois."""
+    global predicteur_par_lots
+
+    if predicteur_par_lots is not None:
+        ancien, predicteur_par_lots = predicteur_par_lots, None
+        ancien.arreter()
+
+
+def metriques_prediction_par_lots() -> dict:
+    """Métriques du micro-batching ({} s'il n'est pas activé)."""
+    if predicteur_par_lots is None:
+        return {}
+    return predicteur_par_lots.metriques()
+
+
+def activer_pool_calcul(nb_processus: int, profondeur_max: int = None) -> PoolCalcul:
+    """
+    Démarre (ou redémarre) le pool de processus sur l'artefact courant et attend que
+    chaque process l'ait chargé. Bloquant : appelé depuis le thread de chargement.
+    """
+    global pool_calcul
+
+    from app.models import artefact
+
+    nouveau = PoolCalcul(nb_processus, artefact.ARTEFACTS_DIR, profondeur_max)
+    try:
+        processus = nouveau.prechauffer()
+    except Exception as e:
+        print(f"[WARN] Pool de calcul indisponible, predict dans le process de l'API : {e}")
+        nouveau.arreter()
+        desactiver_pool_calcul()
+        return None
+    # L'ancien pool (version précédente) finit ses calculs en cours avant de s'arrêter
+    ancien, pool_calcul = pool_calcul, nouveau
+    if ancien is not None:
+        ancien.arreter(annuler=False)
+    print(
+        f"[MODELE] Pool de calcul : {nb_processus} process "
+        f"(file max {nouveau.profondeur_max}), versions {sorted({v for _, v in processus})}"
+    )
+    return pool_calcul
+
+
+def desactiver_pool_calcul():
+    """Arrête le pool (les calculs en attente sont annulés)."""
+    global pool_calcul
+
+    if pool_calcul is not None:
+        ancien, pool_calcul = pool_calcul, None
+        ancien.arreter()
+
+
+def prediction_deportee() -> bool:
+    """
+    True si la prédiction doit partir dans le pool : forêt active, modèle chargé et
+    PAS de table compilée. Avec la table, une prédiction coûte ~1 µs, bien moins que
+    l'aller-retour vers un autre process (pickle + pipe, ~100 µs).
+    """
+    return (
+        pool_calcul is not None
+        and isinstance(moteur, MoteurForet)
+        and modele is not None
+        and table_prediction is None
+    )
+
+
+async def predire_niveaux_deportes(reponses: list) -> np.ndarray:
+    """
+    Prédit dans le pool les niveaux d'une liste de (user_id, question_id, score, temps, sujet).
+    Lève PoolSature si la file est pleine (→ 503). À n'appeler que si prediction_deportee().
+    """
+    debut = time.perf_counter()
+    niveaux = await pool_calcul.predire_niveaux(
+        [r[2] for r in reponses], [r[3] for r in reponses], [r[4] for r in reponses]
+    )
+    METRIQUE_PREDICT.observer(time.perf_counter() - debut, "pool")
+    return niveaux
+
+
+def metriques_pool_calcul() -> dict:
+    """Métriques du pool de processus ({} s'il n'est pas activé)."""
+    if pool_calcul is None:
+        return {}
+    return pool_calcul.metriques()
+
+
+def activer_reentrainement(
+    taille_tampon: int = 100_000,
+    intervalle_s: float = 3600,
+    min_nouvelles: int = 1_000,
+    mode: str = "complet",
+    arbres_ajoutes: int = 20,
+) -> Reentraineur:
+    """
+    Démarre le tampon des réponses + le thread de ré-entraînement (voir reentrainement.py).
+    Les candidats retenus sont basculés à chaud par basculer_version.
+    """
+    global tampon_reponses, reentraineur
+
+    desactiver_reentrainement()
+    tampon_reponses = TamponReponses(taille_tampon)
+    if journal_evenements is not None:
+        # Après un redémarrage le tampon repart des dernières réponses du journal
+        reponses = evenements.reponses_recentes(journal_evenements.dossier, taille_tampon)
+        for ligne in zip(
+            reponses["score"], reponses["temps_secondes"], reponses["sujet"], reponses["niveau"]
+        ):
+            tampon_reponses.ajouter(*ligne)
+        print(f"[REENTRAINEMENT] {reponses['nb_total']} réponses reprises du journal")
+    reentraineur = Reentraineur(
+        tampon_reponses,
+        _contexte_reentrainement,
+        basculer_version,
+        intervalle_s=intervalle_s,
+        min_nouvelles=min_nouvelles,
+        mode=mode,
+        arbres_ajoutes=arbres_ajoutes,
+    )
+    return reentraineur
+
+
+def _contexte_reentrainement():
+    """(dossier des artefacts, manifeste servi, CSV), None tant que rien n'est chargé."""
+    from app.models import artefact
+
+    if modele is None or manifeste_modele is None:
+        return None
+    return artefact.ARTEFACTS_DIR, manifeste_modele, DATA_PATH
 
 
-def _ajuster_niveau_manuel(profil: dict, score: int):
+def desactiver_reentrainement():
+    """Arrête le thread (un entraînement en cours dans le process est abandonné)."""
+    global tampon_reponses, reentraineur
+
+    if reentraineur is not None:
+        ancien, reentraineur, tampon_reponses = reentraineur, None, None
+        ancien.arreter()
+
+
+def activer_evenements(dossier: str, **options) -> evenements.JournalEvenements:
+    """Démarre le journal des réponses (voir evenements.py pour les options)."""
+    global journal_evenements
+
+    desactiver_evenements()
+    journal_evenements = evenements.JournalEvenements(dossier, **options)
+    return journal_evenements
+
+
+def desactiver_evenements():
+    """Écrit les événements en attente et ferme les fichiers ouverts."""
+    global journal_evenements
+
+    if journal_evenements is not None:
+        ancien, journal_evenements = journal_evenements, None
+        ancien.fermer()
+
+
+def metriques_evenements() -> dict:
+    if journal_evenements is None:
+        return {}
+    return journal_evenements.metriques()
+
+
+def metriques_reentrainement() -> dict:
+    """Métriques du ré-entraînement ({} s'il n'est pas activé)."""
+    if reentraineur is None:
+        return {}
+    return reentraineur.metriques()
+
+
+def _ajuster_niveau_manuel(profil: Profil, score: int, compter: bool = True):
     """
     Ajustement de niveau basique sans ML.
     Utilisé si le modèle n'est pas disponible — c'est mon fallback.
+    compter=False : pas de fallbacks_total (tables du simulateur, voir simulateur.py).
     """
-    if len(profil["historique"]) >= 3:
+    if compter:
+        METRIQUE_FALLBACKS.inc("ajustement_manuel")
+    if profil.nb_historique() >= 3:
         # On regarde les 3 dernières réponses
-        recents = profil["historique"][-3:]
-        taux = sum(h["score"] for h in recents) / 3
+        recents = profil.scores_recents(3)
+        taux = sum(recents) / 3
 
-        if taux == 1.0 and profil["niveau_actuel"] < 5:
-            profil["niveau_actuel"] += 1  # tout bon → on monte
-        elif taux < 0.34 and profil["niveau_actuel"] > 1:
-            profil["niveau_actuel"] -= 1  # moins d'1/3 → on descend
+        if taux == 1.0 and profil.niveau_actuel < 5:
+            profil.niveau_actuel += 1  # tout bon → on monte
+        elif taux < 0.34 and profil.niveau_actuel > 1:
+            profil.niveau_actuel -= 1  # moins d'1/3 → on descend
 
 
 def select_question(user_id: str, sujet: str = None) -> dict:
     """
     Sélectionne la prochaine question adaptée au niveau de l'utilisateur.
     Si un sujet est spécifié, on filtre dessus. Sinon on prend au hasard.
+
+    Avec le préchargement actif (et sans sujet imposé), on sert d'abord la file
+    préparée en fond après la dernière réponse, si elle est encore valable.
     """
-    profil = get_user_profile(user_id)
-    niveau_cible = profil["niveau_actuel"]
+    with etape("profil"):
+        # Utilisateur inconnu : profil vierge jetable, rien n'est gardé en mémoire
+        profil = trouver_profil(user_id) or Profil(user_id)
+
+    if nb_prechargement > 0 and sujet is None:
+        with etape("file"):
+            question = _depiler_question(profil)
+        if question is not None:
+            return question
 
-    if df_global is None:
+    return _choisir_question(profil, sujet)
+
+
+def _choisir_question(profil: Profil, sujet: str = None) -> dict:
+    """Le tirage lui-même : bande niveau ± 1, sujet demandé ou sujet faible en priorité."""
+    niveau_cible = moteur.niveau_cible(profil, sujet)
+
+    if index_questions is None:
         # Pas de données chargées — on retourne une question hardcodée de secours
         return _question_fallback(niveau_cible)
 
-    # Filtre sur le niveau (on accepte niveau ± 1 pour avoir plus de choix)
-    niveaux_acceptes = [
-        max(1, niveau_cible - 1),
-        niveau_cible,
-        min(5, niveau_cible + 1),
-    ]
-    df_filtre = df_global[df_global["niveau_difficulte"].isin(niveaux_acceptes)]
+    # On accepte niveau ± 1 pour avoir plus de choix — les bandes sont précalculées
+    # dans l'index, donc pas de filtre pandas ici (voir index_questions.py)
+    position = -1
 
-    # Filtre sur le sujet si demandé
-    if sujet and sujet in df_global["sujet"].unique():
-        df_filtre = df_filtre[df_filtre["sujet"] == sujet]
+    with etape("tirage"):
+        # Priorité aux sujets faibles de l'utilisateur
+        if profil.sujets_faibles and sujet is None:
+            code_prioritaire = index_questions.code(profil.sujets_faibles[0])
+            if code_prioritaire is not None:
+                # Le moteur peut viser plus bas sur un sujet faible (Elo : θ du sujet)
+                niveau_sujet = moteur.niveau_cible(profil, profil.sujets_faibles[0])
+                position = _tirer_non_vue(profil, niveau_sujet, code_prioritaire)
+                if position >= 0:
+                    METRIQUE_CANDIDATS.observer(
+                        index_questions.taille_bande(niveau_sujet, code_prioritaire)
+                    )
 
-    # Priorité aux sujets faibles de l'utilisateur
-    if profil["sujets_faibles"] and sujet is None:
-        sujet_prioritaire = profil["sujets_faibles"][0]
-        df_priorite = df_filtre[df_filtre["sujet"] == sujet_prioritaire]
-        if not df_priorite.empty:
-            df_filtre = df_priorite
+        if position < 0:
+            # Filtre sur le sujet si demandé (et s'il existe dans le dataset)
+            code_sujet = index_questions.code(sujet) if sujet else None
+            position = _tirer_non_vue(profil, niveau_cible, code_sujet)
+            METRIQUE_CANDIDATS.observer(index_questions.taille_bande(niveau_cible, code_sujet))
 
-    if df_filtre.empty:
+    if position < 0:
         return _question_fallback(niveau_cible)
 
-    # On choisit une ligne au hasard dans le dataset filtré
-    ligne = df_filtre.sample(1).iloc[0]
+    with etape("enonce"):
+        question_id, sujet_question, niveau_question = index_questions.ligne(position)
 
-    return {
-        "question_id": int(ligne["question_id"]),
-        "sujet": ligne["sujet"],
-        "niveau_difficulte": int(ligne["niveau_difficulte"]),
-        "enonce": _generer_enonce(ligne["sujet"], int(ligne["niveau_difficulte"])),
-        "options": _generer_options(ligne["sujet"], int(ligne["niveau_difficulte"])),
-        "bonne_reponse_index": 0,  # dans une vraie app, ce serait stocké en base
-    }
+        return {
+            "question_id": question_id,
+            "sujet": sujet_question,
+            "niveau_difficulte": niveau_question,
+            "enonce": _generer_enonce(sujet_question, niveau_question),
+            "options": _generer_options(sujet_question, niveau_question),
+            "bonne_reponse_index": 0,  # dans une vraie app, ce serait stocké en base
+        }
+
+
+def _tirer_non_vue(profil: Profil, niveau_cible: int, code_sujet=None) -> int:
+    """
+    Tirage dans la bande niveau ± 1 en sautant les questions déjà vues.
+    Si l'utilisateur a tout vu dans la bande, on applique politique_epuisement.
+    """
+    vus = profil.vus if sans_repetition else None
+    position = index_questions.tirer(niveau_cible, code_sujet, exclus=vus)
+    if position >= 0 or not vus or index_questions.taille_bande(niveau_cible, code_sujet) == 0:
+        return position
+
+    METRIQUE_EPUISEMENTS.inc(politique_epuisement)
+    if politique_epuisement == "elargir":
+        for largeur in range(2, NIVEAU_MAX - NIVEAU_MIN + 1):
+            position = index_questions.tirer(niveau_cible, code_sujet, exclus=vus, largeur=largeur)
+            if position >= 0:
+                return position
+        # Même tous niveaux confondus tout est vu : on finit par réinitialiser
+
+    positions = index_questions.positions_bande(niveau_cible, code_sujet)
+    vus.retirer(index_questions.question_ids[positions])
+    return index_questions.tirer(niveau_cible, code_sujet, exclus=vus)
+
+
+def _cle_selection(profil: Profil) -> tuple:
+    """
+    Tout ce dont dépend _choisir_question(profil, None) : niveau visé, sujet faible
+    prioritaire et niveau visé sur ce sujet. Si la clé change, la file est périmée.
+    """
+    faible = profil.sujets_faibles[0] if profil.sujets_faibles else None
+    niveau_faible = moteur.niveau_cible(profil, faible) if faible is not None else None
+    return moteur.niveau_cible(profil), faible, niveau_faible
+
+
+def _depiler_question(profil: Profil):
+    """Question préchargée encore valable, ou None (→ tirage synchrone)."""
+    file = profil.questions_prechargees
+    if file is None:
+        METRIQUE_PRECHARGEMENT.inc("vide")
+        return None
+    cle, questions = file
+    if cle != _cle_selection(profil):
+        # Le niveau ou les sujets faibles ont bougé depuis la préparation
+        profil.questions_prechargees = None
+        METRIQUE_PRECHARGEMENT.inc("perimee")
+        return None
+    try:
+        question = questions.pop()  # atomique sous le GIL, même si la tâche de fond écrit
+    except IndexError:
+        METRIQUE_PRECHARGEMENT.inc("vide")
+        return None
+    METRIQUE_PRECHARGEMENT.inc("servie")
+    return question
+
+
+def precharger_questions(user_id: str):
+    """
+    Tâche de fond (lancée par POST /reponse après l'envoi de la réponse) :
+    prépare les `nb_prechargement` prochaines questions de l'utilisateur avec les
+    mêmes règles que select_question. Si la file existante a toujours la bonne clé
+    et n'est pas vide, on la garde telle quelle (rien à refaire).
+    """
+    if nb_prechargement <= 0 or index_questions is None:
+        return
+    profil = user_profiles.get(user_id)  # jamais de création de profil ici
+    if profil is None:
+        return
+
+    cle = _cle_selection(profil)
+    file = profil.questions_prechargees
+    if file is not None and file[0] == cle and file[1]:
+        METRIQUE_PRECHARGEMENT.inc("conservee")
+        return
+
+    # Les questions de la file doivent aussi être différentes entre elles
+    questions = []
+    ids = set()
+    for _ in range(2 * nb_prechargement):
+        question = _choisir_question(profil)
+        if question["question_id"] not in ids:
+            ids.add(question["question_id"])
+            questions.append(question)
+            if len(questions) == nb_prechargement:
+                break
+    # Remplacement en une affectation : un GET concurrent voit l'ancienne file ou la nouvelle
+    profil.questions_prechargees = (cle, questions)
+    METRIQUE_PRECHARGEMENT.inc("remplie")
+
+
+def activer_prechargement(nb: int = 3):
+    """Active le préchargement de `nb` questions par utilisateur (0 = désactive)."""
+    global nb_prechargement
+
+    nb_prechargement = max(0, int(nb))
+    if nb_prechargement == 0:
+        for profil in list(user_profiles.values()):
+            profil.questions_prechargees = None
+
+
+def prechargement_actif() -> bool:
+    return nb_prechargement > 0
 
 
 def _generer_enonce(sujet: str, niveau: int) -> str:
@@ -270,6 +1018,7 @@ def _generer_options(sujet: str, niveau: int) -> list:
 
 def _question_fallback(niveau: int) -> dict:
     """Question de secours si le dataset n'est pas dispo."""
+    METRIQUE_FALLBACKS.inc("question_fallback")
     return {
         "question_id": -1,
         "sujet": "python",
@@ -281,30 +1030,30 @@ def _question_fallback(niveau: int) -> dict:
 
 
 def get_stats(user_id: str) -> dict:
-    """Retourne un résumé des stats de l'utilisateur."""
-    profil = get_user_profile(user_id)
+    """Retourne un résumé des stats de l'utilisateur (profil vierge s'il est inconnu)."""
+    profil = trouver_profil(user_id) or Profil(user_id)
 
     taux_reussite = 0.0
-    if profil["nb_questions"] > 0:
-        taux_reussite = profil["bonnes_reponses"] / profil["nb_questions"] * 100
+    if profil.nb_questions > 0:
+        taux_reussite = profil.bonnes_reponses / profil.nb_questions * 100
 
     return {
         "user_id": user_id,
-        "niveau_actuel": profil["niveau_actuel"],
-        "nb_questions_repondues": profil["nb_questions"],
+        "niveau_actuel": profil.niveau_actuel,
+        "nb_questions_repondues": profil.nb_questions,
         "taux_reussite": round(taux_reussite, 1),
-        "sujets_faibles": profil["sujets_faibles"],
+        "sujets_faibles": list(profil.sujets_faibles),
         "progression": _calculer_progression(profil),
+        "score_pondere": round(profil.score_pondere(), 3),
     }
 
 
-def _calculer_progression(profil: dict) -> str:
+def _calculer_progression(profil: Profil) -> str:
     """Évalue la progression de l'utilisateur sur les 10 dernières questions."""
-    if len(profil["historique"]) < 5:
+    if profil.nb_historique() < 5:
         return "Pas assez de données"
 
-    recents = profil["historique"][-10:]
-    taux = sum(h["score"] for h in recents) / len(recents)
+    taux = profil.reussites_recentes() / profil.nb_recents()
 
     if taux >= 0.8:
         return "Excellente progression 🚀"
@@ -316,5 +1065,106 @@ def _calculer_progression(profil: dict) -> str:
         return "Des efforts à fournir 💪"
 
 
-# Chargement du modèle au démarrage du module
-charger_modele()
+def _metriques_numeriques(metriques: dict) -> dict:
+    """{clé: valeur} → {(clé,): valeur} pour une jauge, en gardant les nombres seulement."""
+    return {
+        (cle,): valeur
+        for cle, valeur in metriques.items()
+        if isinstance(valeur, (int, float)) and not isinstance(valeur, bool)
+    }
+
+
+# Jauges lues au moment du scrape (rien à faire sur le chemin chaud)
+registre.jauge(
+    "profils_en_memoire",
+    "Profils dans le cache chaud (user_profiles)",
+    lambda: len(user_profiles),
+)
+registre.jauge(
+    "historique_octets",
+    "Octets des historiques des profils en mémoire",
+    lambda: len(user_profiles) * OCTETS_HISTORIQUE,
+)
+registre.jauge(
+    "modele_pret",
+    "1 si le modèle ML est chargé, 0 en mode fallback",
+    lambda: int(modele is not None),
+)
+registre.jauge(
+    "modele_chargement_duree_secondes",
+    "Durée du dernier chargement du modèle",
+    lambda: etat_modele["duree_chargement_s"],
+)
+registre.jauge(
+    "prediction_par_lots",
+    "Métriques du micro-batching (si activé)",
+    lambda: _metriques_numeriques(metriques_prediction_par_lots()),
+    ("cle",),
+)
+registre.jauge(
+    "pool_calcul",
+    "Métriques du pool de processus (en cours, refus pour file pleine...)",
+    lambda: _metriques_numeriques(metriques_pool_calcul()),
+    ("cle",),
+)
+registre.jauge(
+    "reentrainement",
+    "Ré-entraînement en fond : réponses dans le tampon, dernier delta d'accuracy...",
+    lambda: _metriques_numeriques(metriques_reentrainement()),
+    ("cle",),
+)
+registre.jauge(
+    "evenements_reponses",
+    "Journal des réponses : lignes en attente, tampons libres, fichiers écrits, perdus...",
+    lambda: _metriques_numeriques(metriques_evenements()),
+    ("cle",),
+)
+registre.jauge(
+    "moteur_adaptation",
+    "Métriques du moteur d'adaptation (Elo : nb de réponses, questions inconnues...)",
+    lambda: _metriques_numeriques(moteur.metriques()),
+    ("cle",),
+)
+registre.jauge(
+    "cache_profils",
+    "Cache des profils : taille, octets estimés, bornes, profils débordés sur disque",
+    lambda: _metriques_numeriques(user_profiles.metriques()),
+    ("cle",),
+)
+registre.jauge(
+    "stockage_profils",
+    "Métriques du stockage des profils",
+    lambda: _metriques_numeriques(stockage.metriques()),
+    ("cle",),
+)
+
+
+changer_moteur(os.environ.get("MOTEUR_ADAPTATION", "foret"))
+activer_prechargement(int(os.environ.get("PRECHARGEMENT_QUESTIONS", 0)))
+
+# Le chargement du modèle n'est plus fait à l'import : c'est le lifespan de
+# main.py qui le lance en tâche de fond (voir demarrer_chargement_en_fond)
+# Le journal d'événements avant le ré-entraînement : il sert à re-remplir son tampon
+if os.environ.get("EVENEMENTS") == "1":
+    activer_evenements(
+        os.environ.get(
+            "EVENEMENTS_DOSSIER", os.path.join(os.path.dirname(__file__), "../data/evenements")
+        ),
+        taille_tampon=int(os.environ.get("EVENEMENTS_TAMPON", evenements.TAILLE_TAMPON)),
+        nb_tampons=int(os.environ.get("EVENEMENTS_NB_TAMPONS", evenements.NB_TAMPONS)),
+        politique=os.environ.get("EVENEMENTS_POLITIQUE", "perdre"),
+        rotation_s=float(os.environ.get("EVENEMENTS_ROTATION_S", evenements.ROTATION_S)),
+    )
+if os.environ.get("REENTRAINEMENT") == "1":
+    activer_reentrainement(
+        taille_tampon=int(os.environ.get("REENTRAINEMENT_TAMPON", 100_000)),
+        intervalle_s=float(os.environ.get("REENTRAINEMENT_INTERVALLE_S", 3600)),
+        min_nouvelles=int(os.environ.get("REENTRAINEMENT_MIN_REPONSES", 1_000)),
+        mode=os.environ.get("REENTRAINEMENT_MODE", "complet"),
+        arbres_ajoutes=int(os.environ.get("REENTRAINEMENT_ARBRES", 20)),
+    )
+if os.environ.get("PREDICTION_PAR_LOTS") == "1":
+    activer_prediction_par_lots(
+        taille_max=int(os.environ.get("PREDICTION_PAR_LOTS_TAILLE", 64)),
+        attente_max_us=int(os.environ.get("PREDICTION_PAR_LOTS_ATTENTE_US", 500)),
+    )
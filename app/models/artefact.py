@@ -0,0 +1,362 @@
+"""
+artefact.py — Entraînement une seule fois + artefact versionné du modèle
+Auteur : Moi (ESIEA 3A)
+
+Avant, importer adaptive_model relisait le CSV et ré-entraînait 100 arbres à chaque
+démarrage, dans chaque worker et à chaque --reload. Maintenant on entraîne une fois
+et on écrit un dossier d'artefact :
+
+    artefacts/<version>/
+        manifeste.json      # version, schéma des features, classes, métriques, hash du dataset
+        modele.joblib       # le RandomForest
+        table_*.npy         # la table compilée (voir compilateur.py)
+        index_*.npy         # l'index des questions (voir index_questions.py)
+        elo_*.npy           # difficultés calibrées pour le moteur Elo (voir moteurs.py)
+    artefacts/COURANT       # nom de la version active
+
+Au démarrage on charge juste ça (les .npy en mmap). On ne ré-entraîne que si
+on le demande (--forcer) ou si le hash du dataset a changé.
+
+Lancer :
+    python -m app.models.artefact            # entraîne si besoin
+    python -m app.models.artefact --forcer   # ré-entraîne quoi qu'il arrive
+    python -m app.models.artefact --info     # affiche le manifeste courant
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from app.data.colonnes import DatasetColonnes, charger_colonnes
+from app.models.compilateur import FEATURES, TablePrediction, compiler_foret, verifier_table
+from app.models.index_questions import IndexQuestions
+from app.models.moteurs import calibrer_elo
+
+FORMAT_ARTEFACT = 1
+CIBLE = "niveau_difficulte"
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/dataset_quiz.csv")
+ARTEFACTS_DIR = os.environ.get(
+    "ARTEFACTS_DIR", os.path.join(os.path.dirname(__file__), "artefacts")
+)
+
+
+def hash_dataset(chemin: str) -> str:
+    """SHA-256 du fichier, lu par blocs pour ne pas tout charger en RAM."""
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def _empreinte_rapide(chemin: str) -> dict:
+    """Taille + mtime : permet d'éviter de re-hasher un gros CSV qui n'a pas bougé."""
+    st = os.stat(chemin)
+    return {"taille": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def entrainer(ds: DatasetColonnes) -> dict:
+    """
+    Entraîne le RandomForest sur le dataset (en colonnes, voir data/colonnes.py)
+    et compile la table. Retourne un dict avec tout ce qu'il faut pour servir
+    (et pour l'artefact).
+    """
+    # Le sujet est déjà codé dans l'ordre trié → même résultat que fit_transform
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.array(ds.sujets, dtype=object)
+
+    # Features pour prédire la difficulté optimale (pas de copie de tout le dataset)
+    X = pd.DataFrame(
+        {
+            "score": ds["score"],
+            "temps_secondes": ds["temps_secondes"],
+            "sujet_encode": ds["sujet"],
+        },
+        columns=FEATURES,
+    )
+    y = ds[CIBLE]
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42
+    )
+
+    modele = RandomForestClassifier(
+        n_estimators=100,
+        max_depth=8,  # j'ai testé des valeurs entre 5 et 15, 8 semblait bien
+        random_state=42,
+    )
+    modele.fit(X_train, y_train)
+
+    score_train = modele.score(X_train, y_train)
+    score_test = modele.score(X_test, y_test)
+    print(f"[MODELE] Accuracy train: {score_train:.3f} | test: {score_test:.3f}")
+
+    # Compilation de la forêt en table + vérif sur tout le dataset :
+    # au moindre écart avec modele.predict on garde sklearn, par sécurité
+    table = compiler_foret(modele, label_encoder.classes_)
+    nb_ecarts = verifier_table(table, modele, X)
+    if nb_ecarts == 0:
+        print(f"[MODELE] Table compilée : {table.table.size} cases")
+    else:
+        table = None
+        print(f"[WARN] Table compilée ≠ modele.predict sur {nb_ecarts} lignes, ignorée")
+
+    # Calibration du moteur Elo (quelques bincount sur tout le dataset)
+    debut = time.perf_counter()
+    elo = calibrer_elo(ds["user_id"], ds[CIBLE], ds["score"], ds["question_id"])
+    print(
+        f"[MODELE] Calibration Elo : β niveaux {elo['metriques']['beta_niveaux']} "
+        f"({time.perf_counter() - debut:.2f}s)"
+    )
+
+    return {
+        "modele": modele,
+        "label_encoder": label_encoder,
+        "table": table,
+        "index": IndexQuestions(
+            ds["question_id"], ds[CIBLE], ds["sujet"], ds.sujets
+        ),
+        "elo": elo,
+        "metriques": {
+            "accuracy_train": round(float(score_train), 4),
+            "accuracy_test": round(float(score_test), 4),
+            "nb_lignes": int(len(ds)),
+        },
+    }
+
+
+def sauvegarder(resultat: dict, infos_dataset: dict, dossier: str = ARTEFACTS_DIR) -> str:
+    """
+    Écrit l'artefact dans un dossier temporaire puis le renomme (atomique),
+    et met à jour le pointeur COURANT. Retourne la version écrite.
+    """
+    os.makedirs(dossier, exist_ok=True)
+    version = (
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{infos_dataset['sha256'][:8]}"
+    )
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=dossier)
+
+    modele = resultat["modele"]
+    joblib.dump(modele, os.path.join(tmp, "modele.joblib"))
+
+    table = resultat["table"]
+    if table is not None:
+        np.save(os.path.join(tmp, "table_seuils.npy"), table.seuils_temps)
+        np.save(os.path.join(tmp, "table_valeurs.npy"), table.table)
+
+    index = resultat["index"]
+    for nom in ("question_ids", "niveaux", "codes_sujets", "ordre", "debuts"):
+        np.save(os.path.join(tmp, f"index_{nom}.npy"), getattr(index, nom))
+
+    elo = resultat.get("elo")
+    if elo is not None:
+        np.save(os.path.join(tmp, "elo_question_ids.npy"), elo["question_ids"])
+        np.save(os.path.join(tmp, "elo_difficultes.npy"), elo["difficultes"])
+
+    manifeste = {
+        "format": FORMAT_ARTEFACT,
+        "version": version,
+        "cree_le": datetime.now().isoformat(timespec="seconds"),
+        "sklearn_version": sklearn.__version__,
+        "dataset": infos_dataset,
+        "schema": {
+            "features": FEATURES,
+            "cible": CIBLE,
+            "classes_sujets": [str(s) for s in resultat["label_encoder"].classes_],
+            "classes_niveaux": [int(c) for c in modele.classes_],
+            "sujets_index": index.noms_sujets,
+        },
+        "metriques": resultat["metriques"],
+        "table_compilee": table is not None,
+        # Absent des artefacts plus anciens : le moteur Elo part alors de b = niveau
+        "elo": None if elo is None else {
+            "beta_niveaux": [float(b) for b in elo["beta_niveaux"]],
+            **elo["metriques"],
+        },
+    }
+    with open(os.path.join(tmp, "manifeste.json"), "w") as f:
+        json.dump(manifeste, f, indent=2, ensure_ascii=False)
+
+    os.replace(tmp, os.path.join(dossier, version))
+
+    pointeur_tmp = os.path.join(dossier, ".COURANT.tmp")
+    with open(pointeur_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointeur_tmp, os.path.join(dossier, "COURANT"))
+
+    print(f"[ARTEFACT] Version {version} écrite dans {dossier}")
+    return version
+
+
+def lire_manifeste(dossier: str = ARTEFACTS_DIR, version: str = None) -> dict:
+    """
+    Manifeste de la version courante (ou de `version`), None s'il n'y a pas encore
+    d'artefact.
+    """
+    try:
+        if version is None:
+            with open(os.path.join(dossier, "COURANT")) as f:
+                version = f.read().strip()
+        with open(os.path.join(dossier, version, "manifeste.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def charger(dossier: str = ARTEFACTS_DIR, manifeste: dict = None) -> dict:
+    """
+    Charge la version courante : forêt via joblib, tableaux NumPy en mmap lecture seule
+    (les workers partagent alors les mêmes pages en cache).
+    """
+    manifeste = manifeste or lire_manifeste(dossier)
+    if manifeste is None:
+        raise FileNotFoundError(f"Pas d'artefact dans {dossier}")
+    if manifeste.get("format") != FORMAT_ARTEFACT:
+        raise ValueError(f"Format d'artefact non supporté : {manifeste.get('format')}")
+
+    chemin = os.path.join(dossier, manifeste["version"])
+    schema = manifeste["schema"]
+
+    def npy(nom):
+        return np.load(os.path.join(chemin, f"{nom}.npy"), mmap_mode="r")
+
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.array(schema["classes_sujets"], dtype=object)
+
+    table = None
+    if manifeste["table_compilee"]:
+        table = TablePrediction(
+            npy("table_seuils"), npy("table_valeurs"), schema["classes_sujets"]
+        )
+
+    index = IndexQuestions(
+        npy("index_question_ids"),
+        npy("index_niveaux"),
+        npy("index_codes_sujets"),
+        schema["sujets_index"],
+        ordre=npy("index_ordre"),
+        debuts=npy("index_debuts"),
+    )
+
+    elo = None
+    if manifeste.get("elo"):
+        elo = {
+            "question_ids": npy("elo_question_ids"),
+            "difficultes": npy("elo_difficultes"),
+            "beta_niveaux": manifeste["elo"]["beta_niveaux"],
+        }
+
+    return {
+        "modele": joblib.load(os.path.join(chemin, "modele.joblib")),
+        "label_encoder": label_encoder,
+        "table": table,
+        "index": index,
+        "elo": elo,
+        "metriques": manifeste["metriques"],
+        "manifeste": manifeste,
+    }
+
+
+def artefact_a_jour(manifeste: dict, chemin_dataset: str = DATA_PATH) -> bool:
+    """
+    Vrai si l'artefact correspond au dataset actuel.
+    Si taille + mtime n'ont pas bougé on ne re-hashe même pas.
+    Si le dataset a disparu, on fait confiance à l'artefact (cas d'un déploiement sans CSV).
+    """
+    if manifeste is None:
+        return False
+    if not os.path.exists(chemin_dataset):
+        return True
+
+    infos = manifeste["dataset"]
+    empreinte = _empreinte_rapide(chemin_dataset)
+    if empreinte["taille"] == infos["taille"] and empreinte["mtime_ns"] == infos["mtime_ns"]:
+        return True
+    return hash_dataset(chemin_dataset) == infos["sha256"]
+
+
+def entrainer_et_sauvegarder(
+    chemin_dataset: str = DATA_PATH, dossier: str = ARTEFACTS_DIR
+) -> dict:
+    """
+    Ouvre le dataset en colonnes (converti depuis le CSV si besoin), entraîne,
+    écrit l'artefact et retourne le résultat chargé en mémoire.
+    """
+    infos_dataset = {
+        "chemin": os.path.abspath(chemin_dataset),
+        "sha256": hash_dataset(chemin_dataset),
+        **_empreinte_rapide(chemin_dataset),
+    }
+    resultat = entrainer(charger_colonnes(chemin_dataset))
+    sauvegarder(resultat, infos_dataset, dossier)
+    resultat["manifeste"] = lire_manifeste(dossier)
+    return resultat
+
+
+def charger_ou_entrainer(
+    forcer: bool = False, chemin_dataset: str = DATA_PATH, dossier: str = ARTEFACTS_DIR
+) -> dict:
+    """
+    Point d'entrée du démarrage : charge l'artefact s'il est à jour,
+    sinon (ou si forcer=True) ré-entraîne et écrit une nouvelle version.
+    """
+    manifeste = lire_manifeste(dossier)
+    if not forcer and artefact_a_jour(manifeste, chemin_dataset):
+        return charger(dossier, manifeste)
+
+    if manifeste is not None and not forcer:
+        print("[ARTEFACT] Le dataset a changé depuis le dernier entraînement")
+    return entrainer_et_sauvegarder(chemin_dataset, dossier)
+
+
+def nettoyer_anciennes_versions(dossier: str = ARTEFACTS_DIR, a_garder: int = 3):
+    """Supprime les vieilles versions (on garde les `a_garder` plus récentes)."""
+    manifeste = lire_manifeste(dossier)
+    courante = manifeste["version"] if manifeste else None
+    versions = sorted(
+        v for v in os.listdir(dossier)
+        if os.path.isdir(os.path.join(dossier, v)) and not v.startswith(".")
+    )
+    for version in versions[:-a_garder]:
+        if version != courante:
+            shutil.rmtree(os.path.join(dossier, version), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entraîne et versionne le modèle adaptatif")
+    parser.add_argument("--forcer", action="store_true", help="ré-entraîne même si à jour")
+    parser.add_argument("--info", action="store_true", help="affiche le manifeste courant")
+    parser.add_argument("--dataset", default=DATA_PATH, help="chemin du CSV")
+    parser.add_argument("--dossier", default=ARTEFACTS_DIR, help="dossier des artefacts")
+    args = parser.parse_args()
+
+    if args.info:
+        manifeste = lire_manifeste(args.dossier)
+        print(json.dumps(manifeste, indent=2, ensure_ascii=False) if manifeste else "Aucun artefact")
+        return
+
+    debut = time.perf_counter()
+    resultat = charger_ou_entrainer(args.forcer, args.dataset, args.dossier)
+    nettoyer_anciennes_versions(args.dossier)
+    print(
+        f"[ARTEFACT] Version courante : {resultat['manifeste']['version']} "
+        f"({time.perf_counter() - debut:.2f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+cache_profils.py — Cache borné des profils (LRU + TTL d'inactivité) avec débord sur disque
+Auteur : Moi (ESIEA 3A)
+
+user_profiles était un dict qui ne faisait que grossir : chaque user_id vu (même un
+crawler qui appelle GET /api/stats/xxx) y restait jusqu'à ce que le worker se fasse
+tuer par l'OOM killer. Ici :
+
+- un OrderedDict dans l'ordre d'utilisation (le plus ancien en tête) → LRU en O(1)
+- bornes : nb max de profils ET/OU budget en octets (Profil.octets_estimes), plus un
+  TTL d'inactivité : un profil pas touché depuis `ttl_s` secondes sort du cache
+- un profil qui sort n'est pas perdu : il est sérialisé (Profil.vers_octets, ~0.5 Ko)
+  dans un fichier SQLite local, et rechargé ("faute") au prochain accès
+
+Le débord est un fichier temporaire propre au process (supprimé à la sortie),
+pas de la persistance : ça c'est le rôle du stockage (stockage.py). Le TTL est
+appliqué à chaque insertion (les plus anciens sont en tête, on s'arrête au premier
+encore frais) : sans nouveaux profils la mémoire ne bouge pas, pas besoin de thread.
+
+Limite connue : une requête qui tient un profil pendant qu'il est évincé écrit dans
+une copie qui n'est plus dans le cache. Ça suppose qu'il soit passé de la fin à la
+tête du LRU pendant la requête, donc que le cache soit minuscule devant la charge.
+"""
+
+import atexit
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.models.profil import Profil
+from app.utils.metriques import registre
+
+MAX_PROFILS = 100_000
+TTL_S = 3600.0
+NB_BANDES = 64  # verrous par "bande" de user_id pour modifier() / retirer()
+
+METRIQUE_CACHE = registre.compteur(
+    "profils_cache_total",
+    "Cache des profils : évictions (eviction_lru, eviction_ttl, eviction_octets), "
+    "fautes (faute_disque : rechargé du débord, faute_stockage : du stockage) et creation",
+    ("evenement",),
+)
+
+
+class DebordDisque:
+    """user_id → profil sérialisé, dans un SQLite jetable (pas de fsync, pas de journal)."""
+
+    def __init__(self, dossier: str = None):
+        descripteur, self.chemin = tempfile.mkstemp(
+            prefix=f"profils_deborde_{os.getpid()}_", suffix=".db", dir=dossier
+        )
+        os.close(descripteur)
+        self._conn = sqlite3.connect(self.chemin, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE profils (user_id TEXT PRIMARY KEY, donnees BLOB)")
+        self._verrou = threading.Lock()
+        self._taille = 0
+        atexit.register(self.fermer)  # le fichier ne sert à rien après le process
+
+    def __len__(self) -> int:
+        return self._taille
+
+    def ecrire(self, profil: Profil):
+        donnees = profil.vers_octets()
+        with self._verrou:
+            curseur = self._conn.execute(
+                "INSERT OR IGNORE INTO profils VALUES (?, ?)", (profil.user_id, donnees)
+            )
+            if curseur.rowcount == 0:
+                self._conn.execute(
+                    "UPDATE profils SET donnees = ? WHERE user_id = ?", (donnees, profil.user_id)
+                )
+            else:
+                self._taille += 1
+
+    def extraire(self, user_id: str):
+        """Profil débordé (retiré du disque : c'est la copie en RAM qui fait foi), ou None."""
+        with self._verrou:
+            ligne = self._conn.execute(
+                "SELECT donnees FROM profils WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if ligne is None:
+                return None
+            self._conn.execute("DELETE FROM profils WHERE user_id = ?", (user_id,))
+            self._taille -= 1
+        return Profil.depuis_octets(user_id, ligne[0])
+
+    def supprimer(self, user_id: str):
+        self.extraire(user_id)
+
+    def user_ids(self) -> list:
+        with self._verrou:
+            return [ligne[0] for ligne in self._conn.execute("SELECT user_id FROM profils")]
+
+    def vider(self):
+        with self._verrou:
+            self._conn.execute("DELETE FROM profils")
+            self._taille = 0
+
+    def fermer(self):
+        with self._verrou:
+            if self._conn is None:
+                return
+            self._conn.close()
+            self._conn = None
+        try:
+            os.remove(self.chemin)
+        except OSError:
+            pass
+
+
+class CacheProfils:
+    """
+    S'utilise comme l'ancien dict user_profiles (get, [], in, pop, clear, len, values)
+    plus obtenir() qui va chercher dans le débord puis dans `charger` en cas d'absence.
+    """
+
+    def __init__(
+        self,
+        max_profils: int = MAX_PROFILS,
+        max_octets: int = 0,
+        ttl_s: float = TTL_S,
+        dossier_debord: str = None,
+    ):
+        self.max_profils = max_profils
+        self.max_octets = max_octets  # 0 = pas de budget en octets
+        self.ttl_s = ttl_s  # 0 = pas de TTL
+        self._entrees = OrderedDict()  # user_id → [profil, dernier accès, octets estimés]
+        self._octets = 0
+        self._verrou = threading.Lock()
+        self._bandes = [threading.Lock() for _ in range(NB_BANDES)]
+        self._debord = DebordDisque(dossier_debord)
+
+    # --- Interface façon dict (ne va jamais sur le disque) ---
+
+    def __len__(self) -> int:
+        return len(self._entrees)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entrees
+
+    def __getitem__(self, user_id: str) -> Profil:
+        profil = self.get(user_id)
+        if profil is None:
+            raise KeyError(user_id)
+        return profil
+
+    def __setitem__(self, user_id: str, profil: Profil):
+        with self._verrou:
+            self._inserer(user_id, profil)
+
+    def get(self, user_id: str, defaut=None):
+        with self._verrou:
+            entree = self._entrees.get(user_id)
+            if entree is None:
+                return defaut
+            self._toucher(user_id, entree)
+            return entree[0]
+
+    def pop(self, user_id: str, defaut=None):
+        """Retire le profil du cache ET du débord."""
+        with self._verrou:
+            entree = self._entrees.pop(user_id, None)
+            if entree is not None:
+                self._octets -= entree[2]
+                return entree[0]
+        profil = self._debord.extraire(user_id)
+        return defaut if profil is None else profil
+
+    def clear(self):
+        with self._verrou:
+            self._entrees.clear()
+            self._octets = 0
+            self._debord.vider()
+
+    def values(self) -> list:
+        with self._verrou:
+            return [entree[0] for entree in self._entrees.values()]
+
+    def user_ids(self) -> list:
+        """user_id en RAM et débordés sur disque."""
+        with self._verrou:
+            en_ram = list(self._entrees)
+        return en_ram + self._debord.user_ids()
+
+    # --- Accès avec faute ---
+
+    def obtenir(self, user_id: str, charger=None):
+        """
+        Profil en cache, sinon rechargé du débord, sinon `charger(user_id)` (stockage,
+        création...). None si personne ne l'a. Les absences sont traitées sous le verrou :
+        deux requêtes du même utilisateur ne peuvent pas créer deux profils différents.
+        """
+        with self._verrou:
+            entree = self._entrees.get(user_id)
+            if entree is not None:
+                self._toucher(user_id, entree)
+                return entree[0]
+
+            profil = self._debord.extraire(user_id)
+            if profil is not None:
+                METRIQUE_CACHE.inc("faute_disque")
+            elif charger is not None:
+                profil = charger(user_id)
+            if profil is not None:
+                self._inserer(user_id, profil)
+            return profil
+
+    @contextmanager
+    def modifier(self, user_id: str, charger=None):
+        """
+        Profil à modifier en place : c'est obtenir() (le profil EST celui du cache), plus
+        le verrou de la bande du user_id jusqu'à la fin du bloc. Deux threads sur le même
+        apprenant passent l'un après l'autre, et retirer() ne peut pas passer au milieu.
+        Même interface que TableProfilsPartagee.modifier, qui elle doit réécrire.
+        """
+        with self._bandes[hash(user_id) % NB_BANDES]:
+            yield self.obtenir(user_id, charger)
+
+    @contextmanager
+    def retirer(self, user_id: str, charger=None):
+        """
+        Comme modifier(), mais le profil est retiré (cache et débord) à la fin du bloc.
+        Exception dans le bloc → il reste. Pour le passage de relais entre nœuds.
+        """
+        with self._bandes[hash(user_id) % NB_BANDES]:
+            profil = self.obtenir(user_id, charger)
+            yield profil
+            if profil is not None:
+                self.pop(user_id)
+
+    # --- Interne (appelé sous le verrou) ---
+
+    def _toucher(self, user_id: str, entree: list):
+        entree[1] = time.monotonic()
+        if self.max_octets:
+            # Le profil a pu grossir depuis (questions vues, état Elo). Sans budget en
+            # octets on garde l'estimation de l'insertion, le hit reste minimal.
+            octets = entree[0].octets_estimes()
+            self._octets += octets - entree[2]
+            entree[2] = octets
+        self._entrees.move_to_end(user_id)
+
+    def _inserer(self, user_id: str, profil: Profil):
+        ancienne = self._entrees.pop(user_id, None)
+        if ancienne is not None:
+            self._octets -= ancienne[2]
+        octets = profil.octets_estimes()
+        self._entrees[user_id] = [profil, time.monotonic(), octets]
+        self._octets += octets
+        self._evincer()
+
+    def _evincer(self):
+        # Le dernier inséré n'est jamais évincé (len > 1), même s'il dépasse le budget à lui seul
+        if self.ttl_s > 0:
+            limite = time.monotonic() - self.ttl_s
+            while len(self._entrees) > 1 and next(iter(self._entrees.values()))[1] < limite:
+                self._evincer_premier("eviction_ttl")
+        while len(self._entrees) > self.max_profils:
+            self._evincer_premier("eviction_lru")
+        while self.max_octets and self._octets > self.max_octets and len(self._entrees) > 1:
+            self._evincer_premier("eviction_octets")
+
+    def _evincer_premier(self, raison: str):
+        user_id, (profil, _, octets) = self._entrees.popitem(last=False)
+        self._octets -= octets
+        profil.questions_prechargees = None  # pas sérialisée de toute façon
+        self._debord.ecrire(profil)
+        METRIQUE_CACHE.inc(raison)
+
+    # --- Divers ---
+
+    def metriques(self) -> dict:
+        return {
+            "profils": len(self._entrees),
+            "octets_estimes": self._octets,
+            "max_profils": self.max_profils,
+            "max_octets": self.max_octets,
+            "ttl_s": self.ttl_s,
+            "profils_debordes": len(self._debord),
+        }
+
+
+def creer_cache_depuis_env():
+    """
+    Réglages via les variables d'environnement :
+        CACHE_PROFILS_MAX=100000      nb max de profils en RAM
+        CACHE_PROFILS_OCTETS=0        budget en octets (0 = pas de budget)
+        CACHE_PROFILS_TTL_S=3600      inactivité avant éviction (0 = jamais)
+        CACHE_PROFILS_DEBORD=<dossier> où mettre le fichier de débord (défaut : /tmp)
+
+    Ou, pour partager les profils entre les workers uvicorn (voir profils_partages.py) :
+        PROFILS_PARTAGES=<nom>              nom de la table (même nom = même table)
+        PROFILS_PARTAGES_CAPACITE=65536     nb de cases (puissance de 2)
+        PROFILS_PARTAGES_OCTETS_CASE=4096   taille d'une case
+    """
+    nom = os.environ.get("PROFILS_PARTAGES")
+    if nom:
+        from app.models import profils_partages
+
+        return profils_partages.TableProfilsPartagee(
+            nom,
+            capacite=int(os.environ.get("PROFILS_PARTAGES_CAPACITE", profils_partages.CAPACITE)),
+            octets_case=int(
+                os.environ.get("PROFILS_PARTAGES_OCTETS_CASE", profils_partages.OCTETS_CASE)
+            ),
+        )
+    return CacheProfils(
+        max_profils=int(os.environ.get("CACHE_PROFILS_MAX", MAX_PROFILS)),
+        max_octets=int(os.environ.get("CACHE_PROFILS_OCTETS", 0)),
+        ttl_s=float(os.environ.get("CACHE_PROFILS_TTL_S", TTL_S)),
+        dossier_debord=os.environ.get("CACHE_PROFILS_DEBORD") or None,
+    )
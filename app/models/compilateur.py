@@ -0,0 +1,133 @@
+"""
+compilateur.py — "Compilation" du RandomForest en table de prédiction
+Auteur : Moi (ESIEA 3A)
+
+Chaque POST /reponse appelait modele.predict sur UNE ligne : 100 arbres parcourus,
+validation sklearn, etc. → plusieurs millisecondes de CPU pour une seule prédiction.
+
+Or l'espace des features est minuscule : score ∈ {0, 1}, 4 sujets, et le temps.
+Le temps est continu, mais la forêt ne le regarde qu'à travers ses seuils de split :
+entre deux seuils consécutifs, toutes les valeurs donnent la même prédiction.
+Donc on découpe le temps aux seuils réels de la forêt, on prédit une fois pour
+chaque case (score, sujet, tranche de temps), et après une prédiction = un accès tableau.
+
+Détail important : sklearn convertit X en float32 avant de comparer aux seuils
+(qui sont en float64). On fait pareil ici sinon on aurait des écarts pile sur les seuils.
+Un temps au-delà du plus grand float32 est ramené à TEMPS_MAX avant la conversion (sinon
+overflow → RuntimeWarning) : il tombe dans la dernière tranche, comme TEMPS_MAX chez sklearn.
+"""
+
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+# Ordre des features du modèle (cf. charger_modele)
+FEATURES = ["score", "temps_secondes", "sujet_encode"]
+IDX_TEMPS = FEATURES.index("temps_secondes")
+TEMPS_MAX = float(np.finfo(np.float32).max)
+
+
+class TablePrediction:
+    """Table dense table[score, code_sujet, tranche_temps] → niveau prédit."""
+
+    def __init__(self, seuils_temps: np.ndarray, table: np.ndarray, classes_sujets):
+        self.seuils_temps = np.asarray(seuils_temps, dtype=np.float64)
+        self.table = np.asarray(table)
+        self.classes_sujets = [str(s) for s in classes_sujets]
+        self.code_par_sujet = {s: code for code, s in enumerate(self.classes_sujets)}
+        # bisect sur une liste Python est plus rapide que np.searchsorted pour un scalaire
+        self._seuils_liste = self.seuils_temps.tolist()
+
+    def tranche(self, temps_secondes: float) -> int:
+        """Numéro de tranche : nb de seuils strictement inférieurs au temps (en float32)."""
+        return bisect_left(self._seuils_liste, float(np.float32(min(temps_secondes, TEMPS_MAX))))
+
+    def predire(self, score: int, temps_secondes: float, sujet: str) -> int:
+        """Prédiction pour une réponse. KeyError si le sujet est inconnu du modèle."""
+        if score not in (0, 1):
+            raise ValueError(f"Score hors table : {score}")
+        code = self.code_par_sujet[sujet]
+        return int(self.table[score, code, self.tranche(temps_secondes)])
+
+    def predire_lot(self, scores, temps_secondes, codes_sujets) -> np.ndarray:
+        """Version vectorisée (codes sujets déjà encodés)."""
+        temps = np.minimum(np.asarray(temps_secondes, dtype=np.float64), TEMPS_MAX)
+        temps32 = temps.astype(np.float32).astype(np.float64)
+        tranches = np.searchsorted(self.seuils_temps, temps32, side="left")
+        return self.table[
+            np.asarray(scores, dtype=np.intp), np.asarray(codes_sujets, dtype=np.intp), tranches
+        ]
+
+
+def _seuils_temps(modele) -> np.ndarray:
+    """Tous les seuils de split sur le temps, tous arbres confondus, triés et uniques."""
+    seuils = [
+        arbre.tree_.threshold[arbre.tree_.feature == IDX_TEMPS]
+        for arbre in modele.estimators_
+    ]
+    if not seuils:
+        return np.empty(0, dtype=np.float64)
+    return np.unique(np.concatenate(seuils))
+
+
+def _representants(seuils: np.ndarray) -> np.ndarray:
+    """
+    Une valeur float32 par tranche : la tranche i couvre ]seuils[i-1], seuils[i]]
+    (sklearn envoie à gauche si x <= seuil), la dernière couvre ]seuils[-1], +inf[.
+    """
+    if len(seuils) == 0:
+        return np.zeros(1, dtype=np.float32)
+
+    # Plus grand float32 <= seuil → il tombe bien dans la tranche du seuil
+    reps = seuils.astype(np.float32)
+    trop_grands = reps.astype(np.float64) > seuils
+    reps[trop_grands] = np.nextafter(reps[trop_grands], np.float32(-np.inf))
+
+    # Dernière tranche : juste au-dessus du plus grand seuil
+    dernier = np.float32(seuils[-1])
+    while float(dernier) <= seuils[-1]:
+        dernier = np.nextafter(dernier, np.float32(np.inf))
+    return np.append(reps, dernier)
+
+
+def compiler_foret(modele, classes_sujets) -> TablePrediction:
+    """
+    Transforme la forêt entraînée en TablePrediction.
+    Une seule passe de predict sur la grille (2 × nb_sujets × nb_tranches lignes).
+    """
+    seuils = _seuils_temps(modele)
+    reps = _representants(seuils)
+    nb_sujets = len(classes_sujets)
+
+    scores, codes, tranches = np.meshgrid(
+        np.arange(2), np.arange(nb_sujets), np.arange(len(reps)), indexing="ij"
+    )
+    grille = pd.DataFrame(
+        {
+            "score": scores.ravel().astype(np.float32),
+            "temps_secondes": reps[tranches.ravel()],
+            "sujet_encode": codes.ravel().astype(np.float32),
+        }
+    )[FEATURES]
+
+    predictions = modele.predict(grille)
+    table = predictions.reshape(2, nb_sujets, len(reps))
+
+    # Les niveaux tiennent sur un int8, pas besoin de plus
+    if np.issubdtype(table.dtype, np.integer):
+        table = table.astype(np.int8)
+
+    return TablePrediction(seuils, table, classes_sujets)
+
+
+def verifier_table(table: TablePrediction, modele, X: pd.DataFrame) -> int:
+    """
+    Compare la table à modele.predict sur X (colonnes FEATURES).
+    Retourne le nombre de lignes où les deux ne sont pas d'accord (0 = équivalent).
+    """
+    attendu = modele.predict(X[FEATURES])
+    obtenu = table.predire_lot(
+        X["score"].to_numpy(), X["temps_secondes"].to_numpy(), X["sujet_encode"].to_numpy()
+    )
+    return int(np.count_nonzero(attendu != obtenu))
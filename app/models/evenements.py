@@ -0,0 +1,435 @@
+"""
+evenements.py — Journal des réponses (événements) en Parquet, écrit par gros lots en fond
+Auteur : Moi (ESIEA 3A)
+
+Jusqu'ici une réponse ne laissait rien derrière elle à part les 50 dernières entrées de
+l'historique du profil : le notebook ne pouvait analyser que le CSV simulé. Ici chaque
+réponse traitée devient une ligne d'événement :
+
+    ts, user_id, question_id, score, temps_secondes, niveau_question, niveau_apres
+    (+ jour et sujet, qui sont dans le chemin : partitionnement "hive")
+
+- chemin de la requête : ajouter() écrit quelques cases de tableaux numpy préalloués
+  sous un verrou, rien d'autre (pas d'I/O, pas d'objet Arrow)
+- mémoire bornée : `nb_tampons` tampons de `taille_tampon` lignes. Le tampon actif
+  plein part dans la file du thread d'écriture et un tampon libre le remplace. S'il
+  n'y en a plus (disque trop lent) : politique "perdre" (l'événement est compté puis
+  jeté, la réponse n'attend jamais) ou "attendre" (jusqu'à `attente_max_s`, puis perdu)
+- thread "evenements" : regroupe le tampon par (jour, sujet) et ajoute un row group
+  au fichier ouvert de chaque partition, compressé en zstd :
+      <dossier>/jour=2026-10-17/sujet=python/part-20261017T101500-<pid>-000001.parquet
+  Un fichier est écrit sous un nom caché (.part-...tmp, ignoré par les lecteurs) puis
+  renommé quand il tourne : `lignes_par_fichier` lignes ou `rotation_s` secondes. Un
+  lecteur ne voit donc jamais de fichier à moitié écrit. Le pid dans le nom permet à
+  plusieurs workers d'écrire dans le même dossier.
+
+Ce n'est pas un journal durable (ça c'est journal.py pour les profils) : un crash perd
+le tampon en mémoire et les fichiers pas encore tournés, au plus `rotation_s` secondes.
+
+Lecture (notebook, ré-entraînement) : scanner() itère par lots de DataFrames avec
+élagage des partitions (jours, sujets) et des colonnes, sans tout charger ; lire()
+pour les petits volumes ; reponses_recentes() au format de TamponReponses.copie().
+Il faut pyarrow (comme pour generate_data.py --format parquet).
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from app.models.profil import code_sujet, nom_sujet
+from app.utils.metriques import registre
+
+TAILLE_TAMPON = 65_536
+NB_TAMPONS = 4
+INTERVALLE_S = 5.0
+ROTATION_S = 300.0
+LIGNES_PAR_FICHIER = 1_000_000
+POLITIQUES = ("perdre", "attendre")
+
+METRIQUE_EVENEMENTS = registre.compteur(
+    "evenements_reponses_total",
+    "Journal des réponses : événements ecrits, perdus (plus de tampon libre), "
+    "attentes (politique attendre)",
+    ("issue",),
+)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Le journal des réponses nécessite pyarrow : pip install pyarrow")
+    return pa, ds, pq
+
+
+def _nom_partition(sujet: str) -> str:
+    # Le sujet finit dans un chemin : pas de / ni de .. (les routes valident déjà le sujet)
+    return re.sub(r"[^A-Za-z0-9_-]", "_", sujet) or "_"
+
+
+class _Tampon:
+    """Colonnes préallouées d'un lot d'événements."""
+
+    def __init__(self, taille: int):
+        self.ts = np.empty(taille, dtype=np.float64)
+        self.user_id = np.empty(taille, dtype=object)
+        self.question_id = np.empty(taille, dtype=np.int64)
+        self.score = np.empty(taille, dtype=np.int8)
+        self.temps = np.empty(taille, dtype=np.float32)
+        self.sujet = np.empty(taille, dtype=np.uint8)
+        self.niveau_question = np.empty(taille, dtype=np.int8)  # 0 = inconnu
+        self.niveau_apres = np.empty(taille, dtype=np.int8)
+        self.n = 0
+
+
+class JournalEvenements:
+    """Puits des événements de réponse : tampons bornés + thread d'écriture Parquet."""
+
+    def __init__(
+        self,
+        dossier: str,
+        taille_tampon: int = TAILLE_TAMPON,
+        nb_tampons: int = NB_TAMPONS,
+        politique: str = "perdre",
+        attente_max_s: float = 0.05,
+        intervalle_s: float = INTERVALLE_S,
+        rotation_s: float = ROTATION_S,
+        lignes_par_fichier: int = LIGNES_PAR_FICHIER,
+    ):
+        if politique not in POLITIQUES:
+            raise ValueError(f"Politique inconnue : {politique} (valeurs : {POLITIQUES})")
+        if nb_tampons < 2:
+            raise ValueError("Il faut au moins 2 tampons (un qui se remplit, un qui s'écrit)")
+        self._pa, _, self._pq = _pyarrow()
+        self.dossier = dossier
+        self.taille_tampon = taille_tampon
+        self.politique = politique
+        self.attente_max_s = attente_max_s
+        self.intervalle_s = intervalle_s
+        self.rotation_s = rotation_s
+        self.lignes_par_fichier = lignes_par_fichier
+        os.makedirs(dossier, exist_ok=True)
+        self._nettoyer_orphelins()
+
+        self._cond = threading.Condition()
+        self._actif = _Tampon(taille_tampon)
+        self._libres = [_Tampon(taille_tampon) for _ in range(nb_tampons - 1)]
+        self._pleins = deque()
+        self._arret = False
+        self._vidages_demandes = 0
+        self._vidages_faits = 0
+
+        # Côté thread d'écriture seulement
+        self._fichiers: dict = {}  # (jour, sujet) → [writer, tmp, final, lignes, ouvert_a]
+        self._seq = 0
+        self._schema = self._pa.schema([
+            ("ts", self._pa.timestamp("us", tz="UTC")),
+            ("user_id", self._pa.string()),
+            ("question_id", self._pa.int64()),
+            ("score", self._pa.int8()),
+            ("temps_secondes", self._pa.float32()),
+            ("niveau_question", self._pa.int8()),
+            ("niveau_apres", self._pa.int8()),
+        ])
+
+        self.nb_perdus = 0
+        self.nb_ecrits = 0
+        self.nb_fichiers = 0
+        self._duree_dernier_flush_s = 0.0
+
+        self._thread = threading.Thread(target=self._boucle, name="evenements", daemon=True)
+        self._thread.start()
+
+    # --- Chemin de la requête ---
+
+    def ajouter(
+        self, user_id: str, question_id: int, score: int, temps_secondes: float, sujet: str,
+        niveau_question: int = None, niveau_apres: int = 0,
+    ):
+        code = code_sujet(sujet)
+        with self._cond:
+            tampon = self._actif
+            if tampon is None:
+                tampon = self._attendre_tampon()
+                if tampon is None:
+                    self.nb_perdus += 1
+                    METRIQUE_EVENEMENTS.inc("perdu")
+                    return
+            i = tampon.n
+            tampon.ts[i] = time.time()
+            tampon.user_id[i] = user_id
+            tampon.question_id[i] = question_id
+            tampon.score[i] = score
+            tampon.temps[i] = temps_secondes
+            tampon.sujet[i] = code
+            tampon.niveau_question[i] = niveau_question or 0
+            tampon.niveau_apres[i] = niveau_apres
+            tampon.n = i + 1
+            if tampon.n == self.taille_tampon:
+                self._pleins.append(tampon)
+                self._actif = self._libres.pop() if self._libres else None
+                self._cond.notify_all()
+
+    def _attendre_tampon(self):
+        """Plus de tampon libre (sous _cond) : on attend un peu ou on perd l'événement."""
+        if self.politique == "attendre" and not self._arret:
+            METRIQUE_EVENEMENTS.inc("attente")
+            self._cond.wait_for(
+                lambda: self._actif is not None or self._arret, timeout=self.attente_max_s
+            )
+        return self._actif
+
+    # --- Thread d'écriture ---
+
+    def _boucle(self):
+        dernier_flush = time.monotonic()
+        while True:
+            with self._cond:
+                self._cond.wait_for(self._travail_en_attente, timeout=self.intervalle_s)
+                arret = self._arret
+                vidage = self._vidages_demandes
+                tout = arret or vidage > self._vidages_faits
+                partiel = time.monotonic() - dernier_flush >= self.intervalle_s or tout
+                if partiel and self._actif is not None and self._actif.n:
+                    # Pas plein mais ça fait un moment : on l'écrit quand même. Sans
+                    # tampon libre on attend le tour suivant, sauf pour un vidage / l'arrêt :
+                    # là on le prend quand même, ajouter() attend (ou perd) le temps d'écrire
+                    if self._libres:
+                        self._pleins.append(self._actif)
+                        self._actif = self._libres.pop()
+                    elif tout:
+                        self._pleins.append(self._actif)
+                        self._actif = None
+                a_ecrire = list(self._pleins)
+                self._pleins.clear()
+
+            for tampon in a_ecrire:
+                try:
+                    self._ecrire(tampon)
+                except Exception as e:  # disque plein, droits... : le lot est perdu
+                    self.nb_perdus += tampon.n
+                    METRIQUE_EVENEMENTS.inc("perdu", n=tampon.n)
+                    print(f"[WARN] Écriture des événements ratée ({tampon.n} perdus) : {e}")
+                tampon.n = 0
+                with self._cond:
+                    if self._actif is None:
+                        self._actif = tampon
+                    else:
+                        self._libres.append(tampon)
+                    self._cond.notify_all()
+            if a_ecrire or partiel:
+                dernier_flush = time.monotonic()
+
+            self._tourner(tout=tout)
+            with self._cond:
+                self._vidages_faits = vidage
+                self._cond.notify_all()
+            if arret:
+                return
+
+    def _travail_en_attente(self) -> bool:
+        return bool(self._pleins) or self._arret or self._vidages_demandes > self._vidages_faits
+
+    def _ecrire(self, tampon: _Tampon):
+        """Un tampon → un row group par partition (jour, sujet) touchée."""
+        pa = self._pa
+        debut = time.perf_counter()
+        n = tampon.n
+        ts = tampon.ts[:n]
+        jours = (ts // 86_400).astype(np.int64)
+        cles = jours * 256 + tampon.sujet[:n]
+        # Tri stable par partition : chaque partition = une tranche contiguë
+        ordre = np.argsort(cles, kind="stable")
+        cles_triees = cles[ordre]
+        bornes = np.flatnonzero(np.diff(cles_triees)) + 1
+        for morceau in np.split(ordre, bornes):
+            cle = int(cles[morceau[0]])
+            jour = str(np.datetime64(cle // 256, "D"))
+            sujet = _nom_partition(nom_sujet(cle % 256))
+            niveaux = tampon.niveau_question[morceau]
+            table = pa.Table.from_arrays(
+                [
+                    pa.array((ts[morceau] * 1e6).astype(np.int64), pa.timestamp("us", tz="UTC")),
+                    pa.array(tampon.user_id[morceau], pa.string()),
+                    pa.array(tampon.question_id[morceau]),
+                    pa.array(tampon.score[morceau]),
+                    pa.array(tampon.temps[morceau]),
+                    pa.array(niveaux, mask=niveaux == 0),
+                    pa.array(tampon.niveau_apres[morceau]),
+                ],
+                schema=self._schema,
+            )
+            self._fichier(jour, sujet).write_table(table)
+            self._fichiers[(jour, sujet)][3] += len(morceau)
+        self.nb_ecrits += n
+        METRIQUE_EVENEMENTS.inc("ecrit", n=n)
+        self._duree_dernier_flush_s = time.perf_counter() - debut
+
+    def _fichier(self, jour: str, sujet: str):
+        entree = self._fichiers.get((jour, sujet))
+        if entree is None:
+            partition = os.path.join(self.dossier, f"jour={jour}", f"sujet={sujet}")
+            os.makedirs(partition, exist_ok=True)
+            self._seq += 1
+            nom = f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._seq:06d}.parquet"
+            tmp = os.path.join(partition, f".{nom}.tmp")
+            writer = self._pq.ParquetWriter(tmp, self._schema, compression="zstd")
+            entree = self._fichiers[(jour, sujet)] = [
+                writer, tmp, os.path.join(partition, nom), 0, time.monotonic(),
+            ]
+        return entree[0]
+
+    def _tourner(self, tout: bool = False):
+        """Ferme (et rend visibles) les fichiers assez gros ou assez vieux."""
+        maintenant = time.monotonic()
+        for cle, (writer, tmp, final, lignes, ouvert_a) in list(self._fichiers.items()):
+            trop_vieux = maintenant - ouvert_a >= self.rotation_s
+            if tout or trop_vieux or lignes >= self.lignes_par_fichier:
+                del self._fichiers[cle]
+                writer.close()
+                os.replace(tmp, final)
+                self.nb_fichiers += 1
+
+    def _nettoyer_orphelins(self):
+        """Fichiers cachés d'un process mort (jamais tournés, illisibles sans leur pied)."""
+        limite = time.time() - 2 * self.rotation_s
+        orphelins = 0
+        for racine, _, fichiers in os.walk(self.dossier):
+            for nom in fichiers:
+                chemin = os.path.join(racine, nom)
+                if nom.startswith(".part-") and os.path.getmtime(chemin) < limite:
+                    os.remove(chemin)
+                    orphelins += 1
+        if orphelins:
+            print(f"[WARN] {orphelins} fichiers d'événements jamais terminés supprimés")
+
+    def vider(self, delai_s: float = 30):
+        """Écrit tout ce qui est en mémoire et rend tous les fichiers visibles."""
+        with self._cond:
+            self._vidages_demandes += 1
+            demande = self._vidages_demandes
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._vidages_faits >= demande, timeout=delai_s)
+
+    def fermer(self, delai_s: float = 30):
+        with self._cond:
+            self._arret = True
+            self._cond.notify_all()
+        self._thread.join(timeout=delai_s)
+
+    def metriques(self) -> dict:
+        with self._cond:
+            en_attente = sum(t.n for t in self._pleins)
+            en_attente += self._actif.n if self._actif is not None else 0
+            libres = len(self._libres) + (self._actif is not None)
+        return {
+            "politique": self.politique,
+            "lignes_en_attente": en_attente,
+            "tampons_libres": libres,
+            "fichiers_ouverts": len(self._fichiers),
+            "fichiers_ecrits": self.nb_fichiers,
+            "evenements_ecrits": self.nb_ecrits,
+            "evenements_perdus": self.nb_perdus,
+            "duree_dernier_flush_ms": self._duree_dernier_flush_s * 1e3,
+        }
+
+
+# ============================================================
+# Lecture
+# ============================================================
+
+
+def ouvrir(dossier: str):
+    """Le journal vu comme un pyarrow.dataset (fichiers terminés seulement)."""
+    pa, ds, _ = _pyarrow()
+    partitionnement = ds.partitioning(
+        pa.schema([("jour", pa.string()), ("sujet", pa.string())]), flavor="hive"
+    )
+    return ds.dataset(dossier, format="parquet", partitioning=partitionnement)
+
+
+def _filtre(depuis: str = None, jusqu_a: str = None, sujets: list = None):
+    """Filtre sur les partitions : jours "AAAA-MM-JJ" inclus, liste de sujets."""
+    _, ds, _ = _pyarrow()
+    filtre = None
+    conditions = []
+    if depuis is not None:
+        conditions.append(ds.field("jour") >= depuis)
+    if jusqu_a is not None:
+        conditions.append(ds.field("jour") <= jusqu_a)
+    if sujets is not None:
+        conditions.append(ds.field("sujet").isin(list(sujets)))
+    for condition in conditions:
+        filtre = condition if filtre is None else filtre & condition
+    return filtre
+
+
+def scanner(
+    dossier: str, depuis: str = None, jusqu_a: str = None, sujets: list = None,
+    colonnes: list = None, taille_lot: int = 262_144,
+):
+    """
+    Itère sur les événements par DataFrames d'au plus `taille_lot` lignes. Seules les
+    partitions (jours, sujets) et les colonnes demandées sont lues.
+    """
+    jeu = ouvrir(dossier)
+    for lot in jeu.to_batches(
+        columns=colonnes, filter=_filtre(depuis, jusqu_a, sujets), batch_size=taille_lot
+    ):
+        if lot.num_rows:
+            yield lot.to_pandas()
+
+
+def lire(
+    dossier: str, depuis: str = None, jusqu_a: str = None, sujets: list = None,
+    colonnes: list = None,
+) -> pd.DataFrame:
+    """Tout d'un coup dans un DataFrame (pour un volume qui tient en mémoire)."""
+    table = ouvrir(dossier).to_table(columns=colonnes, filter=_filtre(depuis, jusqu_a, sujets))
+    return table.to_pandas()
+
+
+def jours(dossier: str) -> list:
+    """Jours présents dans le journal, du plus ancien au plus récent."""
+    if not os.path.isdir(dossier):
+        return []
+    return sorted(nom[len("jour=") :] for nom in os.listdir(dossier) if nom.startswith("jour="))
+
+
+def reponses_recentes(dossier: str, nb_max: int) -> dict:
+    """
+    Les `nb_max` dernières réponses dont on connaît le niveau de la question, au format
+    de TamponReponses.copie() (pour re-remplir le tampon du ré-entraînement au démarrage).
+    On remonte jour par jour depuis le plus récent : le reste du journal n'est pas lu.
+    """
+    _, ds, _ = _pyarrow()
+    colonnes = ["ts", "score", "temps_secondes", "sujet", "niveau_question"]
+    morceaux, total = [], 0
+    for jour in reversed(jours(dossier)):
+        if total >= nb_max:
+            break
+        table = ouvrir(dossier).to_table(
+            columns=colonnes,
+            filter=(ds.field("jour") == jour) & ds.field("niveau_question").is_valid(),
+        )
+        morceaux.append(table.to_pandas())
+        total += table.num_rows
+    if not morceaux:
+        df = pd.DataFrame(columns=colonnes)
+    else:
+        df = pd.concat(morceaux, ignore_index=True).sort_values("ts", kind="stable")
+        df = df.tail(nb_max)
+    return {
+        "score": df["score"].to_numpy(np.int8),
+        "temps_secondes": df["temps_secondes"].to_numpy(np.float32),
+        "sujet": df["sujet"].astype(str).to_numpy(object),
+        "niveau": df["niveau_question"].to_numpy(np.int8),
+        "nb_total": len(df),
+    }
@@ -0,0 +1,191 @@
+"""
+index_questions.py — Index en mémoire des questions par (niveau, sujet)
+Auteur : Moi (ESIEA 3A)
+
+Avant, chaque GET /questions refaisait plusieurs passes pandas sur tout le dataset
+(isin sur le niveau, masque sur le sujet, unique(), sample). Ça grossit avec le CSV.
+
+Ici on trie une seule fois les positions des lignes par clé (niveau, sujet) au chargement.
+Chaque case (niveau, sujet) devient une tranche contiguë du tableau trié, et comme la clé
+est niveau * nb_sujets + sujet, la bande "niveau ± 1 tous sujets" est elle aussi contiguë.
+Pour un sujet précis, la bande c'est juste 3 tranches. Tirer une question = un tirage
+aléatoire + un accès tableau, sans pandas.
+
+Sans répétition : tirer() peut recevoir l'ensemble des question_id déjà vues (vus.py).
+On retire au hasard tant qu'on tombe sur du vu (quelques essais suffisent tant que
+l'utilisateur n'a vu qu'une petite partie de la bande), puis, si vraiment tout ce
+qu'on tire est vu, on énumère les non vues de la bande. Dans ce cas-là la bande est
+forcément petite devant le plafond de vues, donc ça reste borné.
+"""
+
+import random
+
+import numpy as np
+
+NIVEAU_MIN = 1
+NIVEAU_MAX = 5
+ESSAIS_REJET = 8  # tirages "au hasard" avant d'énumérer les questions non vues
+
+
+class IndexQuestions:
+    """
+    Positions des lignes du catalogue groupées par (niveau, sujet).
+
+    Les colonnes sont gardées en tableaux NumPy (question_id, niveau, code sujet),
+    et les bandes niveau ± 1 sont précalculées sous forme de tranches de `ordre`.
+    """
+
+    def __init__(
+        self, question_ids, niveaux, codes_sujets, noms_sujets, ordre=None, debuts=None
+    ):
+        self.question_ids = np.asarray(question_ids, dtype=np.int64)
+        self.niveaux = np.asarray(niveaux, dtype=np.int8)
+        self.codes_sujets = np.asarray(codes_sujets, dtype=np.uint8)
+        self.noms_sujets = list(noms_sujets)
+        self.code_par_sujet = {nom: code for code, nom in enumerate(self.noms_sujets)}
+
+        nb_sujets = len(self.noms_sujets)
+        nb_niveaux = NIVEAU_MAX - NIVEAU_MIN + 1
+
+        if ordre is not None and debuts is not None:
+            # Déjà calculés (chargés depuis l'artefact, éventuellement en mmap)
+            self.ordre = np.asarray(ordre, dtype=np.int32)
+            self.debuts = np.asarray(debuts, dtype=np.int64)
+        else:
+            self.ordre, self.debuts = self._trier(nb_sujets, nb_niveaux)
+
+        # Bandes précalculées : (niveau_cible, code_sujet ou None) → (tranches, total)
+        # Les bandes plus larges (± 2, ± 3...) sont calculées à la demande dans _bandes_larges
+        self._bandes = {}
+        self._bandes_larges = {}
+        for niveau_cible in range(NIVEAU_MIN, NIVEAU_MAX + 1):
+            for code in (None, *range(nb_sujets)):
+                self._bandes[(niveau_cible, code)] = self._calculer_bande(niveau_cible, code, 1)
+
+    def _calculer_bande(self, niveau_cible: int, code_sujet, largeur: int) -> tuple:
+        """Tranches de `ordre` de la bande niveau ± largeur (un sujet ou tous)."""
+        nb_sujets = len(self.noms_sujets)
+        bas = max(NIVEAU_MIN, niveau_cible - largeur)
+        haut = min(NIVEAU_MAX, niveau_cible + largeur)
+
+        if code_sujet is None:
+            # Tous sujets : une seule tranche de bas à haut
+            debut = int(self.debuts[(bas - NIVEAU_MIN) * nb_sujets])
+            fin = int(self.debuts[(haut - NIVEAU_MIN + 1) * nb_sujets])
+            return self._preparer_bande([(debut, fin)])
+
+        tranches = []
+        for niveau in range(bas, haut + 1):
+            case = (niveau - NIVEAU_MIN) * nb_sujets + code_sujet
+            tranches.append((int(self.debuts[case]), int(self.debuts[case + 1])))
+        return self._preparer_bande(tranches)
+
+    def _bande(self, niveau_cible: int, code_sujet, largeur: int) -> tuple:
+        if largeur == 1:
+            return self._bandes[(niveau_cible, code_sujet)]
+        cle = (niveau_cible, code_sujet, largeur)
+        bande = self._bandes_larges.get(cle)
+        if bande is None:
+            bande = self._calculer_bande(niveau_cible, code_sujet, largeur)
+            self._bandes_larges[cle] = bande
+        return bande
+
+    def _trier(self, nb_sujets: int, nb_niveaux: int) -> tuple:
+        """Trie les positions par clé (niveau, sujet) → (ordre, debuts des cases)."""
+        # On ignore les lignes hors de [1, 5] (le générateur clippe déjà, mais bon)
+        valides = (self.niveaux >= NIVEAU_MIN) & (self.niveaux <= NIVEAU_MAX)
+        positions = np.flatnonzero(valides)
+        cles = (self.niveaux[positions].astype(np.int64) - NIVEAU_MIN) * nb_sujets
+        cles += self.codes_sujets[positions]
+
+        # Tri stable par clé → chaque case (niveau, sujet) est une tranche contiguë
+        tri = np.argsort(cles, kind="stable")
+        ordre = positions[tri].astype(np.int32)
+        comptes = np.bincount(cles, minlength=nb_niveaux * nb_sujets)
+        debuts = np.concatenate([[0], np.cumsum(comptes)]).astype(np.int64)
+        return ordre, debuts
+
+    @staticmethod
+    def _preparer_bande(tranches: list) -> tuple:
+        """Garde seulement les tranches non vides avec leur taille cumulée."""
+        bande = []
+        total = 0
+        for debut, fin in tranches:
+            if fin > debut:
+                bande.append((total, debut, fin - debut))
+                total += fin - debut
+        return tuple(bande), total
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def code(self, sujet: str):
+        """Code entier du sujet, ou None s'il n'est pas dans le catalogue."""
+        return self.code_par_sujet.get(sujet)
+
+    def case(self, niveau: int, code_sujet: int) -> np.ndarray:
+        """Positions des lignes d'une case (niveau, sujet) — vue sur `ordre`, pas de copie."""
+        idx = (niveau - NIVEAU_MIN) * len(self.noms_sujets) + code_sujet
+        return self.ordre[self.debuts[idx] : self.debuts[idx + 1]]
+
+    def taille_bande(self, niveau_cible: int, code_sujet=None, largeur: int = 1) -> int:
+        """Nombre de questions dans la bande niveau ± largeur (filtrée sur le sujet si donné)."""
+        return self._bande(niveau_cible, code_sujet, largeur)[1]
+
+    def tirer(
+        self, niveau_cible: int, code_sujet=None, rng=random, exclus=None, largeur: int = 1
+    ) -> int:
+        """
+        Tire une position de ligne uniformément dans la bande niveau ± largeur,
+        en sautant les question_id de `exclus` (un EnsembleVus) si on en donne un.
+        Retourne -1 si la bande est vide ou entièrement exclue.
+        """
+        tranches, total = self._bande(niveau_cible, code_sujet, largeur)
+        if total == 0:
+            return -1
+        if not exclus:
+            return self._position_dans(tranches, rng.randrange(total))
+
+        for _ in range(ESSAIS_REJET):
+            position = self._position_dans(tranches, rng.randrange(total))
+            if int(self.question_ids[position]) not in exclus:
+                return position
+
+        # Presque tout est vu : tirage exact parmi les non vues de la bande
+        candidats = self.positions_bande(niveau_cible, code_sujet, largeur)
+        restants = candidats[~np.isin(self.question_ids[candidats], exclus.valeurs())]
+        if len(restants) == 0:
+            return -1
+        return int(restants[rng.randrange(len(restants))])
+
+    def _position_dans(self, tranches: tuple, r: int) -> int:
+        for cumul, debut, taille in tranches:
+            if r < cumul + taille:
+                return int(self.ordre[debut + r - cumul])
+        return -1  # pas censé arriver
+
+    def positions_bande(self, niveau_cible: int, code_sujet=None, largeur: int = 1) -> np.ndarray:
+        """Toutes les positions de la bande (copie) — pour oublier une bande épuisée."""
+        tranches, _ = self._bande(niveau_cible, code_sujet, largeur)
+        if not tranches:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([self.ordre[debut : debut + taille] for _, debut, taille in tranches])
+
+    def ligne(self, position: int) -> tuple:
+        """Retourne (question_id, sujet, niveau) pour une position de ligne."""
+        return (
+            int(self.question_ids[position]),
+            self.noms_sujets[self.codes_sujets[position]],
+            int(self.niveaux[position]),
+        )
+
+
+def construire_index(df) -> IndexQuestions:
+    """Construit l'index à partir du DataFrame du dataset (une seule passe au chargement)."""
+    noms, codes = np.unique(df["sujet"].to_numpy(), return_inverse=True)
+    return IndexQuestions(
+        df["question_id"].to_numpy(),
+        df["niveau_difficulte"].to_numpy(),
+        codes,
+        [str(nom) for nom in noms],
+    )
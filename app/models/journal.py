@@ -0,0 +1,589 @@
+"""
+journal.py — Profils persistés : snapshot binaire (mmap) + journal en ajout seul
+Auteur : Moi (ESIEA 3A)
+
+Le SQLite (stockage.py) marche, mais au redémarrage chaque profil est relu avec deux
+requêtes, et un snapshot de 1M de profils c'est une grosse base. Ici c'est le
+schéma classique des bases de données :
+
+- un SNAPSHOT : tous les profils en enregistrements de taille fixe
+  (Profil.vers_enregistrement, DTYPE_ENREGISTREMENT = 682 octets), ouvert en mmap
+  comme un tableau numpy ; ce qui ne tient pas dans les cases fixes (questions vues,
+  user_id de plus de 48 octets...) est dans un fichier "tas" à côté
+- un JOURNAL en ajout seul : chaque enregistrer() y ajoute l'image complète du profil
+  (Profil.vers_octets) dans une trame [taille, crc32, type, user_id, données]. Les
+  trames s'accumulent dans un tampon, qu'un thread écrit + fsync toutes les
+  `intervalle_ms` (group commit : un seul fsync pour toutes les réponses de la fenêtre).
+  En mode synchrone, enregistrer() attend que SA trame soit sur disque.
+
+Au démarrage : on ouvre le dernier snapshot (rien n'est décodé, on construit juste
+l'index user_id → case) puis on rejoue la queue du journal (user_id → position de
+sa dernière trame). Un profil n'est décodé qu'au premier charger(), depuis le mmap
+ou le journal. Une trame coupée par un crash (crc faux / incomplète) est tronquée.
+
+Compaction : toutes les `intervalle_snapshot_s` secondes (ou quand le journal dépasse
+`seuil_snapshot_octets`), on bascule sur un nouveau segment de journal, on écrit un
+nouveau snapshot = ancien snapshot + trames des segments précédents, puis on supprime
+ces segments et l'ancien snapshot. Les réponses continuent pendant ce temps (dans le
+nouveau segment), le seul moment bloquant c'est la copie de l'index.
+
+Fichiers dans `dossier` :
+    snapshot_<lsn>.bin / .tas   lsn = position du journal où commence la queue à rejouer
+    journal_<debut>.log         segments, nommés par leur position globale de début
+    verrou                      un seul process à la fois sur le dossier
+
+Les positions sont "globales" (début du segment + offset), donc une entrée de l'index
+tient dans un int : >= 0 → case du snapshot, < 0 → -(position + 1) dans le journal.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from datetime import datetime
+
+import numpy as np
+
+from app.models.profil import (
+    DTYPE_ENREGISTREMENT,
+    TAILLE_ID_FIXE,
+    Profil,
+    code_sujet,
+    sujets_enregistres,
+)
+from app.models.stockage import StockageProfils
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou de dossier
+    fcntl = None
+
+MAGIQUE_SNAPSHOT = b"PROFSNAP"
+VERSION_SNAPSHOT = 1
+# magique, version, ordre des octets (1 = little), taille d'un enregistrement,
+# nb d'enregistrements, lsn, taille du JSON (sujets, date)
+_ENTETE_SNAPSHOT = struct.Struct("<8sHHIQQI")
+ALIGNEMENT = 64
+
+# taille des données, crc32 (type + user_id + données), type, taille de l'user_id
+_TRAME = struct.Struct("<IIBH")
+TYPE_PROFIL, TYPE_SUPPRESSION, TYPE_SUJETS = 0, 1, 2
+
+TAILLE_LOT_SNAPSHOT = 65_536  # enregistrements écrits par paquet (RAM bornée)
+
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+
+def _trame(type_: int, user_id: bytes, donnees: bytes = b"") -> bytes:
+    crc = zlib.crc32(donnees, zlib.crc32(user_id, type_))
+    return _TRAME.pack(len(donnees), crc, type_, len(user_id)) + user_id + donnees
+
+
+def _lire_dans_segments(segments: list, position: int) -> bytes:
+    """Données de la trame à la position globale `position`. segments : [(début, chemin, fd)]"""
+    debut, _, fd = segments[bisect_right([s[0] for s in segments], position) - 1]
+    taille, _, _, taille_id = _TRAME.unpack(os.pread(fd, _TRAME.size, position - debut))
+    return os.pread(fd, taille, position - debut + _TRAME.size + taille_id)
+
+
+def _fsync_dossier(dossier: str):
+    if os.name != "posix":
+        return
+    fd = os.open(dossier, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _Snapshot:
+    """Un snapshot ouvert : enregistrements + tas en mmap (lecture seule)."""
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        with open(chemin, "rb") as f:
+            entete = f.read(_ENTETE_SNAPSHOT.size)
+            magique, version, ordre, taille, nb, lsn, taille_json = _ENTETE_SNAPSHOT.unpack(
+                entete
+            )
+            if magique != MAGIQUE_SNAPSHOT or version != VERSION_SNAPSHOT:
+                raise ValueError(f"{chemin} : pas un snapshot de profils (v{VERSION_SNAPSHOT})")
+            if ordre != (sys.byteorder == "little") or taille != DTYPE_ENREGISTREMENT.itemsize:
+                raise ValueError(f"{chemin} : écrit sur une autre architecture / autre format")
+            self.infos = json.loads(f.read(taille_json))
+        self.lsn = lsn
+        self.nb = nb
+        debut = -(-(_ENTETE_SNAPSHOT.size + taille_json) // ALIGNEMENT) * ALIGNEMENT
+        # .view(np.ndarray) : même mémoire, sans le surcoût de la sous-classe memmap
+        # à chaque indexation
+        self.enregistrements = (
+            np.memmap(chemin, DTYPE_ENREGISTREMENT, "r", offset=debut, shape=(nb,)).view(
+                np.ndarray
+            )
+            if nb
+            else np.empty(0, DTYPE_ENREGISTREMENT)
+        )
+        chemin_tas = chemin[: -len(".bin")] + ".tas"
+        self.tas = (
+            np.memmap(chemin_tas, np.uint8, "r").view(np.ndarray)
+            if os.path.getsize(chemin_tas)
+            else np.empty(0, np.uint8)
+        )
+
+    def user_ids(self) -> list:
+        """user_id de chaque case (les ids longs sont relus dans le tas)."""
+        # (un id long est coupé à 48 octets, éventuellement au milieu d'un caractère)
+        ids = [b.decode(errors="replace") for b in self.enregistrements["user_id"].tolist()]
+        longs = np.flatnonzero(
+            (np.char.str_len(self.enregistrements["user_id"]) == TAILLE_ID_FIXE)
+            & (self.enregistrements["tas_taille"] > 0)
+        )
+        for i in longs.tolist():
+            offset = int(self.enregistrements["tas_offset"][i])
+            (longueur,) = struct.unpack_from("=H", self.tas[offset : offset + 2].tobytes())
+            if longueur:
+                ids[i] = self.tas[offset + 2 : offset + 2 + longueur].tobytes().decode()
+        return ids
+
+    def tas_de(self, i: int) -> bytes:
+        enregistrement = self.enregistrements[i]
+        offset = int(enregistrement["tas_offset"])
+        return self.tas[offset : offset + int(enregistrement["tas_taille"])].tobytes()
+
+    def profil(self, i: int) -> Profil:
+        enregistrement = self.enregistrements[i]
+        offset, taille = int(enregistrement["tas_offset"]), int(enregistrement["tas_taille"])
+        tas = self.tas[offset : offset + taille].tobytes() if taille else b""
+        return Profil.depuis_enregistrement(enregistrement.tobytes(), tas)
+
+
+class StockageJournal(StockageProfils):
+    """Snapshot binaire en mmap + journal avec fsync groupés (voir le haut du fichier)."""
+
+    def __init__(
+        self,
+        dossier: str,
+        intervalle_ms: float = 10,
+        synchrone: bool = False,
+        intervalle_snapshot_s: float = 600,
+        seuil_snapshot_octets: int = 256 << 20,
+        taille_tampon_max: int = 4 << 20,
+    ):
+        self.dossier = dossier
+        self.intervalle_s = intervalle_ms / 1000
+        self.synchrone = synchrone
+        self.intervalle_snapshot_s = intervalle_snapshot_s
+        self.seuil_snapshot_octets = seuil_snapshot_octets
+        self.taille_tampon_max = taille_tampon_max
+        os.makedirs(dossier, exist_ok=True)
+        self._verrouiller_dossier()
+
+        # _verrou : index, tampon, positions. _verrou_fichier : écritures dans les
+        # segments (flush vs bascule de segment). _verrou_snapshot : un snapshot à la fois.
+        self._verrou = threading.Lock()
+        self._verrou_fichier = threading.Lock()
+        self._verrou_snapshot = threading.Lock()
+        self._durable = threading.Condition(self._verrou)
+
+        self._index: dict = {}
+        self._snapshot: _Snapshot = None
+        self._segments: list = []  # [(début global, chemin, fd)], triés
+        self._tampon = bytearray()
+        self._position = 0  # fin du journal (tampon compris)
+        self._position_ecrite = 0  # fin de ce qui est dans le fichier
+        self._position_durable = 0  # fin de ce qui est fsyncé
+        self._nb_sujets_journalises = 0
+        self._modifies: set = None  # user_id touchés pendant la construction d'un snapshot
+
+        self._nb_fsync = 0
+        self._nb_snapshots = 0
+        self._duree_dernier_snapshot_s = None
+        self._dernier_snapshot = time.monotonic()
+
+        debut = time.perf_counter()
+        nb_trames = self._recuperer()
+        self.duree_recuperation_s = time.perf_counter() - debut
+        print(
+            f"[JOURNAL] {len(self._index)} profils récupérés "
+            f"en {self.duree_recuperation_s:.2f}s "
+            f"(snapshot : {self._snapshot.nb if self._snapshot else 0}, "
+            f"trames rejouées : {nb_trames})"
+        )
+        self._ouvrir_segment(self._position)
+
+        self._arret = threading.Event()
+        self._reveil = threading.Event()
+        self._reveil_snapshot = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._boucle_fsync, name="journal-fsync", daemon=True),
+            threading.Thread(target=self._boucle_snapshot, name="journal-snapshot", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # --- Démarrage ---
+
+    def _verrouiller_dossier(self):
+        self._fichier_verrou = open(os.path.join(self.dossier, "verrou"), "w")
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._fichier_verrou, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            raise RuntimeError(
+                f"{self.dossier} est déjà utilisé par un autre process "
+                "(un dossier de journal par worker)"
+            )
+
+    def _recuperer(self) -> int:
+        """Dernier snapshot lisible + rejeu des segments suivants. Retourne le nb de trames."""
+        lsn = 0
+        snapshots = sorted(glob.glob(os.path.join(self.dossier, "snapshot_*.bin")), reverse=True)
+        for chemin in snapshots:
+            try:
+                snapshot = _Snapshot(chemin)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Snapshot ignoré : {e}")
+                continue
+            for k, nom in enumerate(snapshot.infos["sujets"]):
+                if code_sujet(nom) != k:
+                    raise ValueError(f"Sujet {nom} déjà enregistré avec un autre code")
+            self._snapshot = snapshot
+            self._index = dict(zip(snapshot.user_ids(), range(snapshot.nb)))
+            lsn = snapshot.lsn
+            break
+        # Restes d'une compaction interrompue : snapshots plus anciens, fichiers .tmp
+        for chemin in glob.glob(os.path.join(self.dossier, "snapshot_*")):
+            garde = self._snapshot is not None and chemin.startswith(self._snapshot.chemin[:-4])
+            if not garde or chemin.endswith(".tmp"):
+                os.remove(chemin)
+        self._nb_sujets_journalises = len(sujets_enregistres())
+
+        nb_trames = 0
+        self._position = lsn
+        for chemin in sorted(glob.glob(os.path.join(self.dossier, "journal_*.log"))):
+            debut = int(os.path.basename(chemin)[len("journal_") : -len(".log")], 16)
+            if debut < lsn:
+                os.remove(chemin)  # déjà dans le snapshot (compaction interrompue)
+                continue
+            nb_trames += self._rejouer(chemin, debut)
+        self._position_ecrite = self._position_durable = self._position
+        return nb_trames
+
+    def _rejouer(self, chemin: str, debut: int) -> int:
+        taille_fichier = os.path.getsize(chemin)
+        offset, nb = 0, 0
+        if taille_fichier:
+            # mmap + memoryview : le segment n'est pas recopié en RAM (il peut faire 256 Mo)
+            with open(chemin, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                donnees = memoryview(m)
+                try:
+                    offset, nb = self._rejouer_trames(donnees, debut)
+                finally:
+                    donnees.release()
+
+        if offset < taille_fichier:
+            print(
+                f"[WARN] {chemin} : trame incomplète ou corrompue à l'octet {offset}, "
+                f"{taille_fichier - offset} octets tronqués"
+            )
+            with open(chemin, "r+b") as f:
+                f.truncate(offset)
+        if offset == 0:
+            os.remove(chemin)
+        else:
+            self._segments.append((debut, chemin, os.open(chemin, os.O_RDWR | os.O_APPEND)))
+        self._position = debut + offset
+        return nb
+
+    def _rejouer_trames(self, donnees: memoryview, debut: int) -> tuple:
+        """Applique les trames valides à l'index. Retourne (fin de la dernière, nb de trames)."""
+        offset, nb = 0, 0
+        index = self._index
+        while offset + _TRAME.size <= len(donnees):
+            taille, crc, type_, taille_id = _TRAME.unpack_from(donnees, offset)
+            debut_corps = offset + _TRAME.size + taille_id
+            fin = debut_corps + taille
+            if fin > len(donnees):
+                break
+            user_id = donnees[offset + _TRAME.size : debut_corps]
+            corps = donnees[debut_corps:fin]
+            if zlib.crc32(corps, zlib.crc32(user_id, type_)) != crc:
+                break
+            if type_ == TYPE_PROFIL:
+                index[str(user_id, "utf-8")] = -(debut + offset + 1)
+            elif type_ == TYPE_SUPPRESSION:
+                index.pop(str(user_id, "utf-8"), None)
+            elif type_ == TYPE_SUJETS:
+                for k, nom in enumerate(str(corps, "utf-8").split("\n")):
+                    if code_sujet(nom) != k:
+                        raise ValueError(f"Sujet {nom} déjà enregistré avec un autre code")
+            offset = fin
+            nb += 1
+        return offset, nb
+
+    def _ouvrir_segment(self, debut: int):
+        """Nouveau segment qui commence à la position `debut` (appelé sous les verrous)."""
+        if self._segments and self._segments[-1][0] == debut:
+            return  # le dernier segment rejoué est vide de toute façon
+        chemin = os.path.join(self.dossier, f"journal_{debut:016x}.log")
+        fd = os.open(chemin, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segments.append((debut, chemin, fd))
+        _fsync_dossier(self.dossier)
+
+    # --- Lecture ---
+
+    def charger(self, user_id: str):
+        with self._verrou:
+            valeur = self._index.get(user_id)
+            if valeur is None:
+                return None
+            if valeur >= 0:
+                snapshot = self._snapshot
+            else:
+                donnees = self._lire_trame(-valeur - 1)
+        if valeur >= 0:
+            return snapshot.profil(valeur)
+        return Profil.depuis_octets(user_id, donnees)
+
+    def user_ids(self) -> list:
+        with self._verrou:
+            return list(self._index)
+
+    def _lire_trame(self, position: int) -> bytes:
+        """Données de la trame à `position` (sous _verrou)."""
+        if position >= self._position_ecrite:
+            self._ecrire_tampon()
+        return _lire_dans_segments(self._segments, position)
+
+    # --- Écriture ---
+
+    def enregistrer(self, profil: Profil, entree: tuple = None):
+        trame = _trame(TYPE_PROFIL, profil.user_id.encode(), profil.vers_octets())
+        self._ajouter(profil.user_id, trame)
+
+    def supprimer(self, user_id: str):
+        self._ajouter(user_id, _trame(TYPE_SUPPRESSION, user_id.encode()), suppression=True)
+
+    def _ajouter(self, user_id: str, trame: bytes, suppression: bool = False):
+        with self._verrou:
+            sujets = sujets_enregistres()
+            if len(sujets) > self._nb_sujets_journalises:
+                # Le registre des sujets a grandi : il doit être dans le journal AVANT
+                # la première trame qui utilise le nouveau code
+                trame_sujets = _trame(TYPE_SUJETS, b"", "\n".join(sujets).encode())
+                self._tampon += trame_sujets
+                self._position += len(trame_sujets)
+                self._nb_sujets_journalises = len(sujets)
+            position = self._position
+            self._tampon += trame
+            self._position += len(trame)
+            if suppression:
+                self._index.pop(user_id, None)
+            else:
+                self._index[user_id] = -(position + 1)
+            if self._modifies is not None:
+                self._modifies.add(user_id)
+            plein = len(self._tampon) >= self.taille_tampon_max
+            fin = self._position
+
+        if plein or self.synchrone:
+            self._reveil.set()
+        if self.synchrone:
+            with self._durable:
+                while self._position_durable < fin:
+                    self._durable.wait(1)
+
+    def _ecrire_tampon(self) -> tuple:
+        """Tampon → fichier du segment courant, sans fsync (sous _verrou)."""
+        fd = self._segments[-1][2]
+        if self._tampon:
+            os.write(fd, self._tampon)
+            self._tampon = bytearray()
+            self._position_ecrite = self._position
+        return fd, self._position_ecrite
+
+    def vider(self):
+        """Écrit et fsync tout ce qui est en attente."""
+        with self._verrou_fichier:
+            with self._verrou:
+                fd, fin = self._ecrire_tampon()
+            if fin > self._position_durable:
+                _fdatasync(fd)
+                with self._verrou:
+                    self._nb_fsync += 1
+                    self._position_durable = fin
+                    self._durable.notify_all()
+
+    def _boucle_fsync(self):
+        while not self._arret.is_set():
+            self._reveil.wait(self.intervalle_s)
+            self._reveil.clear()
+            try:
+                self.vider()
+            except OSError as e:
+                print(f"[WARN] Écriture du journal ratée : {e}")
+
+    def _boucle_snapshot(self):
+        while not self._arret.is_set():
+            self._reveil_snapshot.wait(min(self.intervalle_snapshot_s, 1.0))
+            self._reveil_snapshot.clear()
+            if self._arret.is_set():
+                return
+            taille_journal = self._position - (self._snapshot.lsn if self._snapshot else 0)
+            age = time.monotonic() - self._dernier_snapshot
+            if taille_journal > 0 and (
+                age >= self.intervalle_snapshot_s or taille_journal >= self.seuil_snapshot_octets
+            ):
+                try:
+                    self.snapshot()
+                except OSError as e:
+                    print(f"[WARN] Snapshot raté : {e}")
+
+    # --- Snapshot + compaction ---
+
+    def snapshot(self) -> str:
+        """Écrit un nouveau snapshot, puis supprime l'ancien et les segments qu'il couvre."""
+        with self._verrou_snapshot:
+            debut_chrono = time.perf_counter()
+
+            # 1. Bascule : tout ce qui précède `lsn` ira dans le snapshot. Le tampon est
+            # vidé et le segment changé sous le même verrou, sinon une trame ajoutée
+            # entre les deux finirait dans le nouveau segment avec une position < lsn.
+            with self._verrou_fichier:
+                with self._verrou:
+                    fd, lsn = self._ecrire_tampon()
+                    copie = dict(self._index)
+                    self._modifies = set()
+                    ancien = self._snapshot
+                    anciens_segments = list(self._segments)
+                    self._ouvrir_segment(lsn)
+                    sujets = sujets_enregistres()
+                _fdatasync(fd)
+                with self._verrou:
+                    self._position_durable = max(self._position_durable, lsn)
+                    self._durable.notify_all()
+
+            # 2. Écriture (hors verrou : les réponses continuent dans le nouveau segment)
+            user_ids = list(copie)
+            chemin = os.path.join(self.dossier, f"snapshot_{lsn:016x}.bin")
+            self._ecrire_snapshot(chemin, lsn, user_ids, copie, ancien, anciens_segments, sujets)
+            nouveau = _Snapshot(chemin)
+            nouvel_index = dict(zip(user_ids, range(len(user_ids))))
+
+            # 3. Bascule de l'index : ce qui a bougé entre-temps garde sa position journal
+            with self._verrou:
+                for user_id in self._modifies:
+                    valeur = self._index.get(user_id)
+                    if valeur is None:
+                        nouvel_index.pop(user_id, None)
+                    else:
+                        nouvel_index[user_id] = valeur
+                self._index = nouvel_index
+                self._snapshot = nouveau
+                self._modifies = None
+                self._segments = [s for s in self._segments if s[0] >= lsn]
+
+            # 4. Compaction
+            for debut_segment, chemin_segment, fd in anciens_segments:
+                if debut_segment != lsn:
+                    os.close(fd)
+                    os.remove(chemin_segment)
+            if ancien is not None:
+                os.remove(ancien.chemin)
+                os.remove(ancien.chemin[: -len(".bin")] + ".tas")
+
+            self._nb_snapshots += 1
+            self._dernier_snapshot = time.monotonic()
+            self._duree_dernier_snapshot_s = time.perf_counter() - debut_chrono
+            print(
+                f"[JOURNAL] Snapshot de {len(user_ids)} profils en "
+                f"{self._duree_dernier_snapshot_s:.2f}s ({os.path.basename(chemin)})"
+            )
+            return chemin
+
+    def _ecrire_snapshot(self, chemin, lsn, user_ids, copie, ancien, segments, sujets):
+        infos = json.dumps(
+            {"sujets": sujets, "date": datetime.now().isoformat(timespec="seconds")}
+        ).encode()
+        entete = _ENTETE_SNAPSHOT.pack(
+            MAGIQUE_SNAPSHOT, VERSION_SNAPSHOT, sys.byteorder == "little",
+            DTYPE_ENREGISTREMENT.itemsize, len(user_ids), lsn, len(infos),
+        )
+        debut = -(-(len(entete) + len(infos)) // ALIGNEMENT) * ALIGNEMENT
+        valeurs = np.fromiter(copie.values(), np.int64, len(copie))
+
+        chemin_tas = chemin[: -len(".bin")] + ".tas"
+        with open(chemin + ".tmp", "wb") as f, open(chemin_tas + ".tmp", "wb") as tas:
+            f.write((entete + infos).ljust(debut, b"\0"))
+            taille_tas = 0
+            for lot in range(0, len(user_ids), TAILLE_LOT_SNAPSHOT):
+                fin_lot = min(lot + TAILLE_LOT_SNAPSHOT, len(user_ids))
+                v = valeurs[lot:fin_lot]
+                enregistrements = np.zeros(fin_lot - lot, DTYPE_ENREGISTREMENT)
+                du_snapshot = np.flatnonzero(v >= 0)
+                if len(du_snapshot):
+                    # Cases inchangées : copie vectorisée, seul le tas est recopié une à une
+                    enregistrements[du_snapshot] = ancien.enregistrements[v[du_snapshot]]
+                    for k in du_snapshot[enregistrements["tas_taille"][du_snapshot] > 0].tolist():
+                        morceau = ancien.tas_de(int(v[k]))
+                        enregistrements["tas_offset"][k] = taille_tas
+                        tas.write(morceau)
+                        taille_tas += len(morceau)
+                for k in np.flatnonzero(v < 0).tolist():
+                    donnees = _lire_dans_segments(segments, -int(v[k]) - 1)
+                    profil = Profil.depuis_octets(user_ids[lot + k], donnees)
+                    enregistrement, morceau = profil.vers_enregistrement(taille_tas)
+                    enregistrements[k] = np.frombuffer(enregistrement, DTYPE_ENREGISTREMENT)[0]
+                    tas.write(morceau)
+                    taille_tas += len(morceau)
+                f.write(enregistrements.tobytes())
+            for fichier in (f, tas):
+                fichier.flush()
+                os.fsync(fichier.fileno())
+
+        # Le .bin est le point de validation : le .tas doit être en place avant lui
+        os.replace(chemin_tas + ".tmp", chemin_tas)
+        os.replace(chemin + ".tmp", chemin)
+        _fsync_dossier(self.dossier)
+
+    # --- Divers ---
+
+    def fermer(self):
+        if self._arret.is_set():
+            return
+        self._arret.set()
+        self._reveil.set()
+        self._reveil_snapshot.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self.vider()
+        with self._verrou:
+            for _, _, fd in self._segments:
+                os.close(fd)
+            self._segments = []
+        self._fichier_verrou.close()
+
+    def metriques(self) -> dict:
+        lsn = self._snapshot.lsn if self._snapshot else 0
+        return {
+            "mode": "journal" + (" synchrone" if self.synchrone else ""),
+            "profils": len(self._index),
+            "profils_snapshot": self._snapshot.nb if self._snapshot else 0,
+            "journal_octets": self._position - lsn,
+            "octets_non_durables": self._position - self._position_durable,
+            "nb_fsync": self._nb_fsync,
+            "nb_snapshots": self._nb_snapshots,
+            "duree_dernier_snapshot_ms": (
+                self._duree_dernier_snapshot_s * 1e3
+                if self._duree_dernier_snapshot_s is not None
+                else None
+            ),
+            "duree_recuperation_ms": self.duree_recuperation_s * 1e3,
+        }
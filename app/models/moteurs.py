@@ -0,0 +1,323 @@
+"""
+moteurs.py — Moteurs d'adaptation du niveau (interface + moteur Elo / IRT 1PL)
+Auteur : Moi (ESIEA 3A)
+
+Le moteur décide deux choses :
+- après chaque réponse, le nouveau niveau de l'utilisateur (apres_reponse)
+- avant chaque question, le niveau visé, éventuellement pour un sujet (niveau_cible)
+
+Le moteur historique (RandomForest + lissage 70/30) est dans adaptive_model.py
+(MoteurForet). Ici il y a l'interface et le moteur Elo.
+
+Moteur Elo = IRT à 1 paramètre (Rasch) mis à jour en ligne :
+    P(réussite) = sigmoid(θ_utilisateur,sujet - b_question)
+C'est exactement la loi de generate_data.py (sigmoid(niveau_reel - niveau_question)),
+donc l'échelle de θ est directement celle des niveaux 1-5. Après une réponse :
+    e = score - P
+    θ_global += K(n) · e         (capacité générale de l'utilisateur)
+    Δ_sujet  += K_sujet(n) · e   (écart propre au sujet, θ_sujet = θ_global + Δ_sujet)
+    b_question -= K_question(n) · e
+Les K décroissent avec le nombre de réponses (K = a / (1 + b·n), plancher) :
+on bouge vite au début, puis on se stabilise tout en suivant la progression.
+Tout est en O(1) par réponse : pas de forêt, pas de numpy sur le chemin chaud.
+Le temps de réponse n'est pas utilisé (1PL : seul le score compte).
+
+Les difficultés de départ des questions viennent d'une calibration hors-ligne
+vectorisée sur le dataset (calibrer_elo, appelée à l'entraînement de l'artefact).
+
+L'état Elo d'un profil (θ, Δ) est sérialisé avec lui (Profil.vers_octets) : SQLite,
+journal et débord le gardent. Un profil sans état (créé avant, ou par la forêt)
+repart de θ = son niveau_actuel, ce qui est une bonne approximation.
+"""
+
+import math
+from array import array
+from bisect import bisect_right
+
+import numpy as np
+
+from app.models.index_questions import NIVEAU_MAX, NIVEAU_MIN
+from app.models.profil import SUJETS_CONNUS, code_sujet
+
+NIVEAUX = np.arange(NIVEAU_MIN, NIVEAU_MAX + 1)
+
+# Gains Elo (a, b, plancher) : K(n) = max(plancher, a / (1 + b·n))
+K_UTILISATEUR = (1.0, 0.15, 0.15)
+K_SUJET = (0.6, 0.15, 0.08)
+K_QUESTION = (0.3, 0.05, 0.02)
+
+# Probabilité de réussite visée pour choisir le niveau : 0.5 = niveau "pile à sa hauteur"
+CIBLE_REUSSITE = 0.5
+
+# Calibration hors-ligne
+ITERATIONS_CALIBRATION = 30
+ECART_TYPE_CAPACITES = 1.5  # a priori sur θ (les niveaux réels vont de 1 à 5)
+ECART_TYPE_QUESTIONS = 0.5  # a priori sur l'écart d'une question à son niveau nominal
+
+
+def _gain(parametres: tuple, n: float) -> float:
+    a, b, plancher = parametres
+    return max(plancher, a / (1.0 + b * n))
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class MoteurAdaptation:
+    """
+    Interface d'un moteur d'adaptation. Le moteur ne touche qu'à niveau_actuel
+    (et à son propre état) : compteurs, historique et sujets faibles sont déjà
+    mis à jour par adaptive_model avant l'appel.
+    """
+
+    nom = "base"
+
+    def apres_reponse(
+        self, profil, question_id: int, score: int, temps_secondes: float, sujet: str,
+        prediction=None,
+    ):
+        """Met à jour profil.niveau_actuel après une réponse.
+        `prediction` : résultat de predire_lot pour cette ligne (chemin par lot)."""
+        raise NotImplementedError
+
+    def predire_lot(self, reponses: list):
+        """Pré-calcul vectorisé pour un lot de (user_id, question_id, score, temps, sujet).
+        Retourne une valeur par ligne (passée à apres_reponse) ou None."""
+        return None
+
+    def niveau_cible(self, profil, sujet: str = None) -> int:
+        """Niveau des questions à proposer (par défaut : le niveau du profil)."""
+        return profil.niveau_actuel
+
+    def metriques(self) -> dict:
+        return {}
+
+
+class MoteurElo(MoteurAdaptation):
+    """
+    Elo / IRT 1PL. L'état d'un utilisateur est un array('f') dans profil.etat_moteur :
+        [θ_global, n_global, Δ_sujet0, n_sujet0, Δ_sujet1, n_sujet1, ...]
+    Les difficultés des questions sont un array('f') (copie modifiable de la
+    calibration, 4 octets par question) indexé par la position de la question_id :
+    lire/écrire une case d'array coûte bien moins qu'un accès scalaire NumPy.
+    """
+
+    nom = "elo"
+
+    def __init__(self, calibration: dict = None, cible_reussite: float = CIBLE_REUSSITE):
+        self.decalage_cible = math.log(cible_reussite / (1 - cible_reussite))
+        self.nb_reponses = 0
+        self.nb_questions_inconnues = 0
+        self.charger_calibration(calibration)
+
+    def charger_calibration(self, calibration: dict = None):
+        """
+        Installe les difficultés calibrées (ou les valeurs par défaut b = niveau).
+        Tout est construit à côté puis publié d'un coup : une requête en cours voit
+        soit l'ancienne calibration, soit la nouvelle.
+        """
+        if calibration is None:
+            beta = NIVEAUX.astype(np.float64)
+            ids = np.empty(0, dtype=np.int64)
+            difficultes = array("f")
+        else:
+            beta = np.asarray(calibration["beta_niveaux"], dtype=np.float64)
+            ids = np.asarray(calibration["question_ids"], dtype=np.int64)
+            # Copie : l'artefact est en mmap lecture seule et on met à jour en ligne
+            difficultes = array("f", np.asarray(calibration["difficultes"], dtype=np.float32).tobytes())
+
+        # ids triés : si c'est une plage continue (cas du générateur), position = id - premier
+        contigus = len(ids) > 0 and int(ids[-1]) - int(ids[0]) + 1 == len(ids)
+        # Frontières entre niveaux sur l'échelle des difficultés (milieux des β,
+        # rendus croissants au cas où un niveau peu représenté sortirait dans le désordre)
+        croissants = np.maximum.accumulate(beta)
+        frontieres = [float(x) for x in (croissants[1:] + croissants[:-1]) / 2]
+
+        self._catalogue = (
+            ids,
+            difficultes,
+            array("H", bytes(2 * len(ids))),  # nb de mises à jour en ligne par question
+            int(ids[0]) if contigus else None,
+            [float(b) for b in beta],
+            frontieres,
+        )
+        self.calibre = calibration is not None
+
+    # --- État par utilisateur ---
+
+    def _etat(self, profil, code: int) -> array:
+        etat = profil.etat_moteur
+        if etat is None:
+            # Nouveau profil (ou rechargé du stockage) : θ = difficulté de son niveau actuel
+            beta = self._catalogue[4]
+            theta = beta[min(max(profil.niveau_actuel, NIVEAU_MIN), NIVEAU_MAX) - NIVEAU_MIN]
+            etat = array("f", [theta, 0.0] + [0.0] * (2 * len(SUJETS_CONNUS)))
+            profil.etat_moteur = etat
+        if 2 + 2 * code >= len(etat):
+            etat.extend([0.0] * (2 + 2 * code + 2 - len(etat)))
+        return etat
+
+    def _position(self, question_id: int, ids, premier) -> int:
+        if premier is not None:
+            position = question_id - premier
+            return position if 0 <= position < len(ids) else -1
+        position = int(np.searchsorted(ids, question_id))
+        return position if position < len(ids) and ids[position] == question_id else -1
+
+    def _niveau(self, theta: float) -> int:
+        """Niveau dont la difficulté est la plus proche de θ - logit(cible)."""
+        return NIVEAU_MIN + bisect_right(self._catalogue[5], theta - self.decalage_cible)
+
+    # --- Interface ---
+
+    def apres_reponse(
+        self, profil, question_id: int, score: int, temps_secondes: float, sujet: str,
+        prediction=None,
+    ):
+        ids, difficultes, nb_maj, premier, beta, _ = self._catalogue
+        code = code_sujet(sujet)
+        etat = self._etat(profil, code)
+        i = 2 + 2 * code
+
+        position = self._position(question_id, ids, premier)
+        if position >= 0:
+            b = difficultes[position]
+        else:
+            # Question hors catalogue (fallback hors-ligne...) : elle était au niveau du profil
+            self.nb_questions_inconnues += 1
+            b = beta[min(max(profil.niveau_actuel, NIVEAU_MIN), NIVEAU_MAX) - NIVEAU_MIN]
+
+        e = score - 1.0 / (1.0 + math.exp(b - etat[0] - etat[i]))
+
+        etat[0] += _gain(K_UTILISATEUR, etat[1]) * e
+        etat[1] += 1
+        etat[i] += _gain(K_SUJET, etat[i + 1]) * e
+        etat[i + 1] += 1
+        if position >= 0:
+            n = nb_maj[position]
+            difficultes[position] = b - _gain(K_QUESTION, n) * e
+            if n < 65535:
+                nb_maj[position] = n + 1
+
+        self.nb_reponses += 1
+        profil.niveau_actuel = self._niveau(etat[0])
+
+    def niveau_cible(self, profil, sujet: str = None) -> int:
+        etat = profil.etat_moteur
+        if sujet is None or etat is None:
+            return profil.niveau_actuel
+        i = 2 + 2 * code_sujet(sujet)
+        if i >= len(etat) or etat[i + 1] == 0:
+            return profil.niveau_actuel
+        return self._niveau(etat[0] + etat[i])
+
+    def capacite(self, profil, sujet: str = None) -> float:
+        """θ estimé (global, ou pour un sujet) — pour les stats et les benchmarks."""
+        etat = profil.etat_moteur
+        if etat is None:
+            return float("nan")
+        if sujet is None:
+            return float(etat[0])
+        i = 2 + 2 * code_sujet(sujet)
+        return float(etat[0] + (etat[i] if i < len(etat) else 0.0))
+
+    def metriques(self) -> dict:
+        return {
+            "calibre": int(self.calibre),
+            "nb_questions": len(self._catalogue[0]),
+            "nb_reponses": self.nb_reponses,
+            "nb_questions_inconnues": self.nb_questions_inconnues,
+        }
+
+
+def calibrer_elo(
+    users,
+    niveaux,
+    scores,
+    question_ids,
+    nb_iterations: int = ITERATIONS_CALIBRATION,
+) -> dict:
+    """
+    Calibration hors-ligne du modèle de Rasch sur tout le dataset, vectorisée :
+        logit P(réussite) = θ_user - β_niveau - δ_question
+    - β_niveau : difficulté de chaque niveau nominal (5 paramètres)
+    - δ_question : écart d'une question à son niveau, tiré vers 0 par un a priori
+      (avec une seule réponse par question, comme dans le dataset simulé, il reste ~0)
+    - θ_user : capacité de chaque utilisateur du dataset (sert à évaluer la calibration)
+
+    Maximum a posteriori par pas de Newton diagonaux (un bloc de paramètres à la fois) :
+    chaque pas = quelques np.bincount sur toutes les lignes, pas de boucle Python
+    par ligne. L'échelle est ancrée pour que la moyenne des β (pondérée par le nb
+    de réponses) soit la moyenne des niveaux : θ reste comparable aux niveaux 1-5.
+
+    Retourne question_ids (triés, uniques), difficultes (β_niveau + δ par question),
+    beta_niveaux, capacites (par code user) et quelques métriques.
+    """
+    users = np.asarray(users, dtype=np.int64)
+    niveaux = np.clip(np.asarray(niveaux, dtype=np.int64), NIVEAU_MIN, NIVEAU_MAX) - NIVEAU_MIN
+    scores = np.asarray(scores, dtype=np.float64)
+    ids, questions = np.unique(np.asarray(question_ids, dtype=np.int64), return_inverse=True)
+
+    nb_users = int(users.max()) + 1 if len(users) else 0
+    nb_niveaux = len(NIVEAUX)
+    nb_questions = len(ids)
+
+    comptes_niveaux = np.bincount(niveaux, minlength=nb_niveaux)
+    ancre = float(np.dot(comptes_niveaux, NIVEAUX) / max(1, comptes_niveaux.sum()))
+    prec_theta = 1.0 / ECART_TYPE_CAPACITES**2
+    prec_delta = 1.0 / ECART_TYPE_QUESTIONS**2
+
+    theta = np.full(nb_users, ancre)
+    beta = NIVEAUX.astype(np.float64)
+    delta = np.zeros(nb_questions)
+
+    def residus():
+        p = _sigmoid(theta[users] - beta[niveaux] - delta[questions])
+        return scores - p, p * (1 - p)
+
+    for _ in range(nb_iterations):
+        r, w = residus()
+        moyenne = theta.mean() if nb_users else ancre
+        theta += (np.bincount(users, r, nb_users) - prec_theta * (theta - moyenne)) / (
+            np.bincount(users, w, nb_users) + prec_theta
+        )
+
+        r, w = residus()
+        poids = np.bincount(niveaux, w, nb_niveaux)
+        pas = np.bincount(niveaux, r, nb_niveaux) / np.maximum(poids, 1e-9)
+        beta -= np.where(comptes_niveaux > 0, pas, 0.0)
+
+        r, w = residus()
+        delta -= (np.bincount(questions, r, nb_questions) + prec_delta * delta) / (
+            np.bincount(questions, w, nb_questions) + prec_delta
+        )
+
+        # Ancrage de l'échelle (le modèle est invariant par translation θ, β)
+        observes = comptes_niveaux > 0
+        decalage = ancre - np.dot(comptes_niveaux, beta) / max(1, comptes_niveaux.sum())
+        beta[observes] += decalage
+        theta += decalage
+
+    r, _ = residus()
+    p = scores - r
+    log_vraisemblance = float(
+        np.mean(scores * np.log(np.maximum(p, 1e-12)) + (1 - scores) * np.log(np.maximum(1 - p, 1e-12)))
+    )
+
+    # Difficulté de départ de chaque question : β de son niveau + son écart propre
+    niveau_question = np.zeros(nb_questions, dtype=np.int64)
+    niveau_question[questions] = niveaux
+    difficultes = (beta[niveau_question] + delta).astype(np.float32)
+
+    return {
+        "question_ids": ids,
+        "difficultes": difficultes,
+        "beta_niveaux": beta,
+        "capacites": theta,
+        "metriques": {
+            "iterations": nb_iterations,
+            "log_vraisemblance_moyenne": round(log_vraisemblance, 4),
+            "beta_niveaux": [round(float(b), 3) for b in beta],
+        },
+    }
@@ -0,0 +1,189 @@
+"""
+pool_calcul.py — Pool de processus pour le calcul lourd du modèle
+Auteur : Moi (ESIEA 3A)
+
+Quand c'est sklearn qui prédit (pas de table compilée), modele.predict tient le GIL
+quelques millisecondes : dans le threadpool de Starlette les requêtes se sérialisent
+derrière, un worker uvicorn n'utilise jamais plus d'un cœur.
+
+Ici le predict part dans un ProcessPoolExecutor :
+- chaque process du pool charge l'artefact UNE fois au démarrage (initializer),
+  les tableaux .npy sont en mmap donc partagés avec les autres process
+- seules les features partent dans le pool (quelques nombres), seuls les niveaux
+  reviennent : les profils restent dans le process de l'API
+- la file est bornée : au-delà de `profondeur_max` calculs en cours, soumettre()
+  lève PoolSature tout de suite, et la route répond 503 + Retry-After au lieu
+  de laisser les latences exploser
+
+Les process sont lancés en "spawn" : pas de fork d'un process qui a déjà des
+threads (chargement du modèle, write-behind SQLite, threadpool...).
+
+Activé par POOL_CALCUL=<nb de process> (voir adaptive_model.activer_pool_calcul).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.models.compilateur import FEATURES
+
+# État d'un process du pool, rempli par _initialiser
+_modele = None
+_table = None
+_code_par_sujet: dict = {}
+_version: str = None
+
+
+class PoolSature(RuntimeError):
+    """Trop de calculs en attente : la requête doit être refusée (503)."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after  # secondes conseillées au client
+
+
+def calculer_niveaux(modele, table, code_par_sujet: dict, scores, temps_secondes, sujets):
+    """
+    Prédiction vectorisée des niveaux (table compilée si dispo, sinon sklearn).
+    Retourne un tableau int64, 0 pour les lignes non prédictibles (sujet inconnu...).
+    Utilisée par adaptive_model et par les process du pool.
+    """
+    codes = np.array([code_par_sujet.get(s, -1) for s in sujets], dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.int64)
+    temps = np.asarray(temps_secondes, dtype=np.float64)
+    valides = codes >= 0
+    if table is not None:
+        valides &= (scores == 0) | (scores == 1)
+
+    niveaux = np.zeros(len(sujets), dtype=np.int64)
+    if not valides.any():
+        return niveaux
+
+    if table is not None:
+        niveaux[valides] = table.predire_lot(scores[valides], temps[valides], codes[valides])
+    else:
+        X = np.column_stack([scores[valides], temps[valides], codes[valides]])
+        niveaux[valides] = modele.predict(pd.DataFrame(X, columns=FEATURES))
+    return niveaux
+
+
+# ============================================================
+# Côté process du pool
+# ============================================================
+
+
+def _initialiser(dossier_artefacts: str, avec_table: bool):
+    """Charge l'artefact courant une seule fois par process."""
+    global _modele, _table, _code_par_sujet, _version
+
+    from app.models import artefact  # sklearn s'importe ici, pas dans l'API
+
+    resultat = artefact.charger(dossier_artefacts)
+    _modele = resultat["modele"]
+    _table = resultat["table"] if avec_table else None
+    _code_par_sujet = {str(s): code for code, s in enumerate(resultat["label_encoder"].classes_)}
+    _version = resultat["manifeste"]["version"]
+
+
+def _predire(scores: list, temps_secondes: list, sujets: list) -> np.ndarray:
+    return calculer_niveaux(_modele, _table, _code_par_sujet, scores, temps_secondes, sujets)
+
+
+def _identite() -> tuple:
+    return os.getpid(), _version
+
+
+# ============================================================
+# Côté API
+# ============================================================
+
+
+class PoolCalcul:
+    """ProcessPoolExecutor + file bornée (sémaphore libérée à la fin de chaque calcul)."""
+
+    def __init__(
+        self,
+        nb_processus: int,
+        dossier_artefacts: str,
+        profondeur_max: int = None,
+        avec_table: bool = False,
+    ):
+        self.nb_processus = nb_processus
+        self.profondeur_max = profondeur_max or 8 * nb_processus
+        self._executeur = ProcessPoolExecutor(
+            max_workers=nb_processus,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialiser,
+            initargs=(dossier_artefacts, avec_table),
+        )
+        self._places = threading.BoundedSemaphore(self.profondeur_max)
+        self._verrou = threading.Lock()
+        self._en_cours = 0
+        self.nb_calculs = 0
+        self.nb_refus = 0
+        self.nb_erreurs = 0
+
+    def soumettre(self, fonction, *args):
+        """Future (concurrent.futures) du calcul, ou PoolSature si la file est pleine."""
+        if not self._places.acquire(blocking=False):
+            with self._verrou:
+                self.nb_refus += 1
+            raise PoolSature(
+                f"{self.profondeur_max} calculs déjà en attente", self.retry_after()
+            )
+        try:
+            futur = self._executeur.submit(fonction, *args)
+        except BaseException:
+            self._places.release()
+            raise
+        with self._verrou:
+            self._en_cours += 1
+        futur.add_done_callback(self._termine)
+        return futur
+
+    def _termine(self, futur):
+        with self._verrou:
+            self._en_cours -= 1
+            self.nb_calculs += 1
+            if futur.cancelled() or futur.exception() is not None:
+                self.nb_erreurs += 1
+        self._places.release()
+
+    async def executer(self, fonction, *args):
+        """Version await-able (depuis un handler async)."""
+        return await asyncio.wrap_future(self.soumettre(fonction, *args))
+
+    async def predire_niveaux(self, scores: list, temps_secondes: list, sujets: list):
+        return await self.executer(_predire, scores, temps_secondes, sujets)
+
+    def prechauffer(self, timeout: float = 120) -> list:
+        """
+        Démarre tous les process et attend qu'ils aient chargé l'artefact
+        (sinon la première requête de chaque process paie l'import de sklearn).
+        Retourne [(pid, version)] — bloquant, à appeler hors de la boucle asyncio.
+        """
+        futurs = [self._executeur.submit(_identite) for _ in range(self.nb_processus)]
+        return [f.result(timeout) for f in futurs]
+
+    def retry_after(self) -> int:
+        """Secondes conseillées au client avant de réessayer (au moins 1)."""
+        return max(1, self._en_cours // (10 * self.nb_processus))
+
+    def arreter(self, annuler: bool = True):
+        """annuler=False : les calculs déjà soumis vont au bout (bascule de version)."""
+        self._executeur.shutdown(wait=False, cancel_futures=annuler)
+
+    def metriques(self) -> dict:
+        return {
+            "nb_processus": self.nb_processus,
+            "profondeur_max": self.profondeur_max,
+            "en_cours": self._en_cours,
+            "nb_calculs": self.nb_calculs,
+            "nb_refus": self.nb_refus,
+            "nb_erreurs": self.nb_erreurs,
+        }
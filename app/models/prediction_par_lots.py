@@ -0,0 +1,168 @@
+"""
+prediction_par_lots.py — Micro-batching des prédictions sklearn
+Auteur : Moi (ESIEA 3A)
+
+Quand c'est le RandomForest sklearn qui prédit (pas la table compilée), chaque
+POST /reponse paie tout le coût fixe de modele.predict pour une seule ligne.
+Sous charge, les handlers tournent en parallèle dans le threadpool de Starlette :
+au lieu que chacun appelle predict, ils déposent leur ligne dans une file et
+attendent un Future. Un thread dédié ramasse jusqu'à N lignes (ou attend au plus
+T microsecondes), fait UN predict vectorisé et répond à tout le monde.
+
+Optionnel : activé via activer_prediction_par_lots() dans adaptive_model,
+ou la variable d'environnement PREDICTION_PAR_LOTS=1.
+
+Une fois arrêté, soumettre() refuse tout de suite (PredictionIndisponible) et
+predire() n'attend jamais plus de `timeout`, file pleine comprise : un handler qui
+avait pris le prédicteur juste avant desactiver_prediction_par_lots(), ou qui tombe
+sur une file saturée, retombe sur le predict direct au lieu de bloquer un thread du
+threadpool.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FuturExpire
+
+import numpy as np
+
+TIMEOUT_S = 1.0
+
+
+class PredictionIndisponible(RuntimeError):
+    """Prédicteur arrêté, ou pas de réponse à temps : faire le predict soi-même."""
+
+
+class PredicteurParLots:
+    """
+    File de prédictions vidée par lots par un thread de fond.
+
+    fonction_predict reçoit un tableau 2D (une ligne par requête)
+    et doit retourner une prédiction par ligne.
+    """
+
+    def __init__(
+        self,
+        fonction_predict,
+        taille_max: int = 64,
+        attente_max_us: int = 500,
+        profondeur_max: int = 10_000,
+    ):
+        self.fonction_predict = fonction_predict
+        self.taille_max = taille_max
+        self.attente_max_us = attente_max_us
+        self._file = queue.Queue(maxsize=profondeur_max)
+        self._arret = threading.Event()
+
+        # Métriques — écrites uniquement par le thread de fond
+        self._nb_lots = 0
+        self._nb_lignes = 0
+        self._taille_max_observee = 0
+        self._attente_max_observee_s = 0.0
+        self._latence_totale_s = 0.0
+        self._latence_max_s = 0.0
+        self._derniere_latence_s = 0.0
+
+        self._thread = threading.Thread(
+            target=self._boucle, name="prediction-par-lots", daemon=True
+        )
+        self._thread.start()
+
+    def soumettre(self, ligne, timeout: float = TIMEOUT_S) -> Future:
+        """
+        Dépose une ligne de features et retourne le Future de sa prédiction.
+        File pleine : on attend au plus `timeout` (backpressure), puis PredictionIndisponible.
+        """
+        if self._arret.is_set():
+            raise PredictionIndisponible("Prédicteur par lots arrêté")
+        futur = Future()
+        try:
+            self._file.put((ligne, futur, time.perf_counter()), timeout=timeout)
+        except queue.Full:
+            raise PredictionIndisponible(f"File de prédiction pleine depuis {timeout}s") from None
+        return futur
+
+    def predire(self, ligne, timeout: float = TIMEOUT_S):
+        """Version bloquante de soumettre(), jamais plus de `timeout` secondes en tout."""
+        limite = time.perf_counter() + timeout
+        futur = self.soumettre(ligne, timeout)
+        try:
+            return futur.result(max(limite - time.perf_counter(), 0))
+        except FuturExpire:
+            raise PredictionIndisponible(f"Pas de prédiction en {timeout}s") from None
+
+    def arreter(self):
+        """Arrête le thread de fond (les lignes encore en file sont traitées avant)."""
+        self._arret.set()
+        self._thread.join(timeout=1)
+        # Déposées entre le test de _arret et la fin du thread : personne ne les lira
+        while True:
+            try:
+                _, futur, _ = self._file.get_nowait()
+            except queue.Empty:
+                break
+            futur.set_exception(PredictionIndisponible("Prédicteur par lots arrêté"))
+
+    def _boucle(self):
+        attente_max_s = self.attente_max_us / 1e6
+        while not self._arret.is_set() or not self._file.empty():
+            try:
+                premier = self._file.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            lot = [premier]
+            limite = time.perf_counter() + attente_max_s
+            while len(lot) < self.taille_max:
+                reste = limite - time.perf_counter()
+                if reste <= 0:
+                    break
+                try:
+                    lot.append(self._file.get(timeout=reste))
+                except queue.Empty:
+                    break
+
+            self._traiter(lot)
+
+    def _traiter(self, lot: list):
+        debut = time.perf_counter()
+        try:
+            predictions = self.fonction_predict(np.array([ligne for ligne, _, _ in lot]))
+        except Exception as e:
+            for _, futur, _ in lot:
+                futur.set_exception(e)
+            predictions = None
+
+        if predictions is not None:
+            for (_, futur, _), prediction in zip(lot, predictions):
+                futur.set_result(prediction)
+
+        fin = time.perf_counter()
+        latence = fin - debut
+        self._nb_lots += 1
+        self._nb_lignes += len(lot)
+        self._taille_max_observee = max(self._taille_max_observee, len(lot))
+        self._attente_max_observee_s = max(
+            self._attente_max_observee_s, debut - min(t for _, _, t in lot)
+        )
+        self._latence_totale_s += latence
+        self._latence_max_s = max(self._latence_max_s, latence)
+        self._derniere_latence_s = latence
+
+    def metriques(self) -> dict:
+        """Taille des lots, attente max, profondeur de file et latence par lot."""
+        nb_lots = self._nb_lots
+        return {
+            "taille_max_lot": self.taille_max,
+            "attente_max_us": self.attente_max_us,
+            "profondeur_file": self._file.qsize(),
+            "nb_lots": nb_lots,
+            "nb_predictions": self._nb_lignes,
+            "taille_moyenne_lot": self._nb_lignes / nb_lots if nb_lots else 0.0,
+            "taille_max_observee": self._taille_max_observee,
+            "attente_max_observee_us": self._attente_max_observee_s * 1e6,
+            "latence_moyenne_lot_ms": self._latence_totale_s / nb_lots * 1e3 if nb_lots else 0.0,
+            "latence_max_lot_ms": self._latence_max_s * 1e3,
+            "derniere_latence_lot_ms": self._derniere_latence_s * 1e3,
+        }
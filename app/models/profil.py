@@ -0,0 +1,473 @@
+"""
+profil.py — Profil utilisateur compact (__slots__ + historique en buffer circulaire)
+Auteur : Moi (ESIEA 3A)
+
+Avant, un profil c'était un dict avec un "historique" = liste de 50 dicts max,
+re-slicée avec [-50:] à chaque réponse. Avec des centaines de milliers d'apprenants,
+tous ces petits dicts coûtent cher en RAM et en GC.
+
+Ici :
+- une classe à __slots__ (pas de __dict__ par instance)
+- l'historique est un buffer circulaire préalloué de 4 tableaux typés parallèles :
+  question_id (int32), score (int8), temps (float32), code sujet (uint8)
+- les sujets sont codés sur un octet via un petit registre global
+
+La propriété `historique` reconstruit l'ancienne liste de dicts si besoin
+(debug, export) mais le chemin chaud n'y touche pas.
+
+En plus, le profil tient des compteurs glissants mis à jour en O(1) quand une
+entrée entre dans la fenêtre de 50 (et qu'une autre en sort) : tentatives et
+réussites par sujet, réussites sur les 10 dernières, et le score pondéré à
+décroissance exponentielle de calculer_score_ponderer (utils/helpers.py).
+Plus besoin de re-parcourir l'historique à chaque réponse ou à chaque /stats.
+
+vers_octets / depuis_octets : le profil entier en quelques centaines d'octets
+(en-tête struct + les tableaux tels quels), pour le débord sur disque du cache
+(voir cache_profils.py).
+"""
+
+import struct
+from array import array
+
+import numpy as np
+
+from app.models.vus import EnsembleVus
+
+TAILLE_HISTORIQUE = 50
+FENETRE_RECENTE = 10  # pour la progression (cf. _calculer_progression)
+NIVEAU_INITIAL = 2  # on commence en niveau intermédiaire
+
+# Taille fixe des 4 tableaux de l'historique (int32 + int8 + float32 + uint8 par entrée)
+OCTETS_HISTORIQUE = TAILLE_HISTORIQUE * (4 + 1 + 4 + 1)
+
+# RAM d'un profil vide, en-têtes Python compris (objet + 6 array + liste + user_id ≈ 1350
+# octets mesurés avec sys.getsizeof), plus son entrée dans le cache
+OCTETS_PROFIL_FIXE = 1500
+
+# Sérialisation : version, niveau, score_total, nb_questions, bonnes_reponses, tête,
+# taille, réussites récentes, score pondéré, nb de sujets comptés, nb de sujets faibles,
+# taille de etat_moteur, nb de questions vues. Les tableaux suivent, dans l'ordre
+# natif de la machine (débord et journal restent sur la machine, pas un format d'échange).
+FORMAT_SERIALISATION = 1
+_ENTETE = struct.Struct("<BbiiiBBBdBBHI")
+
+# Enregistrement de TAILLE FIXE pour le snapshot (voir journal.py), lisible en mmap
+# comme un tableau numpy de DTYPE_ENREGISTREMENT. Ce qui ne rentre pas dans les cases
+# fixes va dans un "tas" à côté (tas_offset, tas_taille) :
+#   [u16 longueur de l'user_id s'il dépasse 48 octets][user_id][questions vues en u32]
+# et si le profil déborde des cases (plus de 8 sujets, état moteur plus grand),
+# format = 1 et le tas contient l'image vers_octets complète à la place des vues.
+TAILLE_ID_FIXE = 48
+SUJETS_FIXES = 8
+ETAT_FIXE = 2 + 2 * SUJETS_FIXES  # θ global, n, puis (Δ, n) par sujet (cf. moteurs.py)
+_FIXE_DEBUT = struct.Struct(f"={TAILLE_ID_FIXE}sBbBBBiiid")
+_FIXE_FIN = struct.Struct(f"={SUJETS_FIXES}sB{ETAT_FIXE}fQI")
+_AUCUN_SUJET = 0xFF
+_LONGUEUR_ID = struct.Struct("=H")
+DTYPE_ENREGISTREMENT = np.dtype(
+    [
+        ("user_id", f"S{TAILLE_ID_FIXE}"),
+        ("format", "u1"),
+        ("niveau_actuel", "i1"),
+        ("tete", "u1"),
+        ("taille", "u1"),
+        ("reussites_recentes", "u1"),
+        ("score_total", "=i4"),
+        ("nb_questions", "=i4"),
+        ("bonnes_reponses", "=i4"),
+        ("score_pondere", "=f8"),
+        ("question_ids", "=i4", (TAILLE_HISTORIQUE,)),
+        ("scores", "i1", (TAILLE_HISTORIQUE,)),
+        ("temps", "=f4", (TAILLE_HISTORIQUE,)),
+        ("sujets", "u1", (TAILLE_HISTORIQUE,)),
+        ("tentatives", "u1", (SUJETS_FIXES,)),
+        ("reussites", "u1", (SUJETS_FIXES,)),
+        ("faibles", "u1", (SUJETS_FIXES,)),  # codes dans l'ordre, 0xFF = case vide
+        ("nb_etat", "u1"),
+        ("etat_moteur", "=f4", (ETAT_FIXE,)),
+        ("tas_offset", "=u8"),
+        ("tas_taille", "=u4"),
+    ]
+)
+_DEBUT_FIN = DTYPE_ENREGISTREMENT.itemsize - _FIXE_FIN.size
+assert _DEBUT_FIN == _FIXE_DEBUT.size + OCTETS_HISTORIQUE + 2 * SUJETS_FIXES
+
+# Même facteur d'oubli que calculer_score_ponderer (decay=0.9 par défaut)
+DECAY_SCORE = 0.9
+_DECAY_SORTIE = DECAY_SCORE**TAILLE_HISTORIQUE
+
+# Somme des poids pour n entrées, calculée comme dans calculer_score_ponderer
+_POIDS_TOTAUX = [0.0]
+_poids = 1.0
+for _ in range(TAILLE_HISTORIQUE):
+    _POIDS_TOTAUX.append(_POIDS_TOTAUX[-1] + _poids)
+    _poids *= DECAY_SCORE
+
+# Registre des sujets ↔ code sur 1 octet. Les 4 sujets connus d'abord,
+# les autres sont ajoutés à la volée (max 256).
+SUJETS_CONNUS = ["python", "algo", "math", "bdd"]
+_noms_sujets: list = list(SUJETS_CONNUS)
+_codes_sujets: dict = {nom: code for code, nom in enumerate(_noms_sujets)}
+
+
+def code_sujet(sujet: str) -> int:
+    """Code uint8 d'un sujet (enregistré au premier passage)."""
+    code = _codes_sujets.get(sujet)
+    if code is None:
+        if len(_noms_sujets) >= 256:
+            raise ValueError("Trop de sujets différents (256 max)")
+        code = len(_noms_sujets)
+        _noms_sujets.append(sujet)
+        _codes_sujets[sujet] = code
+    return code
+
+
+def nom_sujet(code: int) -> str:
+    return _noms_sujets[code]
+
+
+def sujets_enregistres() -> list:
+    """Tous les sujets du registre, dans l'ordre des codes."""
+    return list(_noms_sujets)
+
+
+class Profil:
+    """Profil d'un apprenant. Mêmes champs que l'ancien dict, en attributs."""
+
+    __slots__ = (
+        "user_id",
+        "niveau_actuel",
+        "score_total",
+        "nb_questions",
+        "bonnes_reponses",
+        "sujets_faibles",
+        "_question_ids",
+        "_scores",
+        "_temps",
+        "_sujets",
+        "_tete",
+        "_taille",
+        "_tentatives",
+        "_reussites",
+        "_reussites_recentes",
+        "_score_pondere",
+        "etat_moteur",
+        "questions_prechargees",
+        "vus",
+    )
+
+    def __init__(self, user_id: str, niveau_actuel: int = NIVEAU_INITIAL):
+        self.user_id = user_id
+        self.niveau_actuel = niveau_actuel
+        self.score_total = 0
+        self.nb_questions = 0
+        self.bonnes_reponses = 0
+        self.sujets_faibles = []  # sujets où l'utilisateur a du mal
+
+        # Buffer circulaire : _tete = prochaine case écrite, _taille = nb d'entrées valides
+        self._question_ids = array("i", bytes(4 * TAILLE_HISTORIQUE))
+        self._scores = array("b", bytes(TAILLE_HISTORIQUE))
+        self._temps = array("f", bytes(4 * TAILLE_HISTORIQUE))
+        self._sujets = array("B", bytes(TAILLE_HISTORIQUE))
+        self._tete = 0
+        self._taille = 0
+
+        # Compteurs glissants sur la fenêtre (uint8 suffit : 50 entrées max)
+        self._tentatives = array("B", bytes(len(SUJETS_CONNUS)))
+        self._reussites = array("B", bytes(len(SUJETS_CONNUS)))
+        self._reussites_recentes = 0
+        self._score_pondere = 0.0  # numérateur : somme des score * decay^age
+
+        # État propre au moteur d'adaptation (ex. capacités Elo), None tant qu'il n'a servi
+        self.etat_moteur = None
+
+        # File de prochaines questions préparées en fond : (clé de sélection, liste) ou None
+        self.questions_prechargees = None
+
+        # question_id déjà répondues (EnsembleVus, voir vus.py), créé à la première réponse
+        self.vus = None
+
+    # --- Sérialisation compacte ---
+
+    def vers_octets(self) -> bytes:
+        """Tout le profil sauf la file de questions préchargées (c'est un cache)."""
+        faibles = bytes(code_sujet(s) for s in self.sujets_faibles)
+        etat = self.etat_moteur if self.etat_moteur is not None else array("f")
+        vus = self.vus.valeurs().astype("u4").tobytes() if self.vus is not None else b""
+        return b"".join(
+            (
+                _ENTETE.pack(
+                    FORMAT_SERIALISATION,
+                    self.niveau_actuel,
+                    self.score_total,
+                    self.nb_questions,
+                    self.bonnes_reponses,
+                    self._tete,
+                    self._taille,
+                    self._reussites_recentes,
+                    self._score_pondere,
+                    len(self._tentatives),
+                    len(faibles),
+                    len(etat),
+                    len(vus) // 4,
+                ),
+                self._question_ids.tobytes(),
+                self._scores.tobytes(),
+                self._temps.tobytes(),
+                self._sujets.tobytes(),
+                self._tentatives.tobytes(),
+                self._reussites.tobytes(),
+                faibles,
+                etat.tobytes(),
+                vus,
+            )
+        )
+
+    @classmethod
+    def depuis_octets(cls, user_id: str, donnees: bytes) -> "Profil":
+        """Inverse de vers_octets."""
+        (
+            version, niveau, score_total, nb_questions, bonnes_reponses, tete, taille,
+            recentes, score_pondere, nb_sujets, nb_faibles, nb_etat, nb_vus,
+        ) = _ENTETE.unpack_from(donnees)
+        if version != FORMAT_SERIALISATION:
+            raise ValueError(f"Format de profil inconnu : {version}")
+
+        profil = cls(user_id, niveau)
+        profil.score_total = score_total
+        profil.nb_questions = nb_questions
+        profil.bonnes_reponses = bonnes_reponses
+        profil._tete = tete
+        profil._taille = taille
+        profil._reussites_recentes = recentes
+        profil._score_pondere = score_pondere
+
+        vue = memoryview(donnees)[_ENTETE.size:]
+        for tableau in (profil._question_ids, profil._scores, profil._temps, profil._sujets):
+            taille_octets = TAILLE_HISTORIQUE * tableau.itemsize
+            del tableau[:]
+            tableau.frombytes(vue[:taille_octets])
+            vue = vue[taille_octets:]
+        profil._tentatives = array("B", vue[:nb_sujets])
+        profil._reussites = array("B", vue[nb_sujets : 2 * nb_sujets])
+        vue = vue[2 * nb_sujets :]
+        profil.sujets_faibles = [nom_sujet(code) for code in vue[:nb_faibles]]
+        vue = vue[nb_faibles:]
+        if nb_etat:
+            profil.etat_moteur = array("f")
+            profil.etat_moteur.frombytes(vue[: 4 * nb_etat])
+        vue = vue[4 * nb_etat :]
+        if nb_vus:
+            profil.vus = EnsembleVus.depuis_valeurs(np.frombuffer(vue[: 4 * nb_vus], "u4"))
+        return profil
+
+    def vers_enregistrement(self, tas_offset: int) -> tuple:
+        """(enregistrement de taille fixe, tas) pour le snapshot ; le tas ira à tas_offset."""
+        id_octets = self.user_id.encode()
+        id_long = id_octets if len(id_octets) > TAILLE_ID_FIXE else b""
+        etat = self.etat_moteur if self.etat_moteur is not None else ()
+        codes_faibles = [code_sujet(s) for s in self.sujets_faibles]
+        complet = (
+            len(self._tentatives) <= SUJETS_FIXES
+            and len(etat) <= ETAT_FIXE
+            and all(code < SUJETS_FIXES for code in codes_faibles)
+        )
+        if complet:
+            reste = self.vus.valeurs().astype("u4").tobytes() if self.vus is not None else b""
+        else:
+            reste = self.vers_octets()
+        tas = _LONGUEUR_ID.pack(len(id_long)) + id_long + reste if id_long or reste else b""
+
+        faibles = bytes(codes_faibles if complet else ()).ljust(SUJETS_FIXES, b"\xff")
+        etat_fixe = list(etat) if complet else []
+        bourrage_sujets = bytes(SUJETS_FIXES - len(self._tentatives)) if complet else b""
+        enregistrement = b"".join(
+            (
+                _FIXE_DEBUT.pack(
+                    id_octets[:TAILLE_ID_FIXE],
+                    0 if complet else 1,
+                    self.niveau_actuel,
+                    self._tete,
+                    self._taille,
+                    self._reussites_recentes,
+                    self.score_total,
+                    self.nb_questions,
+                    self.bonnes_reponses,
+                    self._score_pondere,
+                ),
+                self._question_ids.tobytes(),
+                self._scores.tobytes(),
+                self._temps.tobytes(),
+                self._sujets.tobytes(),
+                (self._tentatives.tobytes() + bourrage_sujets)[:SUJETS_FIXES],
+                (self._reussites.tobytes() + bourrage_sujets)[:SUJETS_FIXES],
+                _FIXE_FIN.pack(
+                    faibles,
+                    len(etat_fixe),
+                    *etat_fixe,
+                    *[0.0] * (ETAT_FIXE - len(etat_fixe)),
+                    tas_offset if tas else 0,
+                    len(tas),
+                ),
+            )
+        )
+        return enregistrement, tas
+
+    @classmethod
+    def depuis_enregistrement(cls, enregistrement, tas) -> "Profil":
+        """
+        Inverse de vers_enregistrement. `enregistrement` : les octets d'une case du
+        snapshot ; `tas` : les tas_taille octets de son tas (vide s'il n'en a pas).
+        """
+        (
+            id_octets, format_, niveau, tete, taille, recentes,
+            score_total, nb_questions, bonnes_reponses, score_pondere,
+        ) = _FIXE_DEBUT.unpack_from(enregistrement)
+        faibles, nb_etat, *reste_fin = _FIXE_FIN.unpack_from(enregistrement, _DEBUT_FIN)
+        etat = reste_fin[:ETAT_FIXE]
+
+        tas = memoryview(tas)
+        if len(tas):
+            (longueur_id,) = _LONGUEUR_ID.unpack_from(tas)
+            if longueur_id:
+                id_octets = bytes(tas[2 : 2 + longueur_id])
+            tas = tas[2 + longueur_id :]
+        user_id = id_octets.rstrip(b"\0").decode()
+        if format_ == 1:
+            return cls.depuis_octets(user_id, tas)
+
+        profil = cls(user_id, niveau)
+        profil.score_total = score_total
+        profil.nb_questions = nb_questions
+        profil.bonnes_reponses = bonnes_reponses
+        profil._tete = tete
+        profil._taille = taille
+        profil._reussites_recentes = recentes
+        profil._score_pondere = score_pondere
+
+        vue = memoryview(enregistrement)[_FIXE_DEBUT.size :]
+        for tableau in (profil._question_ids, profil._scores, profil._temps, profil._sujets):
+            taille_octets = TAILLE_HISTORIQUE * tableau.itemsize
+            del tableau[:]
+            tableau.frombytes(vue[:taille_octets])
+            vue = vue[taille_octets:]
+        # Les sujets au-delà des 4 connus n'ont une case que s'ils ont servi
+        nb_sujets = max(len(SUJETS_CONNUS), max(profil._sujets[: taille] or [0]) + 1)
+        codes_faibles = [code for code in faibles if code != _AUCUN_SUJET]
+        nb_sujets = max([nb_sujets] + [code + 1 for code in codes_faibles])
+        profil._tentatives = array("B", vue[:nb_sujets])
+        profil._reussites = array("B", vue[SUJETS_FIXES : SUJETS_FIXES + nb_sujets])
+        profil.sujets_faibles = [nom_sujet(code) for code in codes_faibles]
+        if nb_etat:
+            profil.etat_moteur = array("f", etat[:nb_etat])
+        if len(tas):
+            profil.vus = EnsembleVus.depuis_valeurs(np.frombuffer(tas, "u4"))
+        return profil
+
+    def octets_estimes(self) -> int:
+        """Estimation de la RAM du profil (objet + tableaux + questions vues), pour le cache."""
+        total = OCTETS_PROFIL_FIXE
+        if self.etat_moteur is not None:
+            total += 4 * len(self.etat_moteur)
+        if self.vus is not None:
+            total += self.vus.octets() + 100 * len(self.vus._blocs)
+        return total
+
+    # --- Historique ---
+
+    def ajouter(self, question_id: int, score: int, temps: float, code: int):
+        """
+        Ajoute une entrée ; si le buffer est plein, la plus ancienne est écrasée.
+        Les compteurs glissants sont ajustés pour l'entrée qui entre et celle qui sort.
+        """
+        i = self._tete
+        plein = self._taille == TAILLE_HISTORIQUE
+        # En premier : c'est la seule écriture qui peut lever (OverflowError hors int32),
+        # rien n'a encore été modifié dans ce cas
+        self._question_ids[i] = question_id
+
+        # L'entrée qui sort des 10 dernières (elle reste dans la fenêtre de 50)
+        if self._taille >= FENETRE_RECENTE:
+            self._reussites_recentes -= self._scores[(i - FENETRE_RECENTE) % TAILLE_HISTORIQUE]
+
+        score_sortant = 0
+        if plein:
+            # L'entrée écrasée sort complètement de la fenêtre
+            score_sortant = self._scores[i]
+            self._tentatives[self._sujets[i]] -= 1
+            self._reussites[self._sujets[i]] -= score_sortant
+
+        self._scores[i] = score
+        self._temps[i] = temps
+        self._sujets[i] = code
+        self._tete = (i + 1) % TAILLE_HISTORIQUE
+        if not plein:
+            self._taille += 1
+
+        if code >= len(self._tentatives):
+            # Sujet ajouté au registre après la création du profil
+            manque = code + 1 - len(self._tentatives)
+            self._tentatives.extend(bytes(manque))
+            self._reussites.extend(bytes(manque))
+        self._tentatives[code] += 1
+        self._reussites[code] += score
+        self._reussites_recentes += score
+
+        # Toutes les entrées vieillissent d'un cran (× decay), la nouvelle a un poids 1,
+        # et celle qui sort aurait eu un poids decay^50
+        self._score_pondere = (
+            score + DECAY_SCORE * self._score_pondere - score_sortant * _DECAY_SORTIE
+        )
+
+    def nb_historique(self) -> int:
+        return self._taille
+
+    def _indices(self, n: int = None):
+        """Indices des n entrées les plus récentes, de la plus ancienne à la plus récente."""
+        n = self._taille if n is None else min(n, self._taille)
+        debut = self._tete - n
+        return [(debut + k) % TAILLE_HISTORIQUE for k in range(n)]
+
+    def scores_recents(self, n: int) -> list:
+        """Scores des n dernières réponses (ordre chronologique)."""
+        return [self._scores[i] for i in self._indices(n)]
+
+    def stats_sujet(self, code: int) -> tuple:
+        """(tentatives, réussites) sur la fenêtre pour un sujet — O(1)."""
+        if code >= len(self._tentatives):
+            return 0, 0
+        return self._tentatives[code], self._reussites[code]
+
+    def nb_recents(self) -> int:
+        """Nombre d'entrées dans la fenêtre des 10 dernières."""
+        return min(self._taille, FENETRE_RECENTE)
+
+    def reussites_recentes(self) -> int:
+        """Bonnes réponses parmi les 10 dernières — O(1)."""
+        return self._reussites_recentes
+
+    def score_pondere(self) -> float:
+        """Même valeur que calculer_score_ponderer(historique), sans le parcourir."""
+        if self._taille == 0:
+            return 0.0
+        return self._score_pondere / _POIDS_TOTAUX[self._taille]
+
+    @property
+    def historique(self) -> list:
+        """L'historique au format d'origine (liste de dicts) — pour debug / export."""
+        return [
+            {
+                "question_id": self._question_ids[i],
+                "score": self._scores[i],
+                "temps": self._temps[i],
+                "sujet": nom_sujet(self._sujets[i]),
+            }
+            for i in self._indices()
+        ]
+
+    def octets_historique(self) -> int:
+        """Octets occupés par les données de l'historique (hors en-têtes Python)."""
+        return sum(
+            a.itemsize * len(a)
+            for a in (self._question_ids, self._scores, self._temps, self._sujets)
+        )
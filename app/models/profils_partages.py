@@ -0,0 +1,416 @@
+"""
+profils_partages.py — Table de profils en mémoire partagée entre les workers uvicorn
+Auteur : Moi (ESIEA 3A)
+
+Avec `uvicorn app.main:app --workers N`, chaque worker avait son propre user_profiles :
+les réponses d'un même apprenant tombaient dans des process différents et son niveau
+dépendait du worker qui répondait. Ici tous les workers de la machine partagent UNE
+table, un fichier en mémoire partagée (/dev/shm) ouvert en mmap par chacun :
+
+    [en-tête 4 Ko][case 0][case 1]...[case capacite-1]      (cases de taille fixe)
+    case = [seq u32, etat u8, -, longueur_id u16, hash u64, longueur_donnees u32, -]
+           [user_id][Profil.vers_octets()]
+
+- index : table de hachage à adressage ouvert (sondage linéaire) sur un hash stable
+  du user_id (blake2b, pas hash() qui change d'un process à l'autre). Une case prise
+  ne redevient jamais VIDE : une suppression la laisse en "pierre tombale" (RESERVEE,
+  sans profil), que la prochaine insertion de n'importe quel user_id peut reprendre.
+  Un user_id est donc toujours avant la première case vide de sa séquence de sondage
+  → lecture sans verrou (la clé est revérifiée sous le seqlock).
+- insertion : seulement quand il y a un profil à écrire (un user_id inconnu dont
+  charger() ne trouve rien ne prend pas de case). Un verrou d'insertion par bande de
+  hash (octet de l'en-tête) empêche de poser deux fois le même user_id.
+- écriture : verrou PAR CASE, un verrou fcntl sur un octet de la case (marche entre
+  process sans lien de parenté, relâché par le noyau si le worker meurt) + un verrou
+  threading par "bande" de cases (les verrous fcntl appartiennent au process, pas au
+  thread). update_user_profile garde le verrou de la lecture à l'écriture (modifier) :
+  deux workers qui traitent deux réponses du même apprenant ne perdent rien.
+- lecture (GET /stats, /questions) : seqlock, sans verrou. L'écrivain passe seq à
+  impair, écrit, repasse à pair ; le lecteur recommence si seq a bougé pendant sa copie.
+
+La table a la même interface que CacheProfils (obtenir, get, pop, clear, len,
+metriques, modifier, retirer). Mais ce qui en sort est une COPIE décodée : le
+préchargement de questions (gardé sur l'objet Profil) n'y survit pas.
+
+Limites : capacité fixe (TablePleine quand il ne reste ni case vide ni pierre tombale,
+→ 503 dans les routes : augmenter PROFILS_PARTAGES_CAPACITE et redémarrer) ; un
+profil dont l'image dépasse la case perd ses questions vues (comme au-delà de MAX_VUS) ;
+le seqlock suppose l'ordre des écritures de x86 (TSO).
+Activé par PROFILS_PARTAGES=<nom> (voir cache_profils.creer_cache_depuis_env).
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from app.models.profil import Profil
+from app.utils.metriques import registre
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrous entre process
+    fcntl = None
+
+CAPACITE = 65_536
+OCTETS_CASE = 4096
+DOSSIER = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+MAGIQUE = b"PROFSHM2"
+TAILLE_ENTETE = 4096
+# magique, capacité, octets par case, cases prises (non vides), profils stockés
+_ENTETE = struct.Struct("<8sIIQQ")
+_CASE = struct.Struct("<IBBHQII")  # seq, etat, -, longueur_id, hash, longueur_donnees, -
+_SEQ = struct.Struct("<I")
+OFFSET_NB_PRISES = 16
+OFFSET_NB_PROFILS = 24
+OFFSET_INSERTION = 64  # un octet verrouillable par bande d'insertion
+VIDE, RESERVEE, OCCUPEE = 0, 1, 2  # RESERVEE : clé posée, pas (ou plus) de profil
+NB_BANDES = 256
+
+METRIQUE_PARTAGES = registre.compteur(
+    "profils_partages_total",
+    "Table de profils partagée : relecture (seqlock pris pendant une écriture), "
+    "vus_videes (profil trop gros pour sa case), recyclage (pierre tombale reprise)",
+    ("evenement",),
+)
+
+
+class TablePleine(RuntimeError):
+    """Plus de case libre dans la séquence de sondage (augmenter PROFILS_PARTAGES_CAPACITE)."""
+
+
+def _hash(id_octets: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(id_octets, digest_size=8).digest(), "little")
+
+
+class TableProfilsPartagee:
+    """Profils en mémoire partagée, lisibles et modifiables par tous les workers locaux."""
+
+    def __init__(
+        self,
+        nom: str,
+        capacite: int = CAPACITE,
+        octets_case: int = OCTETS_CASE,
+        dossier: str = DOSSIER,
+    ):
+        if capacite & (capacite - 1):
+            raise ValueError("La capacité doit être une puissance de 2")
+        self.chemin = os.path.join(dossier or "/tmp", f"profils_partages_{nom}")
+        self._fd = os.open(self.chemin, os.O_RDWR | os.O_CREAT, 0o600)
+        taille = TAILLE_ENTETE + capacite * octets_case
+
+        # Le premier worker crée la table, les suivants l'ouvrent telle quelle
+        self._verrouiller(0)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, taille)  # tmpfs : les pages sont allouées à l'usage
+                os.pwrite(self._fd, _ENTETE.pack(MAGIQUE, capacite, octets_case, 0, 0), 0)
+            magique, capacite, octets_case, _, _ = _ENTETE.unpack(
+                os.pread(self._fd, _ENTETE.size, 0)
+            )
+            if magique != MAGIQUE:
+                raise ValueError(f"{self.chemin} n'est pas une table de profils partagée")
+        finally:
+            self._deverrouiller(0)
+
+        self.capacite = capacite
+        self.octets_case = octets_case
+        self._masque = capacite - 1
+        self._mm = mmap.mmap(self._fd, TAILLE_ENTETE + capacite * octets_case)
+        self._bandes = [threading.Lock() for _ in range(NB_BANDES)]
+        self._bandes_insertion = [threading.Lock() for _ in range(NB_BANDES)]
+        # Même raison que les bandes pour le compteur de l'en-tête : sans lui, deux threads
+        # qui réservent en même temps passent tous les deux le verrou fcntl (il est au
+        # process) et le LOCK_UN de l'un relâche celui de l'autre
+        self._verrou_entete = threading.Lock()
+
+    # --- Verrous ---
+
+    def _verrouiller(self, offset: int):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, offset)
+
+    def _deverrouiller(self, offset: int):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+
+    @contextmanager
+    def _verrou_case(self, i: int):
+        offset = TAILLE_ENTETE + i * self.octets_case
+        with self._bandes[i % NB_BANDES]:
+            self._verrouiller(offset)
+            try:
+                yield offset
+            finally:
+                self._deverrouiller(offset)
+
+    # --- Index ---
+
+    def _cle(self, offset: int) -> tuple:
+        """(etat, hash, user_id en octets) d'une case, lus sans verrou."""
+        _, etat, _, longueur_id, h, _, _ = _CASE.unpack_from(self._mm, offset)
+        debut = offset + _CASE.size
+        return etat, h, self._mm[debut : debut + longueur_id]
+
+    def _sonder(self, id_octets: bytes, h: int):
+        """Cases de la séquence de sondage : (i, offset, etat, c'est notre clé)."""
+        i = h & self._masque
+        for _ in range(self.capacite):
+            offset = TAILLE_ENTETE + i * self.octets_case
+            etat, h_case, id_case = self._cle(offset)
+            yield i, offset, etat, etat != VIDE and h_case == h and id_case == id_octets
+            i = (i + 1) & self._masque
+
+    def _trouver(self, id_octets: bytes, h: int) -> int:
+        """Offset de la case de ce user_id, -1 s'il n'en a pas."""
+        for _, offset, etat, a_nous in self._sonder(id_octets, h):
+            if a_nous:
+                return offset
+            if etat == VIDE:
+                return -1
+        return -1
+
+    @contextmanager
+    def _case_de(self, id_octets: bytes, h: int):
+        """Case (verrouillée) qui porte ce user_id, profil ou pas ; -1 s'il n'en a aucune."""
+        while True:
+            offset = self._trouver(id_octets, h)
+            if offset < 0:
+                yield -1
+                return
+            with self._verrou_case((offset - TAILLE_ENTETE) // self.octets_case):
+                etat, h_case, id_case = self._cle(offset)
+                if etat != VIDE and h_case == h and id_case == id_octets:
+                    yield offset
+                    return
+            # pierre tombale reprise par un autre user_id entre-temps : on recherche
+
+    @contextmanager
+    def _case_a_creer(self, id_octets: bytes, h: int):
+        """
+        Case (verrouillée) de ce user_id, prise au besoin sur la première case vide ou
+        pierre tombale de sa séquence. Le verrou d'insertion de sa bande reste tenu.
+        """
+        bande = h % NB_BANDES
+        with self._bandes_insertion[bande]:
+            self._verrouiller(OFFSET_INSERTION + bande)
+            try:
+                with self._case_de(id_octets, h) as offset:
+                    if offset >= 0:
+                        yield offset
+                        return
+                for i, _, etat, _ in self._sonder(id_octets, h):
+                    if etat == OCCUPEE:
+                        continue
+                    with self._verrou_case(i) as offset:
+                        if self._cle(offset)[0] == OCCUPEE:
+                            continue  # un autre worker vient d'y écrire : on sonde plus loin
+                        self._reserver(offset, id_octets, h)
+                        yield offset
+                        return
+                raise TablePleine(f"Table de profils pleine ({self.capacite} cases)")
+            finally:
+                self._deverrouiller(OFFSET_INSERTION + bande)
+
+    def _reserver(self, offset: int, id_octets: bytes, h: int):
+        """Pose la clé dans une case vide ou une pierre tombale (verrou de la case tenu)."""
+        if _CASE.size + len(id_octets) > self.octets_case:
+            raise ValueError(f"user_id trop long pour la table partagée ({len(id_octets)} octets)")
+        etait_vide = self._cle(offset)[0] == VIDE
+        (seq,) = _SEQ.unpack_from(self._mm, offset)
+        _SEQ.pack_into(self._mm, offset, seq + 1)  # impair : la clé change
+        debut = offset + _CASE.size
+        self._mm[debut : debut + len(id_octets)] = id_octets
+        # etat en dernier : un lecteur qui voit RESERVEE voit aussi la clé
+        _CASE.pack_into(self._mm, offset, seq + 1, RESERVEE, 0, len(id_octets), h, 0, 0)
+        _SEQ.pack_into(self._mm, offset, seq + 2)
+        if etait_vide:
+            self._compter(OFFSET_NB_PRISES, 1)
+        else:
+            METRIQUE_PARTAGES.inc("recyclage")
+
+    def _compter(self, offset_compteur: int, delta: int):
+        """Compteur u64 de l'en-tête, sous le verrou de l'en-tête."""
+        with self._verrou_entete:
+            self._verrouiller(0)
+            try:
+                (nb,) = struct.unpack_from("<Q", self._mm, offset_compteur)
+                struct.pack_into("<Q", self._mm, offset_compteur, nb + delta)
+            finally:
+                self._deverrouiller(0)
+
+    # --- Lecture / écriture d'une case ---
+
+    def _lire(self, offset: int, id_octets: bytes, user_id: str):
+        """
+        Profil de la case s'il est bien à ce user_id (la case a pu être reprise depuis le
+        sondage). Seqlock : on recommence si un écrivain est passé.
+        """
+        while True:
+            (seq,) = _SEQ.unpack_from(self._mm, offset)
+            if seq & 1:
+                METRIQUE_PARTAGES.inc("relecture")
+                time.sleep(0)
+                continue
+            _, etat, _, longueur_id, _, longueur, _ = _CASE.unpack_from(self._mm, offset)
+            debut = offset + _CASE.size
+            a_nous = etat == OCCUPEE and self._mm[debut : debut + longueur_id] == id_octets
+            debut += longueur_id
+            donnees = self._mm[debut : debut + longueur] if a_nous else None
+            if _SEQ.unpack_from(self._mm, offset)[0] == seq:
+                break
+            METRIQUE_PARTAGES.inc("relecture")
+        return None if donnees is None else Profil.depuis_octets(user_id, donnees)
+
+    def _ecrire(self, offset: int, profil, id_octets: bytes):
+        """Écrit le profil (ou l'efface si None) dans sa case, verrou tenu."""
+        place = self.octets_case - _CASE.size - len(id_octets)
+        donnees = b"" if profil is None else profil.vers_octets()
+        if len(donnees) > place and profil.vus is not None:
+            profil.vus.vider()  # comme au-delà de MAX_VUS : on oublie les questions vues
+            METRIQUE_PARTAGES.inc("vus_videes")
+            donnees = profil.vers_octets()
+        if len(donnees) > place:
+            raise ValueError(f"Profil de {profil.user_id} trop gros pour une case")
+
+        (seq,) = _SEQ.unpack_from(self._mm, offset)
+        _SEQ.pack_into(self._mm, offset, seq + 1)  # impair : écriture en cours
+        debut = offset + _CASE.size + len(id_octets)
+        self._mm[debut : debut + len(donnees)] = donnees
+        _, avant, _, longueur_id, h, _, _ = _CASE.unpack_from(self._mm, offset)
+        etat = RESERVEE if profil is None else OCCUPEE
+        _CASE.pack_into(self._mm, offset, seq + 1, etat, 0, longueur_id, h, len(donnees), 0)
+        _SEQ.pack_into(self._mm, offset, seq + 2)
+        if (avant == OCCUPEE) != (etat == OCCUPEE):
+            self._compter(OFFSET_NB_PROFILS, 1 if etat == OCCUPEE else -1)
+
+    # --- Interface façon CacheProfils ---
+
+    @contextmanager
+    def _case_profil(self, user_id: str, charger):
+        """
+        (offset verrouillé, clé, profil). Absent → `charger(user_id)` SANS case réservée :
+        une case n'est prise que si charger trouve un profil ; sinon (-1, clé, None).
+        """
+        id_octets = user_id.encode()
+        h = _hash(id_octets)
+        with self._case_de(id_octets, h) as offset:
+            profil = self._lire(offset, id_octets, user_id) if offset >= 0 else None
+            if profil is not None:
+                yield offset, id_octets, profil
+                return
+        profil = charger(user_id) if charger is not None else None
+        if profil is None:
+            yield -1, id_octets, None
+            return
+        with self._case_a_creer(id_octets, h) as offset:
+            # un autre worker a pu écrire ce profil pendant charger() : le sien gagne
+            existant = self._lire(offset, id_octets, user_id)
+            yield offset, id_octets, profil if existant is None else existant
+
+    @contextmanager
+    def modifier(self, user_id: str, charger=None):
+        """
+        Profil à modifier, verrou de sa case tenu jusqu'à la fin du bloc, puis réécrit.
+        Absent → `charger(user_id)` (stockage, création). Exception dans le bloc → rien
+        n'est écrit.
+        """
+        with self._case_profil(user_id, charger) as (offset, id_octets, profil):
+            yield profil
+            if profil is not None:
+                self._ecrire(offset, profil, id_octets)
+
+    @contextmanager
+    def retirer(self, user_id: str, charger=None):
+        """
+        Comme modifier(), mais la case est vidée à la fin du bloc au lieu d'être réécrite.
+        Exception dans le bloc → le profil reste.
+        """
+        with self._case_profil(user_id, charger) as (offset, id_octets, profil):
+            yield profil
+            if profil is not None:
+                self._ecrire(offset, None, id_octets)
+
+    def obtenir(self, user_id: str, charger=None):
+        """Copie du profil ; absent → `charger(user_id)`, écrit dans la table s'il existe."""
+        profil = self.get(user_id)
+        if profil is not None or charger is None:
+            return profil
+        with self.modifier(user_id, charger) as profil:
+            return profil
+
+    def get(self, user_id: str, defaut=None):
+        id_octets = user_id.encode()
+        offset = self._trouver(id_octets, _hash(id_octets))
+        profil = self._lire(offset, id_octets, user_id) if offset >= 0 else None
+        return defaut if profil is None else profil
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id: str) -> Profil:
+        profil = self.get(user_id)
+        if profil is None:
+            raise KeyError(user_id)
+        return profil
+
+    def __setitem__(self, user_id: str, profil: Profil):
+        id_octets = user_id.encode()
+        with self._case_a_creer(id_octets, _hash(id_octets)) as offset:
+            self._ecrire(offset, profil, id_octets)
+
+    def pop(self, user_id: str, defaut=None):
+        """Efface le profil (la case devient une pierre tombale, reprise à l'insertion)."""
+        id_octets = user_id.encode()
+        with self._case_de(id_octets, _hash(id_octets)) as offset:
+            profil = self._lire(offset, id_octets, user_id) if offset >= 0 else None
+            if profil is not None:
+                self._ecrire(offset, None, id_octets)
+        return defaut if profil is None else profil
+
+    def clear(self):
+        """Efface tous les profils (pour TOUS les workers)."""
+        for i in range(self.capacite):
+            if self._cle(TAILLE_ENTETE + i * self.octets_case)[0] != OCCUPEE:
+                continue
+            with self._verrou_case(i) as offset:
+                etat, _, id_case = self._cle(offset)
+                if etat == OCCUPEE:
+                    self._ecrire(offset, None, bytes(id_case))
+
+    def values(self) -> list:
+        # Les profils sont des copies : rien à faire dessus côté appelant (préchargement)
+        return []
+
+    def user_ids(self) -> list:
+        ids = []
+        for i in range(self.capacite):
+            etat, _, id_case = self._cle(TAILLE_ENTETE + i * self.octets_case)
+            if etat == OCCUPEE:
+                ids.append(bytes(id_case).decode())
+        return ids
+
+    def __len__(self) -> int:
+        """Profils stockés (pas les cases prises : voir metriques())."""
+        return struct.unpack_from("<Q", self._mm, OFFSET_NB_PROFILS)[0]
+
+    def fermer(self, supprimer: bool = False):
+        self._mm.close()
+        os.close(self._fd)
+        if supprimer:
+            os.remove(self.chemin)
+
+    def metriques(self) -> dict:
+        (prises,) = struct.unpack_from("<Q", self._mm, OFFSET_NB_PRISES)
+        return {
+            "profils": len(self),
+            "cases_prises": prises,  # jamais redevenues vides (pierres tombales comprises)
+            "capacite": self.capacite,
+            "octets_case": self.octets_case,
+            "remplissage": prises / self.capacite,
+            "pid": os.getpid(),
+        }
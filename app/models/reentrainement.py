@@ -0,0 +1,357 @@
+"""
+reentrainement.py — Ré-entraînement en fond sur les vraies réponses + bascule à chaud
+Auteur : Moi (ESIEA 3A)
+
+Le modèle n'avait jamais vu que le CSV simulé, et le ré-entraîner voulait dire
+relancer tous les workers. Maintenant :
+
+1. chaque réponse (update_user_profile) va dans un TAMPON borné (TamponReponses) :
+   score, temps, sujet et niveau de la question (la cible du modèle). Anneau numpy,
+   les plus vieilles réponses sont écrasées → mémoire fixe (~10 octets par réponse)
+2. un thread "reentrainement" se réveille toutes les `intervalle_s` secondes et, s'il y a
+   assez de nouvelles réponses, envoie une copie du tampon à un PROCESS à part
+   (ProcessPoolExecutor, spawn) : le fit ne tient jamais le GIL du process de l'API
+3. le process entraîne un candidat (voir reentrainer) :
+   - "complet" : nouvelle forêt sur CSV + tampon
+   - "arbres"  : warm start, on ajoute `arbres_ajoutes` arbres à la forêt actuelle
+   puis compare candidat et modèle actuel sur un holdout jamais vu par aucun des deux
+   (le test du CSV, même découpage que artefact.entrainer, + 20 % du tampon).
+   Candidat moins bon (au-delà de `tolerance`) → rejeté. Sinon il est écrit comme une
+   nouvelle version d'artefact (table compilée comprise) et COURANT est mis à jour
+4. de retour dans le thread, on charge la version et on remplace les globales du
+   modèle (adaptive_model.installer_modele) : les requêtes en cours finissent avec
+   l'ancien, les suivantes prennent le nouveau, aucune n'est refusée
+
+Chaque tentative est gardée dans l'historique (durée d'entraînement, durée de la
+bascule, accuracy avant/après) et comptée dans /metrics.
+
+Limite : avec plusieurs workers uvicorn, chacun a son tampon et son thread. Les autres
+workers prennent la nouvelle version à leur prochain démarrage (pointeur COURANT).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.models.compilateur import FEATURES
+from app.utils.metriques import registre
+
+TAILLE_TAMPON = 100_000
+INTERVALLE_S = 3600.0
+MIN_NOUVELLES_REPONSES = 1_000
+MODES = ("complet", "arbres")
+
+METRIQUE_REENTRAINEMENTS = registre.compteur(
+    "reentrainements_total",
+    "Ré-entraînements en tâche de fond : bascule (candidat adopté), rejete (moins bon "
+    "que le modèle actuel sur le holdout), erreur",
+    ("resultat",),
+)
+METRIQUE_BASCULE = registre.histogramme(
+    "modele_bascule_duree_secondes",
+    "Durée de la bascule à chaud vers un modèle ré-entraîné (chargement + remplacement)",
+)
+
+
+class TamponReponses:
+    """Anneau borné des dernières réponses (features + niveau de la question)."""
+
+    def __init__(self, taille_max: int = TAILLE_TAMPON):
+        self.taille_max = taille_max
+        self._scores = np.zeros(taille_max, dtype=np.int8)
+        self._temps = np.zeros(taille_max, dtype=np.float32)
+        self._sujets = np.zeros(taille_max, dtype=np.uint8)
+        self._niveaux = np.zeros(taille_max, dtype=np.int8)
+        self._noms_sujets: list = []
+        self._code_par_sujet: dict = {}
+        self._verrou = threading.Lock()
+        self.nb_total = 0  # réponses reçues depuis le démarrage (écrasées comprises)
+
+    def __len__(self) -> int:
+        return min(self.nb_total, self.taille_max)
+
+    def ajouter(self, score: int, temps_secondes: float, sujet: str, niveau: int):
+        with self._verrou:
+            code = self._code_par_sujet.get(sujet)
+            if code is None:
+                if len(self._noms_sujets) >= 255:
+                    return  # pas un vrai sujet (les vrais sont validés par la route)
+                code = self._code_par_sujet[sujet] = len(self._noms_sujets)
+                self._noms_sujets.append(sujet)
+            i = self.nb_total % self.taille_max
+            self._scores[i] = score
+            self._temps[i] = temps_secondes
+            self._sujets[i] = code
+            self._niveaux[i] = niveau
+            self.nb_total += 1
+
+    def copie(self) -> dict:
+        """Copie du contenu (picklable, pour le process d'entraînement)."""
+        with self._verrou:
+            n = len(self)
+            return {
+                "score": self._scores[:n].copy(),
+                "temps_secondes": self._temps[:n].copy(),
+                "sujet": np.array(self._noms_sujets, dtype=object)[self._sujets[:n]],
+                "niveau": self._niveaux[:n].copy(),
+                "nb_total": self.nb_total,
+            }
+
+
+# ============================================================
+# Côté process d'entraînement
+# ============================================================
+
+
+def _features(scores, temps, codes) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"score": scores, "temps_secondes": temps, "sujet_encode": codes}, columns=FEATURES
+    )
+
+
+def reentrainer(
+    dossier_artefacts: str,
+    manifeste: dict,
+    chemin_dataset: str,
+    reponses: dict,
+    mode: str = "complet",
+    arbres_ajoutes: int = 20,
+    tolerance: float = 0.0,
+    fraction_holdout: float = 0.2,
+) -> dict:
+    """
+    Entraîne un candidat sur CSV + `reponses` (TamponReponses.copie), le compare au
+    modèle de la version `manifeste` et l'écrit comme nouvelle version s'il est
+    au moins aussi bon. Tourne dans le process d'entraînement. Retourne un résumé.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+
+    from app.data.colonnes import charger_colonnes
+    from app.models import artefact
+    from app.models.compilateur import compiler_foret, verifier_table
+
+    debut = time.perf_counter()
+    courant = artefact.charger(dossier_artefacts, manifeste)
+    code_par_sujet = {str(s): code for code, s in enumerate(courant["label_encoder"].classes_)}
+
+    # Réponses du tampon : sujets inconnus du modèle écartés, 20 % gardés pour le holdout
+    codes = np.array([code_par_sujet.get(s, -1) for s in reponses["sujet"]], dtype=np.int64)
+    valides = codes >= 0
+    X_live = _features(
+        reponses["score"][valides], reponses["temps_secondes"][valides], codes[valides]
+    )
+    y_live = pd.Series(reponses["niveau"][valides].astype(np.int64))
+    ordre = np.random.default_rng(0).permutation(len(X_live))
+    nb_holdout = int(len(X_live) * fraction_holdout)
+    test_live, train_live = ordre[:nb_holdout], ordre[nb_holdout:]
+
+    X_train, y_train = [X_live.iloc[train_live]], [y_live.iloc[train_live]]
+    X_test, y_test = [X_live.iloc[test_live]], [y_live.iloc[test_live]]
+    if os.path.exists(chemin_dataset):
+        # Même découpage que artefact.entrainer : le test du CSV n'a jamais été vu
+        # par le modèle actuel, la comparaison est honnête
+        ds = charger_colonnes(chemin_dataset)
+        X_csv = _features(ds["score"], ds["temps_secondes"], ds["sujet"])
+        Xa, Xb, ya, yb = train_test_split(
+            X_csv, ds[artefact.CIBLE], test_size=0.2, random_state=42
+        )
+        X_train.insert(0, Xa)
+        y_train.insert(0, pd.Series(np.asarray(ya, dtype=np.int64)))
+        X_test.insert(0, Xb)
+        y_test.insert(0, pd.Series(np.asarray(yb, dtype=np.int64)))
+    X_train = pd.concat(X_train, ignore_index=True)
+    y_train = pd.concat(y_train, ignore_index=True)
+    X_test = pd.concat(X_test, ignore_index=True)
+    y_test = pd.concat(y_test, ignore_index=True)
+
+    # Score du modèle actuel AVANT le fit : en warm start le candidat est le même objet
+    accuracy_courant = float(courant["modele"].score(X_test, y_test))
+    if mode == "arbres":
+        candidat = courant["modele"]  # copie propre à ce process (joblib.load)
+        candidat.set_params(
+            warm_start=True, n_estimators=candidat.n_estimators + arbres_ajoutes
+        )
+    else:
+        candidat = RandomForestClassifier(n_estimators=100, max_depth=8, random_state=42)
+    candidat.fit(X_train, y_train)
+    duree_entrainement = time.perf_counter() - debut
+
+    accuracy_candidat = float(candidat.score(X_test, y_test))
+    resume = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "mode": mode,
+        "version_depart": manifeste["version"],
+        "version": None,
+        "nb_reponses": int(valides.sum()),
+        "nb_holdout": int(len(X_test)),
+        "accuracy_courant": round(accuracy_courant, 4),
+        "accuracy_candidat": round(accuracy_candidat, 4),
+        "delta_accuracy": round(accuracy_candidat - accuracy_courant, 4),
+        "duree_entrainement_s": round(duree_entrainement, 3),
+        "accepte": accuracy_candidat + tolerance >= accuracy_courant,
+    }
+    if not resume["accepte"]:
+        return resume
+
+    table = compiler_foret(candidat, courant["label_encoder"].classes_)
+    if verifier_table(table, candidat, pd.concat([X_train, X_test], ignore_index=True)):
+        table = None
+    # Index et calibration Elo ne dépendent que du CSV : repris tels quels
+    elo = courant["elo"]
+    if elo is not None:
+        infos_elo = dict(manifeste["elo"])
+        infos_elo.pop("beta_niveaux")
+        elo = {**elo, "metriques": infos_elo}
+    resultat = {
+        **courant,
+        "modele": candidat,
+        "table": table,
+        "elo": elo,
+        "metriques": {
+            **manifeste["metriques"],
+            "accuracy_test": resume["accuracy_candidat"],
+            "reentrainement": {
+                k: resume[k]
+                for k in ("mode", "version_depart", "nb_reponses", "nb_holdout",
+                          "accuracy_courant", "delta_accuracy")
+            },
+        },
+    }
+    # Même empreinte du CSV : un redémarrage ne ré-entraîne pas par-dessus
+    resume["version"] = artefact.sauvegarder(resultat, manifeste["dataset"], dossier_artefacts)
+    artefact.nettoyer_anciennes_versions(dossier_artefacts)
+    resume["duree_entrainement_s"] = round(time.perf_counter() - debut, 3)
+    return resume
+
+
+# ============================================================
+# Côté API
+# ============================================================
+
+
+class Reentraineur:
+    """
+    Thread qui déclenche les ré-entraînements et bascule le modèle.
+    `contexte()` → (dossier des artefacts, manifeste servi, chemin du CSV) ou None
+    si aucun modèle n'est chargé ; `installer(version)` charge la version et remplace
+    le modèle servi.
+    """
+
+    def __init__(
+        self,
+        tampon: TamponReponses,
+        contexte,
+        installer,
+        intervalle_s: float = INTERVALLE_S,
+        min_nouvelles: int = MIN_NOUVELLES_REPONSES,
+        mode: str = "complet",
+        arbres_ajoutes: int = 20,
+        tolerance: float = 0.0,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Mode de ré-entraînement inconnu : {mode} (attendu : {MODES})")
+        self.tampon = tampon
+        self._contexte = contexte
+        self._installer = installer
+        self.intervalle_s = intervalle_s
+        self.min_nouvelles = min_nouvelles
+        self.mode = mode
+        self.arbres_ajoutes = arbres_ajoutes
+        self.tolerance = tolerance
+        self.historique = deque(maxlen=50)
+        self._vu_jusqua = 0  # tampon.nb_total au dernier ré-entraînement
+        self._en_cours = False
+        self._verrou = threading.Lock()  # un ré-entraînement à la fois
+        self._executeur = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._arret = threading.Event()
+        self._reveil = threading.Event()
+        self._thread = threading.Thread(
+            target=self._boucle, name="reentrainement", daemon=True
+        )
+        self._thread.start()
+
+    def declencher(self):
+        """Ré-entraîne au prochain réveil du thread, même avec peu de nouvelles réponses."""
+        self._reveil.set()
+
+    def _boucle(self):
+        while not self._arret.is_set():
+            force = self._reveil.wait(self.intervalle_s)
+            self._reveil.clear()
+            if self._arret.is_set():
+                return
+            nouvelles = self.tampon.nb_total - self._vu_jusqua
+            if nouvelles > 0 and (force or nouvelles >= self.min_nouvelles):
+                self.reentrainer_maintenant()
+
+    def reentrainer_maintenant(self) -> dict:
+        """Ré-entraîne et bascule si le candidat est retenu. Bloquant (thread de fond)."""
+        with self._verrou:
+            contexte = self._contexte()
+            if contexte is None:
+                return None
+            dossier, manifeste, chemin_dataset = contexte
+            reponses = self.tampon.copie()
+            self._en_cours = True
+            try:
+                resume = self._executeur.submit(
+                    reentrainer, dossier, manifeste, chemin_dataset, reponses,
+                    self.mode, self.arbres_ajoutes, self.tolerance,
+                ).result()
+                self._vu_jusqua = reponses["nb_total"]
+                if resume["accepte"]:
+                    debut = time.perf_counter()
+                    self._installer(resume["version"])
+                    duree = time.perf_counter() - debut
+                    METRIQUE_BASCULE.observer(duree)
+                    resume["duree_bascule_ms"] = round(duree * 1e3, 1)
+                    METRIQUE_REENTRAINEMENTS.inc("bascule")
+                else:
+                    METRIQUE_REENTRAINEMENTS.inc("rejete")
+            except Exception as e:
+                print(f"[WARN] Ré-entraînement raté : {e}")
+                METRIQUE_REENTRAINEMENTS.inc("erreur")
+                resume = {"date": datetime.now().isoformat(timespec="seconds"), "erreur": str(e)}
+            finally:
+                self._en_cours = False
+
+            self.historique.append(resume)
+            if "erreur" not in resume:
+                print(
+                    f"[REENTRAINEMENT] {resume['nb_reponses']} réponses, accuracy "
+                    f"{resume['accuracy_courant']:.3f} → {resume['accuracy_candidat']:.3f} "
+                    + (
+                        f"→ version {resume['version']} (bascule {resume['duree_bascule_ms']} ms)"
+                        if resume["accepte"]
+                        else "→ candidat rejeté"
+                    )
+                )
+            return resume
+
+    def arreter(self):
+        self._arret.set()
+        self._reveil.set()
+        self._executeur.shutdown(wait=False, cancel_futures=True)
+
+    def metriques(self) -> dict:
+        dernier = next((r for r in reversed(self.historique) if "erreur" not in r), None)
+        return {
+            "mode": self.mode,
+            "reponses_tampon": len(self.tampon),
+            "reponses_recues": self.tampon.nb_total,
+            "nouvelles_reponses": self.tampon.nb_total - self._vu_jusqua,
+            "en_cours": int(self._en_cours),
+            "nb_tentatives": len(self.historique),
+            "dernier_delta_accuracy": dernier["delta_accuracy"] if dernier else None,
+            "derniere_bascule_ms": dernier.get("duree_bascule_ms") if dernier else None,
+        }
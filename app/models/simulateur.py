@@ -0,0 +1,318 @@
+"""
+simulateur.py — Simulateur vectorisé d'apprenants pour évaluer la politique d'adaptation
+Auteur : Moi (ESIEA 3A)
+
+Le simuler_progression du notebook fait avancer UN apprenant à la fois en Python :
+quelques centaines d'apprenants = plusieurs minutes. Ici les N apprenants (100k et plus)
+avancent en même temps, chacun est une case de tableaux NumPy :
+
+- niveau réel tiré comme dans generate_data.py, niveau affiché = 2 au départ (Profil)
+- à chaque pas, chacun reçoit une question de la bande niveau ± 1 (pondérée par le
+  nb de questions de chaque niveau dans l'index, comme le tirage de select_question)
+- réponse (score, temps) avec le modèle sigmoid de generate_data.repondre
+- mise à jour du niveau avec la VRAIE logique d'adaptive_model :
+    * "foret" : _predire_niveaux_lot sur tout le monde d'un coup (table compilée ou
+      sklearn), puis _lisser_niveau ; ligne non prédite → _ajuster_niveau_manuel
+    * "manuel" : _ajuster_niveau_manuel (le fallback sans modèle)
+  _lisser_niveau et _ajuster_niveau_manuel sont scalaires : on les appelle une fois sur
+  tous les états possibles (niveau × prédiction, niveau × 3 derniers scores) pour en
+  faire des tables, puis on indexe. Si quelqu'un change une des deux fonctions, le
+  simulateur suit tout seul.
+
+Non simulé : la priorité aux sujets faibles et le sans-répétition (sujet tiré au hasard).
+
+On mesure la vitesse de convergence : erreur moyenne |niveau - round(niveau réel)| à
+chaque pas, pas où le niveau réel est atteint pour la première fois, pas à partir
+duquel on reste à ± 1 jusqu'à la fin, et le coût en µs par apprenant et par pas.
+verifier() compare un résultat à des seuils → contrôle de non-régression.
+
+Lancer :
+    python -m app.models.simulateur
+    python -m app.models.simulateur --apprenants 200000 --pas 60 --politique manuel
+    python -m app.models.simulateur --verifier --apprenants 20000   # ~5 s, sortie 1 si régression
+    python -m app.models.simulateur --verifier --budget-temps       # + seuils de µs par pas
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.data.generate_data import SUJETS, repondre
+from app.models import adaptive_model
+from app.models.index_questions import NIVEAU_MAX, NIVEAU_MIN
+from app.models.profil import Profil
+
+POLITIQUES = ("foret", "manuel")
+NIVEAU_DEPART = Profil("").niveau_actuel
+
+# Seuils de non-régression (40 pas), un peu au-dessus des valeurs mesurées avec 200k
+# apprenants (tenus aussi à 20k). Attention : avec la forêt le niveau ne converge PAS
+# aujourd'hui (elle prédit la difficulté de la question posée à partir du temps, donc
+# le niveau reste collé autour de 2). Les seuils figent ce comportement pour voir
+# les régressions ; à resserrer quand la politique sera corrigée.
+# Pas de seuil sur le p50 d'atteinte pour la forêt : il vaut 0 seulement parce
+# qu'environ 40 % des apprenants ont un niveau réel de 2, celui de départ. L'erreur
+# moyenne après PAS_CONTROLE pas dit, elle, si le niveau se rapproche du niveau réel.
+# us_par_pas_max est un temps absolu qui dépend de la machine : il n'est vérifié que sur
+# demande (--budget-temps ou SIMULATEUR_BUDGET_TEMPS=1), sinon une CI lente échoue.
+PAS_CONTROLE = 10
+SEUILS = {
+    "foret": {
+        "erreur_finale_max": 1.05,
+        "erreur_pas_controle_max": 1.0,
+        "part_jamais_atteint_max": 0.5,
+        "us_par_pas_max": 3.0,
+    },
+    "manuel": {
+        "erreur_finale_max": 0.9,
+        "erreur_pas_controle_max": 0.9,
+        "part_jamais_atteint_max": 0.01,
+        "p50_atteinte_max": 4,
+        "us_par_pas_max": 0.2,
+    },
+}
+
+
+def table_lissage() -> np.ndarray:
+    """table[niveau, prediction] = _lisser_niveau(niveau, prediction), niveaux 1..5."""
+    table = np.zeros((NIVEAU_MAX + 1, NIVEAU_MAX + 1), dtype=np.int8)
+    for niveau in range(NIVEAU_MIN, NIVEAU_MAX + 1):
+        for prediction in range(NIVEAU_MIN, NIVEAU_MAX + 1):
+            table[niveau, prediction] = adaptive_model._lisser_niveau(niveau, prediction)
+    return table
+
+
+def table_ajustement_manuel() -> np.ndarray:
+    """
+    table[niveau, motif] = niveau après _ajuster_niveau_manuel, `motif` = les 3 derniers
+    scores en bits (le plus récent en bit 0). Valable dès 3 réponses dans l'historique.
+    """
+    table = np.zeros((NIVEAU_MAX + 1, 8), dtype=np.int8)
+    for niveau in range(NIVEAU_MIN, NIVEAU_MAX + 1):
+        for motif in range(8):
+            profil = Profil("simulation", niveau)
+            for age in (2, 1, 0):
+                profil.ajouter(0, (motif >> age) & 1, 30.0, 0)
+            # Sans compter de fallback : ce n'est pas un vrai passage par le fallback
+            adaptive_model._ajuster_niveau_manuel(profil, motif & 1, compter=False)
+            table[niveau, motif] = profil.niveau_actuel
+    return table
+
+
+def probas_bandes() -> np.ndarray:
+    """
+    probas[cible, niveau] : chance de tirer une question de `niveau` quand on vise
+    `cible` (bande cible ± 1, au prorata des questions de l'index ; uniforme sans index).
+    """
+    index = adaptive_model.index_questions
+    nb_par_niveau = np.ones(NIVEAU_MAX + 1)
+    if index is not None:
+        nb_par_niveau = np.bincount(np.asarray(index.niveaux), minlength=NIVEAU_MAX + 1)
+    nb_par_niveau = nb_par_niveau.astype(np.float64)
+    nb_par_niveau[:NIVEAU_MIN] = 0
+
+    probas = np.zeros((NIVEAU_MAX + 1, NIVEAU_MAX + 1))
+    for cible in range(NIVEAU_MIN, NIVEAU_MAX + 1):
+        bande = np.zeros(NIVEAU_MAX + 1)
+        bas, haut = max(NIVEAU_MIN, cible - 1), min(NIVEAU_MAX, cible + 1)
+        bande[bas : haut + 1] = nb_par_niveau[bas : haut + 1]
+        if bande.sum() == 0:
+            bande[cible] = 1  # bande vide : question de secours au niveau cible
+        probas[cible] = bande / bande.sum()
+    return probas
+
+
+def simuler(
+    nb_apprenants: int = 100_000,
+    nb_pas: int = 40,
+    politique: str = "foret",
+    graine: int = 0,
+) -> dict:
+    """
+    Fait répondre `nb_apprenants` apprenants simulés `nb_pas` fois chacun.
+    Retourne les courbes (erreur moyenne par pas...) et les distributions
+    (pas d'atteinte du niveau réel, de convergence), plus le temps de calcul.
+    """
+    if politique not in POLITIQUES:
+        raise ValueError(f"Politique inconnue : {politique} (attendu : {POLITIQUES})")
+    if politique == "foret" and adaptive_model.modele is None:
+        raise RuntimeError("Politique 'foret' : le modèle n'est pas chargé (charger_modele)")
+
+    rng = np.random.default_rng(graine)
+    lissage = table_lissage()
+    manuel = table_ajustement_manuel()
+    cumul_bandes = np.cumsum(probas_bandes(), axis=1)
+    sujets = np.asarray(SUJETS)
+
+    # Même tirage des niveaux réels que generate_data.py
+    niveau_reel = np.clip(rng.normal(2.5, 1.2, nb_apprenants), 1, 5)
+    cible = np.rint(niveau_reel).astype(np.int8)
+    niveau = np.full(nb_apprenants, NIVEAU_DEPART, dtype=np.int8)
+    motifs = np.zeros(nb_apprenants, dtype=np.int8)  # 3 derniers scores en bits
+
+    niveaux = np.empty((nb_pas + 1, nb_apprenants), dtype=np.int8)
+    niveaux[0] = niveau
+    taux_reussite = np.empty(nb_pas)
+    duree_mise_a_jour = 0.0
+
+    debut_total = time.perf_counter()
+    for pas in range(nb_pas):
+        # Question : niveau dans la bande du niveau affiché, sujet au hasard
+        u = rng.random(nb_apprenants)[:, None]
+        niveau_question = (u >= cumul_bandes[niveau]).sum(axis=1).astype(np.int64)
+        sujet = sujets[rng.integers(0, len(sujets), nb_apprenants)]
+        score, temps = repondre(rng, niveau_reel, niveau_question)
+        taux_reussite[pas] = score.mean()
+
+        debut = time.perf_counter()
+        motifs = ((motifs << 1) | score).astype(np.int8) & 7
+        # Moins de 3 réponses : _ajuster_niveau_manuel ne bouge pas le niveau
+        apres_manuel = manuel[niveau, motifs] if pas >= 2 else niveau
+        if politique == "foret":
+            predictions = adaptive_model._predire_niveaux_lot(score, temps, sujet)
+            if predictions is None:
+                niveau = apres_manuel
+            else:
+                predictions = np.clip(predictions, 0, NIVEAU_MAX)
+                niveau = np.where(predictions > 0, lissage[niveau, predictions], apres_manuel)
+        else:
+            niveau = apres_manuel
+        niveau = niveau.astype(np.int8)
+        duree_mise_a_jour += time.perf_counter() - debut
+        niveaux[pas + 1] = niveau
+    duree_totale = time.perf_counter() - debut_total
+
+    ecarts = np.abs(niveaux.astype(np.int16) - cible)  # (pas + 1, apprenants)
+    atteint = ecarts == 0
+    jamais = ~atteint.any(axis=0)
+    pas_atteinte = np.where(jamais, -1, atteint.argmax(axis=0))
+    # Convergence : premier pas à partir duquel on reste à ± 1 jusqu'à la fin
+    hors_bande = ecarts > 1
+    dernier_hors = np.where(
+        hors_bande.any(axis=0), nb_pas - np.argmax(hors_bande[::-1], axis=0), 0
+    )
+    converge = ~hors_bande[-1]
+
+    def quantiles(valeurs):
+        if len(valeurs) == 0:
+            return {"p50": None, "p90": None, "p99": None}
+        p50, p90, p99 = np.percentile(valeurs, [50, 90, 99])
+        return {"p50": float(p50), "p90": float(p90), "p99": float(p99)}
+
+    nb_mises_a_jour = nb_apprenants * nb_pas
+    return {
+        "politique": politique,
+        "nb_apprenants": nb_apprenants,
+        "nb_pas": nb_pas,
+        "erreur_par_pas": ecarts.mean(axis=1),
+        "taux_reussite_par_pas": taux_reussite,
+        "erreur_finale": float(ecarts[-1].mean()),
+        "part_niveau_exact_final": float(atteint[-1].mean()),
+        "part_jamais_atteint": float(jamais.mean()),
+        "pas_atteinte": quantiles(pas_atteinte[~jamais]),
+        "pas_convergence": quantiles(dernier_hors[converge]),
+        "distribution_atteinte": np.bincount(pas_atteinte[~jamais], minlength=nb_pas + 1),
+        "erreur_par_niveau_reel": {
+            int(n): float(ecarts[-1][cible == n].mean()) for n in np.unique(cible)
+        },
+        "us_par_pas": duree_mise_a_jour / nb_mises_a_jour * 1e6,
+        "us_par_pas_total": duree_totale / nb_mises_a_jour * 1e6,
+    }
+
+
+def verifier(resultat: dict, seuils: dict = None, budget_temps: bool = False) -> list:
+    """
+    Contrôle de non-régression : liste des seuils dépassés (vide = OK).
+    Par défaut les SEUILS de la politique simulée. Précision et convergence seulement ;
+    le coût en µs par pas n'est comparé à us_par_pas_max que si budget_temps.
+    """
+    seuils = seuils or SEUILS[resultat["politique"]]
+    echecs = []
+    if resultat["erreur_finale"] > seuils["erreur_finale_max"]:
+        echecs.append(
+            f"erreur finale {resultat['erreur_finale']:.3f} > {seuils['erreur_finale_max']}"
+        )
+    if resultat["part_jamais_atteint"] > seuils["part_jamais_atteint_max"]:
+        echecs.append(
+            f"{resultat['part_jamais_atteint']:.1%} n'atteignent jamais leur niveau "
+            f"> {seuils['part_jamais_atteint_max']:.0%}"
+        )
+    pas = min(PAS_CONTROLE, resultat["nb_pas"])
+    erreur = float(resultat["erreur_par_pas"][pas])
+    if erreur > seuils["erreur_pas_controle_max"]:
+        echecs.append(
+            f"erreur au pas {pas} {erreur:.3f} > {seuils['erreur_pas_controle_max']}"
+        )
+    if "p50_atteinte_max" in seuils:
+        p50 = resultat["pas_atteinte"]["p50"]
+        if p50 is None or p50 > seuils["p50_atteinte_max"]:
+            echecs.append(f"p50 d'atteinte du niveau réel {p50} > {seuils['p50_atteinte_max']}")
+    if budget_temps and resultat["us_par_pas"] > seuils["us_par_pas_max"]:
+        echecs.append(
+            f"coût {resultat['us_par_pas']:.2f} µs / apprenant / pas > {seuils['us_par_pas_max']}"
+        )
+    return echecs
+
+
+def afficher(resultat: dict):
+    r = resultat
+    print(
+        f"== Politique {r['politique']} : {r['nb_apprenants']} apprenants × {r['nb_pas']} pas =="
+    )
+    jalons = sorted({1, 3, 5, 10, 20, r["nb_pas"]} & set(range(r["nb_pas"] + 1)))
+    print(
+        "  erreur moyenne |niveau - niveau réel| : "
+        + " | ".join(f"pas {p} : {r['erreur_par_pas'][p]:.3f}" for p in jalons)
+    )
+    print(
+        f"  niveau exact à la fin : {r['part_niveau_exact_final']:.1%} | "
+        f"jamais atteint : {r['part_jamais_atteint']:.1%} | "
+        f"taux de réussite moyen : {r['taux_reussite_par_pas'].mean():.3f}"
+    )
+    for nom in ("pas_atteinte", "pas_convergence"):
+        q = r[nom]
+        print(f"  {nom:16s} : p50 {q['p50']} | p90 {q['p90']} | p99 {q['p99']}")
+    print(
+        "  erreur finale par niveau réel : "
+        + " | ".join(f"{n} : {e:.2f}" for n, e in r["erreur_par_niveau_reel"].items())
+    )
+    print(
+        f"  coût : {r['us_par_pas']:.3f} µs / apprenant / pas pour la mise à jour du niveau "
+        f"({r['us_par_pas_total']:.3f} µs avec le tirage des questions et des réponses)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulateur vectorisé d'apprenants")
+    parser.add_argument("--apprenants", type=int, default=200_000)
+    parser.add_argument("--pas", type=int, default=40, help="réponses par apprenant")
+    parser.add_argument("--politique", choices=POLITIQUES + ("toutes",), default="toutes")
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--verifier", action="store_true", help="code de sortie 1 si régression")
+    parser.add_argument(
+        "--budget-temps",
+        action="store_true",
+        default=os.environ.get("SIMULATEUR_BUDGET_TEMPS") == "1",
+        help="--verifier contrôle aussi les µs par pas (dépend de la machine)",
+    )
+    args = parser.parse_args()
+
+    adaptive_model.charger_modele()
+    politiques = POLITIQUES if args.politique == "toutes" else (args.politique,)
+    echecs = []
+    for politique in politiques:
+        resultat = simuler(args.apprenants, args.pas, politique, args.graine)
+        afficher(resultat)
+        if args.verifier:
+            echecs += [f"{politique} : {e}" for e in verifier(resultat, budget_temps=args.budget_temps)]
+
+    if args.verifier:
+        print("\n[OK] Pas de régression" if not echecs else "\n[REGRESSION] " + "; ".join(echecs))
+        sys.exit(1 if echecs else 0)
+
+
+if __name__ == "__main__":
+    main()
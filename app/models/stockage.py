@@ -0,0 +1,312 @@
+"""
+stockage.py — Stockage des profils utilisateurs (mémoire ou SQLite)
+Auteur : Moi (ESIEA 3A)
+
+Les profils vivaient dans un simple dict → perdus à chaque redémarrage et pas
+partagés entre workers. Ici on met une interface de stockage derrière
+get_user_profile / update_user_profile :
+
+- StockageMemoire : le comportement d'avant (rien n'est persisté)
+- StockageJournal : snapshot binaire en mmap + journal en ajout seul (voir journal.py)
+- StockageSQLite  : base SQLite en mode WAL, avec deux modes
+    * write-through : un commit par réponse (simple mais lent)
+    * write-behind  : on marque le profil "sale", et un thread de fond écrit
+      tous les profils sales + les lignes d'historique en UNE transaction,
+      toutes les `intervalle_s` secondes ou dès `seuil_lot` réponses en attente.
+
+Dans tous les cas, le dict user_profiles d'adaptive_model reste le cache chaud :
+/reponse ne touche jamais le disque en write-behind.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.models.profil import TAILLE_HISTORIQUE, Profil, code_sujet
+
+# Colonnes lisibles en SQL ; le profil complet (historique circulaire, questions vues,
+# état du moteur Elo...) est dans la colonne `donnees` (Profil.vers_octets, comme le
+# journal et le débord). Une ligne d'avant cette colonne (donnees NULL) est reconstruite
+# depuis ces champs + la table historique, sans questions vues ni état Elo.
+CHAMPS_PROFIL = ["niveau_actuel", "score_total", "nb_questions", "bonnes_reponses"]
+
+
+class StockageProfils:
+    """Interface commune. Les profils manipulés sont des Profil (voir profil.py)."""
+
+    def charger(self, user_id: str):
+        """Retourne le profil stocké, ou None s'il n'existe pas."""
+        return None
+
+    def enregistrer(self, profil: Profil, entree: tuple = None):
+        """
+        Signale que `profil` a changé, avec la nouvelle entrée d'historique
+        s'il y en a une : (question_id, score, temps, sujet).
+        """
+
+    def supprimer(self, user_id: str):
+        """Supprime le profil et son historique."""
+
+    def user_ids(self) -> list:
+        """Tous les user_id stockés (handoff vers un autre nœud, voir utils/sharding.py)."""
+        return []
+
+    def vider(self):
+        """Force l'écriture de tout ce qui est en attente."""
+
+    def fermer(self):
+        """Vide et libère les ressources."""
+        self.vider()
+
+    def metriques(self) -> dict:
+        return {}
+
+
+class StockageMemoire(StockageProfils):
+    """Rien n'est persisté : c'est exactement le comportement d'origine."""
+
+
+class StockageSQLite(StockageProfils):
+    """Profils + historique dans SQLite (WAL), en write-through ou write-behind."""
+
+    def __init__(
+        self,
+        chemin: str,
+        write_behind: bool = True,
+        intervalle_s: float = 0.5,
+        seuil_lot: int = 1000,
+    ):
+        self.chemin = chemin
+        self.write_behind = write_behind
+        self.intervalle_s = intervalle_s
+        self.seuil_lot = seuil_lot
+
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+
+        self._conn = sqlite3.connect(chemin, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # suffisant en WAL
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS profils (
+                user_id TEXT PRIMARY KEY,
+                niveau_actuel INTEGER NOT NULL,
+                score_total INTEGER NOT NULL,
+                nb_questions INTEGER NOT NULL,
+                bonnes_reponses INTEGER NOT NULL,
+                sujets_faibles TEXT NOT NULL,
+                donnees BLOB
+            );
+            CREATE TABLE IF NOT EXISTS historique (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                score INTEGER NOT NULL,
+                temps REAL NOT NULL,
+                sujet TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_historique_user ON historique(user_id, id);
+            """
+        )
+        colonnes = [ligne[1] for ligne in self._conn.execute("PRAGMA table_info(profils)")]
+        if "donnees" not in colonnes:  # base créée avant la colonne
+            self._conn.execute("ALTER TABLE profils ADD COLUMN donnees BLOB")
+        self._conn.commit()
+        self._verrou_db = threading.Lock()
+
+        # État du write-behind (protégé par _verrou)
+        self._verrou = threading.Lock()
+        self._sales: dict = {}  # user_id → profil
+        self._historique_en_attente: list = []
+        self._reveil = threading.Event()
+        self._arret = threading.Event()
+
+        self._nb_flush = 0
+        self._nb_lignes_ecrites = 0
+        self._duree_dernier_flush_s = 0.0
+
+        self._thread = None
+        if write_behind:
+            self._thread = threading.Thread(
+                target=self._boucle, name="stockage-sqlite", daemon=True
+            )
+            self._thread.start()
+
+    # --- Lecture ---
+
+    def charger(self, user_id: str):
+        # Un profil encore en attente d'écriture est plus récent que la base
+        with self._verrou:
+            if user_id in self._sales:
+                return self._sales[user_id]
+
+        with self._verrou_db:
+            ligne = self._conn.execute(
+                "SELECT niveau_actuel, score_total, nb_questions, bonnes_reponses,"
+                " sujets_faibles, donnees FROM profils WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+            if ligne is None:
+                return None
+            if ligne[5] is not None:
+                return Profil.depuis_octets(user_id, ligne[5])
+            historique = self._conn.execute(
+                "SELECT question_id, score, temps, sujet FROM historique"
+                " WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, TAILLE_HISTORIQUE),
+            ).fetchall()
+
+        profil = Profil(user_id)
+        for champ, valeur in zip(CHAMPS_PROFIL, ligne[:4]):
+            setattr(profil, champ, valeur)
+        for question_id, score, temps, sujet in reversed(historique):
+            profil.ajouter(question_id, score, temps, code_sujet(sujet))
+        profil.sujets_faibles = json.loads(ligne[4])
+        return profil
+
+    def user_ids(self) -> list:
+        with self._verrou:
+            sales = list(self._sales)
+        with self._verrou_db:
+            lignes = self._conn.execute("SELECT user_id FROM profils").fetchall()
+        return list(dict.fromkeys(sales + [ligne[0] for ligne in lignes]))
+
+    # --- Écriture ---
+
+    def enregistrer(self, profil: Profil, entree: tuple = None):
+        if not self.write_behind:
+            historique = [(profil.user_id, *entree)] if entree else []
+            self._ecrire({profil.user_id: profil}, historique)
+            return
+
+        with self._verrou:
+            self._sales[profil.user_id] = profil
+            if entree is not None:
+                self._historique_en_attente.append((profil.user_id, *entree))
+            plein = len(self._historique_en_attente) >= self.seuil_lot
+        if plein:
+            self._reveil.set()
+
+    def supprimer(self, user_id: str):
+        with self._verrou:
+            self._sales.pop(user_id, None)
+            self._historique_en_attente = [
+                ligne for ligne in self._historique_en_attente if ligne[0] != user_id
+            ]
+        with self._verrou_db:
+            self._conn.execute("DELETE FROM profils WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM historique WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+    def vider(self):
+        with self._verrou:
+            sales, self._sales = self._sales, {}
+            historique, self._historique_en_attente = self._historique_en_attente, []
+            # On copie les valeurs sous le verrou pour écrire un état cohérent
+            lignes = self._lignes_profils(sales)
+        if lignes or historique:
+            self._ecrire_lignes(lignes, historique)
+
+    def fermer(self):
+        self._arret.set()
+        self._reveil.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.vider()
+        with self._verrou_db:
+            self._conn.close()
+
+    def _boucle(self):
+        while not self._arret.is_set():
+            self._reveil.wait(self.intervalle_s)
+            self._reveil.clear()
+            try:
+                self.vider()
+            except sqlite3.Error as e:
+                print(f"[WARN] Flush SQLite raté : {e}")
+
+    @staticmethod
+    def _lignes_profils(profils: dict) -> list:
+        return [
+            (
+                user_id,
+                *(getattr(p, champ) for champ in CHAMPS_PROFIL),
+                json.dumps(p.sujets_faibles),
+                p.vers_octets(),
+            )
+            for user_id, p in profils.items()
+        ]
+
+    def _ecrire(self, profils: dict, historique: list):
+        self._ecrire_lignes(self._lignes_profils(profils), historique)
+
+    def _ecrire_lignes(self, lignes_profils: list, historique: list):
+        debut = time.perf_counter()
+        with self._verrou_db:
+            with self._conn:  # une seule transaction pour tout le lot
+                self._conn.executemany(
+                    "INSERT INTO profils VALUES (?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(user_id) DO UPDATE SET"
+                    " niveau_actuel=excluded.niveau_actuel, score_total=excluded.score_total,"
+                    " nb_questions=excluded.nb_questions, bonnes_reponses=excluded.bonnes_reponses,"
+                    " sujets_faibles=excluded.sujets_faibles, donnees=excluded.donnees",
+                    lignes_profils,
+                )
+                self._conn.executemany(
+                    "INSERT INTO historique (user_id, question_id, score, temps, sujet)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    historique,
+                )
+        self._nb_flush += 1
+        self._nb_lignes_ecrites += len(lignes_profils) + len(historique)
+        self._duree_dernier_flush_s = time.perf_counter() - debut
+
+    def metriques(self) -> dict:
+        with self._verrou:
+            nb_sales = len(self._sales)
+            nb_attente = len(self._historique_en_attente)
+        return {
+            "mode": "write-behind" if self.write_behind else "write-through",
+            "profils_sales": nb_sales,
+            "historique_en_attente": nb_attente,
+            "nb_flush": self._nb_flush,
+            "nb_lignes_ecrites": self._nb_lignes_ecrites,
+            "duree_dernier_flush_ms": self._duree_dernier_flush_s * 1e3,
+        }
+
+
+def creer_stockage_depuis_env() -> StockageProfils:
+    """
+    Choix du stockage via les variables d'environnement :
+        STOCKAGE_PROFILS=memoire (défaut) | sqlite | journal
+        STOCKAGE_SQLITE_CHEMIN=app/data/profils.db
+        STOCKAGE_WRITE_BEHIND=1 (défaut) | 0
+        STOCKAGE_JOURNAL_DOSSIER=app/data/profils_journal   (un dossier par worker)
+        STOCKAGE_JOURNAL_SYNCHRONE=0 (défaut) | 1            (attendre le fsync)
+        STOCKAGE_JOURNAL_INTERVALLE_MS=10                    (fenêtre du group commit)
+        STOCKAGE_SNAPSHOT_INTERVALLE_S=600
+    """
+    type_stockage = os.environ.get("STOCKAGE_PROFILS", "memoire")
+    if type_stockage == "journal":
+        from app.models.journal import StockageJournal  # journal.py importe ce module
+
+        return StockageJournal(
+            os.environ.get(
+                "STOCKAGE_JOURNAL_DOSSIER",
+                os.path.join(os.path.dirname(__file__), "../data/profils_journal"),
+            ),
+            intervalle_ms=float(os.environ.get("STOCKAGE_JOURNAL_INTERVALLE_MS", 10)),
+            synchrone=os.environ.get("STOCKAGE_JOURNAL_SYNCHRONE", "0") == "1",
+            intervalle_snapshot_s=float(os.environ.get("STOCKAGE_SNAPSHOT_INTERVALLE_S", 600)),
+        )
+    if type_stockage == "sqlite":
+        chemin = os.environ.get(
+            "STOCKAGE_SQLITE_CHEMIN",
+            os.path.join(os.path.dirname(__file__), "../data/profils.db"),
+        )
+        return StockageSQLite(chemin, write_behind=os.environ.get("STOCKAGE_WRITE_BEHIND", "1") == "1")
+    return StockageMemoire()
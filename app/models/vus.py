@@ -0,0 +1,122 @@
+"""
+vus.py — Questions déjà vues par un utilisateur (ensemble compact façon Roaring)
+Auteur : Moi (ESIEA 3A)
+
+select_question ne regardait pas l'historique : un apprenant retombait souvent sur
+des questions déjà faites. Il faut donc un "déjà vu" par utilisateur, testé à
+chaque tirage, et qui tienne en RAM avec beaucoup d'utilisateurs et un gros catalogue.
+
+Un bitset complet par utilisateur c'est N/8 octets (12.5 Ko pour 100k questions,
+12.5 Go pour 1M d'utilisateurs) alors qu'un apprenant n'en a vu que quelques
+centaines. On fait comme les Roaring bitmaps : les question_id (entiers 32 bits,
+stables d'une version de l'artefact à l'autre, contrairement aux positions dans le
+catalogue) sont découpés en blocs de 65536 ; chaque bloc est
+- un array('H') trié des 16 bits bas (2 octets par question vue) tant qu'il est petit,
+- un bitmap de 8 Ko dès qu'il dépasse 4096 entrées (c'est alors plus compact).
+Test d'appartenance : un dict.get + un bisect (ou un test de bit).
+
+La taille est plafonnée (MAX_VUS par défaut) : au-delà on oublie tout et on
+repart de zéro, pour borner la mémoire par utilisateur quoi qu'il arrive.
+"""
+
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+TAILLE_BLOC = 1 << 16
+SEUIL_BITMAP = 4096  # au-delà, un bloc trié coûterait plus que le bitmap de 8 Ko
+MAX_VUS = 2048
+
+
+class EnsembleVus:
+    """Ensemble d'entiers de 0 à 2**32 - 1 : ajouter, `in`, retirer, valeurs()."""
+
+    __slots__ = ("_blocs", "_taille")
+
+    def __init__(self):
+        self._blocs = {}  # 16 bits hauts → array('H') trié ou bytearray (bitmap)
+        self._taille = 0
+
+    def __len__(self) -> int:
+        return self._taille
+
+    def __contains__(self, valeur: int) -> bool:
+        bloc = self._blocs.get(valeur >> 16)
+        if bloc is None:
+            return False
+        bas = valeur & 0xFFFF
+        if type(bloc) is bytearray:
+            return bool(bloc[bas >> 3] >> (bas & 7) & 1)
+        i = bisect_left(bloc, bas)
+        return i < len(bloc) and bloc[i] == bas
+
+    def ajouter(self, valeur: int) -> bool:
+        """Ajoute une valeur ; retourne False si elle y était déjà."""
+        haut, bas = valeur >> 16, valeur & 0xFFFF
+        bloc = self._blocs.get(haut)
+        if bloc is None:
+            self._blocs[haut] = array("H", (bas,))
+        elif type(bloc) is bytearray:
+            octet, bit = bas >> 3, 1 << (bas & 7)
+            if bloc[octet] & bit:
+                return False
+            bloc[octet] |= bit
+        else:
+            i = bisect_left(bloc, bas)
+            if i < len(bloc) and bloc[i] == bas:
+                return False
+            bloc.insert(i, bas)  # memmove de ≤ 8 Ko
+            if len(bloc) > SEUIL_BITMAP:
+                self._blocs[haut] = _vers_bitmap(bloc)
+        self._taille += 1
+        return True
+
+    def valeurs(self) -> np.ndarray:
+        """Toutes les valeurs, triées (int64)."""
+        morceaux = []
+        for haut in sorted(self._blocs):
+            bloc = self._blocs[haut]
+            if type(bloc) is bytearray:
+                bas = np.flatnonzero(np.unpackbits(np.frombuffer(bloc, np.uint8), bitorder="little"))
+            else:
+                bas = np.frombuffer(bloc, dtype=np.uint16)
+            morceaux.append(bas.astype(np.int64) + (haut << 16))
+        return np.concatenate(morceaux) if morceaux else np.empty(0, dtype=np.int64)
+
+    def retirer(self, valeurs):
+        """Retire un paquet de valeurs (ex. toutes les questions d'une bande épuisée)."""
+        a_retirer = np.unique(np.asarray(valeurs, dtype=np.int64))
+        if len(a_retirer) == 0:
+            return
+        restantes = np.setdiff1d(self.valeurs(), a_retirer, assume_unique=True)
+        self.vider()
+        self._remplir(restantes)
+
+    @classmethod
+    def depuis_valeurs(cls, valeurs) -> "EnsembleVus":
+        """Reconstruit un ensemble à partir de valeurs triées et uniques (cf. valeurs())."""
+        vus = cls()
+        vus._remplir(np.asarray(valeurs, dtype=np.int64))
+        return vus
+
+    def _remplir(self, valeurs: np.ndarray):
+        for haut in np.unique(valeurs >> 16):
+            bas = (valeurs[(valeurs >> 16) == haut] & 0xFFFF).astype(np.uint16)
+            bloc = array("H", bas.tobytes())
+            self._blocs[int(haut)] = _vers_bitmap(bloc) if len(bloc) > SEUIL_BITMAP else bloc
+        self._taille = len(valeurs)
+
+    def vider(self):
+        self._blocs = {}
+        self._taille = 0
+
+    def octets(self) -> int:
+        """Octets des données (hors en-têtes Python)."""
+        return sum(len(b) if type(b) is bytearray else 2 * len(b) for b in self._blocs.values())
+
+
+def _vers_bitmap(bloc: array) -> bytearray:
+    bits = np.zeros(TAILLE_BLOC, dtype=np.uint8)
+    bits[np.frombuffer(bloc, dtype=np.uint16)] = 1
+    return bytearray(np.packbits(bits, bitorder="little").tobytes())
@@ -0,0 +1,153 @@
+"""
+admin.py — Routes d'administration d'un worker (profilage à chaud, ré-entraînement, cluster)
+Auteur : Moi (ESIEA 3A)
+
+Protégées par un jeton : en-tête X-Admin-Token == variable d'environnement ADMIN_TOKEN.
+Si ADMIN_TOKEN n'est pas défini, les routes admin sont simplement désactivées (403),
+pour ne jamais exposer ça par accident.
+
+Attention : avec plusieurs workers uvicorn, c'est le worker qui reçoit la requête
+qui est profilé (c'est voulu : on veut voir le worker qui rame).
+"""
+
+import asyncio
+import hmac
+import os
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.models import adaptive_model
+from app.utils import profileur, sharding
+
+router = APIRouter()
+
+
+def verifier_admin(x_admin_token: str = Header(None)):
+    """Dépendance : 403 si pas de jeton configuré ou jeton faux."""
+    attendu = os.environ.get("ADMIN_TOKEN")
+    if not attendu:
+        raise HTTPException(status_code=403, detail="Routes admin désactivées (ADMIN_TOKEN)")
+    # compare_digest : pas de fuite du jeton par le temps de comparaison
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, attendu):
+        raise HTTPException(status_code=403, detail="Jeton admin invalide")
+
+
+@router.post("/profil", dependencies=[Depends(verifier_admin)])
+async def profiler(
+    secondes: float = Query(10.0, gt=0, le=profileur.DUREE_MAX_S),
+    intervalle_ms: float = Query(profileur.INTERVALLE_MS, ge=1, le=100),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+):
+    """
+    Profile CE worker pendant `secondes` et renvoie le profil :
+    - format=collapsed  → texte "f1;f2;f3 nb" (flamegraph.pl, speedscope)
+    - format=speedscope → JSON à ouvrir sur https://www.speedscope.app
+
+    Handler async : l'attente ne bloque pas un thread du threadpool,
+    les requêtes normales continuent d'être servies (et échantillonnées).
+    """
+    try:
+        echantillonneur = profileur.demarrer_profilage(intervalle_ms)
+    except profileur.ProfilageEnCours as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    try:
+        await asyncio.sleep(secondes)
+    finally:
+        # join() du thread d'échantillonnage : rapide, il se réveille à chaque intervalle
+        profileur.terminer_profilage(echantillonneur)
+
+    entetes = {
+        "X-Profil-Echantillons": str(echantillonneur.nb_echantillons),
+        "X-Profil-Pid": str(os.getpid()),
+    }
+    if format == "speedscope":
+        return JSONResponse(
+            echantillonneur.speedscope(f"worker {os.getpid()}"), headers=entetes
+        )
+    return PlainTextResponse(echantillonneur.collapsed(), headers=entetes)
+
+
+@router.get("/reentrainement", dependencies=[Depends(verifier_admin)])
+def etat_reentrainement():
+    """Historique des ré-entraînements de CE worker (accuracy avant/après, bascules)."""
+    reentraineur = adaptive_model.reentraineur
+    if reentraineur is None:
+        raise HTTPException(status_code=404, detail="Ré-entraînement désactivé (REENTRAINEMENT)")
+    return {
+        "version_servie": adaptive_model.etat_modele["version"],
+        **reentraineur.metriques(),
+        "historique": list(reentraineur.historique),
+    }
+
+
+@router.post("/reentrainement", status_code=202, dependencies=[Depends(verifier_admin)])
+def declencher_reentrainement():
+    """Demande un ré-entraînement tout de suite (il se fait dans le thread de fond)."""
+    reentraineur = adaptive_model.reentraineur
+    if reentraineur is None:
+        raise HTTPException(status_code=404, detail="Ré-entraînement désactivé (REENTRAINEMENT)")
+    reentraineur.declencher()
+    return {"declenche": True, **reentraineur.metriques()}
+
+
+# --- Cluster (sharding.py) : changement de membres et passage de relais entre nœuds ---
+
+
+def _cluster() -> sharding.Cluster:
+    if sharding.cluster is None:
+        raise HTTPException(status_code=404, detail="Sharding désactivé (SHARDING_NOEUD)")
+    return sharding.cluster
+
+
+@router.get("/cluster", dependencies=[Depends(verifier_admin)])
+def etat_cluster():
+    """Anneau vu par CE nœud : membres, version, transition en cours."""
+    return _cluster().metriques()
+
+
+@router.post("/cluster", dependencies=[Depends(verifier_admin)])
+def changer_cluster(
+    noeuds: dict[str, str] = Body(..., embed=True), version: int = Body(..., embed=True)
+):
+    """
+    Nouveaux membres {nom: url}. À envoyer à TOUS les nœuds (anciens et nouveaux) avec
+    la même version ; chacun pousse ensuite en fond les profils qui changent de main.
+    """
+    try:
+        return _cluster().changer_membres(noeuds, version)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/cluster/profils/{user_id}", dependencies=[Depends(verifier_admin)])
+def ceder_profil(user_id: str):
+    """Le nouveau propriétaire réclame un profil : il lui est cédé (retiré d'ici)."""
+    _cluster()
+    donnees = adaptive_model.ceder_profil(user_id)
+    if donnees is None:
+        raise HTTPException(status_code=404, detail=f"Pas de profil {user_id} ici")
+    return Response(donnees, media_type="application/octet-stream")
+
+
+@router.post("/cluster/profils", dependencies=[Depends(verifier_admin)])
+async def recevoir_profils(requete: Request):
+    """Lot de profils poussés par un ancien propriétaire (trames de sharding.encoder_profils)."""
+    _cluster()
+    profils = sharding.decoder_profils(await requete.body())
+
+    def importer():
+        return sum(adaptive_model.importer_profil(u, donnees) for u, donnees in profils)
+
+    importes = await asyncio.to_thread(importer)
+    sharding.METRIQUE_HANDOFF.inc("recus", n=importes)
+    sharding.METRIQUE_HANDOFF.inc("ignores", n=len(profils) - importes)
+    return {"recus": len(profils), "importes": importes}
+
+
+@router.post("/cluster/handoff-termine", dependencies=[Depends(verifier_admin)])
+def handoff_termine(noeud: str = Body(..., embed=True), version: int = Body(..., embed=True)):
+    """Un nœud a fini de pousser ses profils pour l'anneau `version`."""
+    _cluster().handoff_termine(noeud, version)
+    return {"transition": _cluster().anneau_precedent is not None}
@@ -6,7 +6,8 @@ J'ai séparé les routes dans un fichier à part pour garder main.py propre.
 Pydantic pour la validation des données — vraiment pratique, zéro validation manuelle.
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Body, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional
 import time
@@ -15,13 +16,24 @@ import time
 from app.models.adaptive_model import (
     select_question,
     update_user_profile,
+    update_user_profiles_lot,
     get_stats,
     get_user_profile,
-    user_profiles,
+    supprimer_profil,
+    precharger_questions,
+    prechargement_actif,
+    prediction_deportee,
+    predire_niveaux_deportes,
 )
+from app.models.pool_calcul import PoolSature
+from app.models.profils_partages import TablePleine
+from app.utils.trace import etape  # étapes visibles avec l'en-tête X-Trace: 1
 
 router = APIRouter()
 
+# Taille max d'un lot sur POST /reponses/batch (un client hors-ligne en a quelques dizaines)
+TAILLE_MAX_LOT = 1000
+
 
 # ============================================================
 # Schémas Pydantic — validation automatique des requêtes/réponses
@@ -32,14 +44,18 @@ class ReponseUtilisateur(BaseModel):
     """Corps de la requête POST /reponse"""
 
     user_id: str = Field(..., description="Identifiant unique de l'utilisateur")
-    question_id: int = Field(..., description="ID de la question répondue")
+    # Stocké en int32 dans l'historique du profil (array "i", format binaire)
+    question_id: int = Field(
+        ..., ge=-(2**31), le=2**31 - 1, description="ID de la question répondue"
+    )
     reponse_index: int = Field(
         ..., ge=0, le=3, description="Index de la réponse choisie (0-3)"
     )
     sujet: str = Field(..., description="Sujet de la question")
     niveau_difficulte: int = Field(..., ge=1, le=5, description="Niveau de la question")
+    # Feature float32 du modèle et de l'historique : au-delà, la conversion déborde
     temps_secondes: float = Field(
-        ..., gt=0, description="Temps pris pour répondre (en secondes)"
+        ..., gt=0, le=3.4e38, description="Temps pris pour répondre (en secondes)"
     )
 
 
@@ -72,6 +88,7 @@ class StatsUtilisateur(BaseModel):
     taux_reussite: float
     sujets_faibles: list[str]
     progression: str
+    score_pondere: float = 0.0  # réponses récentes pondérées plus fort (decay 0.9)
 
 
 class ResetConfirmation(BaseModel):
@@ -105,25 +122,48 @@ def get_question(
         )
 
     try:
-        question = select_question(user_id, sujet)
-        return QuestionReponse(
-            question_id=question["question_id"],
-            sujet=question["sujet"],
-            niveau_difficulte=question["niveau_difficulte"],
-            enonce=question["enonce"],
-            options=question["options"],
-        )
+        with etape("handler"):
+            question = select_question(user_id, sujet)
+            return QuestionReponse(
+                question_id=question["question_id"],
+                sujet=question["sujet"],
+                niveau_difficulte=question["niveau_difficulte"],
+                enonce=question["enonce"],
+                options=question["options"],
+            )
+    except TablePleine as e:
+        raise _table_pleine(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Erreur lors de la sélection: {str(e)}"
         )
 
 
+def _table_pleine(e: TablePleine) -> HTTPException:
+    """Plus de case pour un nouvel apprenant dans la table partagée : 503, pas un 500."""
+    return HTTPException(status_code=503, detail=f"Plus de place pour les profils ({e})")
+
+
+def _pool_sature(e: PoolSature) -> HTTPException:
+    """503 + Retry-After : le client réessaie plus tard au lieu d'allonger la file."""
+    return HTTPException(
+        status_code=503,
+        detail=f"Serveur saturé, réessayez plus tard ({e})",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
 @router.post("/reponse", response_model=ResultatReponse)
-def post_reponse(reponse: ReponseUtilisateur):
+async def post_reponse(reponse: ReponseUtilisateur, taches: BackgroundTasks):
     """
     Reçoit la réponse d'un utilisateur, vérifie si elle est correcte,
     met à jour son profil et retourne le résultat.
+    Si le préchargement est actif, les prochaines questions sont préparées
+    en tâche de fond, une fois la réponse partie.
+
+    Handler async : si le pool de calcul est actif (POOL_CALCUL), le predict sklearn
+    part dans un autre process pendant que la boucle sert les autres requêtes ;
+    le reste (profil, stockage) passe par le threadpool. File du pool pleine → 503.
 
     Note : dans cette version simulée, la bonne réponse est toujours l'index 0.
     TODO: stocker les vraies bonnes réponses en BDD.
@@ -139,31 +179,119 @@ def post_reponse(reponse: ReponseUtilisateur):
     score = 1 if est_correct else 0
 
     try:
-        # Mise à jour du profil utilisateur via le modèle ML
-        update_user_profile(
-            user_id=reponse.user_id,
-            question_id=reponse.question_id,
-            score=score,
-            temps_secondes=reponse.temps_secondes,
-            sujet=reponse.sujet,
+        with etape("handler"):
+            prediction = None
+            if prediction_deportee():
+                with etape("pool"):
+                    niveaux = await predire_niveaux_deportes(
+                        [(reponse.user_id, reponse.question_id, score,
+                          reponse.temps_secondes, reponse.sujet)]
+                    )
+                prediction = int(niveaux[0])
+
+            # Mise à jour du profil utilisateur via le modèle ML
+            nouveau_niveau = await run_in_threadpool(
+                _mettre_a_jour, reponse, score, prediction
+            )
+
+            with etape("feedback"):
+                feedback = _generer_feedback(
+                    est_correct, reponse.temps_secondes, reponse.niveau_difficulte
+                )
+
+            if prechargement_actif():
+                taches.add_task(precharger_questions, reponse.user_id)
+
+            return ResultatReponse(
+                correct=est_correct,
+                feedback=feedback,
+                nouveau_niveau=nouveau_niveau,
+                bonne_reponse_index=bonne_reponse_index,
+            )
+
+    except PoolSature as e:
+        raise _pool_sature(e)
+    except TablePleine as e:
+        raise _table_pleine(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Erreur lors du traitement: {str(e)}"
         )
 
-        profil = get_user_profile(reponse.user_id)
 
-        feedback = _generer_feedback(
-            est_correct, reponse.temps_secondes, reponse.niveau_difficulte
+def _mettre_a_jour(reponse: ReponseUtilisateur, score: int, prediction) -> int:
+    """Partie synchrone de POST /reponse (profil + stockage), dans le threadpool."""
+    profil = update_user_profile(
+        user_id=reponse.user_id,
+        question_id=reponse.question_id,
+        score=score,
+        temps_secondes=reponse.temps_secondes,
+        sujet=reponse.sujet,
+        prediction=prediction,
+        niveau_question=reponse.niveau_difficulte,
+    )
+    return profil.niveau_actuel
+
+
+@router.post("/reponses/batch", response_model=list[ResultatReponse])
+async def post_reponses_batch(
+    taches: BackgroundTasks,
+    reponses: list[ReponseUtilisateur] = Body(..., max_length=TAILLE_MAX_LOT),
+):
+    """
+    Reçoit un lot de réponses (ex : un client mobile qui revient en ligne et
+    rejoue sa file d'attente), pour un ou plusieurs utilisateurs.
+
+    Tout le lot est validé d'un coup par Pydantic, le modèle prédit toutes les
+    lignes en une seule passe, puis chaque profil est mis à jour dans l'ordre
+    de ses réponses. Retourne un ResultatReponse par réponse, dans le même ordre.
+    """
+    sujets_valides = ["python", "algo", "math", "bdd"]
+    invalides = [i for i, r in enumerate(reponses) if r.sujet not in sujets_valides]
+    if invalides:
+        raise HTTPException(
+            status_code=400, detail=f"Sujet invalide pour les réponses {invalides}"
         )
 
-        return ResultatReponse(
-            correct=est_correct,
-            feedback=feedback,
-            nouveau_niveau=profil["niveau_actuel"],
-            bonne_reponse_index=bonne_reponse_index,
+    # Vérification des réponses (simulée — index 0 = bonne réponse)
+    bonne_reponse_index = 0
+    scores = [1 if r.reponse_index == bonne_reponse_index else 0 for r in reponses]
+
+    lot = [
+        (r.user_id, r.question_id, score, r.temps_secondes, r.sujet)
+        for r, score in zip(reponses, scores)
+    ]
+
+    try:
+        # Tout le lot part en un seul aller-retour vers le pool (si actif)
+        predictions = await predire_niveaux_deportes(lot) if prediction_deportee() else None
+        niveaux = await run_in_threadpool(
+            update_user_profiles_lot, lot, predictions, [r.niveau_difficulte for r in reponses]
         )
 
+        if prechargement_actif():
+            for user_id in dict.fromkeys(r.user_id for r in reponses):
+                taches.add_task(precharger_questions, user_id)
+
+        return [
+            ResultatReponse(
+                correct=score == 1,
+                feedback=_generer_feedback(
+                    score == 1, r.temps_secondes, r.niveau_difficulte
+                ),
+                nouveau_niveau=niveau,
+                bonne_reponse_index=bonne_reponse_index,
+            )
+            for r, score, niveau in zip(reponses, scores, niveaux)
+        ]
+
+    except PoolSature as e:
+        raise _pool_sature(e)
+    except TablePleine as e:
+        raise _table_pleine(e)
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Erreur lors du traitement: {str(e)}"
+            status_code=500, detail=f"Erreur lors du traitement du lot: {str(e)}"
         )
 
 
@@ -175,6 +303,8 @@ def get_statistiques(user_id: str):
     try:
         stats = get_stats(user_id)
         return StatsUtilisateur(**stats)
+    except TablePleine as e:
+        raise _table_pleine(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Erreur récupération stats: {str(e)}"
@@ -188,8 +318,7 @@ def reset_profil(user_id: str):
     Utile pour recommencer à zéro ou pour les tests.
     """
     try:
-        if user_id in user_profiles:
-            del user_profiles[user_id]
+        if supprimer_profil(user_id):
             message = f"Profil de {user_id} réinitialisé avec succès."
         else:
             # L'utilisateur n'existait pas — pas grave, on confirme quand même
@@ -200,6 +329,8 @@ def reset_profil(user_id: str):
 
         return ResetConfirmation(message=message, user_id=user_id)
 
+    except TablePleine as e:
+        raise _table_pleine(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur reset: {str(e)}")
 
@@ -0,0 +1,230 @@
+"""
+metriques.py — Petit registre de métriques au format texte Prometheus
+Auteur : Moi (ESIEA 3A)
+
+Pas envie d'ajouter prometheus_client pour trois compteurs, et surtout je voulais
+que l'instrumentation ne coûte presque rien sur le chemin chaud :
+
+- chaque thread écrit dans SON shard (threading.local) → pas de verrou à l'écriture,
+  pas de contention entre les threads du threadpool de FastAPI
+- le verrou ne sert qu'à enregistrer un nouveau shard (une fois par thread) et au scrape
+- GET /metrics additionne les shards au moment du scrape ; la lecture peut rater
+  une observation en cours d'écriture, c'est le compromis classique (et sans gravité)
+
+Trois types :
+    Compteur    → *_total, ne fait que monter
+    Histogramme → *_bucket / *_sum / *_count, bornes fixes
+    Jauge       → valeur lue au moment du scrape via une fonction (taille du cache, etc.)
+
+Utilisation :
+    from app.utils.metriques import registre
+    REQUETES = registre.compteur("app_requetes_total", "Nb de requêtes", ("route",))
+    REQUETES.inc("/api/questions")
+    DUREE = registre.histogramme("app_duree_secondes", "Durée", ("route",))
+    DUREE.observer(0.0012, "/api/questions")
+    registre.jauge("app_profils", "Profils en mémoire", lambda: len(user_profiles))
+"""
+
+import math
+import threading
+from bisect import bisect_left
+
+# Bornes par défaut pour des latences en secondes (de 50µs à 10s)
+BORNES_LATENCE = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _echapper(valeur) -> str:
+    return str(valeur).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(noms: tuple, valeurs: tuple, extra: str = "") -> str:
+    paires = [f'{n}="{_echapper(v)}"' for n, v in zip(noms, valeurs)]
+    if extra:
+        paires.append(extra)
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+
+def _format_nombre(valeur: float) -> str:
+    if valeur == math.inf:
+        return "+Inf"
+    if isinstance(valeur, float) and valeur.is_integer() and abs(valeur) < 1e15:
+        return str(int(valeur))
+    return repr(valeur)
+
+
+class _Shardee:
+    """
+    Base commune : un dict par thread, enregistré une seule fois sous verrou.
+    Les shards des threads morts sont repliés dans `_retraites` (plus personne
+    n'écrit dedans) pour que la liste ne grossisse pas si les threads tournent.
+    """
+
+    MAX_SHARDS = 64  # au-delà, on replie les shards morts dès l'enregistrement
+
+    def __init__(self, nom: str, aide: str, labels: tuple):
+        self.nom = nom
+        self.aide = aide
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: list = []  # (thread, dict)
+        self._retraites: dict = {}
+        self._verrou = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "d", None)
+        if shard is None:
+            shard = {}
+            self._local.d = shard
+            with self._verrou:
+                if len(self._shards) >= self.MAX_SHARDS:
+                    self._replier()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _replier(self):
+        """(sous verrou) Fusionne les shards des threads terminés dans _retraites."""
+        vivants = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                vivants.append((thread, shard))
+            else:
+                self._fusionner(self._retraites, shard.items())
+        self._shards = vivants
+
+    def _fusionner(self, total: dict, items):
+        raise NotImplementedError
+
+    def valeurs(self) -> dict:
+        total: dict = {}
+        with self._verrou:
+            self._replier()
+            self._fusionner(total, self._retraites.items())
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # list(d.items()) est atomique sous le GIL même si le thread propriétaire écrit
+            self._fusionner(total, list(shard.items()))
+        return total
+
+
+class Compteur(_Shardee):
+    def inc(self, *valeurs_labels, n: float = 1):
+        shard = self._shard()
+        shard[valeurs_labels] = shard.get(valeurs_labels, 0) + n
+
+    def _fusionner(self, total: dict, items):
+        for cle, valeur in items:
+            total[cle] = total.get(cle, 0) + valeur
+
+    def exposer(self) -> list:
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} counter"]
+        for cle, valeur in sorted(self.valeurs().items()):
+            lignes.append(f"{self.nom}{_labels(self.labels, cle)} {_format_nombre(valeur)}")
+        return lignes
+
+
+class Histogramme(_Shardee):
+    def __init__(self, nom: str, aide: str, labels: tuple = (), bornes: tuple = BORNES_LATENCE):
+        super().__init__(nom, aide, labels)
+        self.bornes = tuple(sorted(bornes))
+
+    def observer(self, valeur: float, *valeurs_labels):
+        shard = self._shard()
+        cases = shard.get(valeurs_labels)
+        if cases is None:
+            # len(bornes) cases + la case +Inf, puis somme et nombre
+            cases = [0] * (len(self.bornes) + 3)
+            shard[valeurs_labels] = cases
+        cases[bisect_left(self.bornes, valeur)] += 1
+        cases[-2] += valeur
+        cases[-1] += 1
+
+    def _fusionner(self, total: dict, items):
+        for cle, cases in items:
+            cumul = total.setdefault(cle, [0] * len(cases))
+            for i, v in enumerate(list(cases)):
+                cumul[i] += v
+
+    def exposer(self) -> list:
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        for cle, cases in sorted(self.valeurs().items()):
+            cumul = 0
+            for borne, nb in zip((*self.bornes, math.inf), cases):
+                cumul += nb
+                le = f'le="{_format_nombre(float(borne))}"'
+                lignes.append(f"{self.nom}_bucket{_labels(self.labels, cle, le)} {cumul}")
+            lignes.append(f"{self.nom}_sum{_labels(self.labels, cle)} {_format_nombre(cases[-2])}")
+            lignes.append(f"{self.nom}_count{_labels(self.labels, cle)} {cases[-1]}")
+        return lignes
+
+
+class Jauge:
+    """
+    Valeur calculée au scrape. La fonction retourne un nombre, ou un dict
+    {tuple de valeurs de labels: nombre} ; None → rien d'exposé.
+    """
+
+    def __init__(self, nom: str, aide: str, fonction, labels: tuple = ()):
+        self.nom = nom
+        self.aide = aide
+        self.fonction = fonction
+        self.labels = tuple(labels)
+
+    def exposer(self) -> list:
+        valeur = self.fonction()
+        if valeur is None:
+            return []
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} gauge"]
+        valeurs = valeur if isinstance(valeur, dict) else {(): valeur}
+        for cle, v in sorted(valeurs.items()):
+            if v is None:
+                continue
+            lignes.append(f"{self.nom}{_labels(self.labels, cle)} {_format_nombre(float(v))}")
+        return lignes
+
+
+class Registre:
+    def __init__(self):
+        self._metriques: dict = {}
+        self._verrou = threading.Lock()
+
+    def _ajouter(self, metrique):
+        with self._verrou:
+            # Idempotent : un module rechargé récupère la même métrique
+            existante = self._metriques.get(metrique.nom)
+            if existante is not None and type(existante) is type(metrique):
+                if isinstance(metrique, Jauge):
+                    existante.fonction = metrique.fonction
+                return existante
+            self._metriques[metrique.nom] = metrique
+            return metrique
+
+    def compteur(self, nom: str, aide: str, labels: tuple = ()) -> Compteur:
+        return self._ajouter(Compteur(nom, aide, labels))
+
+    def histogramme(
+        self, nom: str, aide: str, labels: tuple = (), bornes: tuple = BORNES_LATENCE
+    ) -> Histogramme:
+        return self._ajouter(Histogramme(nom, aide, labels, bornes))
+
+    def jauge(self, nom: str, aide: str, fonction, labels: tuple = ()) -> Jauge:
+        return self._ajouter(Jauge(nom, aide, fonction, labels))
+
+    def exposer(self) -> str:
+        """Tout le registre au format texte Prometheus (version 0.0.4)."""
+        with self._verrou:
+            metriques = list(self._metriques.values())
+        lignes = []
+        for metrique in metriques:
+            try:
+                lignes.extend(metrique.exposer())
+            except Exception as e:
+                # Une jauge qui plante ne doit pas casser tout le scrape
+                lignes.append(f"# ERREUR {metrique.nom}: {_echapper(e)}")
+        return "\n".join(lignes) + "\n"
+
+
+# Registre global du process
+registre = Registre()
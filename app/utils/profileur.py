@@ -0,0 +1,198 @@
+"""
+profileur.py — Profileur par échantillonnage, activable à chaud dans un worker
+Auteur : Moi (ESIEA 3A)
+
+Quand le p99 grimpe en prod, impossible d'attacher py-spy ou cProfile à un worker
+uvicorn qui tourne déjà. Ici un thread de fond regarde toutes les `intervalle_ms`
+la pile de chaque thread (sys._current_frames, pas besoin de tracer chaque appel :
+le coût ne dépend pas du nombre d'appels), et compte les piles identiques.
+
+On ne garde que les piles qui passent par nos modules (par défaut les handlers de
+app.routes.questions et app.models.adaptive_model) : le reste c'est la boucle
+asyncio / le threadpool qui attendent, ça n'apprend rien.
+
+Deux sorties :
+- "collapsed" : une ligne "f1;f2;f3 nb" par pile (flamegraph.pl, speedscope, ...)
+- "speedscope" : le JSON de https://www.speedscope.app (profil "sampled")
+
+Un seul profilage à la fois par process.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+MODULES_CIBLES = ("app.routes.questions", "app.models.adaptive_model")
+INTERVALLE_MS = 5.0
+DUREE_MAX_S = 60.0
+
+_verrou_session = threading.Lock()
+
+
+class ProfilageEnCours(RuntimeError):
+    """Un autre profilage tourne déjà dans ce worker."""
+
+
+def _nom_frame(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}:{code.co_firstlineno}"
+
+
+class Echantillonneur:
+    """Thread qui échantillonne les piles des autres threads jusqu'à arreter()."""
+
+    def __init__(self, intervalle_ms: float = INTERVALLE_MS, modules: tuple = MODULES_CIBLES):
+        self.intervalle_s = intervalle_ms / 1000
+        self.modules = tuple(modules)
+        self.piles = Counter()  # tuple de noms (racine → feuille) → nb d'échantillons
+        self.nb_echantillons = 0
+        self.duree_s = 0.0
+        self._arret = threading.Event()
+        self._thread = threading.Thread(target=self._boucle, name="profileur", daemon=True)
+
+    def _pile_utile(self, frame) -> tuple:
+        """Pile racine → feuille, ou () si elle ne touche aucun module ciblé."""
+        noms = []
+        utile = False
+        while frame is not None:
+            if not utile and frame.f_globals.get("__name__", "").startswith(self.modules):
+                utile = True
+            noms.append(_nom_frame(frame))
+            frame = frame.f_back
+        return tuple(reversed(noms)) if utile else ()
+
+    def _boucle(self):
+        moi = threading.get_ident()
+        # Le thread d'échantillonnage doit récupérer le GIL pour regarder les piles.
+        # Avec l'intervalle de bascule par défaut (5ms) il ne l'obtient souvent que
+        # quand les autres threads se bloquent d'eux-mêmes → on ne verrait jamais
+        # les handlers courts. On raccourcit l'intervalle le temps du profilage.
+        intervalle_bascule = sys.getswitchinterval()
+        sys.setswitchinterval(min(intervalle_bascule, self.intervalle_s / 100))
+        debut = time.perf_counter()
+        try:
+            while not self._arret.wait(self.intervalle_s):
+                for ident, frame in sys._current_frames().items():
+                    if ident == moi:
+                        continue
+                    pile = self._pile_utile(frame)
+                    if pile:
+                        self.piles[pile] += 1
+                self.nb_echantillons += 1
+        finally:
+            sys.setswitchinterval(intervalle_bascule)
+            self.duree_s = time.perf_counter() - debut
+
+    def demarrer(self):
+        self._thread.start()
+
+    def arreter(self):
+        self._arret.set()
+        self._thread.join()
+
+    # --- Sorties ---
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{';'.join(pile)} {nb}\n" for pile, nb in self.piles.most_common()
+        )
+
+    def speedscope(self, nom: str = "worker") -> dict:
+        frames = []
+        index_frame = {}
+        echantillons = []
+        poids = []
+        for pile, nb in self.piles.most_common():
+            indices = []
+            for nom_frame in pile:
+                if nom_frame not in index_frame:
+                    module, fonction, ligne = nom_frame.rsplit(":", 2)
+                    index_frame[nom_frame] = len(frames)
+                    frames.append(
+                        {"name": f"{fonction} ({module})", "file": module, "line": int(ligne)}
+                    )
+                indices.append(index_frame[nom_frame])
+            echantillons.append(indices)
+            poids.append(nb * self.intervalle_s)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": nom,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(poids),
+                    "samples": echantillons,
+                    "weights": poids,
+                }
+            ],
+            "exporter": "app.utils.profileur",
+        }
+
+
+def demarrer_profilage(
+    intervalle_ms: float = INTERVALLE_MS, modules: tuple = MODULES_CIBLES
+) -> Echantillonneur:
+    """Démarre une session ; lève ProfilageEnCours s'il y en a déjà une."""
+    if not _verrou_session.acquire(blocking=False):
+        raise ProfilageEnCours("Un profilage est déjà en cours dans ce worker")
+    echantillonneur = Echantillonneur(intervalle_ms, modules)
+    echantillonneur.demarrer()
+    return echantillonneur
+
+
+def terminer_profilage(echantillonneur: Echantillonneur):
+    try:
+        echantillonneur.arreter()
+    finally:
+        _verrou_session.release()
+
+
+def profiler_pendant(secondes: float, intervalle_ms: float = INTERVALLE_MS) -> Echantillonneur:
+    """Version bloquante (pour le signal ou un script) : profile `secondes` puis rend la main."""
+    echantillonneur = demarrer_profilage(intervalle_ms)
+    try:
+        time.sleep(min(secondes, DUREE_MAX_S))
+    finally:
+        terminer_profilage(echantillonneur)
+    return echantillonneur
+
+
+def installer_signal(signal_num=None, secondes: float = 10.0, dossier: str = "/tmp") -> bool:
+    """
+    kill -USR2 <pid du worker> → profile `secondes` dans un thread, puis écrit
+    <dossier>/profil-<pid>-<horodatage>.collapsed. Retourne False si impossible
+    (Windows, ou pas appelé depuis le thread principal).
+    """
+    signal_num = signal_num or getattr(signal, "SIGUSR2", None)
+    if signal_num is None:
+        return False
+
+    def ecrire_profil():
+        try:
+            echantillonneur = profiler_pendant(secondes)
+        except ProfilageEnCours:
+            print("[WARN] Profilage déjà en cours, signal ignoré")
+            return
+        chemin = os.path.join(
+            dossier, f"profil-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+        )
+        with open(chemin, "w") as f:
+            f.write(echantillonneur.collapsed())
+        print(f"[PROFIL] {echantillonneur.nb_echantillons} échantillons → {chemin}")
+
+    def gestionnaire(signum, frame):
+        # Pas de travail dans le gestionnaire lui-même : on délègue à un thread
+        threading.Thread(target=ecrire_profil, name="profil-signal", daemon=True).start()
+
+    try:
+        signal.signal(signal_num, gestionnaire)
+    except ValueError:
+        return False
+    return True
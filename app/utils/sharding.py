@@ -0,0 +1,621 @@
+"""
+sharding.py — Répartition des apprenants entre plusieurs nœuds (anneau de hachage cohérent)
+Auteur : Moi (ESIEA 3A)
+
+Un seul host ne suffit plus. Chaque apprenant a maintenant UN nœud propriétaire, qui
+garde son profil : le user_id est placé sur un anneau de hachage cohérent où chaque
+nœud a `vnoeuds` points (nœuds virtuels, pour lisser la répartition). Le propriétaire
+est le premier point après hash(user_id) dans le sens de l'anneau.
+
+- MiddlewareSharding : une requête /api/... pour un apprenant d'un autre nœud est
+  relayée au propriétaire (proxy, SHARDING_MODE=proxy) ou redirigée (307,
+  SHARDING_MODE=redirection). Un lot /reponses/batch multi-apprenants est découpé par
+  propriétaire puis recollé dans l'ordre. Une requête déjà relayée (en-tête
+  X-Shard-Relaye) n'est jamais relayée une 2e fois : si ce nœud n'en est pas le
+  propriétaire, c'est que les deux nœuds n'ont pas encore le même anneau (il arrive
+  nœud par nœud) → 503 + Retry-After, le client réessaie une fois l'anneau partout.
+- changement de membres (POST /admin/cluster sur CHAQUE nœud) : ajouter un nœud ne
+  déplace qu'environ 1/N des apprenants. Le passage de relais est incrémental :
+    * en fond, chaque nœud attend la fin des requêtes admises avec l'ancien anneau,
+      puis pousse par lots les profils qu'il n'a plus à garder vers leur nouveau
+      propriétaire, et ne les supprime qu'une fois reçus (sous le verrou du profil) ;
+      il refait un tour pour ceux apparus entre-temps avant de dire qu'il a fini ;
+    * en attendant, le nouveau propriétaire qui voit passer un apprenant qu'il n'a pas
+      encore le demande à l'ancien (il le lui cède), une seule fois ;
+    * chaque nœud qui a fini de pousser le dit à tous les autres ; quand tous les
+      nœuds de l'ancien anneau ont fini, la transition est close.
+
+Les appels entre nœuds passent par les routes /admin/cluster (jeton ADMIN_TOKEN, le
+même partout). Il faut httpx. Un nœud = un worker uvicorn (l'anneau est gardé par le
+process ; pour plusieurs workers par nœud il faudrait le partager comme les profils).
+Seul le profil voyage (Profil.vers_octets, avec ses 50 dernières réponses) : avec
+STOCKAGE_PROFILS=sqlite, l'historique complet de la table `historique` ne suit pas.
+
+Activé par l'environnement :
+    SHARDING_NOEUD=a
+    SHARDING_NOEUDS=a=http://10.0.0.1:8000,b=http://10.0.0.2:8000
+    SHARDING_VNOEUDS=64        SHARDING_MODE=proxy | redirection
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from urllib.parse import parse_qs
+
+from pydantic import TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.models import adaptive_model
+from app.routes.questions import TAILLE_MAX_LOT, ReponseUtilisateur
+from app.utils.metriques import registre
+
+try:
+    import httpx
+except ImportError:  # dépendance optionnelle (requirements.txt)
+    httpx = None
+
+VNOEUDS = 64
+TAILLE_LOT = 500
+TOURS_MAX = 3  # tours de "rattrapage" des profils apparus pendant le passage de relais
+ATTENTE_REQUETES_S = 30.0
+ENTETE_RELAYE = b"x-shard-relaye"
+_TRAME = struct.Struct("<HI")  # longueur du user_id, longueur du profil
+_LOT = TypeAdapter(list[ReponseUtilisateur])
+
+METRIQUE_SHARDING = registre.compteur(
+    "sharding_requetes_total",
+    "Sharding : requêtes servies ici (locale), relayées ou redirigées vers le propriétaire, "
+    "refusées en 503 car relayées par un nœud qui n'a pas le même anneau (desaccord), "
+    "profils demandés à l'ancien propriétaire (recuperation, recuperation_vide), erreurs",
+    ("issue",),
+)
+METRIQUE_HANDOFF = registre.compteur(
+    "sharding_handoff_total",
+    "Passage de relais des profils : envoyes, recus, ignores (déjà présents), erreur",
+    ("evenement",),
+)
+
+
+def _hash(texte: str) -> int:
+    return int.from_bytes(hashlib.blake2b(texte.encode(), digest_size=8).digest(), "little")
+
+
+class AnneauCoherent:
+    """Anneau de hachage cohérent : nom du nœud → URL, `vnoeuds` points par nœud."""
+
+    def __init__(self, noeuds: dict, vnoeuds: int = VNOEUDS):
+        if not noeuds:
+            raise ValueError("Il faut au moins un nœud dans l'anneau")
+        self.noeuds = dict(noeuds)
+        self.vnoeuds = vnoeuds
+        points = sorted((_hash(f"{nom}#{i}"), nom) for nom in self.noeuds for i in range(vnoeuds))
+        self._hashes = [h for h, _ in points]
+        self._noms = [nom for _, nom in points]
+
+    def proprietaire(self, user_id: str) -> str:
+        i = bisect.bisect(self._hashes, _hash(user_id))
+        return self._noms[i % len(self._noms)]
+
+    def url(self, nom: str) -> str:
+        return self.noeuds[nom]
+
+    def parts(self) -> dict:
+        """Part de l'anneau (donc des apprenants, en moyenne) de chaque nœud."""
+        parts = dict.fromkeys(self.noeuds, 0)
+        precedent = self._hashes[-1] - (1 << 64)
+        for h, nom in zip(self._hashes, self._noms):
+            parts[nom] += (h - precedent) / (1 << 64)
+            precedent = h
+        return parts
+
+
+def encoder_profils(profils: list) -> bytes:
+    """[(user_id, Profil.vers_octets()), ...] → trames [longueurs][user_id][profil]."""
+    morceaux = []
+    for user_id, donnees in profils:
+        id_octets = user_id.encode()
+        morceaux += [_TRAME.pack(len(id_octets), len(donnees)), id_octets, donnees]
+    return b"".join(morceaux)
+
+
+def decoder_profils(corps: bytes) -> list:
+    profils, position = [], 0
+    while position < len(corps):
+        longueur_id, longueur = _TRAME.unpack_from(corps, position)
+        position += _TRAME.size
+        user_id = corps[position : position + longueur_id].decode()
+        position += longueur_id
+        profils.append((user_id, corps[position : position + longueur]))
+        position += longueur
+    return profils
+
+
+class Cluster:
+    """Vue de l'anneau par CE nœud + passage de relais lors d'un changement de membres."""
+
+    def __init__(
+        self, noeud: str, noeuds: dict, vnoeuds: int = VNOEUDS, mode: str = "proxy",
+        jeton: str = None,
+    ):
+        if httpx is None:
+            raise RuntimeError("Le sharding a besoin de httpx (pip install httpx)")
+        if mode not in ("proxy", "redirection"):
+            raise ValueError(f"Mode de sharding inconnu : {mode} (proxy ou redirection)")
+        if noeud not in noeuds:
+            raise ValueError(f"Le nœud {noeud} n'est pas dans SHARDING_NOEUDS")
+        self.noeud = noeud
+        self.vnoeuds = vnoeuds
+        self.mode = mode
+        self.jeton = jeton if jeton is not None else os.environ.get("ADMIN_TOKEN", "")
+        self.version = 0
+        self.anneau = AnneauCoherent(noeuds, vnoeuds)
+        self.anneau_precedent = None  # non None pendant une transition
+        self._termines: dict = {}  # version → nœuds qui ont fini de pousser
+        self._verrou = threading.Lock()
+        self._client = None  # httpx.AsyncClient, créé dans la boucle asyncio
+        self._recuperations: dict = {}  # user_id → asyncio.Lock
+        self._handoff = None
+        self._arret = threading.Event()
+        self._nb_pousses = 0
+        self._nb_a_pousser = 0
+        self._en_cours: dict = {}  # version de l'anneau à l'arrivée → requêtes en cours
+
+    # --- Routage ---
+
+    def proprietaire(self, user_id: str) -> str:
+        return self.anneau.proprietaire(user_id)
+
+    def entrer(self) -> int:
+        """Une requête /api/ commence : version de l'anneau avec laquelle elle est routée."""
+        with self._verrou:
+            self._en_cours[self.version] = self._en_cours.get(self.version, 0) + 1
+            return self.version
+
+    def sortir(self, version: int):
+        with self._verrou:
+            self._en_cours[version] -= 1
+            if not self._en_cours[version]:
+                del self._en_cours[version]
+
+    def _attendre_requetes(self, version: int, delai_s: float = ATTENTE_REQUETES_S):
+        """Attend la fin des requêtes routées avec un anneau antérieur à `version`."""
+        fin = time.monotonic() + delai_s
+        while True:
+            with self._verrou:
+                restantes = sum(n for v, n in self._en_cours.items() if v < version)
+            if not restantes:
+                return
+            if time.monotonic() > fin or self._arret.is_set():
+                print(f"[WARN] {restantes} requêtes de l'ancien anneau encore en cours")
+                return
+            time.sleep(0.01)
+
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10.0)
+        return self._client
+
+    async def preparer(self, user_id: str):
+        """
+        Avant de servir un apprenant qui vient d'arriver ici par changement d'anneau :
+        si on n'a pas encore son profil, on le demande à l'ancien propriétaire.
+        """
+        precedent = self.anneau_precedent
+        if precedent is None:
+            return
+        ancien = precedent.proprietaire(user_id)
+        if ancien == self.noeud or ancien not in precedent.noeuds:
+            return
+        # Un verrou par apprenant, gardé jusqu'à la fin de la transition : deux requêtes
+        # du même apprenant ne doivent pas créer un profil neuf pendant que l'autre le réclame
+        verrou = self._recuperations.setdefault(user_id, asyncio.Lock())
+        async with verrou:
+            if await run_in_threadpool(adaptive_model.trouver_profil, user_id) is not None:
+                return
+            reponse = await self.client().get(
+                f"{precedent.url(ancien)}/admin/cluster/profils/{user_id}",
+                headers={"X-Admin-Token": self.jeton},
+            )
+            if reponse.status_code == 404:
+                # Déjà poussé (donc déjà reçu ici) ou apprenant inconnu
+                METRIQUE_SHARDING.inc("recuperation_vide")
+                return
+            reponse.raise_for_status()
+            await run_in_threadpool(adaptive_model.importer_profil, user_id, reponse.content)
+            METRIQUE_SHARDING.inc("recuperation")
+
+    # --- Changement de membres ---
+
+    def changer_membres(self, noeuds: dict, version: int) -> dict:
+        """Nouvel anneau (même `version` sur tous les nœuds) et passage de relais en fond."""
+        with self._verrou:
+            if version <= self.version:
+                raise ValueError(f"Version {version} déjà vue (version courante {self.version})")
+            if self._handoff is not None and self._handoff.is_alive():
+                raise ValueError("Passage de relais précédent encore en cours")
+            self.anneau_precedent = self.anneau
+            self.anneau = AnneauCoherent(noeuds, self.vnoeuds)
+            self.version = version
+        print(
+            f"[SHARDING] Anneau v{version} : {sorted(noeuds)} "
+            f"(avant : {sorted(self.anneau_precedent.noeuds)})"
+        )
+        self._handoff = threading.Thread(
+            target=self._pousser, args=(version,), name="sharding-handoff", daemon=True
+        )
+        self._handoff.start()
+        return self.metriques()
+
+    def _a_pousser(self) -> dict:
+        """Nouveau propriétaire → user_id des profils d'ici qui ne sont plus à nous."""
+        a_pousser: dict = {}
+        for user_id in adaptive_model.ids_profils():
+            nom = self.anneau.proprietaire(user_id)
+            if nom != self.noeud:
+                a_pousser.setdefault(nom, []).append(user_id)
+        return a_pousser
+
+    def _pousser(self, version: int):
+        """Thread : pousse par lots les profils qui ont changé de propriétaire."""
+        # Une requête admise avec l'ancien anneau peut encore écrire un profil qui part
+        self._attendre_requetes(version)
+        self._nb_pousses = 0
+        self._nb_a_pousser = 0
+
+        with httpx.Client(timeout=30.0, headers={"X-Admin-Token": self.jeton}) as client:
+            # Le 1er tour prend tout ; les suivants rattrapent les profils recréés ici
+            # entre-temps (requête en retard au-delà de ATTENTE_REQUETES_S...)
+            for _ in range(TOURS_MAX):
+                a_pousser = self._a_pousser()
+                if not a_pousser:
+                    break
+                self._nb_a_pousser += sum(len(ids) for ids in a_pousser.values())
+                for nom, ids in a_pousser.items():
+                    for debut in range(0, len(ids), TAILLE_LOT):
+                        self._pousser_lot(client, nom, ids[debut : debut + TAILLE_LOT])
+            else:
+                restants = sum(len(ids) for ids in self._a_pousser().values())
+                if restants:
+                    print(f"[WARN] {restants} profils toujours ici après {TOURS_MAX} tours")
+            # Fini : on le dit à tout le monde (ancien et nouvel anneau)
+            destinataires = {**self.anneau_precedent.noeuds, **self.anneau.noeuds}
+            for nom, url in destinataires.items():
+                if nom == self.noeud:
+                    self.handoff_termine(self.noeud, version)
+                    continue
+                self._avec_reessais(
+                    lambda: client.post(
+                        f"{url}/admin/cluster/handoff-termine",
+                        json={"noeud": self.noeud, "version": version},
+                    )
+                )
+        print(f"[SHARDING] Passage de relais v{version} : {self._nb_pousses} profils poussés")
+
+    def _pousser_lot(self, client, nom: str, ids: list):
+        profils = []
+        for user_id in ids:
+            donnees = adaptive_model.image_profil(user_id)
+            if donnees is not None:
+                profils.append((user_id, donnees))
+        if not profils:
+            return
+        url = f"{self.anneau.url(nom)}/admin/cluster/profils"
+        self._avec_reessais(lambda: client.post(url, content=encoder_profils(profils)))
+        # Reçus : ce nœud n'a plus à les garder. Plus personne ne les modifie ici (les
+        # requêtes de l'ancien anneau sont finies, les nouvelles vont au propriétaire)
+        for user_id, _ in profils:
+            adaptive_model.ceder_profil(user_id)
+        self._nb_pousses += len(profils)
+        METRIQUE_HANDOFF.inc("envoyes", n=len(profils))
+
+    def _avec_reessais(self, requete, essais: int = 5):
+        for essai in range(essais):
+            try:
+                requete().raise_for_status()
+                return
+            except httpx.HTTPError as e:
+                METRIQUE_HANDOFF.inc("erreur")
+                if essai == essais - 1 or self._arret.is_set():
+                    raise
+                print(f"[WARN] Passage de relais, nouvel essai : {e}")
+                time.sleep(0.5 * 2**essai)
+
+    def handoff_termine(self, noeud: str, version: int):
+        """Un nœud a fini de pousser ; la transition est close quand ils ont tous fini."""
+        with self._verrou:
+            termines = self._termines.setdefault(version, set())
+            termines.add(noeud)
+            if (
+                version == self.version
+                and self.anneau_precedent is not None
+                and termines >= set(self.anneau_precedent.noeuds)
+            ):
+                self.anneau_precedent = None
+                self._recuperations = {}
+                del self._termines[version]
+                print(f"[SHARDING] Transition v{version} terminée")
+
+    def arreter(self):
+        self._arret.set()
+        if self._handoff is not None:
+            self._handoff.join(timeout=5)
+
+    def metriques(self) -> dict:
+        return {
+            "noeud": self.noeud,
+            "version": self.version,
+            "noeuds": self.anneau.noeuds,
+            "mode": self.mode,
+            "nb_noeuds": len(self.anneau.noeuds),
+            "part_anneau": self.anneau.parts().get(self.noeud, 0.0),
+            "transition": int(self.anneau_precedent is not None),
+            "profils_a_pousser": self._nb_a_pousser,
+            "profils_pousses": self._nb_pousses,
+        }
+
+
+def creer_cluster_depuis_env():
+    """Cluster décrit par SHARDING_NOEUD / SHARDING_NOEUDS (voir en haut), None sinon."""
+    noeud = os.environ.get("SHARDING_NOEUD")
+    if not noeud:
+        return None
+    noeuds = dict(
+        morceau.strip().split("=", 1)
+        for morceau in os.environ.get("SHARDING_NOEUDS", "").split(",")
+        if morceau.strip()
+    )
+    return Cluster(
+        noeud,
+        noeuds,
+        vnoeuds=int(os.environ.get("SHARDING_VNOEUDS", VNOEUDS)),
+        mode=os.environ.get("SHARDING_MODE", "proxy"),
+    )
+
+
+cluster: Cluster = creer_cluster_depuis_env()
+
+
+def arreter_cluster():
+    if cluster is not None:
+        cluster.arreter()
+
+
+registre.jauge(
+    "sharding",
+    "Sharding : version de l'anneau, part de l'anneau de ce nœud, transition en cours...",
+    lambda: {
+        (cle,): valeur
+        for cle, valeur in (cluster.metriques() if cluster is not None else {}).items()
+        if isinstance(valeur, (int, float))
+    },
+    ("cle",),
+)
+
+
+# --- Middleware ---
+
+
+def _user_ids(scope, corps: bytes):
+    """
+    user_id visé par la requête (str), liste de user_id pour /reponses/batch,
+    None si la requête n'est pas liée à un apprenant (elle est servie sur place).
+    """
+    chemin = scope["path"]
+    for prefixe in ("/api/stats/", "/api/reset/"):
+        if chemin.startswith(prefixe):
+            return chemin[len(prefixe) :] or None
+    if chemin == "/api/questions":
+        valeurs = parse_qs(scope.get("query_string", b"").decode()).get("user_id")
+        return valeurs[0] if valeurs else None
+    if chemin not in ("/api/reponse", "/api/reponses/batch"):
+        return None
+    try:
+        donnees = json.loads(corps)
+        if chemin == "/api/reponse":
+            return str(donnees["user_id"])
+        return [str(ligne["user_id"]) for ligne in donnees]
+    except (ValueError, TypeError, KeyError):
+        return None  # corps invalide : FastAPI renverra le 422 lui-même
+
+
+def _lot_valide(corps: bytes) -> bool:
+    """
+    Un lot invalide n'est pas découpé : il est servi ici et FastAPI renvoie le 422 sans
+    rien appliquer, au lieu d'un sous-lot appliqué ailleurs et d'un autre refusé.
+    """
+    try:
+        return len(_LOT.validate_json(corps)) <= TAILLE_MAX_LOT
+    except ValidationError:
+        return False
+
+
+async def _lire_corps(receive) -> bytes:
+    morceaux = []
+    while True:
+        message = await receive()
+        morceaux.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(morceaux)
+
+
+def _rejouer(corps: bytes, receive):
+    """receive ASGI qui redonne le corps déjà lu, puis laisse passer la déconnexion."""
+    envoye = [False]
+
+    async def receive_rejoue():
+        if not envoye[0]:
+            envoye[0] = True
+            return {"type": "http.request", "body": corps, "more_body": False}
+        return await receive()
+
+    return receive_rejoue
+
+
+async def _preparer(user_ids: list):
+    """Profils pas encore arrivés de l'ancien propriétaire (voir Cluster.preparer)."""
+    for user_id in user_ids:
+        try:
+            await cluster.preparer(user_id)
+        except httpx.HTTPError as e:
+            # Ancien propriétaire injoignable : on sert quand même (profil neuf au pire)
+            METRIQUE_SHARDING.inc("erreur")
+            print(f"[WARN] Profil de {user_id} pas récupéré : {e}")
+
+
+async def _envoyer(send, code: int, corps: bytes, entetes: list):
+    await send({
+        "type": "http.response.start",
+        "status": code,
+        "headers": entetes + [(b"content-length", str(len(corps)).encode())],
+    })
+    await send({"type": "http.response.body", "body": corps})
+
+
+class MiddlewareSharding:
+    """
+    Middleware ASGI brut (comme MiddlewareMetriques) : sert sur place les apprenants de
+    ce nœud, relaie ou redirige les autres. Sans cluster configuré, il ne fait rien.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if cluster is None or scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        corps = await _lire_corps(receive) if scope["method"] == "POST" else b""
+        receive = _rejouer(corps, receive)
+        # Compté AVANT de regarder l'anneau : un passage de relais attend cette requête
+        version = cluster.entrer()
+        try:
+            await self._router(scope, corps, receive, send)
+        finally:
+            cluster.sortir(version)
+
+    async def _router(self, scope, corps: bytes, receive, send):
+        cible = _user_ids(scope, corps)
+        relaye = any(nom == ENTETE_RELAYE for nom, _ in scope["headers"])
+
+        if isinstance(cible, list):
+            proprietaires = {cluster.proprietaire(user_id) for user_id in cible}
+            if len(proprietaires) > 1 and not relaye and _lot_valide(corps):
+                await self._decouper_lot(scope, corps, cible, send)
+                return
+            user_ids = list(dict.fromkeys(cible))
+        else:
+            proprietaires = {cluster.proprietaire(cible)} if cible is not None else set()
+            user_ids = [] if cible is None else [cible]
+        proprietaire = proprietaires.pop() if len(proprietaires) == 1 else cluster.noeud
+
+        if relaye and any(nom != cluster.noeud for nom in proprietaires | {proprietaire}):
+            # L'autre nœud croit qu'on est le propriétaire, pas nous : anneau pas encore
+            # arrivé partout. Servir ici écrirait un profil qui n'est plus (ou pas encore)
+            # le nôtre, relayer encore pourrait tourner en rond.
+            METRIQUE_SHARDING.inc("desaccord")
+            detail = json.dumps({"detail": "Changement d'anneau en cours, réessayer"}).encode()
+            await _envoyer(
+                send, 503, detail,
+                [(b"content-type", b"application/json"), (b"retry-after", b"1")],
+            )
+        elif proprietaire == cluster.noeud:
+            METRIQUE_SHARDING.inc("locale")
+            await _preparer(user_ids)
+            await self.app(scope, receive, send)
+        elif cluster.mode == "redirection":
+            METRIQUE_SHARDING.inc("redirigee")
+            url = cluster.anneau.url(proprietaire) + self._chemin(scope)
+            await _envoyer(send, 307, b"", [(b"location", url.encode())])
+        else:
+            code, contenu, entetes = await self._relayer(scope, corps, proprietaire)
+            await _envoyer(send, code, contenu, entetes)
+
+    @staticmethod
+    def _chemin(scope) -> str:
+        requete = scope.get("query_string", b"").decode()
+        return scope["path"] + (f"?{requete}" if requete else "")
+
+    async def _relayer(self, scope, corps: bytes, proprietaire: str) -> tuple:
+        """Requête rejouée telle quelle chez le propriétaire : (code, corps, en-têtes)."""
+        METRIQUE_SHARDING.inc("relayee")
+        entetes = {
+            nom.decode(): valeur.decode()
+            for nom, valeur in scope["headers"]
+            if nom in (b"content-type", b"accept", b"x-trace")
+        }
+        entetes["x-shard-relaye"] = cluster.noeud
+        try:
+            reponse = await cluster.client().request(
+                scope["method"],
+                cluster.anneau.url(proprietaire) + self._chemin(scope),
+                content=corps,
+                headers=entetes,
+            )
+        except httpx.HTTPError as e:
+            METRIQUE_SHARDING.inc("erreur")
+            detail = json.dumps({"detail": f"Nœud {proprietaire} injoignable : {e}"}).encode()
+            return 503, detail, [(b"content-type", b"application/json")]
+        garder = ("content-type", "server-timing", "retry-after")
+        entetes_reponse = [
+            (nom.encode(), valeur.encode())
+            for nom, valeur in reponse.headers.items()
+            if nom in garder
+        ]
+        entetes_reponse.append((b"x-shard-noeud", proprietaire.encode()))
+        return reponse.status_code, reponse.content, entetes_reponse
+
+    async def _decouper_lot(self, scope, corps: bytes, user_ids: list, send):
+        """Lot multi-propriétaires : un sous-lot par nœud, résultats recollés dans l'ordre."""
+        lignes = json.loads(corps)
+        par_noeud: dict = {}
+        for i, user_id in enumerate(user_ids):
+            par_noeud.setdefault(cluster.proprietaire(user_id), []).append(i)
+
+        async def sous_lot(nom, indices):
+            sous_corps = json.dumps([lignes[i] for i in indices]).encode()
+            if nom != cluster.noeud:
+                return await self._relayer(scope, sous_corps, nom)
+            return await self._appeler_ici(scope, sous_corps, user_ids, indices)
+
+        noms = list(par_noeud)
+        reponses = await asyncio.gather(*(sous_lot(nom, par_noeud[nom]) for nom in noms))
+        for code, contenu, entetes in reponses:
+            if code != 200:
+                # Les autres sous-lots sont déjà appliqués, comme un lot qui échoue en cours
+                await _envoyer(send, code, contenu, entetes)
+                return
+        resultats = [None] * len(lignes)
+        for nom, (_, contenu, _) in zip(noms, reponses):
+            for i, resultat in zip(par_noeud[nom], json.loads(contenu)):
+                resultats[i] = resultat
+        await _envoyer(
+            send, 200, json.dumps(resultats).encode(), [(b"content-type", b"application/json")]
+        )
+
+    async def _appeler_ici(self, scope, corps: bytes, user_ids: list, indices: list) -> tuple:
+        """Sous-lot servi par CE nœud, réponse capturée au lieu d'être envoyée."""
+        METRIQUE_SHARDING.inc("locale")
+        await _preparer(list(dict.fromkeys(user_ids[i] for i in indices)))
+        reponse = {"code": 500, "entetes": [], "corps": []}
+
+        async def receive():
+            return {"type": "http.request", "body": corps, "more_body": False}
+
+        async def capturer(message):
+            if message["type"] == "http.response.start":
+                reponse["code"] = message["status"]
+                reponse["entetes"] = [
+                    (nom, valeur) for nom, valeur in message.get("headers", [])
+                    if nom != b"content-length"
+                ]
+            else:
+                reponse["corps"].append(message.get("body", b""))
+
+        await self.app(dict(scope), receive, capturer)
+        return reponse["code"], b"".join(reponse["corps"]), reponse["entetes"]
@@ -0,0 +1,95 @@
+"""
+trace.py — Trace par requête, à la demande (en-tête X-Trace: 1)
+Auteur : Moi (ESIEA 3A)
+
+Pour comprendre UNE requête lente sans profiler tout le worker : le client envoie
+`X-Trace: 1` et la réponse revient avec un en-tête standard Server-Timing, lisible
+directement dans l'onglet réseau des devtools :
+
+    Server-Timing: profil;dur=0.011, tirage;dur=0.004, enonce;dur=0.002,
+                   handler;dur=0.031, framework;dur=0.121, total;dur=0.152
+
+- chaque étape du code est délimitée par `with etape("nom"):`
+- "handler" = le temps dans notre fonction de route
+- "framework" = total - handler (lecture du corps, validation Pydantic, sérialisation)
+
+Sans l'en-tête, etape() ne fait presque rien (un ContextVar.get et un objet partagé).
+Les durées d'une même étape sont additionnées (ex. plusieurs tirages).
+"""
+
+import contextvars
+import time
+from contextlib import nullcontext
+
+ENTETE_TRACE = b"x-trace"
+
+# dict {étape: durée en s} de la requête tracée en cours, None sinon.
+# FastAPI copie le contexte dans le threadpool : le handler sync et le middleware
+# partagent donc le même dict.
+_trace_courante = contextvars.ContextVar("trace_courante", default=None)
+_RIEN = nullcontext()
+
+
+class _Etape:
+    __slots__ = ("nom", "trace", "debut")
+
+    def __init__(self, nom: str, trace: dict):
+        self.nom = nom
+        self.trace = trace
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.trace[self.nom] = self.trace.get(self.nom, 0.0) + time.perf_counter() - self.debut
+
+
+def etape(nom: str):
+    """`with etape("predict"):` — chronométré seulement si la requête est tracée."""
+    trace = _trace_courante.get()
+    if trace is None:
+        return _RIEN
+    return _Etape(nom, trace)
+
+
+def trace_active() -> bool:
+    return _trace_courante.get() is not None
+
+
+def _server_timing(trace: dict) -> bytes:
+    # Server-Timing attend des millisecondes
+    return ", ".join(f"{nom};dur={duree * 1e3:.3f}" for nom, duree in trace.items()).encode()
+
+
+class MiddlewareTrace:
+    """Middleware ASGI : active la trace si X-Trace: 1 et ajoute Server-Timing à la réponse."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (ENTETE_TRACE, b"1") not in scope["headers"]:
+            await self.app(scope, receive, send)
+            return
+
+        trace = {}
+        jeton = _trace_courante.set(trace)
+        debut = time.perf_counter()
+
+        async def send_avec_trace(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - debut
+                if "handler" in trace:
+                    trace["framework"] = total - trace["handler"]
+                trace["total"] = total
+                message = dict(message)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", _server_timing(trace)),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_avec_trace)
+        finally:
+            _trace_courante.reset(jeton)
@@ -0,0 +1,94 @@
+"""
+test_compilateur.py — TablePrediction vs modele.predict (seuils de split, temps extrêmes)
+Auteur : Moi (ESIEA 3A)
+
+Même contrôle que bench_table_prediction.py, mais sur une petite forêt entraînée ici :
+pas besoin du dataset ni de l'artefact du modèle.
+
+Lancer :
+    PYTHONPATH=. python -m pytest -q tests/test_compilateur.py
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from app.models.compilateur import FEATURES, TEMPS_MAX, compiler_foret
+
+SUJETS = ["algo", "bdd", "math", "python"]
+
+
+@pytest.fixture(scope="module")
+def foret():
+    rng = np.random.default_rng(0)
+    n = 3000
+    X = pd.DataFrame(
+        {
+            "score": rng.integers(0, 2, n),
+            "temps_secondes": rng.uniform(1, 120, n),
+            "sujet_encode": rng.integers(0, len(SUJETS), n),
+        }
+    )[FEATURES]
+    y = np.clip(1 + X["temps_secondes"] // 25 + X["score"] + rng.integers(-1, 2, n), 1, 5)
+    modele = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0)
+    modele.fit(X, y.astype(int))
+    return modele, compiler_foret(modele, SUJETS)
+
+
+def predire_sklearn(modele, temps: np.ndarray) -> np.ndarray:
+    """modele.predict pour chaque temps, tous les (score, sujet)."""
+    scores, codes, t = np.meshgrid(np.arange(2), np.arange(len(SUJETS)), temps, indexing="ij")
+    X = pd.DataFrame(
+        {"score": scores.ravel(), "temps_secondes": t.ravel(), "sujet_encode": codes.ravel()}
+    )[FEATURES]
+    return modele.predict(X).reshape(scores.shape)
+
+
+def predire_table(table, temps) -> np.ndarray:
+    return np.array(
+        [
+            [[table.predire(score, t, sujet) for t in temps] for sujet in SUJETS]
+            for score in range(2)
+        ]
+    )
+
+
+def test_seuils_et_voisins(foret):
+    modele, table = foret
+    seuils = table.seuils_temps
+    assert len(seuils) > 0
+    temps = np.concatenate(
+        [
+            seuils,
+            np.nextafter(seuils.astype(np.float32), np.float32(np.inf)),
+            np.nextafter(seuils.astype(np.float32), np.float32(-np.inf)),
+        ]
+    ).astype(np.float64)
+    attendu = predire_sklearn(modele, temps)
+    np.testing.assert_array_equal(predire_table(table, temps), attendu)
+
+    scores, codes, t = np.meshgrid(np.arange(2), np.arange(len(SUJETS)), temps, indexing="ij")
+    np.testing.assert_array_equal(table.predire_lot(scores, t, codes), attendu)
+
+
+def test_temps_extremes(foret):
+    modele, table = foret
+    petits = np.array([1e-300, 1e-45, np.finfo(np.float32).tiny, 1e-3])
+    np.testing.assert_array_equal(predire_table(table, petits), predire_sklearn(modele, petits))
+
+    # Au-delà du float32 sklearn refuse la ligne : la table répond comme pour TEMPS_MAX,
+    # sans RuntimeWarning d'overflow
+    attendu = predire_sklearn(modele, np.array([TEMPS_MAX]))
+    enormes = [TEMPS_MAX, 3.5e38, 1e308, np.inf]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for t in enormes:
+            np.testing.assert_array_equal(predire_table(table, [t]), attendu)
+        scores, codes, t = np.meshgrid(
+            np.arange(2), np.arange(len(SUJETS)), enormes, indexing="ij"
+        )
+        lot = table.predire_lot(scores, t, codes)
+    np.testing.assert_array_equal(lot, np.broadcast_to(attendu, lot.shape))
@@ -0,0 +1,90 @@
+"""
+test_profils_partages.py — Table de profils partagée : cases prises, pierres tombales, len
+Auteur : Moi (ESIEA 3A)
+
+Lancer :
+    PYTHONPATH=. python -m pytest -q tests/test_profils_partages.py
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import adaptive_model
+from app.models.profil import Profil
+from app.models.profils_partages import TablePleine, TableProfilsPartagee
+
+CAPACITE = 16
+
+
+@pytest.fixture
+def table(tmp_path):
+    table = TableProfilsPartagee("test", capacite=CAPACITE, octets_case=1024, dossier=tmp_path)
+    yield table
+    table.fermer(supprimer=True)
+
+
+def cases_prises(table) -> int:
+    return table.metriques()["cases_prises"]
+
+
+def test_inconnus_ne_prennent_pas_de_case(table):
+    for i in range(4 * CAPACITE):
+        assert table.obtenir(f"inconnu_{i}", lambda _: None) is None
+        with table.modifier(f"inconnu_bis_{i}", lambda _: None) as profil:
+            assert profil is None
+        with table.retirer(f"inconnu_ter_{i}", lambda _: None) as profil:
+            assert profil is None
+    assert cases_prises(table) == 0
+    assert len(table) == 0
+
+    # toute la capacité reste disponible pour de vrais profils
+    for i in range(CAPACITE):
+        table[f"apprenant_{i}"] = Profil(f"apprenant_{i}")
+    assert len(table) == CAPACITE
+    with pytest.raises(TablePleine):
+        table["un_de_trop"] = Profil("un_de_trop")
+
+
+def test_get_stats_inconnus_laisse_la_table_libre(table, monkeypatch):
+    monkeypatch.setattr(adaptive_model, "user_profiles", table)
+    client = TestClient(app)
+    for i in range(2 * CAPACITE):
+        assert client.get(f"/api/stats/anonyme_{i}").status_code == 200
+    assert cases_prises(table) == 0
+
+    adaptive_model.update_user_profile("vrai", 1, 1, 12.0, "python", niveau_question=2)
+    assert table.get("vrai").nb_questions == 1
+    assert len(table) == 1
+
+
+def test_pierre_tombale_reprise_par_une_autre_cle(table):
+    for i in range(CAPACITE):
+        table[f"a_{i}"] = Profil(f"a_{i}")
+    for i in range(CAPACITE):
+        assert table.pop(f"a_{i}") is not None
+    assert len(table) == 0
+    assert cases_prises(table) == CAPACITE
+
+    # table sans aucune case vide : les nouvelles clés reprennent les pierres tombales
+    for i in range(CAPACITE):
+        with table.modifier(f"b_{i}", Profil) as profil:
+            profil.nb_questions = i
+    assert len(table) == CAPACITE
+    assert cases_prises(table) == CAPACITE
+    assert all(table.get(f"a_{i}") is None for i in range(CAPACITE))
+    assert all(table.get(f"b_{i}").nb_questions == i for i in range(CAPACITE))
+
+
+def test_len_compte_les_profils(table):
+    table["x"] = Profil("x")
+    table["x"] = Profil("x")
+    table["y"] = Profil("y")
+    assert len(table) == 2
+    table.pop("x")
+    table.pop("x")
+    assert len(table) == 1
+    table.clear()
+    assert len(table) == 0
+    assert table.metriques()["profils"] == 0
+    assert cases_prises(table) == 2